@@ -14,43 +14,46 @@ Date: 2024
 """
 
 import os
-import re
+import hmac
+import copy
 import json
 import numpy as np
-import pandas as pd
+import time
 import logging
+import threading
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 # FastAPI
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
-# Database
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
-# Pretrained NLP Models
-try:
-    from transformers import pipeline, AutoTokenizer, AutoModel
-    from sentence_transformers import SentenceTransformer
-    import torch
-    NLP_AVAILABLE = True
-except ImportError:
+# Pretrained NLP Models (imported by the selected encoder backend, see sentence_encoder.py)
+from sentence_encoder import create_sentence_encoder, sentence_encoder_available
+NLP_AVAILABLE = sentence_encoder_available()
+if not NLP_AVAILABLE:
     print("Transformers not available. Install with: pip install transformers sentence-transformers torch")
-    NLP_AVAILABLE = False
 
-# Traditional ML for fallback
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-    import joblib
-    SKLEARN_AVAILABLE = True
-except ImportError:
-    SKLEARN_AVAILABLE = False
+from embedding_cache import EmbeddingCache
+from artifacts import content_hash, artifact_path, save_array, load_array
+from lazy_services import LazyService
+from keyword_index import FaultKeywordIndex, KeywordGuard, normalize
+from hybrid_retrieval import BM25Index, RetrievalScores, keyword_evidence
+from load_shedding import FULL, KEYWORD, LoadShedder, ResultCache
+from micro_batcher import MAX_BATCH_TEXTS, MicroBatcher
+from db_utils import pooled_connection
+from parts_search import resolve_fault_parts
+from parts_catalogue import catalogue_source
+from repair_history import RepairHistory
+from kb_mining import fault_texts as kb_fault_texts, load_published_kb
+from knowledge_base import changed_faults, load_kb_document
+from parts_associations import add_companion_parts, part_associations
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -75,9 +78,36 @@ class SymptomInput(BaseModel):
     symptoms: List[str]
     vehicle_make: Optional[str] = None
     vehicle_model: Optional[str] = None
+    vehicle_year: Optional[int] = None
     mileage: Optional[int] = None
     additional_info: Optional[str] = None
 
+class JobCardInput(SymptomInput):
+    job_card_id: Optional[str] = None
+
+class BatchDiagnosisInput(BaseModel):
+    job_cards: List[JobCardInput]
+
+# Past job cards consulted per symptom, and the similarity a past symptom needs to count
+HISTORY_TOP_K = int(os.getenv("FAULT_HISTORY_TOP_K", "10"))
+HISTORY_THRESHOLD = float(os.getenv("FAULT_HISTORY_THRESHOLD", "0.6"))
+
+# Retrieval tiers: dense + BM25 rank fusion, or the cheap phrase-weighted keyword matching alone
+RETRIEVAL_MODES = ("hybrid", "keyword")
+# Service tier (load_shedding.py) -> retrieval mode
+TIER_MODES = {FULL: "hybrid", KEYWORD: "keyword"}
+
+# Job cards diagnosed per encoder pass / parts lookup; results stream back after each chunk
+BATCH_CHUNK_SIZE = int(os.getenv("FAULT_BATCH_CHUNK_SIZE", "256"))
+
+# Picks the service tier of each request; parts results of full-tier requests serve the keyword tier
+load_shedder = LoadShedder()
+parts_cache = ResultCache()
+
+# Token for the /admin endpoints (knowledge base reload); unset = admin endpoints disabled
+ML_ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN")
+_kb_reload_lock = threading.Lock()
+
 def get_db():
     try:
         from db_utils import get_connection
@@ -87,555 +117,49 @@ def get_db():
         return None
 
 class AdvancedFaultDiagnosisSystem:
+    SENTENCE_MODEL_NAME = "all-MiniLM-L6-v2"
+
     def __init__(self):
         # NLP Models
         self.symptom_classifier = None
         self.sentence_model = None
-        self.similarity_model = None
         
         # Knowledge base
+        self.kb_version = None
         self.automotive_knowledge_base = []
+        self.fault_texts = []
+        self.keyword_index = None
+        self.bm25_index = None
         self.fault_embeddings = None
+        self.fault_embeddings_normalized = None
+        self.embedding_cache = None
+        self.encode_batcher = None
+        self.repair_history = None
+        self.sentence_model_id = None
+        self._classifier_lock = threading.Lock()
         
         # Initialize system
         self._load_automotive_knowledge_base()
+        self.keyword_index = FaultKeywordIndex(self.automotive_knowledge_base)
+        self.bm25_index = BM25Index(kb_fault_texts(self.automotive_knowledge_base))
         self._initialize_nlp_models()
     
-    def _load_automotive_knowledge_base(self):
-        """Load comprehensive automotive fault knowledge base"""
-        self.automotive_knowledge_base = [
-            # ─── ENGINE ───────────────────────────────────────────────────────
-            {
-                "symptoms": ["engine overheating", "temperature gauge high", "steam from hood", "coolant leak", "radiator boiling"],
-                "fault": "cooling_system_failure",
-                "description": "Cooling system malfunction causing engine overheating",
-                "severity": "high",
-                "parts": ["radiator", "thermostat", "water_pump", "coolant", "radiator_hose"],
-                "diagnostic_steps": [
-                    "Check coolant level in radiator and reservoir",
-                    "Inspect for coolant leaks under vehicle",
-                    "Test thermostat operation with temperature gun",
-                    "Check radiator fan operation",
-                    "Pressure test cooling system for leaks"
-                ]
-            },
-            {
-                "symptoms": ["engine won't start", "no crank", "battery dead", "clicking sound", "dim lights", "car not starting"],
-                "fault": "battery_charging_failure",
-                "description": "Battery or charging system malfunction",
-                "severity": "high",
-                "parts": ["battery", "alternator", "starter_motor", "battery_cables"],
-                "diagnostic_steps": [
-                    "Test battery voltage (should be 12.6V when off)",
-                    "Check battery terminals for corrosion",
-                    "Test alternator charging rate (13.5-14.5V when running)",
-                    "Check for parasitic drain",
-                    "Load test battery capacity"
-                ]
-            },
-            {
-                "symptoms": ["engine rough idle", "shaking", "vibration", "misfiring", "poor acceleration", "engine stuttering"],
-                "fault": "engine_misfire",
-                "description": "Engine misfiring due to ignition or fuel system issues",
-                "severity": "medium",
-                "parts": ["spark_plug", "ignition_coil", "fuel_injector", "air_filter", "fuel_filter"],
-                "diagnostic_steps": [
-                    "Scan for diagnostic trouble codes (DTCs)",
-                    "Check spark plugs condition and gap",
-                    "Test ignition coils with multimeter",
-                    "Check fuel injector operation",
-                    "Verify compression in all cylinders"
-                ]
-            },
-            {
-                "symptoms": ["engine knocking", "ticking noise", "metal knocking sound", "engine rattling", "rod knock"],
-                "fault": "engine_bearing_wear",
-                "description": "Engine internal bearing wear causing knocking noise",
-                "severity": "critical",
-                "parts": ["engine_bearing", "engine_oil", "oil_pump", "crankshaft"],
-                "diagnostic_steps": [
-                    "Check engine oil level and pressure",
-                    "Listen for knock location (top vs bottom)",
-                    "Check oil pressure with gauge",
-                    "Inspect oil for metal particles",
-                    "Perform oil analysis"
-                ]
-            },
-            {
-                "symptoms": ["oil leak", "oil puddle under car", "burning oil smell", "blue smoke exhaust", "oil consumption high"],
-                "fault": "oil_seal_failure",
-                "description": "Engine oil leak from seals or gaskets",
-                "severity": "medium",
-                "parts": ["oil_seal", "gasket", "valve_cover_gasket", "engine_oil"],
-                "diagnostic_steps": [
-                    "Identify leak location with UV dye",
-                    "Check valve cover gasket condition",
-                    "Inspect rear main seal",
-                    "Check oil pan gasket",
-                    "Monitor oil level daily"
-                ]
-            },
-            {
-                "symptoms": ["white smoke exhaust", "coolant loss", "sweet smell exhaust", "milky oil", "overheating with no leak"],
-                "fault": "head_gasket_failure",
-                "description": "Head gasket blown causing coolant and oil mixing",
-                "severity": "critical",
-                "parts": ["head_gasket", "cylinder_head", "coolant"],
-                "diagnostic_steps": [
-                    "Check oil dipstick for milky appearance",
-                    "Test coolant for combustion gases",
-                    "Perform compression test",
-                    "Check for bubbles in coolant reservoir",
-                    "Inspect spark plugs for coolant fouling"
-                ]
-            },
-            {
-                "symptoms": ["check engine light", "engine warning light", "malfunction indicator lamp", "OBD fault code"],
-                "fault": "engine_management_fault",
-                "description": "Engine management system fault detected",
-                "severity": "medium",
-                "parts": ["oxygen_sensor", "mass_airflow_sensor", "throttle_body", "EGR_valve"],
-                "diagnostic_steps": [
-                    "Scan OBD-II for fault codes",
-                    "Check oxygen sensor readings",
-                    "Inspect mass airflow sensor",
-                    "Test throttle position sensor",
-                    "Check EGR valve operation"
-                ]
-            },
-
-            # ─── BRAKES ───────────────────────────────────────────────────────
-            {
-                "symptoms": ["brake noise", "squealing", "grinding", "metallic sound when braking", "brakes screeching"],
-                "fault": "brake_pad_wear",
-                "description": "Brake pads worn beyond safe limits",
-                "severity": "high",
-                "parts": ["brake_pad", "brake_disc", "brake_fluid"],
-                "diagnostic_steps": [
-                    "Visual inspection of brake pads through wheel",
-                    "Measure brake pad thickness (minimum 3mm)",
-                    "Check brake disc condition for scoring",
-                    "Inspect brake fluid level and color",
-                    "Test brake pedal feel and travel"
-                ]
-            },
-            {
-                "symptoms": ["brake pedal soft", "spongy feel", "pedal goes to floor", "brake warning light", "brakes not working", "brake failure"],
-                "fault": "brake_fluid_leak",
-                "description": "Brake fluid leak causing loss of braking pressure",
-                "severity": "critical",
-                "parts": ["brake_fluid", "brake_hose", "master_cylinder", "brake_caliper"],
-                "diagnostic_steps": [
-                    "Check brake fluid reservoir level",
-                    "Inspect brake lines for leaks",
-                    "Test brake pedal for firmness",
-                    "Check brake fluid color (should be clear/amber)",
-                    "Pressure test brake system"
-                ]
-            },
-            {
-                "symptoms": ["brake vibration", "steering wheel shakes when braking", "pulsating brakes", "juddering brakes"],
-                "fault": "warped_brake_disc",
-                "description": "Brake disc warped causing vibration when braking",
-                "severity": "medium",
-                "parts": ["brake_disc", "brake_pad"],
-                "diagnostic_steps": [
-                    "Measure brake disc thickness variation",
-                    "Check disc runout with dial gauge",
-                    "Inspect disc for heat cracks",
-                    "Check wheel bearing play",
-                    "Road test for vibration pattern"
-                ]
-            },
-            {
-                "symptoms": ["car pulling to one side when braking", "uneven braking", "brake drag", "one wheel locking"],
-                "fault": "brake_caliper_fault",
-                "description": "Brake caliper seized or sticking",
-                "severity": "high",
-                "parts": ["brake_caliper", "brake_pad", "brake_hose"],
-                "diagnostic_steps": [
-                    "Check caliper slide pins for seizure",
-                    "Inspect caliper piston movement",
-                    "Check for uneven pad wear",
-                    "Test wheel temperature after driving",
-                    "Inspect brake hose for internal collapse"
-                ]
-            },
-
-            # ─── TRANSMISSION / CLUTCH ────────────────────────────────────────
-            {
-                "symptoms": ["gear shifting hard", "difficult shifting", "transmission slipping", "delayed engagement", "gears not engaging"],
-                "fault": "transmission_fluid_low",
-                "description": "Low transmission fluid affecting gear operation",
-                "severity": "medium",
-                "parts": ["transmission_fluid", "transmission_filter", "transmission_gasket"],
-                "diagnostic_steps": [
-                    "Check transmission fluid level with engine running",
-                    "Inspect fluid color (should be red/pink)",
-                    "Check for transmission fluid leaks",
-                    "Test shift quality during road test",
-                    "Scan for transmission trouble codes"
-                ]
-            },
-            {
-                "symptoms": ["clutch slipping", "clutch not engaging", "clutch pedal high", "burning smell clutch", "clutch judder"],
-                "fault": "clutch_wear",
-                "description": "Clutch plate worn out requiring replacement",
-                "severity": "high",
-                "parts": ["clutch_plate", "clutch_bearing", "pressure_plate", "flywheel"],
-                "diagnostic_steps": [
-                    "Test clutch engagement point height",
-                    "Check clutch pedal free play",
-                    "Test for clutch slip under load",
-                    "Inspect clutch hydraulic system",
-                    "Check flywheel condition"
-                ]
-            },
-            {
-                "symptoms": ["gear slipping out", "popping out of gear", "transmission noise", "whining in gear"],
-                "fault": "transmission_gear_fault",
-                "description": "Transmission gear synchronizer or bearing wear",
-                "severity": "high",
-                "parts": ["transmission_bearing", "gear_synchronizer", "transmission_oil"],
-                "diagnostic_steps": [
-                    "Check transmission oil level and condition",
-                    "Test all gear positions for engagement",
-                    "Listen for noise in specific gears",
-                    "Check gear linkage adjustment",
-                    "Inspect transmission mounts"
-                ]
-            },
+    def _load_automotive_knowledge_base(self, document: Optional[Dict] = None):
+        """Load comprehensive automotive fault knowledge base (a knowledge_base.py document, default the data file)"""
+        document = document or load_kb_document()
+        base_knowledge_base = document["faults"]
+        # Mined from repair invoices (kb_mining.py) when published for this built-in KB
+        self.automotive_knowledge_base = load_published_kb(base_knowledge_base) or base_knowledge_base
+        self.kb_version = document["version"]
+        if document["system_keywords"] != self.SYSTEM_KEYWORDS:
+            self.SYSTEM_KEYWORDS = document["system_keywords"]
+            self.KEYWORD_GUARD = KeywordGuard(self.SYSTEM_KEYWORDS)
+        logger.info(f"Loaded {len(self.automotive_knowledge_base)} fault patterns (knowledge base version {self.kb_version})")
 
-            # ─── ELECTRICAL ───────────────────────────────────────────────────
-            {
-                "symptoms": ["lights dim", "headlight weak", "electrical problems", "battery drains overnight", "alternator warning light"],
-                "fault": "alternator_failure",
-                "description": "Alternator not charging battery properly",
-                "severity": "high",
-                "parts": ["alternator", "alternator_belt", "voltage_regulator"],
-                "diagnostic_steps": [
-                    "Test charging voltage at battery terminals",
-                    "Check alternator belt tension and condition",
-                    "Test alternator output under load",
-                    "Inspect electrical connections",
-                    "Check for warning lights on dashboard"
-                ]
-            },
-            {
-                "symptoms": ["starter motor not working", "engine cranks slowly", "starter clicking", "starter grinding noise"],
-                "fault": "starter_motor_failure",
-                "description": "Starter motor malfunction preventing engine start",
-                "severity": "high",
-                "parts": ["starter_motor", "starter_solenoid", "battery"],
-                "diagnostic_steps": [
-                    "Test battery voltage under load",
-                    "Check starter motor connections",
-                    "Test starter solenoid operation",
-                    "Check flywheel ring gear condition",
-                    "Measure voltage drop at starter"
-                ]
-            },
-            {
-                "symptoms": ["fuse blowing", "electrical short", "burning smell electrical", "sparks from wiring", "lights flickering"],
-                "fault": "electrical_short_circuit",
-                "description": "Electrical short circuit in vehicle wiring",
-                "severity": "critical",
-                "parts": ["fuse", "relay", "wiring_harness"],
-                "diagnostic_steps": [
-                    "Identify which circuit is affected",
-                    "Check fuse box for blown fuses",
-                    "Inspect wiring for chafing or damage",
-                    "Test circuit with multimeter",
-                    "Check for water ingress in connectors"
-                ]
-            },
-
-            # ─── STEERING ─────────────────────────────────────────────────────
-            {
-                "symptoms": ["steering heavy", "hard to steer", "power steering failure", "steering wheel stiff", "no power steering"],
-                "fault": "power_steering_failure",
-                "description": "Power steering system malfunction",
-                "severity": "high",
-                "parts": ["power_steering_pump", "power_steering_fluid", "steering_rack", "power_steering_belt"],
-                "diagnostic_steps": [
-                    "Check power steering fluid level",
-                    "Inspect power steering belt condition",
-                    "Test pump pressure output",
-                    "Check for fluid leaks at rack",
-                    "Inspect steering column joints"
-                ]
-            },
-            {
-                "symptoms": ["steering wheel vibration", "steering shimmy", "car pulling left", "car pulling right", "wheel wobble"],
-                "fault": "wheel_alignment_issue",
-                "description": "Wheel alignment or balance problem",
-                "severity": "medium",
-                "parts": ["tie_rod_end", "ball_joint", "wheel_bearing", "steering_rack"],
-                "diagnostic_steps": [
-                    "Check tire pressure in all wheels",
-                    "Inspect tire wear pattern",
-                    "Check wheel balance",
-                    "Measure wheel alignment angles",
-                    "Inspect tie rod ends for play"
-                ]
-            },
-            {
-                "symptoms": ["steering noise", "clunking when turning", "knocking when steering", "creaking steering"],
-                "fault": "steering_joint_wear",
-                "description": "Steering joints or ball joints worn",
-                "severity": "high",
-                "parts": ["ball_joint", "tie_rod_end", "steering_rack", "CV_joint"],
-                "diagnostic_steps": [
-                    "Check ball joint play with pry bar",
-                    "Inspect tie rod end for looseness",
-                    "Test steering rack for play",
-                    "Check CV joint boots for damage",
-                    "Inspect steering column universal joints"
-                ]
-            },
-
-            # ─── SUSPENSION ───────────────────────────────────────────────────
-            {
-                "symptoms": ["car bouncing", "rough ride", "excessive body roll", "nose diving when braking", "suspension bottoming out"],
-                "fault": "shock_absorber_wear",
-                "description": "Worn shock absorbers affecting ride quality",
-                "severity": "medium",
-                "parts": ["shock_absorber", "strut_mount", "suspension_spring"],
-                "diagnostic_steps": [
-                    "Visual inspection of shock absorbers for leaks",
-                    "Bounce test - push down on each corner",
-                    "Check for uneven tire wear patterns",
-                    "Inspect suspension mounting points",
-                    "Road test for handling characteristics"
-                ]
-            },
-            {
-                "symptoms": ["suspension noise", "clunking over bumps", "rattling suspension", "knocking from wheel area"],
-                "fault": "suspension_component_wear",
-                "description": "Suspension bushes or links worn causing noise",
-                "severity": "medium",
-                "parts": ["suspension_bush", "stabilizer_link", "strut_mount", "control_arm"],
-                "diagnostic_steps": [
-                    "Inspect anti-roll bar links",
-                    "Check suspension bush condition",
-                    "Test strut top mount bearing",
-                    "Inspect control arm bushes",
-                    "Check for loose suspension bolts"
-                ]
-            },
-            {
-                "symptoms": ["uneven tire wear", "tire wearing on inside", "tire wearing on outside", "feathering tire wear"],
-                "fault": "wheel_alignment_camber",
-                "description": "Incorrect wheel alignment causing uneven tire wear",
-                "severity": "medium",
-                "parts": ["tie_rod_end", "ball_joint", "control_arm"],
-                "diagnostic_steps": [
-                    "Measure camber, caster and toe angles",
-                    "Check for bent suspension components",
-                    "Inspect control arm bushes",
-                    "Check for accident damage",
-                    "Perform 4-wheel alignment"
-                ]
-            },
-
-            # ─── AIR CONDITIONING ─────────────────────────────────────────────
-            {
-                "symptoms": ["ac not cooling", "warm air from ac", "ac compressor noise", "refrigerant leak", "ac not working"],
-                "fault": "ac_system_failure",
-                "description": "Air conditioning system malfunction",
-                "severity": "low",
-                "parts": ["ac_compressor", "ac_refrigerant", "ac_filter", "ac_belt"],
-                "diagnostic_steps": [
-                    "Check AC refrigerant pressure",
-                    "Inspect AC compressor operation",
-                    "Test AC clutch engagement",
-                    "Check cabin air filter condition",
-                    "Inspect AC system for leaks"
-                ]
-            },
-            {
-                "symptoms": ["bad smell from ac", "musty smell air conditioning", "mold smell vents", "ac smell"],
-                "fault": "ac_evaporator_contamination",
-                "description": "AC evaporator contaminated with mold or bacteria",
-                "severity": "low",
-                "parts": ["ac_filter", "ac_evaporator"],
-                "diagnostic_steps": [
-                    "Replace cabin air filter",
-                    "Clean evaporator with antibacterial spray",
-                    "Check drain tube for blockage",
-                    "Run AC on max for 10 minutes",
-                    "Inspect evaporator housing"
-                ]
-            },
-
-            # ─── FUEL SYSTEM ──────────────────────────────────────────────────
-            {
-                "symptoms": ["engine stalling", "fuel smell", "poor fuel economy", "hard starting", "engine hesitation"],
-                "fault": "fuel_system_issue",
-                "description": "Fuel delivery or quality problems",
-                "severity": "medium",
-                "parts": ["fuel_pump", "fuel_filter", "fuel_injector", "fuel_pressure_regulator"],
-                "diagnostic_steps": [
-                    "Test fuel pressure at rail",
-                    "Check fuel pump operation",
-                    "Inspect fuel filter condition",
-                    "Test fuel injector spray pattern",
-                    "Check for fuel system leaks"
-                ]
-            },
-            {
-                "symptoms": ["black smoke exhaust", "rich fuel mixture", "fuel smell from exhaust", "excessive fuel consumption"],
-                "fault": "fuel_injector_fault",
-                "description": "Fuel injectors leaking or stuck open",
-                "severity": "medium",
-                "parts": ["fuel_injector", "fuel_pressure_regulator", "oxygen_sensor"],
-                "diagnostic_steps": [
-                    "Test injector balance with scan tool",
-                    "Check fuel pressure regulator",
-                    "Inspect injector O-rings for leaks",
-                    "Test oxygen sensor readings",
-                    "Check for fuel trim codes"
-                ]
-            },
-
-            # ─── EXHAUST ──────────────────────────────────────────────────────
-            {
-                "symptoms": ["loud exhaust", "exhaust noise", "rumbling exhaust", "exhaust hole", "exhaust blowing"],
-                "fault": "exhaust_system_damage",
-                "description": "Exhaust system damaged or corroded",
-                "severity": "medium",
-                "parts": ["muffler", "exhaust_pipe", "exhaust_gasket"],
-                "diagnostic_steps": [
-                    "Inspect exhaust system for holes",
-                    "Check exhaust manifold gasket",
-                    "Inspect muffler condition",
-                    "Check exhaust hangers",
-                    "Test for exhaust leaks with smoke"
-                ]
-            },
-            {
-                "symptoms": ["catalytic converter smell", "sulfur smell exhaust", "rotten egg smell", "cat converter rattle"],
-                "fault": "catalytic_converter_failure",
-                "description": "Catalytic converter damaged or clogged",
-                "severity": "medium",
-                "parts": ["catalytic_converter", "oxygen_sensor"],
-                "diagnostic_steps": [
-                    "Check for P0420/P0430 fault codes",
-                    "Test oxygen sensor before and after cat",
-                    "Check exhaust back pressure",
-                    "Inspect for physical damage",
-                    "Test converter efficiency"
-                ]
-            },
-
-            # ─── TYRES / WHEELS ───────────────────────────────────────────────
-            {
-                "symptoms": ["flat tyre", "tyre puncture", "tyre pressure low", "tyre deflating", "slow puncture"],
-                "fault": "tyre_puncture",
-                "description": "Tyre puncture or valve failure",
-                "severity": "high",
-                "parts": ["tyre", "tyre_valve", "wheel"],
-                "diagnostic_steps": [
-                    "Check tyre pressure in all wheels",
-                    "Inspect tyre for nails or objects",
-                    "Check valve stem for leaks",
-                    "Submerge tyre in water to find leak",
-                    "Inspect wheel rim for damage"
-                ]
-            },
-            {
-                "symptoms": ["wheel bearing noise", "humming noise driving", "grinding noise from wheel", "wheel noise speed related"],
-                "fault": "wheel_bearing_failure",
-                "description": "Wheel bearing worn causing humming or grinding noise",
-                "severity": "high",
-                "parts": ["wheel_bearing", "hub_assembly"],
-                "diagnostic_steps": [
-                    "Jack up car and spin wheel by hand",
-                    "Check for play in wheel bearing",
-                    "Listen for noise change when turning",
-                    "Check ABS sensor ring condition",
-                    "Inspect hub assembly"
-                ]
-            },
-
-            # ─── COOLING SYSTEM (additional) ──────────────────────────────────
-            {
-                "symptoms": ["radiator leaking", "coolant dripping", "green fluid under car", "coolant puddle"],
-                "fault": "radiator_leak",
-                "description": "Radiator or coolant hose leaking",
-                "severity": "high",
-                "parts": ["radiator", "radiator_hose", "coolant", "radiator_cap"],
-                "diagnostic_steps": [
-                    "Pressure test cooling system",
-                    "Inspect radiator for cracks",
-                    "Check all hose connections",
-                    "Test radiator cap pressure rating",
-                    "Check water pump weep hole"
-                ]
-            },
-
-            # ─── BODY / WINDOWS ───────────────────────────────────────────────
-            {
-                "symptoms": ["window not working", "electric window stuck", "window motor noise", "window off track"],
-                "fault": "window_regulator_failure",
-                "description": "Window regulator or motor failure",
-                "severity": "low",
-                "parts": ["glass_winder", "window_motor", "window_regulator"],
-                "diagnostic_steps": [
-                    "Test window switch operation",
-                    "Check window motor fuse",
-                    "Inspect regulator mechanism",
-                    "Test motor with direct power",
-                    "Check window track alignment"
-                ]
-            },
-            {
-                "symptoms": ["horn not working", "horn weak", "horn stuck on", "no horn sound"],
-                "fault": "horn_failure",
-                "description": "Horn malfunction",
-                "severity": "low",
-                "parts": ["horn", "horn_relay", "horn_fuse"],
-                "diagnostic_steps": [
-                    "Check horn fuse",
-                    "Test horn relay",
-                    "Check horn switch in steering wheel",
-                    "Test horn with direct power",
-                    "Inspect horn mounting and connections"
-                ]
-            },
-            {
-                "symptoms": ["wiper not working", "wiper streaking", "wiper blade worn", "wiper motor fault", "wipers not clearing"],
-                "fault": "wiper_system_fault",
-                "description": "Windscreen wiper system malfunction",
-                "severity": "medium",
-                "parts": ["wiper_blade", "wiper_motor", "wiper_linkage"],
-                "diagnostic_steps": [
-                    "Check wiper blade condition",
-                    "Test wiper motor operation",
-                    "Check wiper fuse and relay",
-                    "Inspect wiper linkage",
-                    "Test wiper switch"
-                ]
-            },
-
-            # ─── LIGHTS ───────────────────────────────────────────────────────
-            {
-                "symptoms": ["headlight not working", "bulb blown", "lights not working", "indicator not working", "tail light out"],
-                "fault": "lighting_failure",
-                "description": "Vehicle lighting system fault",
-                "severity": "medium",
-                "parts": ["bulb", "lights", "fuse", "relay"],
-                "diagnostic_steps": [
-                    "Check bulb condition",
-                    "Test fuse for lighting circuit",
-                    "Check relay operation",
-                    "Inspect wiring connections",
-                    "Test switch operation"
-                ]
-            },
-        ]
-
-        logger.info(f"Loaded {len(self.automotive_knowledge_base)} fault patterns")
+    @staticmethod
+    def builtin_knowledge_base() -> List[Dict]:
+        """Hand-written automotive fault knowledge base (fault_knowledge_base.json)"""
+        return load_kb_document()["faults"]
     
     def _initialize_nlp_models(self):
         """Initialize pretrained NLP models"""
@@ -647,119 +171,138 @@ class AdvancedFaultDiagnosisSystem:
             logger.info("Loading pretrained NLP models...")
             
             # 1. Sentence transformer for semantic similarity
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+            # (ONNX Runtime int8 or PyTorch fp32, FAULT_ENCODER_BACKEND)
+            self.sentence_model = create_sentence_encoder(self.SENTENCE_MODEL_NAME)
+            self.sentence_model_id = self.sentence_model.model_id
             logger.info("✅ Sentence transformer loaded")
             
-            # 2. Text classification pipeline
-            self.symptom_classifier = pipeline(
-                "text-classification",
-                model="distilbert-base-uncased",
-                return_all_scores=True
-            )
-            logger.info("✅ Text classifier loaded")
+            # Cache of symptom embeddings, keyed by model name and backend/version
+            self.embedding_cache = EmbeddingCache(self.sentence_model_id, self.sentence_model.dimension)
+            
+            # Concurrent requests' symptom texts are embedded together in micro-batches
+            self.encode_batcher = MicroBatcher(self.sentence_model.encode)
+            
+            # 2. Text classification pipeline is loaded on first use (get_symptom_classifier)
             
             # 3. Precompute embeddings for fault knowledge base
             self._precompute_fault_embeddings()
             
+            # 4. Nearest-neighbour index of past job cards, when one has been built
+            self._load_repair_history()
+            
         except Exception as e:
             logger.error(f"Failed to load NLP models: {e}")
             self.sentence_model = None
-            self.symptom_classifier = None
     
-    def _precompute_fault_embeddings(self):
-        """Precompute embeddings for all fault patterns"""
+    def get_symptom_classifier(self):
+        """Text classification pipeline, loaded lazily on first request"""
+        if self.symptom_classifier is None and NLP_AVAILABLE:
+            with self._classifier_lock:
+                if self.symptom_classifier is None:
+                    try:
+                        from transformers import pipeline
+                        self.symptom_classifier = pipeline(
+                            "text-classification",
+                            model="distilbert-base-uncased",
+                            return_all_scores=True
+                        )
+                        logger.info("✅ Text classifier loaded")
+                    except Exception as e:
+                        logger.error(f"Failed to load text classifier: {e}")
+        return self.symptom_classifier
+    
+    def _precompute_fault_embeddings(self, known: Optional[Dict[str, np.ndarray]] = None) -> int:
+        """
+        Precompute embeddings for all fault patterns; `known` maps fault texts
+        already embedded (by the previous KB version) to their rows, so only new
+        or changed faults are encoded. Returns the number of texts encoded.
+        """
         if not self.sentence_model:
-            return
+            return 0
         
         try:
-            fault_texts = []
-            for fault in self.automotive_knowledge_base:
-                # Combine symptoms and description for better matching
-                text = " ".join(fault["symptoms"]) + " " + fault["description"]
-                fault_texts.append(text)
+            # Combine symptoms and description for better matching
+            fault_texts = kb_fault_texts(self.automotive_knowledge_base)
             
-            # Compute embeddings
-            self.fault_embeddings = self.sentence_model.encode(fault_texts)
-            logger.info(f"✅ Precomputed embeddings for {len(fault_texts)} fault patterns")
+            # Reuse the persisted embeddings unless the KB text or the model changed
+            kb_hash = content_hash(fault_texts, self.sentence_model_id)
+            path = artifact_path("kb_embeddings", f"{kb_hash[:16]}.npy")
+            embeddings = load_array(path)
+            encoded = 0
+            if embeddings is not None and embeddings.shape[0] == len(fault_texts):
+                logger.info(f"✅ Loaded embeddings for {len(fault_texts)} fault patterns from {path}")
+            else:
+                known = known or {}
+                missing = [text for text in dict.fromkeys(fault_texts) if text not in known]
+                if missing:
+                    known = {**known, **dict(zip(missing, self.sentence_model.encode(missing)))}
+                embeddings = np.stack([known[text] for text in fault_texts])
+                encoded = len(missing)
+                save_array(path, embeddings)
+                logger.info(f"✅ Precomputed embeddings for {len(fault_texts)} fault patterns, "
+                            f"{encoded} encoded ({path})")
+            
+            self.fault_texts = fault_texts
+            self.fault_embeddings = embeddings
+            self.fault_embeddings_normalized = self._l2_normalize(embeddings)
+            return encoded
             
         except Exception as e:
             logger.error(f"Failed to precompute embeddings: {e}")
+            return 0
+    
+    def _load_repair_history(self):
+        """Job-card history index from build_history_index.py, if built with the current encoder"""
+        history = RepairHistory.load()
+        if history is None:
+            return
+        if history.model_id != self.sentence_model_id:
+            logger.warning(f"⚠️ Repair history built with {history.model_id}, encoder is {self.sentence_model_id}: rebuild it")
+            return
+        self._fault_by_code = {fault["fault"]: fault for fault in self.automotive_knowledge_base}
+        history.restrict_to(self._fault_by_code)
+        self.repair_history = history
     
-    # System keyword guard: maps symptom keywords -> allowed fault codes.
+    def with_knowledge_base(self, document: Dict) -> "AdvancedFaultDiagnosisSystem":
+        """
+        A new engine serving another knowledge base version. The models, caches
+        and encoder queue are shared; the KB, keyword guard, keyword / BM25
+        indexes and fault embeddings are rebuilt, encoding only the fault texts
+        this engine has not embedded. This engine is left untouched, so requests
+        holding it keep being served from the old version while the new one is
+        swapped in.
+        """
+        engine = copy.copy(self)
+        engine._load_automotive_knowledge_base(document)
+        engine.keyword_index = FaultKeywordIndex(engine.automotive_knowledge_base)
+        engine.bm25_index = BM25Index(kb_fault_texts(engine.automotive_knowledge_base))
+        engine.kb_changes = changed_faults(self.automotive_knowledge_base, engine.automotive_knowledge_base)
+        engine.kb_encoded = 0
+        if self.fault_embeddings is not None:
+            engine.fault_embeddings = engine.fault_embeddings_normalized = None
+            engine.kb_encoded = engine._precompute_fault_embeddings(dict(zip(self.fault_texts, self.fault_embeddings)))
+            if engine.fault_embeddings_normalized is None:
+                raise RuntimeError("fault embeddings of the new knowledge base could not be computed")
+        if self.repair_history is not None:
+            engine._fault_by_code = {fault["fault"]: fault for fault in engine.automotive_knowledge_base}
+            engine.repair_history = self.repair_history.restricted_copy(engine._fault_by_code)
+        return engine
+    
+    @staticmethod
+    def _l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+        """Row-normalize embeddings so a dot product is the cosine similarity"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+    
+    # System keyword guard (fault_knowledge_base.json): maps symptom keywords -> allowed fault codes.
     # More specific keywords (longer phrases, more specific terms) take priority.
     # When multiple keywords match, the MOST SPECIFIC one wins (fewest allowed faults).
-    SYSTEM_KEYWORDS = {
-        # --- Cooling / Overheating (most specific — must come before "engine") ---
-        "overheating": ["cooling_system_failure", "head_gasket_failure", "radiator_leak"],
-        "overheat":    ["cooling_system_failure", "head_gasket_failure", "radiator_leak"],
-        "coolant":     ["cooling_system_failure", "head_gasket_failure", "radiator_leak"],
-        "radiator":    ["cooling_system_failure", "radiator_leak"],
-        "temperature gauge": ["cooling_system_failure", "head_gasket_failure"],
-        "steam":       ["cooling_system_failure", "head_gasket_failure"],
-        # --- Brakes ---
-        "brake":    ["brake_pad_wear", "brake_fluid_leak", "warped_brake_disc", "brake_caliper_fault"],
-        "braking":  ["brake_pad_wear", "brake_fluid_leak", "warped_brake_disc", "brake_caliper_fault"],
-        "squealing": ["brake_pad_wear"],
-        "squeal":    ["brake_pad_wear"],
-        "grinding":  ["brake_pad_wear", "wheel_bearing_failure"],
-        # --- Transmission / Clutch ---
-        "clutch":       ["clutch_wear", "transmission_fluid_low"],
-        "gear":         ["transmission_fluid_low", "transmission_gear_fault", "clutch_wear"],
-        "gearbox":      ["transmission_fluid_low", "transmission_gear_fault", "clutch_wear"],
-        "transmission": ["transmission_fluid_low", "transmission_gear_fault", "clutch_wear"],
-        # --- Steering ---
-        "steering": ["power_steering_failure", "wheel_alignment_issue", "steering_joint_wear"],
-        # --- Engine (generic — only used when no specific engine keyword matched) ---
-        "engine": ["cooling_system_failure", "engine_misfire", "engine_bearing_wear",
-                   "oil_seal_failure", "head_gasket_failure", "engine_management_fault",
-                   "fuel_system_issue"],
-        "misfire": ["engine_misfire"],
-        "knocking": ["engine_bearing_wear"],
-        "knock":    ["engine_bearing_wear"],
-        "idle":     ["engine_misfire", "fuel_system_issue"],
-        "stalling": ["fuel_system_issue", "engine_misfire"],
-        "stall":    ["fuel_system_issue", "engine_misfire"],
-        # --- Oil ---
-        "oil leak": ["oil_seal_failure", "engine_bearing_wear"],
-        "oil":      ["oil_seal_failure", "engine_bearing_wear"],
-        # --- Fuel ---
-        "fuel": ["fuel_system_issue", "fuel_injector_fault"],
-        # --- Electrical ---
-        "battery":    ["battery_charging_failure", "alternator_failure"],
-        "alternator": ["alternator_failure", "battery_charging_failure"],
-        "starter":    ["starter_motor_failure", "battery_charging_failure"],
-        "not starting": ["battery_charging_failure", "starter_motor_failure"],
-        "won't start":  ["battery_charging_failure", "starter_motor_failure"],
-        "wont start":   ["battery_charging_failure", "starter_motor_failure"],
-        "check engine": ["engine_management_fault"],
-        "warning light": ["engine_management_fault", "brake_fluid_leak", "battery_charging_failure"],
-        # --- Suspension ---
-        "suspension": ["shock_absorber_wear", "suspension_component_wear", "wheel_alignment_camber"],
-        "bouncing":   ["shock_absorber_wear", "suspension_component_wear"],
-        "rough ride": ["shock_absorber_wear", "suspension_component_wear"],
-        # --- Wheels / Tyres ---
-        "tyre":     ["tyre_puncture", "wheel_bearing_failure", "wheel_alignment_issue"],
-        "tire":     ["tyre_puncture", "wheel_bearing_failure", "wheel_alignment_issue"],
-        "puncture": ["tyre_puncture"],
-        "flat tyre": ["tyre_puncture"],
-        "flat tire": ["tyre_puncture"],
-        "wheel bearing": ["wheel_bearing_failure"],
-        "humming":  ["wheel_bearing_failure"],
-        # --- Exhaust ---
-        "exhaust": ["exhaust_system_damage", "catalytic_converter_failure"],
-        "smoke":   ["oil_seal_failure", "head_gasket_failure", "exhaust_system_damage"],
-        # --- AC ---
-        "air conditioning": ["ac_system_failure", "ac_evaporator_contamination"],
-        "ac not": ["ac_system_failure"],
-        # --- Misc ---
-        "vibration": ["wheel_alignment_issue", "warped_brake_disc", "wheel_bearing_failure"],
-        "pulling":   ["wheel_alignment_issue", "brake_caliper_fault", "tyre_puncture"],
-        "window":    ["window_regulator_failure"],
-        "wiper":     ["wiper_system_fault"],
-        "horn":      ["horn_failure"],
-        "headlight": ["lighting_failure"],
-        "lights":    ["lighting_failure", "alternator_failure"],
-    }
+    # An engine built from a reloaded KB version carries its own guard (instance attributes).
+    SYSTEM_KEYWORDS = load_kb_document()["system_keywords"]
+
+    # Compiled once at class load: one automaton scan + stem lookups per symptom
+    KEYWORD_GUARD = KeywordGuard(SYSTEM_KEYWORDS)
 
     def _allowed_faults(self, symptom: str) -> set:
         """
@@ -768,125 +311,181 @@ class AdvancedFaultDiagnosisSystem:
         When multiple keywords match, prefer the most specific one
         (the one with the fewest allowed faults = more targeted).
         """
-        s = self._normalize(symptom)
-        s_nospace = s.replace(" ", "")
-
-        matched = []  # list of (specificity, fault_set)
-        for kw, faults in self.SYSTEM_KEYWORDS.items():
-            kw_norm = kw.replace(" ", "")
-            hit = False
-            # Substring match (handles multi-word keys like "check engine")
-            if kw_norm in s_nospace or kw in s:
-                hit = True
+        return self.KEYWORD_GUARD.allowed_faults(symptom)
+
+    def _collect_hybrid_matches(self, scores: RetrievalScores, threshold: float, allowed: set,
+                                triggered_by: str, seen_faults: Dict):
+        """
+        Keep the best-scoring result per fault among the top 5 by fused rank that
+        any retriever supports: cosine similarity above threshold, a BM25 score
+        within 40% of the best keyword match, or a similar past job card
+        """
+        supported = (scores.dense > threshold) | keyword_evidence(scores.keyword)
+        if scores.history is not None:
+            supported |= scores.history > 0
+        evidence = np.flatnonzero(supported)
+        # Best fused rank first; equal fused scores go to the stronger keyword match
+        order = np.lexsort((-scores.keyword[evidence], -scores.fused[evidence]))[:5]
+        for idx in evidence[order]:
+            fault = self.automotive_knowledge_base[idx]
+            fault_code = fault["fault"]
+            # Apply system keyword guard
+            if allowed and fault_code not in allowed:
+                continue
+            confidence = round(float(scores.fused[idx]), 4)
+            retrieval_scores = {
+                "semantic": round(float(scores.dense[idx]), 4),
+                "keyword": round(float(scores.keyword[idx]), 4),
+            }
+            if scores.history is not None:
+                retrieval_scores["history"] = round(float(scores.history[idx]), 4)
+            if fault_code not in seen_faults or confidence > seen_faults[fault_code]["confidence"]:
+                seen_faults[fault_code] = {
+                    "fault": fault_code,
+                    "description": fault["description"],
+                    "confidence": confidence,
+                    "severity": fault["severity"],
+                    "parts": fault["parts"],
+                    "diagnostic_steps": fault["diagnostic_steps"],
+                    "triggered_by": triggered_by,
+                    "retrieval_scores": retrieval_scores
+                }
+
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches of at most MAX_BATCH_TEXTS, reusing cached embeddings for phrases seen before"""
+        def encode(batch):
+            # Timed from the caller's side: queue wait in the micro-batcher counts as encoder latency
+            start = time.perf_counter()
+            if self.encode_batcher is not None:
+                embeddings = self.encode_batcher.encode(batch)
             else:
-                # Stem match for single-word keywords only (>= 5 chars to avoid noise)
-                if " " not in kw and len(kw_norm) >= 5:
-                    for user_word in s.split():
-                        if len(user_word) >= 5 and (
-                            user_word.startswith(kw_norm) or kw_norm.startswith(user_word)
-                        ):
-                            hit = True
-                            break
-            if hit:
-                matched.append((len(faults), set(faults)))
-
-        if not matched:
-            return set()
-
-        # Sort by specificity: fewest faults = most specific
-        matched.sort(key=lambda x: x[0])
-        most_specific_count = matched[0][0]
-
-        # Union of all matches that are equally specific (or within 2x of most specific)
-        allowed = set()
-        for count, faults in matched:
-            if count <= most_specific_count * 2:
-                allowed.update(faults)
-
-        return allowed
-
-    def analyze_symptoms_with_nlp(self, symptoms: List[str]) -> Dict:
-        """Analyze symptoms using pretrained NLP models — each symptom diagnosed independently"""
-        if not self.sentence_model or self.fault_embeddings is None:
-            return self._fallback_analysis(symptoms)
+                embeddings = self.sentence_model.encode(batch, batch_size=min(len(batch), MAX_BATCH_TEXTS))
+            load_shedder.observe_encoder(time.perf_counter() - start, len(batch))
+            return embeddings
         
-        try:
-            seen_faults = {}  # fault_code -> best result
-
-            # Diagnose each symptom independently
-            for symptom in symptoms:
-                symptom_text = symptom.lower()
-                allowed = self._allowed_faults(symptom_text)
-                symptom_embedding = self.sentence_model.encode([symptom_text])
-                similarities = cosine_similarity(symptom_embedding, self.fault_embeddings)[0]
-                top_indices = np.argsort(similarities)[-5:][::-1]
-
-                for idx in top_indices:
-                    similarity_score = float(similarities[idx])
-                    fault = self.automotive_knowledge_base[idx]
-                    fault_code = fault["fault"]
-                    # Apply system keyword guard
-                    if allowed and fault_code not in allowed:
-                        continue
-                    if similarity_score > 0.45:
-                        fault = self.automotive_knowledge_base[idx]
-                        fault_code = fault["fault"]
-                        if fault_code not in seen_faults or similarity_score > seen_faults[fault_code]["confidence"]:
-                            seen_faults[fault_code] = {
-                                "fault": fault_code,
-                                "description": fault["description"],
-                                "confidence": similarity_score,
-                                "severity": fault["severity"],
-                                "parts": fault["parts"],
-                                "diagnostic_steps": fault["diagnostic_steps"],
-                                "triggered_by": symptom
-                            }
-
-            # Also run combined to catch cross-symptom patterns
-            if len(symptoms) > 1:
-                combined_text = " ".join(symptoms).lower()
-                combined_embedding = self.sentence_model.encode([combined_text])
-                similarities = cosine_similarity(combined_embedding, self.fault_embeddings)[0]
-                top_indices = np.argsort(similarities)[-5:][::-1]
-
-                for idx in top_indices:
-                    similarity_score = float(similarities[idx])
-                    if similarity_score > 0.50:
-                        fault = self.automotive_knowledge_base[idx]
-                        fault_code = fault["fault"]
-                        if fault_code not in seen_faults or similarity_score > seen_faults[fault_code]["confidence"]:
-                            seen_faults[fault_code] = {
-                                "fault": fault_code,
-                                "description": fault["description"],
-                                "confidence": similarity_score,
-                                "severity": fault["severity"],
-                                "parts": fault["parts"],
-                                "diagnostic_steps": fault["diagnostic_steps"],
-                                "triggered_by": "combined symptoms"
-                            }
-
-            predicted_faults = sorted(seen_faults.values(), key=lambda x: x["confidence"], reverse=True)
-
-            return {
-                "method": "pretrained_nlp",
-                "predicted_faults": predicted_faults,
-                "symptom_analysis": {
-                    "processed_text": " | ".join(symptoms),
-                    "faults_detected": len(predicted_faults)
-                }
+        if self.embedding_cache is None:
+            return encode(texts)
+        return self.embedding_cache.encode(texts, encode)
+
+    @staticmethod
+    def _query_texts(symptoms: List[str]) -> List[str]:
+        """Texts to embed for one symptom list: each symptom, plus the combined text when there are several"""
+        texts = [symptom.lower() for symptom in symptoms]
+        if len(symptoms) > 1:
+            # Combined text catches cross-symptom patterns
+            texts.append(" ".join(symptoms).lower())
+        return texts
+
+    def _history_scores(self, texts: List[str], history_hits: Dict[str, List[Tuple[str, float, str]]]) -> np.ndarray:
+        """
+        (texts x faults) similarity of the most similar past job card of each fault
+        above HISTORY_THRESHOLD (0 = no evidence): the third ranked list fused with
+        the dense and keyword scores, so history and KB matches share one scale
+        """
+        column_of = {fault["fault"]: i for i, fault in enumerate(self.automotive_knowledge_base)}
+        scores = np.zeros((len(texts), len(column_of)))
+        for row, text in enumerate(texts):
+            for fault_code, similarity_score, _ in history_hits.get(text, ()):
+                column = column_of[fault_code]
+                if similarity_score > HISTORY_THRESHOLD and similarity_score > scores[row, column]:
+                    scores[row, column] = similarity_score
+        return scores
+
+    @staticmethod
+    def _cite_job_cards(hits: List[Tuple[str, float, str]], threshold: float, seen_faults: Dict):
+        """Cite the most similar past job cards (up to 3 above threshold) of each predicted fault"""
+        by_fault: Dict[str, List[str]] = {}
+        for fault_code, similarity_score, job_card_id in hits:
+            if similarity_score > threshold:
+                by_fault.setdefault(fault_code, []).append(job_card_id)
+        for fault_code, job_cards in by_fault.items():
+            if fault_code in seen_faults:
+                seen_faults[fault_code].setdefault("similar_job_cards", job_cards[:3])
+
+    def _history_hits(self, texts: List[str], embeddings: np.ndarray) -> Dict[str, List[Tuple[str, float, str]]]:
+        """Nearest past job cards of each symptom text, restricted by the system keyword guard"""
+        allowed = [self._allowed_faults(text) for text in texts]
+        return dict(zip(texts, self.repair_history.neighbours(embeddings, HISTORY_TOP_K, allowed)))
+
+    def _hybrid_analysis(self, symptoms: List[str], texts: List[str], scores: RetrievalScores,
+                         history_hits: Optional[Dict] = None) -> Dict:
+        """Predicted faults from the retrieval score rows of _query_texts(symptoms)"""
+        seen_faults = {}  # fault_code -> best result
+
+        # Diagnose each symptom independently
+        for i, symptom in enumerate(symptoms):
+            allowed = self._allowed_faults(texts[i])
+            self._collect_hybrid_matches(scores.take(i), 0.45, allowed, symptom, seen_faults)
+            if history_hits is not None:
+                self._cite_job_cards(history_hits[texts[i]], HISTORY_THRESHOLD, seen_faults)
+
+        if len(symptoms) > 1:
+            self._collect_hybrid_matches(scores.take(-1), 0.50, set(), "combined symptoms", seen_faults)
+
+        predicted_faults = sorted(seen_faults.values(), key=lambda x: x["confidence"], reverse=True)
+
+        return {
+            "method": "hybrid_retrieval",
+            "predicted_faults": predicted_faults,
+            "symptom_analysis": {
+                "processed_text": " | ".join(symptoms),
+                "faults_detected": len(predicted_faults)
             }
-        
+        }
+
+    def analyze_symptoms_with_nlp(self, symptoms: List[str], mode: str = "hybrid") -> Dict:
+        """Analyze symptoms using pretrained NLP models — each symptom diagnosed independently"""
+        return self.analyze_symptom_batch([symptoms], mode)[0]
+
+    def analyze_symptom_batch(self, symptom_lists: List[List[str]], mode: str = "hybrid") -> List[Dict]:
+        """
+        Analyze several symptom lists (job cards) at once: the unique texts of all
+        of them are embedded in one batched forward pass, scored against the fault
+        embeddings in one matrix product and against the BM25 index in one sparse
+        product, and the two rankings are fused (reciprocal rank fusion).
+        mode="keyword" skips the encoder and uses the phrase-weighted keyword
+        matching alone, the cheap tier.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}")
+        if mode == "keyword" or not self.sentence_model or self.fault_embeddings_normalized is None:
+            return [self._fallback_analysis(symptoms) for symptoms in symptom_lists]
+
+        texts_per_list = [self._query_texts(symptoms) for symptoms in symptom_lists]
+        unique_texts = list(dict.fromkeys(text for texts in texts_per_list for text in texts))
+        row_of = {text: row for row, text in enumerate(unique_texts)}
+        try:
+            query_embeddings = self._l2_normalize(self._encode_texts(unique_texts))
         except Exception as e:
-            logger.error(f"NLP analysis failed: {e}")
-            return self._fallback_analysis(symptoms)
+            logger.error(f"Symptom encoding failed, using keyword matching: {e}")
+            return [self._fallback_analysis(symptoms) for symptoms in symptom_lists]
+
+        history_hits = history_scores = None
+        if self.repair_history is not None:
+            symptom_texts = list(dict.fromkeys(text for symptoms, texts in zip(symptom_lists, texts_per_list)
+                                               for text in texts[:len(symptoms)]))
+            try:
+                history_hits = self._history_hits(
+                    symptom_texts, query_embeddings[[row_of[text] for text in symptom_texts]]
+                )
+                history_scores = self._history_scores(unique_texts, history_hits)
+            except Exception as e:
+                logger.warning(f"⚠️ Repair history lookup failed, diagnosing without it: {e}")
+                history_hits = None
+
+        # Every query against every fault: cosine similarities (dense), BM25 scores (sparse)
+        # and past job card similarities, fused by rank
+        scores = RetrievalScores.fuse(query_embeddings @ self.fault_embeddings_normalized.T,
+                                      self.bm25_index.scores(unique_texts), history_scores)
+
+        return [
+            self._hybrid_analysis(symptoms, texts, scores.take([row_of[text] for text in texts]), history_hits)
+            for symptoms, texts in zip(symptom_lists, texts_per_list)
+        ]
     
     def _normalize(self, text: str) -> str:
         """Normalize text: lowercase, collapse spaces, remove punctuation"""
-        import re
-        text = text.lower().strip()
-        text = re.sub(r'[^\w\s]', ' ', text)   # remove punctuation
-        text = re.sub(r'\s+', ' ', text)         # collapse whitespace
-        return text
+        return normalize(text)
 
     @staticmethod
     def _word_in_text(word: str, text: str) -> bool:
@@ -939,6 +538,8 @@ class AdvancedFaultDiagnosisSystem:
         Uses weighted scoring: longer/more-specific KB symptom phrases score higher
         than short single-word matches, preventing generic words like 'brake' from
         matching every brake-related fault equally.
+        Reference for a single fault; _fallback_analysis scores all faults at once
+        through self.keyword_index, which gives identical results.
         """
         symptom_lower = symptom.lower()
         total_weight = 0.0
@@ -969,13 +570,11 @@ class AdvancedFaultDiagnosisSystem:
             allowed = self._allowed_faults(symptom_lower)
 
             fault_scores = []
-            for fault in self.automotive_knowledge_base:
-                fault_code = fault["fault"]
-                if allowed and fault_code not in allowed:
+            for fault_idx, score in self.keyword_index.score(symptom_lower).items():
+                fault = self.automotive_knowledge_base[fault_idx]
+                if allowed and fault["fault"] not in allowed:
                     continue
-                score = self._score_fault_match(fault, symptom_lower)
-                if score > 0:
-                    fault_scores.append((fault, score))
+                fault_scores.append((fault, score))
 
             if not fault_scores:
                 continue
@@ -1004,11 +603,10 @@ class AdvancedFaultDiagnosisSystem:
         # Also check combined text for cross-symptom patterns (multiple symptoms only)
         if len(symptoms) > 1:
             combined = " ".join(symptoms)
-            fault_scores = []
-            for fault in self.automotive_knowledge_base:
-                score = self._score_fault_match(fault, combined)
-                if score > 0:
-                    fault_scores.append((fault, score))
+            fault_scores = [
+                (self.automotive_knowledge_base[fault_idx], score)
+                for fault_idx, score in self.keyword_index.score(combined).items()
+            ]
 
             if fault_scores:
                 best_score = max(s for _, s in fault_scores)
@@ -1039,227 +637,177 @@ class AdvancedFaultDiagnosisSystem:
             }
         }
     
-    def search_parts_in_erp(self, parts_list: List[str], vehicle_info: Dict = None) -> List[Dict]:
-        """Search for parts in ERP database with intelligent vehicle-specific matching"""
-        conn = get_db()
-        if not conn:
-            return []
-        
+    @staticmethod
+    def _vehicle_key(vehicle_info: Optional[Dict]) -> Tuple[str, str, Optional[int]]:
+        """Part keywords are matched per vehicle: (make, model, year) normalized"""
+        vehicle_info = vehicle_info or {}
+        return ((vehicle_info.get("vehicle_make") or "").strip().lower(),
+                (vehicle_info.get("vehicle_model") or "").strip().lower(),
+                vehicle_info.get("vehicle_year"))
+
+    def _resolve_parts(self, parts_lists: List[List[str]], vehicle_info: Optional[Dict],
+                       database: bool = True) -> Optional[List[List[Dict]]]:
+        """
+        Parts for several faults from the in-memory catalogue, else (when database) one
+        pooled query for every part keyword, followed by the parts usually invoiced with
+        them (companions); None when no source is available. Without database the
+        catalogue is used only if already loaded (its first load is a database read).
+        """
+        associations = part_associations()
+
+        def resolve(source):
+            fault_parts = resolve_fault_parts(source, parts_lists, vehicle_info)
+            if associations is not None:
+                add_companion_parts(source, fault_parts, associations, vehicle_info)
+            return fault_parts
+
+        catalogue = catalogue_source(load=database)
+        if catalogue is not None:
+            return resolve(catalogue)
+        if not database:
+            return None
         try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            all_parts = []
-            vehicle_make = vehicle_info.get("vehicle_make", "").strip() if vehicle_info else ""
-            vehicle_model = vehicle_info.get("vehicle_model", "").strip() if vehicle_info else ""
-            
-            logger.info(f"Searching parts for: {parts_list}, Vehicle: {vehicle_make} {vehicle_model}")
-            
-            for part_keyword in parts_list:
-                # Enhanced search query with intelligent prioritization
-                query = """
-                    SELECT 
-                        i.itemcode,
-                        i.itemname,
-                        i.suppref as part_number,
-                        g.groupname as category,
-                        m.makename as car_make,
-                        b.brandname as brand,
-                        i.sprice,
-                        i.mrp,
-                        i.curstock,
-                        i.unit,
-                        %s as search_keyword,
-                        -- Scoring for intelligent ranking
-                        (
-                            CASE 
-                                -- Exact vehicle model match gets highest priority
-                                WHEN LOWER(i.itemname) LIKE LOWER(%s) AND LOWER(i.itemname) LIKE LOWER(%s) THEN 100
-                                -- Vehicle make match with part keyword
-                                WHEN LOWER(m.makename) LIKE LOWER(%s) AND (
-                                    LOWER(i.itemname) LIKE LOWER(%s) 
-                                    OR LOWER(g.groupname) LIKE LOWER(%s)
-                                ) THEN 90
-                                -- Part keyword match with stock available
-                                WHEN (LOWER(i.itemname) LIKE LOWER(%s) OR LOWER(g.groupname) LIKE LOWER(%s)) 
-                                     AND i.curstock > 0 THEN 80
-                                -- Part keyword match without stock
-                                WHEN LOWER(i.itemname) LIKE LOWER(%s) OR LOWER(g.groupname) LIKE LOWER(%s) THEN 70
-                                -- Universal parts (no specific make)
-                                WHEN m.makename IS NULL AND (
-                                    LOWER(i.itemname) LIKE LOWER(%s) 
-                                    OR LOWER(g.groupname) LIKE LOWER(%s)
-                                ) THEN 60
-                                ELSE 0
-                            END
-                        ) as relevance_score
-                    FROM tblmasitem i
-                    LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
-                    LEFT JOIN tblmasmake m ON i.makeid = m.makeid
-                    LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
-                    WHERE i.deleted = false
-                    AND (
-                        -- Match part keyword in item name or category
-                        LOWER(i.itemname) LIKE LOWER(%s) 
-                        OR LOWER(g.groupname) LIKE LOWER(%s)
-                        OR LOWER(i.suppref) LIKE LOWER(%s)
-                        -- Also match vehicle-specific parts
-                        OR (LOWER(i.itemname) LIKE LOWER(%s) AND LOWER(i.itemname) LIKE LOWER(%s))
-                    )
-                    ORDER BY 
-                        relevance_score DESC,
-                        CASE WHEN i.curstock > 0 THEN 1 ELSE 2 END,  -- Stock available first
-                        i.curstock DESC,  -- Higher stock first
-                        i.sprice ASC      -- Lower price first
-                    LIMIT 8
-                """
-                
-                # Prepare search patterns
-                part_pattern = f'%{part_keyword}%'
-                make_pattern = f'%{vehicle_make}%' if vehicle_make else '%'
-                model_pattern = f'%{vehicle_model}%' if vehicle_model else '%'
-                
-                params = [
-                    part_keyword,  # search_keyword
-                    model_pattern, part_pattern,  # Exact vehicle model match
-                    make_pattern, part_pattern, part_pattern,  # Vehicle make match
-                    part_pattern, part_pattern,  # Part with stock
-                    part_pattern, part_pattern,  # Part without stock
-                    part_pattern, part_pattern,  # Universal parts
-                    part_pattern, part_pattern, part_pattern,  # Main search conditions
-                    make_pattern, model_pattern   # Vehicle-specific search
-                ]
-                
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                
-                logger.info(f"Found {len(results)} parts for '{part_keyword}'")
-                
-                for row in results:
-                    # Calculate availability status
-                    stock = float(row["curstock"] or 0)
-                    availability = "In Stock" if stock > 0 else "Out of Stock"
-                    
-                    # Add priority flag for exact vehicle matches
-                    is_vehicle_specific = False
-                    item_name_lower = (row["itemname"] or "").lower()
-                    if vehicle_model and vehicle_model.lower() in item_name_lower:
-                        is_vehicle_specific = True
-                    
-                    part_data = {
-                        "item_code": row["itemcode"],
-                        "item_name": row["itemname"],
-                        "part_number": row["part_number"],
-                        "category": row["category"],
-                        "car_make": row["car_make"],
-                        "brand": row["brand"],
-                        "price": float(row["sprice"] or 0),
-                        "mrp": float(row["mrp"] or 0),
-                        "stock": stock,
-                        "unit": row["unit"],
-                        "search_keyword": row["search_keyword"],
-                        "availability": availability,
-                        "relevance_score": float(row["relevance_score"] or 0),
-                        "is_vehicle_specific": is_vehicle_specific
-                    }
-                    
-                    all_parts.append(part_data)
-            
-            cursor.close()
-            conn.close()
-            
-            # Remove duplicates and sort by relevance
-            unique_parts = {}
-            for part in all_parts:
-                key = part["item_code"]
-                if key not in unique_parts or part["relevance_score"] > unique_parts[key]["relevance_score"]:
-                    unique_parts[key] = part
-            
-            # Sort final results by relevance score and stock availability
-            sorted_parts = sorted(
-                unique_parts.values(), 
-                key=lambda x: (x["relevance_score"], x["stock"], -x["price"]), 
-                reverse=True
-            )
-            
-            logger.info(f"Returning {len(sorted_parts)} unique parts")
-            return sorted_parts[:10]  # Return top 10 most relevant parts
-        
+            with pooled_connection() as conn:
+                return resolve(conn)
         except Exception as e:
             logger.error(f"ERP search error: {e}")
-            if conn:
-                conn.close()
-            return []
+            return None
+
+    def search_parts_in_erp(self, parts_list: List[str], vehicle_info: Dict = None) -> List[Dict]:
+        """Search for parts in ERP database with intelligent vehicle-specific matching"""
+        return self.search_parts_for_faults([parts_list], vehicle_info)[0]
+
+    def search_parts_for_faults(self, parts_lists: List[List[str]], vehicle_info: Dict = None,
+                                cached_only: bool = False) -> List[List[Dict]]:
+        """
+        Parts for several faults (see _resolve_parts). Results are cached per knowledge
+        base version, vehicle and fault parts; cached_only (keyword tier) serves the
+        cache, then the in-memory catalogue, and never queries the database.
+        """
+        if not any(parts_lists):
+            return [[] for _ in parts_lists]
+        vehicle = self._vehicle_key(vehicle_info)
+        # A reloaded knowledge base never sees parts cached by the engine it replaced
+        keys = [(self.kb_version, vehicle, tuple(parts)) for parts in parts_lists]
+        results = [parts_cache.get(key) if cached_only and parts else None for key, parts in zip(keys, parts_lists)]
+
+        missing = [i for i, parts in enumerate(results) if parts is None and parts_lists[i]]
+        if missing:
+            resolved = self._resolve_parts([parts_lists[i] for i in missing], vehicle_info, database=not cached_only)
+            for i, parts in zip(missing, resolved or [None] * len(missing)):
+                if parts is not None:
+                    parts_cache.put(keys[i], parts)
+                    results[i] = parts
+        # Copies: the response adds fault fields to each part
+        return [[dict(part) for part in parts] if parts else [] for parts in results]
     
-    def diagnose_fault(self, symptoms: List[str], vehicle_info: Dict = None) -> Dict:
-        """Main diagnosis method using advanced NLP"""
-        
-        logger.info(f"Starting diagnosis for symptoms: {symptoms}")
-        logger.info(f"Vehicle info: {vehicle_info}")
-        
-        # Step 1: Analyze symptoms with NLP
-        logger.info("Step 1: Analyzing symptoms with NLP")
-        analysis_result = self.analyze_symptoms_with_nlp(symptoms)
-        logger.info(f"Analysis result: {analysis_result}")
-        
-        # Step 2: Get recommended parts from all predicted faults
-        logger.info("Step 2: Getting recommended parts")
+    @staticmethod
+    def _diagnosis_result(analysis_result: Dict, fault_parts: List[List[Dict]], tier: str = FULL) -> Dict:
+        """Diagnosis response from an analysis and the parts of each predicted fault"""
         all_parts = []
-        for fault in analysis_result["predicted_faults"]:
-            logger.info(f"Processing fault: {fault['fault']}")
-            parts = self.search_parts_in_erp(fault["parts"], vehicle_info)
+        for fault, parts in zip(analysis_result["predicted_faults"], fault_parts):
             for part in parts:
                 part["fault_type"] = fault["fault"]
                 part["fault_confidence"] = fault["confidence"]
                 part["severity"] = fault["severity"]
             all_parts.extend(parts)
         
-        # Step 3: Get diagnostic steps from top fault
-        logger.info("Step 3: Getting diagnostic steps")
+        # Diagnostic steps from the top fault
         diagnostic_steps = []
         if analysis_result["predicted_faults"]:
             diagnostic_steps = analysis_result["predicted_faults"][0]["diagnostic_steps"]
         
-        logger.info("Diagnosis completed successfully")
         return {
             "analysis_method": analysis_result["method"],
             "predicted_faults": analysis_result["predicted_faults"],
             "recommended_parts": all_parts,
             "diagnostic_steps": diagnostic_steps,
             "symptom_analysis": analysis_result["symptom_analysis"],
-            "nlp_available": NLP_AVAILABLE
+            "nlp_available": NLP_AVAILABLE,
+            "service_tier": tier
         }
 
-# Initialize the advanced system
-advanced_diagnosis = AdvancedFaultDiagnosisSystem()
+    def diagnose_fault(self, symptoms: List[str], vehicle_info: Dict = None, tier: str = FULL) -> Dict:
+        """Main diagnosis method using advanced NLP (tier: load_shedding service tier)"""
+        
+        logger.info(f"Starting diagnosis for symptoms: {symptoms}")
+        logger.info(f"Vehicle info: {vehicle_info}")
+        
+        # Step 1: Analyze symptoms with NLP
+        logger.info("Step 1: Analyzing symptoms with NLP")
+        analysis_result = self.analyze_symptoms_with_nlp(symptoms, TIER_MODES[tier])
+        logger.info(f"Analysis result: {analysis_result}")
+        
+        # Step 2: Get recommended parts from all predicted faults
+        logger.info("Step 2: Getting recommended parts")
+        fault_parts = self.search_parts_for_faults([fault["parts"] for fault in analysis_result["predicted_faults"]],
+                                                   vehicle_info, cached_only=tier == KEYWORD)
+        
+        logger.info("Diagnosis completed successfully")
+        return self._diagnosis_result(analysis_result, fault_parts, tier)
+
+    def diagnose_batch(self, job_cards: List[Tuple[List[str], Dict]], tier: str = FULL) -> List[Dict]:
+        """
+        Diagnose (symptoms, vehicle_info) job cards together: one encoder pass for
+        all unique symptoms, then one parts lookup per distinct vehicle covering
+        every predicted fault of its cards. Results are in job card order.
+        """
+        analyses = self.analyze_symptom_batch([symptoms for symptoms, _ in job_cards], TIER_MODES[tier])
+
+        # Part keywords are matched per vehicle, so cards of the same vehicle share one lookup
+        by_vehicle: Dict[Tuple[str, str, Optional[int]], List[int]] = {}
+        for card_idx, (_, vehicle_info) in enumerate(job_cards):
+            by_vehicle.setdefault(self._vehicle_key(vehicle_info), []).append(card_idx)
+
+        fault_parts: List[List[List[Dict]]] = [[] for _ in job_cards]
+        for card_indices in by_vehicle.values():
+            parts_lists = [fault["parts"] for i in card_indices for fault in analyses[i]["predicted_faults"]]
+            resolved = iter(self.search_parts_for_faults(parts_lists, job_cards[card_indices[0]][1],
+                                                         cached_only=tier == KEYWORD))
+            for i in card_indices:
+                fault_parts[i] = [next(resolved) for _ in analyses[i]["predicted_faults"]]
+
+        logger.info(f"Batch diagnosis: {len(job_cards)} job cards, {len(by_vehicle)} parts lookups")
+        return [self._diagnosis_result(analysis, parts, tier) for analysis, parts in zip(analyses, fault_parts)]
+
+# Built on first use (or by the background warm-up in main.py) so importing this module stays cheap
+advanced_diagnosis = LazyService("fault_diagnosis", AdvancedFaultDiagnosisSystem)
 
 # API Endpoints
 
 @app.get("/")
 async def root():
+    system = advanced_diagnosis.peek()
     return {
         "service": "Advanced AI Fault Diagnosis API",
         "version": "2.0.0",
         "description": "Pretrained NLP models for automotive fault diagnosis",
         "features": {
             "pretrained_nlp": NLP_AVAILABLE,
-            "sentence_transformers": advanced_diagnosis.sentence_model is not None,
-            "automotive_knowledge_base": len(advanced_diagnosis.automotive_knowledge_base),
+            "sentence_transformers": system is not None and system.sentence_model is not None,
+            "automotive_knowledge_base": len(system.automotive_knowledge_base) if system else None,
             "erp_integration": get_db() is not None
-        }
+        },
+        "engine": advanced_diagnosis.status()
+    }
+
+def _vehicle_info(card: SymptomInput) -> Dict:
+    return {
+        "vehicle_make": card.vehicle_make,
+        "vehicle_model": card.vehicle_model,
+        "vehicle_year": card.vehicle_year,
+        "mileage": card.mileage
     }
 
 @app.post("/diagnose")
 async def diagnose_advanced(input_data: SymptomInput):
     """Advanced fault diagnosis using pretrained NLP models"""
     try:
-        result = advanced_diagnosis.diagnose_fault(
-            input_data.symptoms,
-            {
-                "vehicle_make": input_data.vehicle_make,
-                "vehicle_model": input_data.vehicle_model,
-                "mileage": input_data.mileage
-            }
-        )
+        system = await advanced_diagnosis.aget()
+        # Off the event loop, so concurrent requests count as in flight
+        with load_shedder.request() as tier:
+            result = await run_in_threadpool(system.diagnose_fault, input_data.symptoms,
+                                             _vehicle_info(input_data), tier)
         
         return {
             "success": True,
@@ -1268,45 +816,160 @@ async def diagnose_advanced(input_data: SymptomInput):
             "vehicle_info": {
                 "make": input_data.vehicle_make,
                 "model": input_data.vehicle_model,
+                "year": input_data.vehicle_year,
                 "mileage": input_data.mileage
             },
             "diagnosis": result,
-            "parts_count": len(result["recommended_parts"])
+            "parts_count": len(result["recommended_parts"]),
+            "service_tier": tier
         }
     
     except Exception as e:
         logger.error(f"Advanced diagnosis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/diagnose/batch")
+async def diagnose_batch(input_data: BatchDiagnosisInput):
+    """
+    Bulk job-card diagnosis, streamed as NDJSON: one line per job card, in input
+    order, each shaped like a /diagnose response plus its index and job_card_id.
+    """
+    if not input_data.job_cards:
+        raise HTTPException(status_code=400, detail="job_cards must not be empty")
+    system = await advanced_diagnosis.aget()
+    cards = input_data.job_cards
+
+    async def lines():
+        for start in range(0, len(cards), BATCH_CHUNK_SIZE):
+            chunk = cards[start:start + BATCH_CHUNK_SIZE]
+            try:
+                with load_shedder.request() as tier:
+                    results = await run_in_threadpool(
+                        system.diagnose_batch, [(card.symptoms, _vehicle_info(card)) for card in chunk], tier
+                    )
+                error = None
+            except Exception as e:
+                logger.error(f"Batch diagnosis error: {e}")
+                results, error = [None] * len(chunk), str(e)
+            timestamp = datetime.now().isoformat()
+            for offset, (card, result) in enumerate(zip(chunk, results)):
+                line = {
+                    "index": start + offset,
+                    "job_card_id": card.job_card_id,
+                    "success": result is not None,
+                    "timestamp": timestamp,
+                    "input_symptoms": card.symptoms,
+                    "vehicle_info": {
+                        "make": card.vehicle_make,
+                        "model": card.vehicle_model,
+                        "year": card.vehicle_year,
+                        "mileage": card.mileage
+                    },
+                }
+                if result is not None:
+                    line.update(diagnosis=result, parts_count=len(result["recommended_parts"]),
+                                service_tier=result["service_tier"])
+                else:
+                    line["error"] = error
+                yield json.dumps(line, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.get("/knowledge-base")
 async def get_knowledge_base():
     """Get automotive knowledge base statistics"""
+    system = await advanced_diagnosis.aget()
     return {
-        "total_fault_patterns": len(advanced_diagnosis.automotive_knowledge_base),
-        "fault_categories": list(set([f["fault"] for f in advanced_diagnosis.automotive_knowledge_base])),
+        "version": system.kb_version,
+        "total_fault_patterns": len(system.automotive_knowledge_base),
+        "fault_categories": list(set([f["fault"] for f in system.automotive_knowledge_base])),
         "nlp_models_loaded": {
-            "sentence_transformer": advanced_diagnosis.sentence_model is not None,
-            "text_classifier": advanced_diagnosis.symptom_classifier is not None,
-            "embeddings_computed": advanced_diagnosis.fault_embeddings is not None
+            "sentence_transformer": system.sentence_model is not None,
+            "text_classifier": system.symptom_classifier is not None,
+            "embeddings_computed": system.fault_embeddings is not None
         }
     }
 
+def _require_admin(token: Optional[str]):
+    if not ML_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ML_ADMIN_TOKEN)")
+    if not token or not hmac.compare_digest(token, ML_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/knowledge-base/reload")
+async def reload_knowledge_base(x_admin_token: Optional[str] = Header(None)):
+    """
+    Load the knowledge base file (FAULT_KB_PATH) if its version changed and swap
+    in an engine built from it. Only new or changed faults are embedded; requests
+    already running finish on the previous version.
+    """
+    _require_admin(x_admin_token)
+    if not _kb_reload_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A knowledge base reload is already running")
+    try:
+        system = await advanced_diagnosis.aget()
+        try:
+            document = load_kb_document()
+        except (OSError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid knowledge base: {e}")
+        if document["version"] == system.kb_version:
+            return {"status": "unchanged", "version": system.kb_version}
+        try:
+            engine = await run_in_threadpool(system.with_knowledge_base, document)
+        except Exception as e:
+            logger.error(f"❌ Knowledge base reload failed, still serving version {system.kb_version}: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        advanced_diagnosis.replace(engine)
+    finally:
+        _kb_reload_lock.release()
+    logger.info(f"✅ Knowledge base {system.kb_version} -> {engine.kb_version}: "
+                f"{len(engine.automotive_knowledge_base)} faults, {engine.kb_encoded} embedded")
+    return {
+        "status": "reloaded",
+        "previous_version": system.kb_version,
+        "version": engine.kb_version,
+        "total_fault_patterns": len(engine.automotive_knowledge_base),
+        "faults": engine.kb_changes,
+        "embedded_texts": engine.kb_encoded,
+    }
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Symptom embedding cache hit rates"""
+    system = advanced_diagnosis.peek()
+    if system is None or system.embedding_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **system.embedding_cache.stats()}
+
+@app.get("/load/stats")
+async def get_load_stats():
+    """Service tier controller state, the encoder micro-batcher and the parts result cache"""
+    system = advanced_diagnosis.peek()
+    batcher = system.encode_batcher if system is not None else None
+    return {**load_shedder.stats(), "parts_cache": parts_cache.stats(),
+            "encoder_queue": batcher.stats() if batcher is not None else None}
+
 @app.get("/health")
 async def health_check():
+    system = advanced_diagnosis.peek()
     return {
         "status": "healthy",
+        "ready": advanced_diagnosis.ready,
+        "service_tier": load_shedder.tier,
         "nlp_models": "✅" if NLP_AVAILABLE else "❌ Install: pip install transformers sentence-transformers torch",
-        "knowledge_base": f"✅ {len(advanced_diagnosis.automotive_knowledge_base)} patterns",
+        "knowledge_base": (f"✅ {len(system.automotive_knowledge_base)} patterns (version {system.kb_version})"
+                           if system else f"⏳ {advanced_diagnosis.state}"),
         "database": "✅" if get_db() else "❌"
     }
 
 if __name__ == "__main__":
+    system = advanced_diagnosis.get()
     print("\n" + "="*70)
     print("🧠 ADVANCED AI FAULT DIAGNOSIS SYSTEM")
     print("="*70)
     print("🤖 Pretrained NLP Models:", "✅" if NLP_AVAILABLE else "❌")
-    print("📚 Knowledge Base:", f"{len(advanced_diagnosis.automotive_knowledge_base)} patterns")
-    print("🔍 Sentence Similarity:", "✅" if advanced_diagnosis.sentence_model else "❌")
+    print("📚 Knowledge Base:", f"{len(system.automotive_knowledge_base)} patterns")
+    print("🔍 Sentence Similarity:", "✅" if system.sentence_model else "❌")
     print("💾 Database:", "✅" if get_db() else "❌")
     print("="*70)
     print("🌐 Server: http://localhost:8009")
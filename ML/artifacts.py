@@ -0,0 +1,126 @@
+"""
+Versioned on-disk artifacts for the ML services.
+Artifacts live under ML/artifacts (override with ML_ARTIFACT_DIR), are named by
+a content hash of whatever they were derived from, and are written atomically
+so concurrent workers never observe a half-written file.
+
+ModelRegistry keeps trained models under ARTIFACT_DIR/models/<name>/<version>/
+(model.joblib + meta.json) with a CURRENT pointer, so models load the same
+whatever the working directory of the process.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.getenv(
+    "ML_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"),
+)
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable sha256 of JSON-serialisable inputs (dict keys sorted)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def artifact_path(kind: str, name: str) -> str:
+    """Path of an artifact file under ARTIFACT_DIR/<kind>/, creating the directory"""
+    directory = os.path.join(ARTIFACT_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def save_array(path: str, array: np.ndarray):
+    """Write a .npy file atomically (temp file + rename)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def load_array(path: str, mmap: bool = True) -> Optional[np.ndarray]:
+    """Load a .npy artifact (memory-mapped read-only by default); None if missing or unreadable"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.load(path, mmap_mode="r" if mmap else None)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load artifact {path}: {e}")
+        return None
+
+
+class ModelRegistry:
+    """Versioned model store for one model name; versions are content hashes of the training inputs"""
+
+    MODEL_FILE = "model.joblib"
+    META_FILE = "meta.json"
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(ARTIFACT_DIR, "models", self.name)
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(entry for entry in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, entry, self.META_FILE)))
+
+    def save(self, model: Any, version: str, metadata: Optional[Dict] = None) -> str:
+        """Write a version (directory renamed into place) and point CURRENT at it"""
+        os.makedirs(self.directory, exist_ok=True)
+        version_dir = os.path.join(self.directory, version)
+        if not os.path.exists(os.path.join(version_dir, self.META_FILE)):
+            tmp_dir = f"{version_dir}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            joblib.dump(model, os.path.join(tmp_dir, self.MODEL_FILE))
+            with open(os.path.join(tmp_dir, self.META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"name": self.name, "version": version, **(metadata or {})}, f, indent=2, default=str)
+            try:
+                os.replace(tmp_dir, version_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir, ignore_errors=True)  # another worker saved the same version first
+
+        pointer = os.path.join(self.directory, "CURRENT")
+        with open(f"{pointer}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(f"{pointer}.{os.getpid()}.tmp", pointer)
+        return version_dir
+
+    def load(self, version: Optional[str] = None) -> Optional[Tuple[Any, Dict]]:
+        """(model, metadata) of a version (default CURRENT); None if missing or unreadable"""
+        version = version or self.current_version()
+        if not version:
+            return None
+        version_dir = os.path.join(self.directory, version)
+        try:
+            with open(os.path.join(version_dir, self.META_FILE), "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            return joblib.load(os.path.join(version_dir, self.MODEL_FILE)), metadata
+        except Exception as e:
+            if os.path.exists(version_dir):
+                logger.warning(f"⚠️ Could not load model {self.name}/{version}: {e}")
+            return None
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Sentence Encoder Benchmark: PyTorch fp32 vs ONNX Runtime int8
+
+Each backend runs in its own subprocess so import cost and memory are isolated.
+Reports model load time, per-request latency (5 symptoms + combined text in one
+batched encode, as analyze_symptoms_with_nlp does), peak RSS, and agreement of
+the top-k fault ranking with the PyTorch fp32 reference.
+
+Usage:
+    python benchmark_encoder.py [--requests 200] [--top-k 5] [--backends torch onnx] [--model all-MiniLM-L6-v2]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+import tempfile
+
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def peak_rss_mb() -> float:
+    # VmHWM is reset on exec; ru_maxrss on Linux keeps the parent's peak across fork+exec
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_worker(backend: str, model_name: str, input_path: str, output_path: str, requests: int):
+    """Measure one backend (runs in a child process)"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    from sentence_encoder import create_sentence_encoder
+    encoder = create_sentence_encoder(model_name, backend)
+    encoder.encode(["warm up"])
+    load_seconds = time.perf_counter() - start
+
+    kb = encoder.encode(data["kb_texts"])
+    queries = encoder.encode(data["queries"])
+
+    rng = random.Random(42)
+    latencies = []
+    for _ in range(requests):
+        symptoms = rng.sample(data["queries"], 5)
+        texts = symptoms + [" ".join(symptoms)]
+        t0 = time.perf_counter()
+        encoder.encode(texts, batch_size=len(texts))
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    np.savez(output_path, kb=kb, queries=queries)
+    stats = {
+        "backend": encoder.backend,
+        "model_id": encoder.model_id,
+        "load_seconds": round(load_seconds, 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "latency_ms_mean": round(float(np.mean(latencies)), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "model_rss_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+    with open(output_path + ".json", "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+
+
+def top_k(kb: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    kb = kb / np.linalg.norm(kb, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ kb.T), axis=1)[:, :k]
+
+
+def load_benchmark_texts():
+    """Fault KB texts (as embedded by the service) and every KB symptom phrase as a query"""
+    from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem
+    system = AdvancedFaultDiagnosisSystem.__new__(AdvancedFaultDiagnosisSystem)
+    system._load_automotive_knowledge_base()
+    kb = system.automotive_knowledge_base
+    kb_texts = [" ".join(f["symptoms"]) + " " + f["description"] for f in kb]
+    queries = sorted({s.lower() for f in kb for s in f["symptoms"]})
+    return kb_texts, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentence encoder backends")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.model, args.input, args.output, args.requests)
+        return
+
+    kb_texts, queries = load_benchmark_texts()
+    workdir = tempfile.mkdtemp(prefix="encoder_bench_")
+    input_path = os.path.join(workdir, "texts.json")
+    with open(input_path, "w", encoding="utf-8") as f:
+        json.dump({"kb_texts": kb_texts, "queries": queries}, f)
+
+    results = {}
+    for backend in args.backends:
+        output_path = os.path.join(workdir, f"{backend}.npz")
+        print(f"⏱️  Benchmarking {backend}...")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", backend, "--model", args.model,
+             "--input", input_path, "--output", output_path, "--requests", str(args.requests)],
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        with open(output_path + ".json", "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        arrays = np.load(output_path)
+        stats["ranking"] = top_k(arrays["kb"], arrays["queries"], args.top_k)
+        results[backend] = stats
+
+    reference = results.get("torch") or next(iter(results.values()))
+    print("\n" + "=" * 86)
+    print(f"{'backend':<10}{'model':<46}{'load s':>8}{'p50 ms':>8}{'p95 ms':>8}{'RSS MB':>8}")
+    print("-" * 86)
+    for name, stats in results.items():
+        print(f"{name:<10}{stats['model_id']:<46}{stats['load_seconds']:>8}"
+              f"{stats['latency_ms_p50']:>8}{stats['latency_ms_p95']:>8}{stats['peak_rss_mb']:>8}")
+    print("-" * 86)
+    for name, stats in results.items():
+        if stats is reference:
+            continue
+        top1 = float(np.mean(stats["ranking"][:, 0] == reference["ranking"][:, 0]))
+        overlap = np.mean([
+            len(set(a) & set(b)) / args.top_k
+            for a, b in zip(stats["ranking"], reference["ranking"])
+        ])
+        print(f"{name} vs {reference['backend']}: top-1 agreement {top1:.1%}, "
+              f"top-{args.top_k} overlap {overlap:.1%} over {len(queries)} symptom queries")
+    print("=" * 86)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Fault Classifier Benchmark: legacy TF-IDF + RandomForest vs hashed n-gram logistic regression
+
+Trains both classifiers on FaultDiagnosisSystem's sample data and reports
+training time, per-request diagnosis latency (p50/p95; the legacy path runs
+one predict_proba per symptom plus one for the combined text, the new one a
+single batch) and accuracy / negative log-likelihood / expected calibration
+error on noisy rephrasings of the training symptoms (dropped, shuffled and
+misspelt words, filler phrases).
+
+Usage:
+    python benchmark_fault_classifier.py [--variants 10] [--requests 500] [--symptoms 3]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from fault_diagnosis_system import FaultDiagnosisSystem
+from fault_text_classifier import HashedFaultClassifier
+
+FILLERS = ["car", "my car", "since yesterday", "sometimes", "when driving", "please check", "very", "after service"]
+
+
+class LegacyClassifier:
+    """The previous FaultDiagnosisSystem model: TF-IDF (1000 features) + 100-tree RandomForest"""
+
+    def __init__(self, texts, labels):
+        self.vectorizer = TfidfVectorizer(max_features=1000, stop_words="english", ngram_range=(1, 2))
+        self.forest = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10)
+        self.forest.fit(self.vectorizer.fit_transform(texts), labels)
+        self.classes_ = self.forest.classes_
+
+    def predict_proba(self, texts):
+        return self.forest.predict_proba(self.vectorizer.transform(texts))
+
+
+def noisy_variants(texts, labels, per_text: int, seed: int = 0):
+    """Deterministic rephrasings: drop/shuffle words, one typo, a filler phrase"""
+    rng = random.Random(seed)
+    out_texts, out_labels = [], []
+    for text, label in zip(texts, labels):
+        for _ in range(per_text):
+            words = text.split()
+            if len(words) > 2:
+                words.pop(rng.randrange(len(words)))
+            if rng.random() < 0.5:
+                rng.shuffle(words)
+            i = rng.randrange(len(words))
+            if len(words[i]) > 4:
+                j = rng.randrange(1, len(words[i]) - 1)
+                words[i] = words[i][:j] + words[i][j + 1:]
+            words.insert(rng.randrange(len(words) + 1), rng.choice(FILLERS))
+            out_texts.append(" ".join(words))
+            out_labels.append(label)
+    return out_texts, out_labels
+
+
+def quality(classifier, texts, labels, bins: int = 10):
+    """(accuracy, negative log-likelihood, expected calibration error)"""
+    probabilities = classifier.predict_proba(texts)
+    column = {fault: i for i, fault in enumerate(classifier.classes_)}
+    targets = np.array([column[label] for label in labels])
+    predicted, confidence = probabilities.argmax(axis=1), probabilities.max(axis=1)
+    correct = predicted == targets
+    nll = -np.mean(np.log(probabilities[np.arange(len(targets)), targets] + 1e-12))
+    edges = np.linspace(0, 1, bins + 1)
+    ece = sum(abs(correct[in_bin].mean() - confidence[in_bin].mean()) * in_bin.mean()
+              for in_bin in ((confidence > lo) & (confidence <= hi) for lo, hi in zip(edges[:-1], edges[1:]))
+              if in_bin.any())
+    return float(correct.mean()), float(nll), float(ece)
+
+
+def request_latency(requests, diagnose):
+    latencies = []
+    for symptoms in requests:
+        start = time.perf_counter()
+        diagnose(symptoms)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the legacy and hashed fault classifiers")
+    parser.add_argument("--variants", type=int, default=10, help="Noisy rephrasings per training symptom")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--symptoms", type=int, default=3, help="Symptoms per diagnosis request")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")  # one sample per fault
+
+    system = FaultDiagnosisSystem.__new__(FaultDiagnosisSystem)  # sample data only, no registry
+    system._create_sample_training_data()
+    texts = [item["symptoms"] for item in system.symptom_to_fault_data]
+    labels = [item["fault"] for item in system.symptom_to_fault_data]
+    eval_texts, eval_labels = noisy_variants(texts, labels, args.variants)
+    rng = random.Random(1)
+    requests = [rng.sample(eval_texts, args.symptoms) for _ in range(args.requests)]
+
+    print("=" * 78)
+    print(f"📊 {len(texts)} training symptoms, {len(eval_texts)} noisy variants, "
+          f"{args.requests} requests x {args.symptoms} symptoms")
+    print("=" * 78)
+
+    start = time.perf_counter()
+    legacy = LegacyClassifier(texts, labels)
+    legacy_train = time.perf_counter() - start
+    start = time.perf_counter()
+    hashed = HashedFaultClassifier.train(texts, labels, **FaultDiagnosisSystem.MODEL_PARAMS)
+    hashed_train = time.perf_counter() - start
+
+    def legacy_diagnose(symptoms):
+        for symptom in symptoms:
+            legacy.predict_proba([symptom.lower()])
+        legacy.predict_proba([" ".join(symptoms).lower()])
+
+    def hashed_diagnose(symptoms):
+        hashed.predict_proba([symptom.lower() for symptom in symptoms] + [" ".join(symptoms).lower()])
+
+    print(f"{'classifier':<28}{'train s':>9}{'p50 ms':>9}{'p95 ms':>9}{'accuracy':>10}{'nll':>8}{'ece':>8}")
+    for name, classifier, train_seconds, diagnose in (
+        ("tfidf + random forest", legacy, legacy_train, legacy_diagnose),
+        (f"hashed logreg T={hashed.temperature:.2f}", hashed, hashed_train, hashed_diagnose),
+    ):
+        p50, p95 = request_latency(requests, diagnose)
+        accuracy, nll, ece = quality(classifier, eval_texts, eval_labels)
+        print(f"{name:<28}{train_seconds:>9.2f}{p50:>9.2f}{p95:>9.2f}{accuracy:>10.3f}{nll:>8.3f}{ece:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Encoder Micro-Batching Benchmark: per-request encode vs MicroBatcher
+
+Simulates concurrent /diagnose users, each sending requests back to back. A
+request embeds 1-3 KB symptom phrases plus their combined text, as
+analyze_symptom_batch does. Per-request mode calls encoder.encode from every
+user thread (what the service did before); micro-batched mode submits to one
+MicroBatcher. Reports throughput (requests/s), latency p50/p95 and the mean
+number of requests per forward pass.
+
+Usage:
+    python benchmark_micro_batching.py [--users 50] [--requests 20] [--backend auto] [--wait-ms 5] [--max-batch 64]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_encoder import MODEL_NAME, load_benchmark_texts
+from micro_batcher import MicroBatcher
+from sentence_encoder import create_sentence_encoder
+
+
+def request_texts(queries, rng):
+    symptoms = rng.sample(queries, rng.randint(1, 3))
+    return symptoms + [" ".join(symptoms)] if len(symptoms) > 1 else symptoms
+
+
+def run_users(encode, queries, users: int, requests: int):
+    """Wall time and per-request latencies of `users` threads sending `requests` each"""
+    latencies = [[] for _ in range(users)]
+    barrier = threading.Barrier(users + 1)
+
+    def user(index):
+        rng = random.Random(index)
+        barrier.wait()
+        for _ in range(requests):
+            texts = request_texts(queries, rng)
+            start = time.perf_counter()
+            encode(texts)
+            latencies[index].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, np.concatenate(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request vs micro-batched sentence encoding")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per user")
+    parser.add_argument("--backend", default=os.getenv("FAULT_ENCODER_BACKEND", "auto"))
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    _, queries = load_benchmark_texts()
+    encoder = create_sentence_encoder(args.model, args.backend)
+    encoder.encode(["warm up"])
+
+    def per_request(texts):
+        return encoder.encode(texts, batch_size=len(texts))
+
+    batcher = MicroBatcher(encoder.encode, max_batch=args.max_batch, max_wait_ms=args.wait_ms)
+    modes = {"per-request": per_request, "micro-batched": batcher.encode}
+
+    total = args.users * args.requests
+    print("=" * 78)
+    print(f"📊 {encoder.model_id}: {args.users} concurrent users x {args.requests} requests")
+    print("=" * 78)
+    print(f"{'mode':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'wall s':>10}{'req/batch':>12}")
+    print("-" * 78)
+    throughput = {}
+    for name, encode in modes.items():
+        seconds, latencies = run_users(encode, queries, args.users, args.requests)
+        throughput[name] = total / seconds
+        per_batch = batcher.stats()["mean_requests_per_batch"] if encode is batcher.encode else 1.0
+        print(f"{name:<16}{throughput[name]:>10.1f}{np.percentile(latencies, 50):>10.1f}"
+              f"{np.percentile(latencies, 95):>10.1f}{seconds:>10.2f}{per_batch:>12}")
+    batcher.close()
+    print("-" * 78)
+    print(f"Micro-batching throughput: {throughput['micro-batched'] / throughput['per-request']:.2f}x "
+          f"(wait {args.wait_ms} ms, max batch {args.max_batch} texts)")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark for the unified ML service (main.py)
+
+Starts `uvicorn main:app` in a fresh process and measures:
+  - time to first response: until GET /health answers 200 (what platform health checks see)
+  - time to ready: until /health reports every lazy engine ready (background warm-up)
+  - first diagnosis: latency of the first POST /fault/diagnose after the port is up
+
+Usage:
+    python benchmark_startup.py [--runs 3] [--timeout 300] [--no-warmup] [--skip-diagnose]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import statistics
+import urllib.request
+import urllib.error
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, payload: dict = None, timeout: float = 300):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+
+def run_once(port: int, warmup: bool, timeout: float, diagnose: bool) -> dict:
+    env = dict(os.environ, ML_WARMUP="true" if warmup else "false")
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    result = {"first_response_s": None, "ready_s": None, "first_diagnose_s": None, "engines": {}}
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode}")
+            try:
+                status, body = request(f"{base}/health", timeout=2)
+                if status == 200:
+                    result["first_response_s"] = round(time.perf_counter() - start, 2)
+                    break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.05)
+
+        if result["first_response_s"] is None:
+            return result
+
+        if diagnose:
+            t0 = time.perf_counter()
+            try:
+                request(f"{base}/fault/diagnose", {"symptoms": ["engine overheating", "coolant leak"]}, timeout=timeout)
+                result["first_diagnose_s"] = round(time.perf_counter() - t0, 2)
+            except urllib.error.HTTPError as e:
+                result["first_diagnose_s"] = f"HTTP {e.code}"
+
+        while time.perf_counter() - start < timeout:
+            _, body = request(f"{base}/health", timeout=5)
+            result["engines"] = body.get("engines", {})
+            if body.get("ready") or any(e["state"] == "failed" for e in result["engines"].values()):
+                if body.get("ready"):
+                    result["ready_s"] = round(time.perf_counter() - start, 2)
+                break
+            time.sleep(0.25)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the unified ML service")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--no-warmup", action="store_true", help="Disable background warm-up (pure lazy loading)")
+    parser.add_argument("--skip-diagnose", action="store_true", help="Do not send a first /fault/diagnose request")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        result = run_once(free_port(), not args.no_warmup, args.timeout, not args.skip_diagnose)
+        runs.append(result)
+        print(f"⏱️  Run {i + 1}: first response {result['first_response_s']}s, "
+              f"first diagnose {result['first_diagnose_s']}s, all engines ready {result['ready_s']}s")
+        for name, engine in result["engines"].items():
+            print(f"     {name:<18}{engine['state']:<10}{engine['load_seconds']}s {engine['error'] or ''}")
+
+    first = [r["first_response_s"] for r in runs if isinstance(r["first_response_s"], float)]
+    ready = [r["ready_s"] for r in runs if isinstance(r["ready_s"], float)]
+    print("\n" + "=" * 60)
+    print(f"Time to first response (median): {statistics.median(first) if first else 'n/a'}s")
+    print(f"Time to all engines ready (median): {statistics.median(ready) if ready else 'n/a'}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Vector Index Benchmark: exact search vs IVF (per nprobe) vs HNSW
+
+Builds each index over the same corpus and reports build time, per-query
+latency (p50/p95) and recall@k against exact search, unfiltered and with a
+fault mask like the SYSTEM_KEYWORDS guard applies. The corpus is synthetic
+clustered 384-d vectors (MiniLM's size) unless --vectors gives a .npy of real
+embeddings.
+
+Usage:
+    python benchmark_vector_index.py [--size 300000] [--queries 300] [--k 10] [--nprobe 8 16 32 64] [--vectors emb.npy]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vector_index import HNSW_AVAILABLE, ExactIndex, HNSWIndex, IVFIndex, l2_normalize
+
+
+def synthetic_corpus(size: int, dimension: int, clusters: int, seed: int = 0):
+    """
+    Faults (cluster centres) -> recurring phrasings of each fault -> job cards
+    (a phrasing plus noise), with the fault label of every vector
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    phrasings_per_fault = 50
+    phrasings = (np.repeat(centres, phrasings_per_fault, axis=0)
+                 + 0.8 * rng.standard_normal((clusters * phrasings_per_fault, dimension)).astype(np.float32))
+    phrasing = rng.integers(0, len(phrasings), size)
+    vectors = phrasings[phrasing] + 0.5 * rng.standard_normal((size, dimension)).astype(np.float32)
+    return l2_normalize(vectors), phrasing // phrasings_per_fault
+
+
+def measure(index, queries, k, mask, reference_ids):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, reference_ids):
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k, mask)
+        latencies.append((time.perf_counter() - start) * 1000)
+        expected = set(expected[expected >= 0].tolist())
+        if expected:
+            recalls.append(len(expected & set(ids[0].tolist())) / len(expected))
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exact vs approximate vector search")
+    parser.add_argument("--size", type=int, default=300_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--vectors", help="Real embeddings (.npy); labels are then random")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = l2_normalize(np.load(args.vectors))
+        labels = np.random.default_rng(0).integers(0, args.clusters, len(vectors))
+    else:
+        vectors, labels = synthetic_corpus(args.size, args.dimension, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = l2_normalize(vectors[rng.choice(len(vectors), args.queries, replace=False)]
+                           + 0.5 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32))
+    # Keyword guard stand-in: 10% of the faults allowed
+    mask = np.isin(labels, rng.choice(args.clusters, max(1, args.clusters // 10), replace=False))
+
+    print("=" * 78)
+    print(f"📊 {len(vectors)} vectors x {vectors.shape[1]} dims, {args.queries} queries, top-{args.k}")
+    print("=" * 78)
+
+    exact = ExactIndex.build(vectors)
+    reference = {name: exact.search(queries, args.k, m)[1] for name, m in (("all", None), ("filtered", mask))}
+
+    indexes = [("exact", exact, 0.0)]
+    start = time.perf_counter()
+    ivf = IVFIndex.build(vectors)
+    ivf_build = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        probed = IVFIndex(ivf.centroids, ivf.vectors, ivf.ids, ivf.offsets, nprobe=nprobe)
+        indexes.append((f"ivf nlist={len(ivf.centroids)} nprobe={nprobe}", probed, ivf_build))
+    if HNSW_AVAILABLE:
+        start = time.perf_counter()
+        indexes.append(("hnsw M=16 ef=96", HNSWIndex.build(vectors), time.perf_counter() - start))
+    else:
+        print("ℹ️ hnswlib not installed: HNSW skipped (pip install hnswlib)")
+
+    print(f"{'index':<32}{'build s':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall':>9}{'filt p50':>10}{'filt recall':>12}")
+    for name, index, build_seconds in indexes:
+        p50, p95, recall = measure(index, queries, args.k, None, reference["all"])
+        filtered_p50, _, filtered_recall = measure(index, queries, args.k, mask, reference["filtered"])
+        print(f"{name:<32}{build_seconds:>9.1f}{p50:>9.2f}{p95:>9.2f}{recall:>9.3f}{filtered_p50:>10.2f}{filtered_recall:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# Business Rule Engine
+# Declarative thresholds and message templates for BI / cash flow recommendations
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.getenv('BI_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bi_rules.json'))
+
+COMPARATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+ARITHMETIC = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+}
+
+OUTPUT_KINDS = ('recommendations', 'alerts', 'insights')
+
+
+def _column(frame: pd.DataFrame, name: str) -> np.ndarray:
+    """Numeric column of the metrics frame (NaN when a row/metric is missing)"""
+    if name not in frame.columns:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)
+
+
+def _operand(frame: pd.DataFrame, operand) -> np.ndarray:
+    if isinstance(operand, str):
+        return _column(frame, operand)
+    return np.full(len(frame), float(operand))
+
+
+class CompiledRuleSet:
+    """
+    One named rule set compiled into column-wise numpy predicates.
+
+    Derived metrics are evaluated once per frame, every rule's predicate is a
+    boolean vector over all rows (one row per company/branch), and only the
+    rules that fired are rendered into output dictionaries.
+    """
+
+    def __init__(self, name: str, spec: Dict):
+        self.name = name
+        self.derived = [(d['name'], self._compile_derived(d)) for d in spec.get('derived', [])]
+        self.rules = []
+        for rule in spec.get('rules', []):
+            kind = rule['kind']
+            if kind not in OUTPUT_KINDS:
+                raise ValueError(f"Rule {rule.get('id')}: unknown kind '{kind}'")
+            self.rules.append({
+                'id': rule['id'],
+                'kind': kind,
+                'group': rule.get('group'),
+                'predicate': self._compile_condition(rule.get('when', {'all': []})),
+                'output': rule['output'],
+            })
+
+    # ── Compilation ──────────────────────────────────────────────────────────
+    def _compile_derived(self, spec: Dict) -> Callable[[pd.DataFrame], np.ndarray]:
+        func = self._compile_derived_op(spec)
+        if 'when' not in spec:
+            return func
+        # Guarded metric: the "else" value (NaN by default) on rows where "when" does not hold,
+        # e.g. margin_ratio = gross_profit / revenue_30d if revenue_30d > 0 else 0
+        condition, otherwise = self._compile_condition(spec['when']), spec.get('else', np.nan)
+        return lambda frame: np.where(condition(frame), func(frame), otherwise)
+
+    def _compile_derived_op(self, spec: Dict) -> Callable[[pd.DataFrame], np.ndarray]:
+        op = spec['op']
+        if op in ARITHMETIC:
+            func = ARITHMETIC[op]
+            left, right = spec['args']
+            return lambda frame: func(_operand(frame, left), _operand(frame, right))
+        if op == 'div':
+            left, right = spec['args']
+
+            def divide(frame):
+                numerator, denominator = _operand(frame, left), _operand(frame, right)
+                return np.divide(numerator, denominator, out=np.full(len(frame), np.nan),
+                                 where=denominator != 0)
+            return divide
+        if op == 'abs':
+            arg = spec['args'][0]
+            return lambda frame: np.abs(_operand(frame, arg))
+        if op == 'floor':
+            arg = spec['args'][0]
+            return lambda frame: np.trunc(_operand(frame, arg))
+        if op == 'bands':
+            # First matching case wins, e.g. [["<", 2, "good"], ["<", 3, "warning"]]
+            metric, cases, default = spec['metric'], spec['cases'], spec['default']
+
+            def bands(frame):
+                values = _column(frame, metric)
+                conditions = [COMPARATORS[c[0]](values, c[1]) for c in cases]
+                return np.select(conditions, [c[2] for c in cases], default=default)
+            return bands
+        raise ValueError(f"Derived metric {spec.get('name')}: unknown op '{op}'")
+
+    def _compile_condition(self, spec: Dict) -> Callable[[pd.DataFrame], np.ndarray]:
+        if 'all' in spec or 'any' in spec:
+            combine = np.logical_and if 'all' in spec else np.logical_or
+            parts = [self._compile_condition(part) for part in spec.get('all', spec.get('any'))]
+            initial = 'all' in spec
+
+            def compound(frame):
+                result = np.full(len(frame), initial)
+                for part in parts:
+                    result = combine(result, part(frame))
+                return result
+            return compound
+
+        metric, op = spec['metric'], spec['op']
+        if op == 'in':
+            allowed = list(spec['value'])
+            return lambda frame: (frame[metric].isin(allowed).to_numpy() if metric in frame.columns
+                                  else np.zeros(len(frame), dtype=bool))
+
+        compare = COMPARATORS[op]
+        if 'ref' in spec:
+            # Compare against another metric, optionally scaled: overdue > receivables * 0.2
+            ref, factor = spec['ref'], float(spec.get('factor', 1.0))
+            rhs = lambda frame: _column(frame, ref) * factor
+        else:
+            value = float(spec['value'])
+            rhs = lambda frame: value
+
+        def leaf(frame):
+            lhs = _column(frame, metric)
+            right = rhs(frame)
+            return compare(lhs, right) & ~np.isnan(lhs) & ~np.isnan(right)
+        return leaf
+
+    # ── Evaluation ───────────────────────────────────────────────────────────
+    def _render(self, template, context: Dict):
+        if isinstance(template, str):
+            return template.format_map(context)
+        if isinstance(template, list):
+            return [self._render(item, context) for item in template]
+        if isinstance(template, dict):
+            return {key: self._render(value, context) for key, value in template.items()}
+        return template
+
+    def evaluate(self, frame: pd.DataFrame) -> List[Dict]:
+        """Evaluate every rule over all rows; returns one output dict per row"""
+        frame = frame.reset_index(drop=True).copy()
+        for name, func in self.derived:
+            frame[name] = func(frame)
+
+        n_rows = len(frame)
+        fired = []
+        claimed = {}  # group -> rows already matched by an earlier rule in the group
+        for rule in self.rules:
+            mask = np.asarray(rule['predicate'](frame), dtype=bool)
+            group = rule['group']
+            if group:
+                taken = claimed.get(group, np.zeros(n_rows, dtype=bool))
+                mask = mask & ~taken
+                claimed[group] = taken | mask
+            fired.append(mask)
+
+        results = [{kind: [] for kind in OUTPUT_KINDS} for _ in range(n_rows)]
+        if not fired:
+            return results
+
+        fired = np.vstack(fired)
+        for row in np.flatnonzero(fired.any(axis=0)):
+            context = frame.iloc[row].to_dict()
+            for rule_idx in np.flatnonzero(fired[:, row]):
+                rule = self.rules[rule_idx]
+                try:
+                    results[row][rule['kind']].append(self._render(rule['output'], context))
+                except (KeyError, ValueError, TypeError) as e:
+                    logger.error(f"Rule {self.name}.{rule['id']} failed to render: {e}")
+        return results
+
+
+class RuleEngine:
+    """
+    Loads rule sets from a JSON file and recompiles them whenever the file
+    changes on disk, so thresholds and messages can be tuned without a restart.
+    A rule file that fails to parse or compile leaves the previous rules active.
+    """
+
+    def __init__(self, path: str = RULES_PATH):
+        self.path = path
+        self._mtime = None
+        self._rule_sets: Dict[str, CompiledRuleSet] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            if self._mtime is None:
+                logger.error(f"Rule file not found: {self.path} ({e})")
+            return
+
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    spec = json.load(f)
+                rule_sets = {name: CompiledRuleSet(name, body) for name, body in spec['rule_sets'].items()}
+            except Exception as e:
+                logger.error(f"⚠️ Could not load rules from {self.path}, keeping previous rules: {e}")
+                self._mtime = mtime
+                return
+
+            self._rule_sets = rule_sets
+            self._version = spec.get('version')
+            self._mtime = mtime
+            total = sum(len(r.rules) for r in rule_sets.values())
+            logger.info(f"✅ Loaded {total} business rules (version {self._version}) from {self.path}")
+
+    def rule_set(self, name: str) -> Optional[CompiledRuleSet]:
+        self._maybe_reload()
+        return self._rule_sets.get(name)
+
+    def evaluate(self, metrics: pd.DataFrame, rule_set: str) -> List[Dict]:
+        """Evaluate a rule set for many companies/branches (one metrics row each) in one pass"""
+        compiled = self.rule_set(rule_set)
+        if compiled is None:
+            return [{kind: [] for kind in OUTPUT_KINDS} for _ in range(len(metrics))]
+        return compiled.evaluate(metrics)
+
+    def evaluate_one(self, metrics: Dict, rule_set: str) -> Dict:
+        """Evaluate a rule set for a single metrics dict"""
+        return self.evaluate(pd.DataFrame([metrics]), rule_set)[0]
+
+    def info(self) -> Dict:
+        self._maybe_reload()
+        return {
+            'path': self.path,
+            'version': self._version,
+            'rule_sets': {name: len(r.rules) for name, r in self._rule_sets.items()}
+        }
+
+
+# Global instance
+bi_rules = RuleEngine()
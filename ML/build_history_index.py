@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Build the repair-history nearest-neighbour index used by the fault diagnosis engine.
+
+Input is a job-card export, JSON Lines or CSV, one record per job card with
+  job_card_id, fault (knowledge-base fault code) and symptom (text) or
+  symptoms (JSON list / "|"-separated); every symptom becomes one record.
+Records are embedded with the engine's sentence encoder and saved under
+ML/artifacts/history_index/<hash>/ (see repair_history.py), which the engine
+memory-maps on its next start.
+
+Usage:
+    python build_history_index.py job_cards.jsonl [--kind auto|exact|ivf|hnsw] [--nlist N] [--backend onnx|torch]
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from repair_history import build_history
+from sentence_encoder import create_sentence_encoder
+
+logging.basicConfig(level=logging.INFO)
+
+
+def read_records(path: str):
+    if path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    records = []
+    for row in rows:
+        symptoms = row.get("symptoms") or row.get("symptom") or []
+        if isinstance(symptoms, str):
+            symptoms = json.loads(symptoms) if symptoms.startswith("[") else symptoms.split("|")
+        for symptom in symptoms:
+            if symptom.strip() and row.get("fault"):
+                records.append({"symptom": symptom.strip(), "fault": row["fault"], "job_card_id": row.get("job_card_id")})
+    return records
+
+
+def main():
+    from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem
+
+    parser = argparse.ArgumentParser(description="Build the repair-history vector index")
+    parser.add_argument("input", help="Job-card export (.jsonl or .csv)")
+    parser.add_argument("--kind", default="auto", choices=["auto", "exact", "ivf", "hnsw"])
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(n))")
+    parser.add_argument("--backend", default=None, help="Sentence encoder backend (default FAULT_ENCODER_BACKEND)")
+    args = parser.parse_args()
+
+    records = read_records(args.input)
+    if not records:
+        print("❌ No records with a symptom and a fault")
+        sys.exit(1)
+    print(f"📋 {len(records)} symptom records, {len({r['fault'] for r in records})} faults")
+
+    encoder = create_sentence_encoder(AdvancedFaultDiagnosisSystem.SENTENCE_MODEL_NAME, args.backend)
+    params = {"nlist": args.nlist} if args.kind == "ivf" and args.nlist else {}
+    start = time.perf_counter()
+    directory = build_history(records, encoder, args.kind, **params)
+    print(f"✅ Built in {time.perf_counter() - start:.1f}s: {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from datetime import datetime, timedelta
 import logging
 from typing import List, Dict, Tuple, Optional
 import warnings
+from bi_rules import bi_rules
 warnings.filterwarnings('ignore')
 
 logger = logging.getLogger(__name__)
@@ -168,14 +169,26 @@ class CashFlowPredictor:
                 self.seasonal_factors[month] = 1.0
     
     def predict(self, start_date: datetime, days_ahead: int, current_balance: float, 
-                historical_data: pd.DataFrame, conn=None) -> Dict:
-        """Predict cash flow"""
+                historical_data: pd.DataFrame, conn=None, known_flows: Optional[Dict] = None) -> Dict:
+        """
+        Predict cash flow.
+        known_flows: optional {'inflow': array, 'outflow': array} of scheduled
+        settlements (see settlement_schedule.py). They are placed on their
+        expected days and the model only contributes the residual above their
+        average daily level.
+        """
         if not self.is_fitted:
-            return self._fallback_prediction(start_date, days_ahead, current_balance, historical_data)
+            return self._fallback_prediction(start_date, days_ahead, current_balance, historical_data, known_flows)
         
         predictions = []
         running_balance = current_balance
         
+        if known_flows is not None:
+            known_inflow = np.asarray(known_flows['inflow'], dtype=float)[:days_ahead]
+            known_outflow = np.asarray(known_flows['outflow'], dtype=float)[:days_ahead]
+            known_inflow_level = known_inflow.sum() / days_ahead
+            known_outflow_level = known_outflow.sum() / days_ahead
+        
         for day in range(days_ahead):
             pred_date = start_date + timedelta(days=day)
             features = self.extract_features(pred_date, historical_data)
@@ -187,6 +200,10 @@ class CashFlowPredictor:
             predicted_inflow *= seasonal_factor
             predicted_outflow *= seasonal_factor
             
+            if known_flows is not None:
+                predicted_inflow = known_inflow[day] + max(0, predicted_inflow - known_inflow_level)
+                predicted_outflow = known_outflow[day] + max(0, predicted_outflow - known_outflow_level)
+            
             net_flow = predicted_inflow - predicted_outflow
             running_balance += net_flow
             confidence = max(50, 95 - (day * 1.5))
@@ -233,7 +250,10 @@ class CashFlowPredictor:
                 'algorithm': 'Random Forest + Gradient Boosting',
                 'is_fitted': self.is_fitted,
                 'training_data_points': len(self.historical_patterns),
-                'features_used': 12
+                'features_used': 12,
+                'known_flows_blended': known_flows is not None,
+                'scheduled_inflow': round(float(known_inflow.sum()), 2) if known_flows is not None else 0,
+                'scheduled_outflow': round(float(known_outflow.sum()), 2) if known_flows is not None else 0
             }
         }
     
@@ -360,15 +380,23 @@ class CashFlowPredictor:
         return alerts[:10]
     
     def _generate_recommendations(self, predictions: List[Dict], risk: Dict, alerts: List[Dict], conn=None) -> List[Dict]:
-        """Generate recommendations including supplier payment analysis"""
-        recommendations = []
-        
+        """Generate recommendations including supplier payment analysis (rules in bi_rules.json)"""
         # Calculate prediction metrics
         days_ahead = len(predictions)
-        avg_daily_inflow = np.mean([p['predicted_inflow'] for p in predictions])
-        avg_daily_outflow = np.mean([p['predicted_outflow'] for p in predictions])
-        final_balance = predictions[-1]['predicted_balance']
-        min_balance = min(p['predicted_balance'] for p in predictions)
+        metrics = {
+            'days_ahead': days_ahead,
+            'avg_daily_inflow': np.mean([p['predicted_inflow'] for p in predictions]),
+            'avg_daily_outflow': np.mean([p['predicted_outflow'] for p in predictions]),
+            'final_balance': predictions[-1]['predicted_balance'],
+            'min_balance': min(p['predicted_balance'] for p in predictions),
+            'risk_level': risk['risk_level'],
+        }
+        
+        # Cash flow trend
+        if days_ahead >= 30:
+            first_week_balance = np.mean([p['predicted_balance'] for p in predictions[:7]])
+            last_week_balance = np.mean([p['predicted_balance'] for p in predictions[-7:]])
+            metrics['balance_trend'] = (last_week_balance - first_week_balance) / first_week_balance if first_week_balance != 0 else 0
         
         # Analyze pending supplier payments if connection provided
         if conn:
@@ -404,166 +432,22 @@ class CashFlowPredictor:
                 
                 cursor.close()
                 
-                # Supplier payment recommendations
                 if pending_payments:
-                    total_pending = sum(row[2] for row in pending_payments)
-                    oldest_days = pending_payments[0][4]
-                    
-                    supplier_list = [f"{row[0]} (₹{row[2]:,.2f}, {row[4]} days)" for row in pending_payments[:3]]
-                    
-                    priority = 'CRITICAL' if oldest_days > 45 else 'HIGH' if oldest_days > 30 else 'MEDIUM'
-                    
-                    recommendations.append({
-                        'category': 'Supplier Payments',
-                        'priority': priority,
-                        'recommendation': f'Process {len(pending_payments)} Pending Supplier Payments',
-                        'description': f'Total ₹{total_pending:,.2f} in unposted payments. Oldest: {oldest_days} days',
-                        'expected_impact': f'Maintain supplier relationships and avoid late fees',
-                        'action_items': [
-                            f'Review and post {len(pending_payments)} pending payment vouchers',
-                            f'Prioritize: {supplier_list[0] if supplier_list else "N/A"}',
-                            'Verify bank balances before posting',
-                            'Consider payment terms negotiation if cash is tight'
-                        ]
-                    })
+                    top = pending_payments[0]
+                    metrics['pending_supplier_count'] = len(pending_payments)
+                    metrics['pending_supplier_total'] = float(sum(row[2] for row in pending_payments))
+                    metrics['pending_supplier_oldest_days'] = top[4]
+                    metrics['top_supplier'] = f"{top[0]} (₹{top[2]:,.2f}, {top[4]} days)"
                 
-                # Customer receivables recommendations
-                if receivables and receivables[1] and receivables[1] > 0:
-                    total_outstanding = float(receivables[1])
-                    avg_days = int(receivables[2] or 0)
-                    customer_count = receivables[0]
-                    
-                    if avg_days > 45 or total_outstanding > avg_daily_inflow * 30:
-                        recommendations.append({
-                            'category': 'Receivables Management',
-                            'priority': 'HIGH',
-                            'recommendation': 'Accelerate Customer Collections',
-                            'description': f'₹{total_outstanding:,.2f} outstanding from {customer_count} customers (avg {avg_days} days)',
-                            'expected_impact': f'Could improve cash flow by ₹{total_outstanding * 0.3:,.2f} in next {days_ahead} days',
-                            'action_items': [
-                                f'Follow up with customers having invoices older than {avg_days} days',
-                                'Offer 2-3% early payment discount for immediate settlement',
-                                'Send payment reminders via email/SMS',
-                                'Consider invoice factoring for large outstanding amounts'
-                            ]
-                        })
-                    elif avg_days > 30:
-                        recommendations.append({
-                            'category': 'Receivables Management',
-                            'priority': 'MEDIUM',
-                            'recommendation': 'Monitor Customer Payment Patterns',
-                            'description': f'₹{total_outstanding:,.2f} outstanding with average {avg_days} days aging',
-                            'expected_impact': 'Prevent payment delays and maintain healthy cash flow',
-                            'action_items': [
-                                'Review credit terms for slow-paying customers',
-                                'Implement automated payment reminders',
-                                'Consider advance payment incentives for new orders'
-                            ]
-                        })
+                if receivables and receivables[1]:
+                    metrics['receivable_customers'] = receivables[0]
+                    metrics['receivables'] = float(receivables[1])
+                    metrics['receivables_age_days'] = int(receivables[2] or 0)
                         
             except Exception as e:
                 logger.error(f"Error analyzing supplier payments: {e}")
         
-        # Cash flow trend analysis
-        if days_ahead >= 30:
-            first_week_balance = np.mean([p['predicted_balance'] for p in predictions[:7]])
-            last_week_balance = np.mean([p['predicted_balance'] for p in predictions[-7:]])
-            trend = (last_week_balance - first_week_balance) / first_week_balance if first_week_balance != 0 else 0
-            
-            if trend < -0.15:
-                recommendations.append({
-                    'category': 'Cash Flow Trend',
-                    'priority': 'HIGH',
-                    'recommendation': 'Address Declining Cash Flow Trend',
-                    'description': f'Cash balance declining by {abs(trend)*100:.1f}% over {days_ahead} days',
-                    'expected_impact': 'Stabilize cash position and prevent shortages',
-                    'action_items': [
-                        'Review and reduce discretionary expenses',
-                        'Analyze profitability of recent sales',
-                        'Consider temporary credit line for working capital',
-                        'Evaluate pricing strategy and margins'
-                    ]
-                })
-            elif trend > 0.15:
-                recommendations.append({
-                    'category': 'Growth Opportunity',
-                    'priority': 'MEDIUM',
-                    'recommendation': 'Leverage Positive Cash Flow',
-                    'description': f'Cash balance improving by {trend*100:.1f}% over {days_ahead} days',
-                    'expected_impact': 'Optimize excess cash for business growth',
-                    'action_items': [
-                        'Consider inventory expansion for high-demand items',
-                        'Invest in marketing to capture more market share',
-                        'Negotiate bulk purchase discounts with suppliers',
-                        'Explore short-term investment opportunities'
-                    ]
-                })
-        
-        # Working capital optimization
-        if avg_daily_outflow > avg_daily_inflow * 1.1:
-            recommendations.append({
-                'category': 'Working Capital',
-                'priority': 'HIGH',
-                'recommendation': 'Optimize Working Capital Management',
-                'description': f'Daily outflow (₹{avg_daily_outflow:,.2f}) exceeds inflow (₹{avg_daily_inflow:,.2f})',
-                'expected_impact': 'Reduce cash burn rate by 10-15%',
-                'action_items': [
-                    'Review inventory turnover and reduce slow-moving stock',
-                    'Negotiate better payment terms with suppliers',
-                    'Implement just-in-time inventory practices',
-                    'Analyze and reduce operational costs'
-                ]
-            })
-        
-        # Risk-based recommendations
-        if risk['risk_level'] in ['CRITICAL', 'HIGH']:
-            if min_balance < 0:
-                shortage = abs(min_balance)
-                recommendations.append({
-                    'category': 'Financing',
-                    'priority': 'CRITICAL',
-                    'recommendation': 'Arrange Short-term Financing',
-                    'description': f'Predicted cash shortage of ₹{shortage:,.2f} within {days_ahead} days',
-                    'expected_impact': 'Prevent business disruption and maintain operations',
-                    'action_items': [
-                        f'Arrange overdraft facility for ₹{shortage * 1.5:,.2f}',
-                        'Consider invoice discounting for immediate cash',
-                        'Explore short-term business loans',
-                        'Contact bank to discuss working capital solutions'
-                    ]
-                })
-            
-            recommendations.append({
-                'category': 'Payment Management',
-                'priority': 'HIGH',
-                'recommendation': 'Prioritize Critical Payments',
-                'description': 'High cash flow risk requires careful payment management',
-                'expected_impact': 'Preserve ₹50,000-100,000 in working capital',
-                'action_items': [
-                    'Defer non-essential expenses',
-                    'Negotiate extended payment terms with suppliers',
-                    'Prioritize payments to critical suppliers only',
-                    'Review and cancel unnecessary subscriptions/services'
-                ]
-            })
-        
-        # Seasonal/pattern-based recommendations
-        if days_ahead >= 60:
-            recommendations.append({
-                'category': 'Strategic Planning',
-                'priority': 'MEDIUM',
-                'recommendation': 'Plan for Long-term Cash Flow',
-                'description': f'60-day forecast shows final balance of ₹{final_balance:,.2f}',
-                'expected_impact': 'Better preparedness for future cash needs',
-                'action_items': [
-                    'Create monthly cash flow budget',
-                    'Identify seasonal patterns in your business',
-                    'Build cash reserves for lean periods',
-                    'Review and adjust business strategy quarterly'
-                ]
-            })
-        
-        return recommendations
+        return bi_rules.evaluate_one(metrics, 'cashflow')['recommendations']
     
     def _identify_patterns(self, historical_data: pd.DataFrame) -> Dict:
         """Identify detailed cash flow patterns"""
@@ -725,8 +609,9 @@ class CashFlowPredictor:
         return {'status': 'success', 'patterns': patterns, 'pattern_count': len(patterns)}
     
     def _fallback_prediction(self, start_date: datetime, days_ahead: int, 
-                           current_balance: float, historical_data: pd.DataFrame) -> Dict:
-        """Fallback when not fitted"""
+                           current_balance: float, historical_data: pd.DataFrame,
+                           known_flows: Optional[Dict] = None) -> Dict:
+        """Fallback when not fitted (scheduled settlements are blended in as in predict)"""
         if len(historical_data) > 0:
             avg_inflow = historical_data['inflow'].mean()
             avg_outflow = historical_data['outflow'].mean()
@@ -739,12 +624,23 @@ class CashFlowPredictor:
         predictions = []
         running_balance = current_balance
         
+        if known_flows is not None:
+            known_inflow = np.asarray(known_flows['inflow'], dtype=float)[:days_ahead]
+            known_outflow = np.asarray(known_flows['outflow'], dtype=float)[:days_ahead]
+            known_inflow_level = known_inflow.sum() / days_ahead
+            known_outflow_level = known_outflow.sum() / days_ahead
+        
         for day in range(days_ahead):
             pred_date = start_date + timedelta(days=day)
             noise = np.random.normal(0, avg_volatility * 0.1)
             
             predicted_inflow = max(0, avg_inflow + noise)
             predicted_outflow = max(0, avg_outflow + noise)
+            
+            if known_flows is not None:
+                predicted_inflow = known_inflow[day] + max(0, predicted_inflow - known_inflow_level)
+                predicted_outflow = known_outflow[day] + max(0, predicted_outflow - known_outflow_level)
+            
             net_flow = predicted_inflow - predicted_outflow
             running_balance += net_flow
             
@@ -784,7 +680,10 @@ class CashFlowPredictor:
             'patterns': {'status': 'insufficient_data', 'patterns': []},
             'model_info': {
                 'algorithm': 'Simple Average (Fallback)',
-                'is_fitted': False
+                'is_fitted': False,
+                'known_flows_blended': known_flows is not None,
+                'scheduled_inflow': round(float(known_inflow.sum()), 2) if known_flows is not None else 0,
+                'scheduled_outflow': round(float(known_outflow.sum()), 2) if known_flows is not None else 0
             }
         }
     
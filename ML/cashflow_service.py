@@ -16,6 +16,10 @@ from cashflow_predictor import CashFlowPredictor
 from analytics_service import analytics
 from categorized_cashflow_service import get_category_summary, get_category_display_name
 from auto_parts_business_intelligence import auto_parts_bi
+from customer_scoring import customer_scorer
+from settlement_schedule import settlement_schedule
+from bi_rules import bi_rules
+from inventory_analytics import inventory_analytics
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -282,12 +286,22 @@ async def predict_cash_flow(request: PredictionRequest):
         
         # Make prediction
         start_date = datetime.now()
+        
+        # Open receivables/payables projected onto expected settlement days
+        known_flows = None
+        try:
+            known_flows = settlement_schedule.build(conn, start_date, request.days_ahead)
+        except Exception as e:
+            logger.error(f"Error building settlement schedule: {e}")
+            conn.rollback()
+        
         prediction = predictor.predict(
             start_date=start_date,
             days_ahead=request.days_ahead,
             current_balance=current_balance,
             historical_data=historical_data,
-            conn=conn
+            conn=conn,
+            known_flows=known_flows
         )
         
         # Save alerts to history
@@ -422,6 +436,39 @@ async def get_payment_patterns(days: int = 90):
         logger.error(f"Error analyzing payment patterns: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analytics/customer-scores")
+async def get_customer_scores(limit: int = 50):
+    """Get per-customer RFM, days-to-pay and late-payment probability scores"""
+    conn = None
+    try:
+        conn = get_db()
+        return customer_scorer.get_scores(conn, 'SAL', limit)
+    except Exception as e:
+        logger.error(f"Error scoring customers: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+@app.get("/analytics/inventory-items")
+async def get_inventory_items(limit: int = 50, dead_only: bool = False):
+    """Get per-item turnover, days of cover, ABC/XYZ class and dead stock"""
+    conn = None
+    try:
+        conn = get_db()
+        return inventory_analytics.get_item_report(conn, limit, dead_only)
+    except Exception as e:
+        logger.error(f"Error analyzing inventory items: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+@app.get("/analytics/rules")
+async def get_business_rules():
+    """Get the currently loaded recommendation/alert rule sets (reloaded when bi_rules.json changes)"""
+    return bi_rules.info()
+
 @app.get("/analytics/anomalies")
 async def get_anomalies(days: int = 90):
     """Detect unusual transactions"""
@@ -0,0 +1,107 @@
+"""
+Shared test fixtures: a fault diagnosis engine on a hashed bag-of-words encoder
+and an in-memory parts index (no model downloads or database), sample job
+cards, and joined item rows / parts catalogues for the parts search tests.
+"""
+
+import zlib
+
+import numpy as np
+import pytest
+
+from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem
+from hybrid_retrieval import BM25Index
+from keyword_index import FaultKeywordIndex
+from parts_catalogue import PartsCatalogue
+from parts_search import InMemoryPartsIndex, resolve_fault_parts
+
+
+class HashingEncoder:
+    """Deterministic stand-in for SentenceTransformer.encode (counts forward passes)"""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vectors
+
+
+# ─── Fixtures ─────────────────────────────────────────────────────────────────
+@pytest.fixture
+def system():
+    system = AdvancedFaultDiagnosisSystem.__new__(AdvancedFaultDiagnosisSystem)
+    system._load_automotive_knowledge_base()
+    system.keyword_index = FaultKeywordIndex(system.automotive_knowledge_base)
+    system.embedding_cache = None
+    system.encode_batcher = None
+    system.repair_history = None
+    system.sentence_model = HashingEncoder()
+    system.sentence_model_id = "hashing-encoder"
+    fault_texts = [" ".join(f["symptoms"]) + " " + f["description"] for f in system.automotive_knowledge_base]
+    system.bm25_index = BM25Index(fault_texts)
+    system.fault_texts = fault_texts
+    system.fault_embeddings = system.sentence_model.encode(fault_texts)
+    system.fault_embeddings_normalized = system._l2_normalize(system.fault_embeddings)
+    system.sentence_model.calls.clear()
+
+    parts = InMemoryPartsIndex([
+        {"itemcode": code, "itemname": name, "suppref": None, "groupname": group, "makename": make,
+         "brandname": None, "sprice": 100, "mrp": 100, "curstock": stock, "unit": "NOS", "packing": None,
+         "deleted": False}
+        for code, (name, group, make, stock) in enumerate([
+            ("BRAKE PAD SWIFT", "BRAKES", "MARUTI", 3), ("BRAKE DISC", "BRAKES", None, 0),
+            ("RADIATOR CITY", "COOLING", "HONDA", 2), ("THERMOSTAT", "COOLING", None, 5),
+            ("BATTERY 12V", "ELECTRICALS", None, 4), ("CLUTCH PLATE SWIFT", "CLUTCH", "MARUTI", 1),
+        ], 1)
+    ])
+    system.parts_lookups = []
+
+    def search_parts_for_faults(parts_lists, vehicle_info=None, cached_only=False):
+        system.parts_lookups.append(vehicle_info)
+        return resolve_fault_parts(parts, parts_lists, vehicle_info)
+
+    system.search_parts_for_faults = search_parts_for_faults
+    return system
+
+
+JOB_CARDS = [
+    (["brake noise when stopping", "car pulls to one side"], {"vehicle_make": "Maruti", "vehicle_model": "Swift"}),
+    (["engine overheating"], {"vehicle_make": "Honda", "vehicle_model": "City"}),
+    (["car won't start", "clicking sound"], {"vehicle_make": "Maruti", "vehicle_model": "Swift"}),
+    (["clutch slipping"], {"vehicle_make": None, "vehicle_model": None}),
+    (["brake noise when stopping"], {"vehicle_make": "maruti ", "vehicle_model": "SWIFT"}),
+]
+
+
+# ─── Parts catalogue ──────────────────────────────────────────────────────────
+def item(itemcode, itemname, groupname=None, makename=None, curstock=0, sprice=100, suppref=None, deleted=False):
+    return {
+        "itemcode": itemcode, "itemname": itemname, "suppref": suppref, "groupname": groupname,
+        "makename": makename, "brandname": "BOSCH", "sprice": sprice, "mrp": sprice, "curstock": curstock,
+        "unit": "NOS", "packing": None, "deleted": deleted,
+    }
+
+
+def catalogue_of(items):
+    """PartsCatalogue holding the given joined rows (group/make/brand names mapped to ids)"""
+    names = {"groupname": {}, "makename": {}, "brandname": {}}
+
+    def lookup_id(column, value):
+        return None if value is None else names[column].setdefault(value, len(names[column]) + 1)
+
+    records = [{
+        "itemcode": i["itemcode"], "itemname": i["itemname"], "suppref": i["suppref"],
+        "packing": i["packing"], "unit": i["unit"], "sprice": i["sprice"], "mrp": i["mrp"],
+        "curstock": i["curstock"], "deleted": i["deleted"], "edited_date": None,
+        "groupid": lookup_id("groupname", i["groupname"]), "makeid": lookup_id("makename", i["makename"]),
+        "brandid": lookup_id("brandname", i["brandname"]),
+    } for i in items]
+    catalogue = PartsCatalogue()
+    catalogue.apply(records, tuple({v: k for k, v in names[c].items()} for c in names))
+    return catalogue
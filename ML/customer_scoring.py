@@ -0,0 +1,253 @@
+# Customer Payment Scoring Engine
+# Per-party RFM and payment-delay scoring computed over acc_trn_invoice
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CustomerPaymentScorer:
+    """
+    Scores every party in one vectorized pass:
+    - Recency / Frequency / Monetary (1-5 quintile scores)
+    - Days-to-pay distribution of settled invoices
+    - Probability of paying late (smoothed towards the overall late rate)
+    - Expected collection days for open invoices
+
+    Results are cached per transaction type and only recomputed when the
+    invoice table changes (row count / last edit) or the calendar day rolls over.
+    """
+
+    DELAY_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+    def __init__(self, late_threshold_days: int = 30, prior_strength: float = 5.0,
+                 rfm_window_days: int = 365):
+        self.late_threshold_days = late_threshold_days
+        # Number of pseudo-invoices used to pull parties with little history
+        # towards the overall behaviour
+        self.prior_strength = prior_strength
+        self.rfm_window_days = rfm_window_days
+        self._cache = {}  # tran_type -> (version, scores DataFrame, global stats)
+        self._lock = threading.Lock()
+
+    # ── Data access ──────────────────────────────────────────────────────────
+    def _data_version(self, conn, tran_type: str) -> Tuple:
+        """Cheap fingerprint of the invoice rows the scores depend on"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), MAX(edited_date), MAX(created_date)
+            FROM public.acc_trn_invoice
+            WHERE tran_type = %s
+        """, (tran_type,))
+        row = cursor.fetchone()
+        cursor.close()
+        return (row[0], row[1], row[2], datetime.now().date())
+
+    def _fetch_invoices(self, conn, tran_type: str) -> pd.DataFrame:
+        """Fetch all invoices of one type for all parties in a single query"""
+        cursor = conn.cursor()
+        # edited_date is stamped by receipt/payment allocation, so for fully
+        # settled invoices it is the settlement date
+        cursor.execute("""
+            SELECT
+                inv.party_id,
+                p.partyname,
+                inv.tran_date,
+                inv.tran_amount,
+                inv.balance_amount,
+                inv.edited_date::date AS settled_date
+            FROM public.acc_trn_invoice inv
+            LEFT JOIN public.tblmasparty p ON inv.party_id = p.partyid
+            WHERE inv.tran_type = %s
+            AND inv.tran_date IS NOT NULL
+        """, (tran_type,))
+        rows = cursor.fetchall()
+        cursor.close()
+
+        df = pd.DataFrame(rows, columns=[
+            'party_id', 'partyname', 'tran_date', 'tran_amount', 'balance_amount', 'settled_date'
+        ])
+        if len(df) > 0:
+            df['tran_date'] = pd.to_datetime(df['tran_date'])
+            df['settled_date'] = pd.to_datetime(df['settled_date'])
+            df['tran_amount'] = df['tran_amount'].astype(float).fillna(0)
+            df['balance_amount'] = df['balance_amount'].astype(float).fillna(0)
+        return df
+
+    # ── Scoring ──────────────────────────────────────────────────────────────
+    def _quintile_score(self, values: pd.Series, higher_is_better: bool = True) -> pd.Series:
+        """1-5 score from percentile rank (ties broken by order, works for few parties)"""
+        pct = values.rank(method='first', pct=True)
+        if not higher_is_better:
+            pct = 1 - pct + (1 / len(values))
+        return np.ceil(pct * 5).clip(1, 5).astype(int)
+
+    def compute_scores(self, invoices: pd.DataFrame, today: Optional[datetime] = None) -> Tuple[pd.DataFrame, Dict]:
+        """Compute per-party scores from an invoice frame (no database access)"""
+        today = pd.Timestamp((today or datetime.now()).date())
+
+        if len(invoices) == 0:
+            return pd.DataFrame(), {'late_rate': 0.0, 'delay_quantiles': [0.0] * len(self.DELAY_QUANTILES)}
+
+        df = invoices.copy()
+        df['is_open'] = df['balance_amount'] > 0.01
+        df['age_days'] = (today - df['tran_date']).dt.days.clip(lower=0)
+        df['days_to_pay'] = (df['settled_date'] - df['tran_date']).dt.days.clip(lower=0)
+        df.loc[df['is_open'], 'days_to_pay'] = np.nan
+
+        settled = df[~df['is_open']]
+        # Late = settled after the threshold, or still open past the threshold
+        df['is_late'] = (df['days_to_pay'] > self.late_threshold_days) | \
+                        (df['is_open'] & (df['age_days'] > self.late_threshold_days))
+        df['is_decided'] = ~df['is_open'] | (df['age_days'] > self.late_threshold_days)
+
+        in_window = df['age_days'] <= self.rfm_window_days
+        df['window_amount'] = np.where(in_window, df['tran_amount'], 0.0)
+        df['window_count'] = in_window.astype(int)
+        df['open_amount'] = np.where(df['is_open'], df['balance_amount'], 0.0)
+        df['open_age'] = np.where(df['is_open'], df['age_days'], np.nan)
+
+        grouped = df.groupby('party_id')
+        scores = pd.DataFrame({
+            'party_name': grouped['partyname'].first(),
+            'invoice_count': grouped.size(),
+            'recency_days': grouped['age_days'].min(),
+            'frequency': grouped['window_count'].sum(),
+            'monetary': grouped['window_amount'].sum(),
+            'open_invoices': grouped['is_open'].sum(),
+            'outstanding_balance': grouped['open_amount'].sum(),
+            'oldest_open_days': grouped['open_age'].max(),
+            'settled_invoices': grouped['days_to_pay'].count(),
+            'late_count': grouped['is_late'].sum(),
+            'decided_count': grouped['is_decided'].sum(),
+        })
+
+        # Days-to-pay distribution per party (settled invoices only)
+        delay_groups = settled.groupby('party_id')['days_to_pay']
+        q_cols = [f'delay_p{int(q * 100)}' for q in self.DELAY_QUANTILES]
+        if len(settled) > 0:
+            quantiles = delay_groups.quantile(list(self.DELAY_QUANTILES)).unstack()
+            quantiles.columns = q_cols
+        else:
+            # Nothing settled yet (new year, all-open ledger): every party falls back to the global prior
+            quantiles = pd.DataFrame(np.nan, index=scores.index, columns=q_cols)
+        scores = scores.join(quantiles)
+        scores['delay_mean'] = delay_groups.mean()
+        scores['delay_std'] = delay_groups.std()
+
+        # Global behaviour used as the prior for sparse parties
+        global_late_rate = float(df.loc[df['is_decided'], 'is_late'].mean()) if df['is_decided'].any() else 0.0
+        if len(settled) > 0:
+            global_q = settled['days_to_pay'].quantile(list(self.DELAY_QUANTILES)).to_numpy(dtype=float)
+        else:
+            global_q = np.full(len(self.DELAY_QUANTILES), float(self.late_threshold_days))
+
+        k = self.prior_strength
+        scores['late_probability'] = (
+            (scores['late_count'] + k * global_late_rate) / (scores['decided_count'] + k)
+        ).round(4)
+
+        # Shrink each party's delay quantiles towards the global ones
+        n = scores['settled_invoices'].to_numpy(dtype=float)[:, None]
+        party_q = scores[q_cols].to_numpy(dtype=float)
+        party_q = np.where(np.isnan(party_q), global_q[None, :], party_q)
+        shrunk_q = (n * party_q + k * global_q[None, :]) / (n + k)
+        for i, col in enumerate(q_cols):
+            scores[f'expected_{col}'] = shrunk_q[:, i].round(1)
+        scores['expected_collection_days'] = scores['expected_delay_p50']
+
+        # RFM quintiles
+        scores['r_score'] = self._quintile_score(scores['recency_days'], higher_is_better=False)
+        scores['f_score'] = self._quintile_score(scores['frequency'])
+        scores['m_score'] = self._quintile_score(scores['monetary'])
+        scores['rfm_segment'] = (scores['r_score'].astype(str) + scores['f_score'].astype(str) +
+                                 scores['m_score'].astype(str))
+
+        scores['risk_level'] = np.select(
+            [scores['late_probability'] > 0.6, scores['late_probability'] > 0.3],
+            ['HIGH', 'MEDIUM'],
+            default='LOW'
+        )
+
+        global_stats = {
+            'late_rate': round(global_late_rate, 4),
+            'delay_quantiles': [round(float(v), 1) for v in global_q],
+        }
+        return scores, global_stats
+
+    def score_parties(self, conn, tran_type: str = 'SAL') -> Tuple[pd.DataFrame, Dict]:
+        """Return cached scores for all parties, recomputing only when the data changed"""
+        version = self._data_version(conn, tran_type)
+
+        with self._lock:
+            cached = self._cache.get(tran_type)
+            if cached and cached[0] == version:
+                return cached[1], cached[2]
+
+        invoices = self._fetch_invoices(conn, tran_type)
+        scores, global_stats = self.compute_scores(invoices)
+        logger.info(f"Scored {len(scores)} parties for {tran_type} ({len(invoices)} invoices)")
+
+        with self._lock:
+            self._cache[tran_type] = (version, scores, global_stats)
+        return scores, global_stats
+
+    def delay_quantile_table(self, conn, tran_type: str = 'SAL') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Expected days-to-pay quantiles for every party.
+        Returns (party_ids, quantile matrix [parties x quantiles], global quantiles)
+        """
+        scores, global_stats = self.score_parties(conn, tran_type)
+        global_q = np.array(global_stats['delay_quantiles'], dtype=float)
+        if len(scores) == 0:
+            return np.array([], dtype=np.int64), np.empty((0, len(self.DELAY_QUANTILES))), global_q
+
+        q_cols = [f'expected_delay_p{int(q * 100)}' for q in self.DELAY_QUANTILES]
+        return scores.index.to_numpy(dtype=np.int64), scores[q_cols].to_numpy(dtype=float), global_q
+
+    def get_scores(self, conn, tran_type: str = 'SAL', limit: int = 50) -> Dict:
+        """API-friendly scores, riskiest parties first"""
+        scores, global_stats = self.score_parties(conn, tran_type)
+        if len(scores) == 0:
+            return {'parties': [], 'total_parties': 0, 'global': global_stats}
+
+        ranked = scores.sort_values(['late_probability', 'outstanding_balance'], ascending=[False, False])
+        parties = []
+        for party_id, row in ranked.head(limit).iterrows():
+            parties.append({
+                'party_id': int(party_id),
+                'name': row['party_name'],
+                'rfm': {
+                    'recency_days': int(row['recency_days']),
+                    'frequency': int(row['frequency']),
+                    'monetary': round(float(row['monetary']), 2),
+                    'segment': row['rfm_segment']
+                },
+                'days_to_pay': {
+                    'settled_invoices': int(row['settled_invoices']),
+                    'median': None if pd.isna(row['delay_p50']) else float(row['delay_p50']),
+                    'p90': None if pd.isna(row['delay_p90']) else float(row['delay_p90']),
+                    'mean': None if pd.isna(row['delay_mean']) else round(float(row['delay_mean']), 1)
+                },
+                'late_probability': float(row['late_probability']),
+                'expected_collection_days': float(row['expected_collection_days']),
+                'outstanding_balance': round(float(row['outstanding_balance']), 2),
+                'open_invoices': int(row['open_invoices']),
+                'risk_level': row['risk_level']
+            })
+
+        return {
+            'parties': parties,
+            'total_parties': len(scores),
+            'late_threshold_days': self.late_threshold_days,
+            'global': global_stats
+        }
+
+
+# Global instance
+customer_scorer = CustomerPaymentScorer()
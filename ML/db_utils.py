@@ -2,23 +2,30 @@
 Shared database connection utility.
 Supports local Postgres and hosted Neon via DATABASE_URL.
 Handles Neon's idle connection termination with keepalive settings.
+get_connection() opens a dedicated connection; pooled_connection() borrows one
+from a process-wide pool for hot request paths.
 """
 
 import os
 import re
-import psycopg2
+import threading
 import logging
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 
 logger = logging.getLogger(__name__)
 
 
-def get_connection():
+def _connection_args():
     """
-    Returns a psycopg2 connection.
+    (dsn, kwargs) for psycopg2.connect.
     - Prefers DATABASE_URL (Neon/Render)
     - Strips unsupported params (channel_binding)
     - Adds TCP keepalive to prevent Neon from dropping idle connections
     """
+    keepalive = dict(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=5)
     database_url = os.getenv("DATABASE_URL")
 
     if database_url:
@@ -28,32 +35,110 @@ def get_connection():
         if "sslmode" not in clean_url:
             sep = "&" if "?" in clean_url else "?"
             clean_url = f"{clean_url}{sep}sslmode=require"
+        return clean_url, keepalive
+    return None, dict(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5433"),
+        database=os.getenv("DB_NAME", "newgen"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "admin"),
+        **keepalive,
+    )
+
+
+def get_connection():
+    """Returns a new psycopg2 connection (caller closes it)"""
+    dsn, kwargs = _connection_args()
+    try:
+        if dsn:
+            return psycopg2.connect(dsn, **kwargs)
+        return psycopg2.connect(**kwargs)
+    except Exception as e:
+        source = "DATABASE_URL" if dsn else "env vars"
+        logger.error(f"Database connection failed ({source}): {e}")
+        raise
+
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+# Seconds pooled_connection() waits for a free connection before raising PoolError
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def get_pool():
+    """Process-wide ThreadedConnectionPool (DB_POOL_MIN / DB_POOL_MAX), created on first use"""
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                dsn, kwargs = _connection_args()
+                minconn = int(os.getenv("DB_POOL_MIN", "1"))
+                maxconn = int(os.getenv("DB_POOL_MAX", "5"))
+                if dsn:
+                    _pool = ThreadedConnectionPool(minconn, maxconn, dsn, **kwargs)
+                else:
+                    _pool = ThreadedConnectionPool(minconn, maxconn, **kwargs)
+                # getconn() raises PoolError past maxconn instead of waiting: borrowers queue here
+                _pool_slots = threading.BoundedSemaphore(maxconn)
+                logger.info(f"✅ Database pool ready ({minconn}-{maxconn} connections)")
+    return _pool
+
+
+def _alive(conn) -> bool:
+    """
+    Round trip on an idle pooled connection. psycopg2 only marks a connection
+    closed after an operation on it fails, so a server-side drop shows up here.
+    """
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrow a pooled connection for one unit of work.
+    Each checkout is checked with SELECT 1; a connection dropped by the server
+    (e.g. Neon idle termination) is discarded and replaced by a new one;
+    a connection that raised is rolled back, and discarded if it is broken.
+    When every connection is checked out, waits up to DB_POOL_TIMEOUT seconds for
+    one to be returned, then raises PoolError.
+    """
+    pool = get_pool()
+    slots = _pool_slots
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise PoolError(f"no pooled connection free after {DB_POOL_TIMEOUT:g}s")
+    try:
+        conn = pool.getconn()
+        if not _alive(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+    broken = False
+    try:
+        yield conn
+        if not conn.closed:
+            conn.rollback()  # end the read transaction; writers commit explicitly
+    except Exception:
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
         try:
-            conn = psycopg2.connect(
-                clean_url,
-                keepalives=1,
-                keepalives_idle=30,
-                keepalives_interval=10,
-                keepalives_count=5,
-            )
-            return conn
-        except Exception as e:
-            logger.error(f"Database connection failed (DATABASE_URL): {e}")
-            raise
-    else:
-        try:
-            conn = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                port=os.getenv("DB_PORT", "5433"),
-                database=os.getenv("DB_NAME", "newgen"),
-                user=os.getenv("DB_USER", "postgres"),
-                password=os.getenv("DB_PASSWORD", "admin"),
-                keepalives=1,
-                keepalives_idle=30,
-                keepalives_interval=10,
-                keepalives_count=5,
-            )
-            return conn
-        except Exception as e:
-            logger.error(f"Database connection failed (env vars): {e}")
-            raise
+            pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            slots.release()
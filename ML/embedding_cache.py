@@ -0,0 +1,216 @@
+"""
+Symptom embedding cache.
+In-memory LRU in front of an on-disk store shared by all workers and restarts:
+  <cache_dir>/<model key>/embeddings.f16  - memory-mapped float16 matrix
+  <cache_dir>/<model key>/keys.txt        - one normalized text per line (line n = row n)
+Rows are written before their key is appended, so a key visible in keys.txt
+always points at a complete row. Creating the matrix and appends are serialised
+with a file lock.
+"""
+
+import os
+import re
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process locking unavailable, threads are still serialised
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "embeddings"),
+)
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a symptom: lowercase, trimmed, single spaces (tokenizer-neutral)"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    def __init__(self, model_id: str, dim: int, cache_dir: str = DEFAULT_CACHE_DIR,
+                 capacity: int = 4096, disk_capacity: int = 200_000):
+        self.model_id = model_id
+        self.dim = dim
+        self.capacity = capacity
+        self.disk_capacity = disk_capacity
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._disk_index: Dict[str, int] = {}
+        self._disk_rows = 0
+        self._keys_offset = 0
+        self._full_warned = False
+        self._lock = threading.Lock()
+        # misses: lookups not served by the cache; batch_duplicates: the misses that repeat
+        # an earlier text of the same call (encoded once, not a cache hit)
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "batch_duplicates": 0}
+
+        # One directory per model name/version so embeddings never mix between models
+        model_key = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+        self.directory = os.path.join(cache_dir, f"{model_key}-d{dim}")
+        self._matrix = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._keys_path = os.path.join(self.directory, "keys.txt")
+            self._lock_path = os.path.join(self.directory, ".lock")
+            matrix_path = os.path.join(self.directory, "embeddings.f16")
+            self._create_matrix(matrix_path)
+            self._matrix = np.memmap(matrix_path, dtype=np.float16, mode="r+", shape=(disk_capacity, dim))
+            open(self._keys_path, "a").close()
+            self._sync_disk_index()
+            logger.info(f"✅ Embedding cache ready ({len(self._disk_index)} persisted entries) at {self.directory}")
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding cache persistence disabled: {e}")
+            self._matrix = None
+
+    # ── Disk store ───────────────────────────────────────────────────────────
+    def _file_lock(self):
+        handle = open(self._lock_path, "a")
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _file_unlock(self, handle):
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+    def _create_matrix(self, path: str):
+        """
+        Create the zero-filled matrix file unless it exists (O_EXCL, sized under the
+        file lock): a worker starting at the same time never truncates rows another
+        one already wrote, nor maps the file before it has its full size.
+        """
+        handle = self._file_lock()
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            try:
+                os.ftruncate(fd, self.disk_capacity * self.dim * np.dtype(np.float16).itemsize)
+            finally:
+                os.close(fd)
+        except FileExistsError:
+            pass
+        finally:
+            self._file_unlock(handle)
+
+    def _sync_disk_index(self):
+        """Pick up keys appended by other workers since the last sync"""
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            chunk = f.read()
+        # Only consume complete lines; a partial line is finished by its writer shortly
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        if not complete:
+            return
+        for key in complete.decode("utf-8").split("\n")[:-1]:
+            self._disk_index.setdefault(key, self._disk_rows)
+            self._disk_rows += 1
+        self._keys_offset += len(complete)
+
+    def _persist(self, entries: Dict[str, np.ndarray]):
+        handle = self._file_lock()
+        try:
+            self._sync_disk_index()
+            new_keys = [key for key in entries if key not in self._disk_index]
+            free = self.disk_capacity - self._disk_rows
+            if len(new_keys) > free:
+                if not self._full_warned:
+                    logger.warning("⚠️ Embedding cache disk store is full; new entries stay in memory only")
+                    self._full_warned = True
+                new_keys = new_keys[:max(free, 0)]
+            if not new_keys:
+                return
+
+            start = self._disk_rows
+            rows = np.stack([entries[key] for key in new_keys]).astype(np.float16)
+            self._matrix[start:start + len(new_keys)] = rows
+            self._matrix.flush()
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in new_keys))
+            self._sync_disk_index()
+        finally:
+            self._file_unlock(handle)
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def encode(self, texts: List[str], encoder: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for texts in order. Cache misses are encoded together in a
+        single encoder call on their normalized text.
+        """
+        keys = [normalize_text(text) for text in texts]
+        result = np.empty((len(keys), self.dim), dtype=np.float32)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            disk_synced = False
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    result[i] = vector
+                    continue
+
+                if self._matrix is not None and key not in self._disk_index and not disk_synced:
+                    self._sync_disk_index()
+                    disk_synced = True
+                row = self._disk_index.get(key) if self._matrix is not None else None
+                if row is not None:
+                    vector = np.asarray(self._matrix[row], dtype=np.float32)
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+                    result[i] = vector
+                    continue
+
+                self._stats["misses"] += 1
+                if key in missing:
+                    self._stats["batch_duplicates"] += 1
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            encoded = np.asarray(encoder(list(missing)), dtype=np.float32)
+            entries = dict(zip(missing, encoded))
+            for key, vector in entries.items():
+                result[missing[key]] = vector
+            with self._lock:
+                for key, vector in entries.items():
+                    self._remember(key, vector)
+                if self._matrix is not None:
+                    try:
+                        self._persist(entries)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not persist embeddings: {e}")
+
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                "model": self.model_id,
+                "dimension": self.dim,
+                **self._stats,
+                "lookups": lookups,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.capacity,
+                "disk_entries": len(self._disk_index),
+                "disk_capacity": self.disk_capacity,
+                "persistent": self._matrix is not None,
+                "directory": self.directory,
+            }
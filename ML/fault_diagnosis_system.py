@@ -21,7 +21,6 @@ import pandas as pd
 import logging
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
-import pickle
 
 # FastAPI
 from fastapi import FastAPI, HTTPException
@@ -36,11 +35,8 @@ from dotenv import load_dotenv
 
 # ML libraries
 try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.ensemble import RandomForestClassifier
-    from sklearn.model_selection import train_test_split
-    from sklearn.metrics import accuracy_score, classification_report
-    import joblib
+    from artifacts import ModelRegistry, content_hash
+    from fault_text_classifier import HashedFaultClassifier
     ML_AVAILABLE = True
 except ImportError:
     print("ML libraries not available. Install with: pip install scikit-learn")
@@ -93,34 +89,38 @@ def get_db():
         return None
 
 class FaultDiagnosisSystem:
+    MODEL_NAME = "fault_text_classifier"
+    MODEL_PARAMS = {"C": 10.0, "folds": 3, "seed": 0}
+
     def __init__(self):
-        self.symptom_vectorizer = None
         self.fault_classifier = None
         self.fault_to_parts_map = {}
         self.symptom_to_fault_data = []
         
-        # Initialize system
+        # Initialize system (the sample data also feeds the fault -> parts map)
+        self._create_sample_training_data()
         self._load_or_create_models()
         self._load_fault_to_parts_mapping()
     
     def _load_or_create_models(self):
-        """Load existing models or create new ones"""
-        model_path = 'ML/models/fault_diagnosis_model.pkl'
-        vectorizer_path = 'ML/models/symptom_vectorizer.pkl'
-        
-        if os.path.exists(model_path) and os.path.exists(vectorizer_path):
-            try:
-                self.fault_classifier = joblib.load(model_path)
-                self.symptom_vectorizer = joblib.load(vectorizer_path)
-                logger.info("✅ Loaded existing fault diagnosis models")
-                return
-            except Exception as e:
-                logger.warning(f"Failed to load models: {e}")
-        
-        # Create new models with sample data
-        logger.info("Creating new fault diagnosis models with sample data...")
-        self._create_sample_training_data()
-        self._train_models()
+        """Load the model trained on the current data from the registry, or train and register it"""
+        if not ML_AVAILABLE:
+            logger.error("ML libraries not available for training")
+            return
+
+        # Version = hash of the training inputs: edited sample data or params retrain once
+        registry = ModelRegistry(self.MODEL_NAME)
+        version = content_hash(
+            [[item["symptoms"], item["fault"]] for item in self.symptom_to_fault_data], self.MODEL_PARAMS
+        )[:16]
+        loaded = registry.load(version)
+        if loaded is not None:
+            self.fault_classifier = loaded[0]
+            logger.info(f"✅ Loaded fault diagnosis model {self.MODEL_NAME}/{version}")
+            return
+
+        logger.info("Training fault diagnosis model on sample data...")
+        self._train_models(registry, version)
     
     def _create_sample_training_data(self):
         """Create sample training data for fault diagnosis"""
@@ -170,42 +170,26 @@ class FaultDiagnosisSystem:
         self.symptom_to_fault_data = sample_data
         logger.info(f"Created {len(sample_data)} sample fault diagnosis records")
     
-    def _train_models(self):
-        """Train the fault diagnosis models"""
-        if not ML_AVAILABLE:
-            logger.error("ML libraries not available for training")
-            return
-        
+    def _train_models(self, registry: "ModelRegistry", version: str):
+        """Train the hashed n-gram classifier and register it under version"""
         # Prepare training data
         symptoms_text = [item["symptoms"] for item in self.symptom_to_fault_data]
         fault_labels = [item["fault"] for item in self.symptom_to_fault_data]
-        
-        # Create TF-IDF vectorizer for symptoms
-        self.symptom_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
-        
-        # Vectorize symptoms
-        X = self.symptom_vectorizer.fit_transform(symptoms_text)
-        y = fault_labels
-        
-        # Train classifier
-        self.fault_classifier = RandomForestClassifier(
-            n_estimators=100,
-            random_state=42,
-            max_depth=10
-        )
-        
-        self.fault_classifier.fit(X, y)
-        
-        # Save models
-        os.makedirs('ML/models', exist_ok=True)
-        joblib.dump(self.fault_classifier, 'ML/models/fault_diagnosis_model.pkl')
-        joblib.dump(self.symptom_vectorizer, 'ML/models/symptom_vectorizer.pkl')
-        
-        logger.info("✅ Fault diagnosis models trained and saved")
+
+        # Hashed features need no vocabulary fit; probabilities are temperature-calibrated
+        self.fault_classifier = HashedFaultClassifier.train(symptoms_text, fault_labels, **self.MODEL_PARAMS)
+
+        try:
+            registry.save(self.fault_classifier, version, {
+                "trained_at": datetime.now().isoformat(),
+                "samples": len(symptoms_text),
+                "faults": len(self.fault_classifier.classes_),
+                "temperature": self.fault_classifier.temperature,
+                "params": self.MODEL_PARAMS,
+            })
+            logger.info(f"✅ Fault diagnosis model trained and saved as {self.MODEL_NAME}/{version}")
+        except OSError as e:
+            logger.warning(f"⚠️ Fault diagnosis model trained but not saved: {e}")
     
     def _load_fault_to_parts_mapping(self):
         """Load fault to parts mapping from training data and ERP"""
@@ -226,7 +210,7 @@ class FaultDiagnosisSystem:
     def diagnose_fault(self, symptoms: List[str], vehicle_info: Dict = None) -> Dict:
         """Diagnose fault based on symptoms — each symptom diagnosed independently,
         then results merged so multiple unrelated faults are all returned."""
-        if not self.fault_classifier or not self.symptom_vectorizer:
+        if not self.fault_classifier:
             return {
                 "error": "Fault diagnosis models not available",
                 "predicted_faults": [],
@@ -238,12 +222,15 @@ class FaultDiagnosisSystem:
         try:
             seen_faults = {}  # fault_code -> best result so far
 
-            # 1. Diagnose each symptom individually
-            for symptom in symptoms:
-                X = self.symptom_vectorizer.transform([symptom.lower()])
-                probs = self.fault_classifier.predict_proba(X)[0]
-                classes = self.fault_classifier.classes_
+            # Every symptom plus the combined text, classified in one batch
+            texts = [symptom.lower() for symptom in symptoms]
+            if len(symptoms) > 1:
+                texts.append(" ".join(symptoms).lower())
+            all_probs = self.fault_classifier.predict_proba(texts)
+            classes = self.fault_classifier.classes_
 
+            # 1. Diagnose each symptom individually
+            for symptom, probs in zip(symptoms, all_probs):
                 top_indices = np.argsort(probs)[-3:][::-1]
                 for idx in top_indices:
                     if probs[idx] > 0.1:
@@ -258,10 +245,7 @@ class FaultDiagnosisSystem:
 
             # 2. Also run combined symptoms to catch cross-symptom patterns
             if len(symptoms) > 1:
-                combined_text = " ".join(symptoms).lower()
-                X_combined = self.symptom_vectorizer.transform([combined_text])
-                probs_combined = self.fault_classifier.predict_proba(X_combined)[0]
-                classes = self.fault_classifier.classes_
+                probs_combined = all_probs[-1]
 
                 top_indices = np.argsort(probs_combined)[-3:][::-1]
                 for idx in top_indices:
@@ -283,7 +267,7 @@ class FaultDiagnosisSystem:
                 "confidence_score": predicted_faults[0]["confidence"] if predicted_faults else 0.0,
                 "symptoms_analyzed": symptoms,
                 "nlp_available": ML_AVAILABLE,
-                "analysis_method": "sklearn_tfidf_random_forest" if ML_AVAILABLE else "fallback"
+                "analysis_method": "hashed_ngram_logistic_regression" if ML_AVAILABLE else "fallback"
             }
 
         except Exception as e:
@@ -0,0 +1,133 @@
+"""
+Linear fault classifier on hashed n-gram features.
+
+Symptom texts are mapped to a fixed-size sparse vector by feature hashing
+(word unigrams/bigrams and character 3-5-grams), so there is no vocabulary to
+fit or store and memory stays constant however much text is seen. A
+multinomial logistic regression is trained on the training phrases plus
+their 3-word windows (every fault gets several examples even when the
+training set has one phrase per fault), and its probabilities are calibrated
+by temperature scaling fitted on out-of-fold predictions. The temperature is
+folded into the stored weights, which are kept sparse (only features seen in
+training carry weight):
+
+    probabilities = softmax(X @ W + b)
+
+so any number of texts is classified with one hashing pass and one sparse
+matrix product.
+"""
+
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import minimize_scalar
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+
+logger = logging.getLogger(__name__)
+
+WORD_FEATURES = 2 ** 16
+CHAR_FEATURES = 2 ** 16
+WINDOW_WORDS = 3
+
+_word_hasher = HashingVectorizer(n_features=WORD_FEATURES, ngram_range=(1, 2), stop_words="english",
+                                 alternate_sign=False, norm="l2")
+_char_hasher = HashingVectorizer(n_features=CHAR_FEATURES, analyzer="char_wb", ngram_range=(3, 5),
+                                 alternate_sign=False, norm="l2")
+
+
+def hashed_features(texts: Sequence[str]) -> sparse.csr_matrix:
+    """Unit-norm hashed word + character n-gram features, one row per text"""
+    texts = [text.lower() for text in texts]
+    return (sparse.hstack([_word_hasher.transform(texts), _char_hasher.transform(texts)], format="csr")
+            * np.sqrt(0.5))
+
+
+def augment(texts: Sequence[str], labels: Sequence[str], window: int = WINDOW_WORDS):
+    """Training phrases plus each of their `window`-word windows (same label)"""
+    out_texts, out_labels = [], []
+    for text, label in zip(texts, labels):
+        words = text.split()
+        variants = [text] + [" ".join(words[i:i + window]) for i in range(len(words) - window + 1)
+                             if len(words) > window]
+        out_texts.extend(variants)
+        out_labels.extend([label] * len(variants))
+    return out_texts, out_labels
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _fit_temperature(logits: np.ndarray, targets: np.ndarray) -> float:
+    """Temperature minimizing the negative log-likelihood of held-out logits"""
+    def nll(log_t):
+        probabilities = _softmax(logits / np.exp(log_t))
+        return -np.mean(np.log(probabilities[np.arange(len(targets)), targets] + 1e-12))
+    return float(np.exp(minimize_scalar(nll, bounds=(-3.0, 3.0), method="bounded").x))
+
+
+class HashedFaultClassifier:
+    """Calibrated softmax over hashed n-grams; weights are a sparse (features x classes) matrix"""
+
+    def __init__(self, classes: Sequence[str], weights: sparse.csr_matrix, bias: np.ndarray, temperature: float = 1.0):
+        self.classes_ = np.asarray(classes)
+        self.weights = weights
+        self.bias = bias
+        self.temperature = temperature
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str], C: float = 10.0,
+              folds: int = 3, seed: int = 0) -> "HashedFaultClassifier":
+        train_texts, train_labels = augment(texts, labels)
+        classes, targets = np.unique(train_labels, return_inverse=True)
+        hashed = hashed_features(train_texts)
+        # Features never seen in training keep zero weight: fit on the seen columns only
+        seen = np.unique(hashed.indices)
+        X = hashed[:, seen]
+
+        def fit(rows) -> LogisticRegression:
+            return LogisticRegression(C=C, max_iter=2000).fit(X[rows], targets[rows])
+
+        # Out-of-fold logits for the temperature (each class needs an example in every fold)
+        temperature = 1.0
+        folds = min(folds, int(np.bincount(targets).min()))
+        if folds >= 2:
+            logits = np.zeros((len(targets), len(classes)))
+            splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+            for train_rows, held_out in splitter.split(X, targets):
+                model = fit(train_rows)
+                logits[np.ix_(held_out, model.classes_)] = model.decision_function(X[held_out])
+            temperature = _fit_temperature(logits, targets)
+
+        model = fit(np.arange(len(targets)))
+        seen_weights = model.coef_.T / temperature
+        weights = sparse.csr_matrix(
+            (seen_weights.ravel(), (np.repeat(seen, len(classes)), np.tile(np.arange(len(classes)), len(seen)))),
+            shape=(hashed.shape[1], len(classes)),
+        )
+        logger.info(f"✅ Hashed fault classifier: {len(classes)} faults, {len(train_texts)} phrases, "
+                    f"{weights.nnz} weights, temperature {temperature:.2f}")
+        return cls(classes, weights.astype(np.float32), (model.intercept_ / temperature).astype(np.float32), temperature)
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Class probabilities (rows follow texts, columns follow classes_)"""
+        if not texts:
+            return np.zeros((0, len(self.classes_)), dtype=np.float32)
+        logits = (hashed_features(texts) @ self.weights).toarray() + self.bias
+        return _softmax(logits)
+
+    def top_faults(self, texts: Sequence[str], k: int = 3, threshold: Optional[float] = None) -> List[List[tuple]]:
+        """Per text, up to k (fault, probability) pairs above threshold, best first"""
+        probabilities = self.predict_proba(texts)
+        results = []
+        for row in probabilities:
+            best = np.argsort(row)[::-1][:k]
+            results.append([(str(self.classes_[i]), float(row[i])) for i in best
+                            if threshold is None or row[i] > threshold])
+        return results
@@ -18,6 +18,7 @@ import os
 import io
 import re
 import json
+import importlib.util
 import numpy as np
 import logging
 from typing import List, Dict, Optional, Tuple
@@ -38,22 +39,22 @@ from dotenv import load_dotenv
 from PIL import Image
 import cv2
 
-# Google Vision API (optional)
-try:
-    from google.cloud import vision
-    GOOGLE_VISION_AVAILABLE = True
-except ImportError:
-    GOOGLE_VISION_AVAILABLE = False
-
-# ML libraries for your trained model
-try:
-    import tensorflow as tf
-    from tensorflow.keras.applications import MobileNetV2
-    from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-    from tensorflow.keras.preprocessing import image as keras_image
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
+from lazy_services import LazyService
+from parts_search import search_category_items
+from parts_catalogue import catalogue_source, parts_catalogue
+
+
+def _module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:  # parent package missing (e.g. no google.cloud)
+        return False
+
+
+# Google Vision API (optional) and TensorFlow for your trained model are only
+# checked here; they are imported when HybridPartsService is built
+GOOGLE_VISION_AVAILABLE = _module_available("google.cloud.vision")
+TF_AVAILABLE = _module_available("tensorflow")
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -88,6 +89,7 @@ def get_db():
 
 class HybridPartsService:
     def __init__(self):
+        self.vision = None
         self.vision_client = None
         self.parts_classifier = None
         self.part_categories = []
@@ -125,6 +127,8 @@ class HybridPartsService:
                 logger.info("📝 Google Vision credentials not set (optional)")
                 return
             
+            from google.cloud import vision
+            self.vision = vision
             self.vision_client = vision.ImageAnnotatorClient()
             self.google_vision_enabled = True
             logger.info("✅ Google Vision API initialized")
@@ -136,6 +140,8 @@ class HybridPartsService:
         if not TF_AVAILABLE:
             return
         
+        import tensorflow as tf
+        
         model_paths = [
             'models/parts_classifier.h5',
             'ML/models/parts_classifier.h5'
@@ -158,7 +164,7 @@ class HybridPartsService:
             return {'objects': [], 'texts': [], 'available': False}
         
         try:
-            image = vision.Image(content=image_data)
+            image = self.vision.Image(content=image_data)
             
             # Object detection
             objects_response = self.vision_client.object_localization(image=image)
@@ -232,8 +238,10 @@ class HybridPartsService:
             if img.mode != 'RGB':
                 img = img.convert('RGB')
 
+            from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+
             img = img.resize((224, 224))
-            img_array = keras_image.img_to_array(img)
+            img_array = np.asarray(img, dtype=np.float32)
             img_array = np.expand_dims(img_array, axis=0)
             img_array = preprocess_input(img_array)
 
@@ -306,35 +314,14 @@ class HybridPartsService:
     
     def search_inventory(self, category: str, part_numbers: List[str] = None) -> List[Dict]:
         """Search inventory"""
-        conn = get_db()
-        if not conn:
+        catalogue = catalogue_source()
+        conn = None if catalogue is not None else get_db()
+        if catalogue is None and not conn:
             return []
         
         try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            query = """
-                SELECT 
-                    i.itemcode, i.itemname, i.suppref as part_number,
-                    g.groupname as category, m.makename as car_make,
-                    b.brandname as brand, i.sprice, i.curstock
-                FROM tblmasitem i
-                LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
-                LEFT JOIN tblmasmake m ON i.makeid = m.makeid
-                LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
-                WHERE i.deleted = false
-            """
-            
-            params = []
-            
-            if category and category != 'unknown':
-                query += " AND LOWER(g.groupname) LIKE LOWER(%s)"
-                params.append(f'%{category}%')
-            
-            query += " ORDER BY i.curstock DESC LIMIT 10"
-            
-            cursor.execute(query, params)
-            results = cursor.fetchall()
+            # In-memory catalogue, else the group name match served by the pg_trgm index (see parts_search.py)
+            results = search_category_items(catalogue or conn, category, limit=10)
             
             matches = []
             for row in results:
@@ -349,8 +336,8 @@ class HybridPartsService:
                     'stock': float(row['curstock'] or 0)
                 })
             
-            cursor.close()
-            conn.close()
+            if conn:
+                conn.close()
             return matches
         
         except Exception as e:
@@ -404,32 +391,48 @@ class HybridPartsService:
             'filter_reason': filter_result['reason']
         }
 
-# Initialize service
-hybrid_service = HybridPartsService()
+# Built on first use (or by the background warm-up in main.py) so importing this module stays cheap
+hybrid_service = LazyService("parts_vision", HybridPartsService)
 
 @app.get("/")
 async def root():
+    service = hybrid_service.peek()
     return {
         "service": "Hybrid Parts Vision API",
         "version": "6.0.0",
         "description": "Smart parts identification with optional Google Vision",
         "status": {
-            "google_vision": hybrid_service.google_vision_enabled,
-            "your_model": hybrid_service.parts_classifier is not None,
+            "google_vision": service.google_vision_enabled if service else None,
+            "your_model": service.parts_classifier is not None if service else None,
             "database": get_db() is not None
         },
-        "categories": len(hybrid_service.part_categories)
+        "categories": len(service.part_categories) if service else None,
+        "engine": hybrid_service.status()
     }
 
 @app.get("/health")
 async def health_check():
+    service = hybrid_service.peek()
+    if service is None:
+        return {
+            "status": "healthy",
+            "ready": False,
+            "engine": hybrid_service.status(),
+            "database": "✅" if get_db() else "❌"
+        }
     return {
         "status": "healthy",
-        "google_vision": "✅" if hybrid_service.google_vision_enabled else "📝 Optional",
-        "your_model": "✅" if hybrid_service.parts_classifier else "❌",
+        "ready": True,
+        "google_vision": "✅" if service.google_vision_enabled else "📝 Optional",
+        "your_model": "✅" if service.parts_classifier else "❌",
         "database": "✅" if get_db() else "❌"
     }
 
+@app.get("/catalogue")
+async def catalogue_stats():
+    """In-memory parts catalogue size, watermarks and refresh counters"""
+    return parts_catalogue.stats()
+
 @app.post("/identify")
 async def identify_part(file: UploadFile = File(...)):
     """Smart part identification"""
@@ -439,7 +442,8 @@ async def identify_part(file: UploadFile = File(...)):
 
         image_data = await file.read()
 
-        result = hybrid_service.identify_part(image_data)
+        service = await hybrid_service.aget()
+        result = service.identify_part(image_data)
 
         return {
             "filename": file.filename,
@@ -464,13 +468,14 @@ async def identify_part(file: UploadFile = File(...)):
         }
 
 if __name__ == "__main__":
+    service = hybrid_service.get()
     print("\n" + "="*70)
     print("🔧 HYBRID PARTS VISION SERVICE")
     print("="*70)
-    print("🌐 Google Vision:", "✅ Enabled" if hybrid_service.google_vision_enabled else "📝 Optional (not configured)")
-    print("🤖 Your Model:", "✅" if hybrid_service.parts_classifier else "❌")
+    print("🌐 Google Vision:", "✅ Enabled" if service.google_vision_enabled else "📝 Optional (not configured)")
+    print("🤖 Your Model:", "✅" if service.parts_classifier else "❌")
     print("💾 Database:", "✅" if get_db() else "❌")
-    print(f"📂 Categories: {len(hybrid_service.part_categories)}")
+    print(f"📂 Categories: {len(service.part_categories)}")
     print("="*70)
     print("🌐 Server: http://localhost:8007")
     print("📖 Docs: http://localhost:8007/docs")
@@ -480,7 +485,7 @@ if __name__ == "__main__":
     print("✅ Better filtering for anime/artistic content")
     print("✅ Improved confidence thresholds")
     print("✅ Graceful fallback when services unavailable")
-    if not hybrid_service.google_vision_enabled:
+    if not service.google_vision_enabled:
         print("\n📝 To enable Google Vision:")
         print("1. Set up Google Cloud credentials")
         print("2. Set GOOGLE_APPLICATION_CREDENTIALS environment variable")
@@ -0,0 +1,133 @@
+"""
+Hybrid fault retrieval: BM25 keyword scores fused with dense similarities.
+
+  - BM25Index: Okapi BM25 weights of every (fault document, term) precomputed
+    into a sparse matrix, so the scores of a batch of queries against every
+    fault are one sparse matrix product. Terms are light-stemmed words
+    ("brakes" -> "brake", "overheating" -> "overheat") plus word bigrams.
+  - reciprocal_rank_fusion: RRF over any number of (queries x faults) score
+    matrices in one vectorized pass; each list contributes w / (k + rank) for
+    the faults it scores above zero, normalized so rank 1 everywhere is 1.0.
+
+Rank fusion needs no score calibration between BM25 (unbounded) and cosine
+similarity, and a fault found by both retrievers outranks one found by either.
+"""
+
+import os
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from keyword_index import normalize
+
+# Faults number in the tens, so a smaller k than the usual 60 keeps ranks apart
+RRF_K = int(os.getenv("FAULT_RRF_K", "10"))
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "when", "while", "after", "into", "not", "but", "has", "have",
+    "car", "vehicle", "issue", "problem", "some", "very", "too",
+}
+_SUFFIXES = ("ing", "ed", "s")
+
+
+def stem(word: str) -> str:
+    """Strip one inflection suffix, keeping at least 4 characters"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    """Stemmed words (3+ chars, no stopwords) and their adjacent bigrams"""
+    words = [stem(w) for w in normalize(text).split() if len(w) > 2 and w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class BM25Index:
+    """Precomputed BM25 weights (documents x terms); query scores by sparse matmul"""
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.vocabulary: Dict[str, int] = {}
+        rows, cols, counts = [], [], []
+        lengths = []
+        for doc_id, document in enumerate(documents):
+            doc_terms = terms(document)
+            lengths.append(len(doc_terms))
+            for term, count in Counter(doc_terms).items():
+                rows.append(doc_id)
+                cols.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                counts.append(count)
+
+        tf = np.asarray(counts, dtype=np.float32)
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        document_frequency = np.bincount(cols, minlength=len(self.vocabulary))
+        idf = np.log1p((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        weights = idf[cols] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows] / average_length))
+        # Stored transposed (terms x documents): query rows @ weights = scores per document
+        self.weights = sparse.csr_matrix((weights.astype(np.float32), (cols, rows)),
+                                         shape=(len(self.vocabulary), len(documents)))
+
+    @property
+    def document_count(self) -> int:
+        return self.weights.shape[1]
+
+    def query_matrix(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Binary (texts x terms) matrix of the indexed terms of each text"""
+        indptr, indices = [0], []
+        for text in texts:
+            ids = {self.vocabulary[t] for t in terms(text) if t in self.vocabulary}
+            indices.extend(sorted(ids))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float32)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(texts), len(self.vocabulary)))
+
+    def scores(self, texts: Sequence[str]) -> np.ndarray:
+        """(texts x documents) BM25 scores"""
+        return (self.query_matrix(texts) @ self.weights).toarray()
+
+
+def reciprocal_rank_fusion(score_matrices: Sequence[np.ndarray], weights: Optional[Sequence[float]] = None,
+                           k: int = RRF_K) -> np.ndarray:
+    """
+    Row-wise RRF of several (queries x faults) score matrices. A fault scoring
+    <= 0 in a list is absent from it. Result is in [0, 1]; 1.0 = ranked first
+    by every list.
+    """
+    weights = [1.0] * len(score_matrices) if weights is None else list(weights)
+    fused = np.zeros(score_matrices[0].shape, dtype=np.float64)
+    for scores, weight in zip(score_matrices, weights):
+        # rank 1 = best; stable so ties keep KB order
+        order = np.argsort(-scores, axis=1, kind="stable")
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1)[None, :], axis=1)
+        fused += np.where(scores > 0, weight / (k + ranks), 0.0)
+    return fused / (sum(weights) / (k + 1))
+
+
+class RetrievalScores(NamedTuple):
+    """Per-query rows of the dense, keyword, optional repair history and fused score matrices"""
+    dense: np.ndarray
+    keyword: np.ndarray
+    fused: np.ndarray
+    history: Optional[np.ndarray] = None
+
+    @classmethod
+    def fuse(cls, dense: np.ndarray, keyword: np.ndarray,
+             history: Optional[np.ndarray] = None) -> "RetrievalScores":
+        ranked = [dense, keyword] if history is None else [dense, keyword, history]
+        return cls(dense, keyword, reciprocal_rank_fusion(ranked), history)
+
+    def take(self, rows) -> "RetrievalScores":
+        return RetrievalScores(self.dense[rows], self.keyword[rows], self.fused[rows],
+                               None if self.history is None else self.history[rows])
+
+
+def keyword_evidence(keyword_scores: np.ndarray, relative: float = 0.4) -> np.ndarray:
+    """Faults with a BM25 score of at least `relative` x the best of their row"""
+    best = keyword_scores.max(axis=-1, keepdims=True)
+    return (keyword_scores > 0) & (keyword_scores >= best * relative)
@@ -0,0 +1,281 @@
+# Item-Level Inventory Analytics
+# Per-item turnover, days of cover, last movement, ABC/XYZ class and dead stock
+# computed from tblmasitem and trn_stock_ledger
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Optional
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ItemInventoryAnalytics:
+    """
+    Item analytics engine over the whole catalogue.
+
+    The stock ledger is fetched once in bulk and then incrementally: only rows
+    with a stock_ledger_id above the last processed one are appended to the
+    cached ledger frame. Item metrics are recomputed (vectorized) only when new
+    ledger rows arrive or the calendar day rolls over.
+
+    - Turnover: units sold in the window / average units on hand, annualised.
+      Average stock is reconstructed backwards from current stock and the
+      ledger movements inside the window.
+    - ABC: share of annual consumption value (A <= 80%, B <= 95%, C rest)
+    - XYZ: coefficient of variation of monthly demand (X < 0.5, Y < 1.0, Z rest)
+    - Dead stock: stock on hand not sold (or, if never sold, not moved) for dead_stock_days
+    """
+
+    SALE_TYPES = ('Sale', 'SRET')  # sales are negative qty, sales returns positive
+    LEDGER_COLUMNS = ['stock_ledger_id', 'itemcode', 'tran_type', 'tran_date', 'qty']
+
+    def __init__(self, window_days: int = 365, dead_stock_days: int = 180):
+        self.window_days = window_days
+        self.dead_stock_days = dead_stock_days
+        self._ledger = self._typed_ledger([])
+        self._last_ledger_id = 0
+        self._analysis = None  # (version, items DataFrame)
+        self._lock = threading.Lock()
+
+    # ── Data access ──────────────────────────────────────────────────────────
+    @classmethod
+    def _typed_ledger(cls, rows) -> pd.DataFrame:
+        """Ledger frame with typed columns, also when empty (date arithmetic needs datetime64)"""
+        df = pd.DataFrame(rows, columns=cls.LEDGER_COLUMNS)
+        df['stock_ledger_id'] = df['stock_ledger_id'].astype(np.int64)
+        df['itemcode'] = df['itemcode'].astype(np.int64)
+        df['tran_date'] = pd.to_datetime(df['tran_date'])
+        df['qty'] = df['qty'].astype(float)
+        return df
+
+    def _fetch_ledger(self, conn, after_id: int) -> pd.DataFrame:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT stock_ledger_id, itemcode, tran_type, tran_date, qty
+            FROM public.trn_stock_ledger
+            WHERE stock_ledger_id > %s
+            AND itemcode IS NOT NULL
+            AND tran_date IS NOT NULL
+            ORDER BY stock_ledger_id
+        """, (after_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+
+        return self._typed_ledger(rows)
+
+    def _ledger_is_consistent(self, conn) -> bool:
+        """Detect deleted ledger rows, which an id watermark cannot see"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM public.trn_stock_ledger
+            WHERE stock_ledger_id <= %s
+            AND itemcode IS NOT NULL
+            AND tran_date IS NOT NULL
+        """, (self._last_ledger_id,))
+        count = cursor.fetchone()[0]
+        cursor.close()
+        return count == len(self._ledger)
+
+    def _fetch_items(self, conn) -> pd.DataFrame:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                i.itemcode,
+                i.itemname,
+                i.partno,
+                g.groupname,
+                COALESCE(i.curstock, 0) AS curstock,
+                COALESCE(NULLIF(i.avgcost, 0), i.cost, 0) AS unit_cost
+            FROM public.tblmasitem i
+            LEFT JOIN public.tblmasgroup g ON i.groupid = g.groupid
+            WHERE COALESCE(i.deleted, false) = false
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        df = pd.DataFrame(rows, columns=['itemcode', 'itemname', 'partno', 'groupname', 'curstock', 'unit_cost'])
+        df['itemcode'] = df['itemcode'].astype(np.int64)
+        df['curstock'] = df['curstock'].astype(float)
+        df['unit_cost'] = df['unit_cost'].astype(float)
+        return df.set_index('itemcode')
+
+    def refresh_ledger(self, conn) -> int:
+        """Append ledger rows added since the last refresh; returns the number of new rows"""
+        with self._lock:
+            if self._last_ledger_id and not self._ledger_is_consistent(conn):
+                logger.info("Stock ledger rows were removed, reloading the full ledger")
+                self._ledger = self._ledger.iloc[0:0]
+                self._last_ledger_id = 0
+                self._analysis = None
+
+            new_rows = self._fetch_ledger(conn, self._last_ledger_id)
+            if len(new_rows) > 0:
+                self._ledger = new_rows if len(self._ledger) == 0 else pd.concat([self._ledger, new_rows], ignore_index=True)
+                self._last_ledger_id = int(new_rows['stock_ledger_id'].iloc[-1])
+            return len(new_rows)
+
+    # ── Analytics ────────────────────────────────────────────────────────────
+    def compute_item_metrics(self, items: pd.DataFrame, ledger: pd.DataFrame,
+                             today: Optional[datetime] = None) -> pd.DataFrame:
+        """Per-item analytics from an item master frame and a stock ledger frame (no database access)"""
+        today = pd.Timestamp((today or datetime.now()).date())
+        window_start = today - pd.Timedelta(days=self.window_days)
+        result = items.copy()
+        if len(result) == 0:
+            return result
+        if len(ledger) == 0:
+            ledger = self._typed_ledger([])
+
+        ledger = ledger[ledger['itemcode'].isin(result.index)]
+        in_window = ledger[ledger['tran_date'] > window_start]
+        grouped_all = ledger.groupby('itemcode')
+
+        result['last_movement_date'] = grouped_all['tran_date'].max()
+        sales_all = ledger[ledger['tran_type'].isin(self.SALE_TYPES)]
+        result['last_sale_date'] = sales_all.groupby('itemcode')['tran_date'].max()
+
+        # Units sold in the window, net of sales returns
+        sales = in_window[in_window['tran_type'].isin(self.SALE_TYPES)]
+        result['units_sold'] = (-sales.groupby('itemcode')['qty'].sum()).reindex(result.index).fillna(0).clip(lower=0)
+
+        # Average units on hand over the window: stock(t) = curstock - movements after t,
+        # so each movement shifts the stock of the days before it
+        days_before_move = (in_window['tran_date'] - window_start).dt.days.to_numpy(dtype=float)
+        shift = (in_window['qty'].to_numpy(dtype=float) * days_before_move / self.window_days)
+        shift = pd.Series(shift, index=in_window['itemcode'].to_numpy()).groupby(level=0).sum()
+        result['avg_stock'] = (result['curstock'] - shift.reindex(result.index).fillna(0)).clip(lower=0)
+
+        annualise = 365.0 / self.window_days
+        daily_demand = result['units_sold'] / self.window_days
+        result['turnover'] = np.where(result['avg_stock'] > 0,
+                                      result['units_sold'] * annualise / result['avg_stock'].where(result['avg_stock'] > 0),
+                                      np.nan)
+        result['days_of_cover'] = np.where(daily_demand > 0,
+                                           result['curstock'].clip(lower=0) / daily_demand.where(daily_demand > 0),
+                                           np.nan)
+        result['days_since_movement'] = (today - result['last_movement_date']).dt.days
+        result['stock_value'] = result['curstock'].clip(lower=0) * result['unit_cost']
+        result['consumption_value'] = result['units_sold'] * annualise * result['unit_cost']
+
+        # ABC on consumption value
+        order = result['consumption_value'].sort_values(ascending=False)
+        total_value = order.sum()
+        if total_value > 0:
+            share_before = (order.cumsum() - order) / total_value
+            abc = pd.Series(np.select([share_before < 0.8, share_before < 0.95], ['A', 'B'], default='C'),
+                            index=order.index)
+            abc[order <= 0] = 'C'
+            result['abc_class'] = abc
+        else:
+            result['abc_class'] = 'C'
+
+        # XYZ on monthly demand variability (months with no sales count as zero demand)
+        n_months = max(1, int(np.ceil(self.window_days / 30.4375)))
+        month_index = ((today - sales['tran_date']).dt.days // 30.4375).astype(int).clip(upper=n_months - 1)
+        monthly = (-sales['qty']).groupby([sales['itemcode'].to_numpy(), month_index.to_numpy()]).sum().unstack(fill_value=0)
+        monthly = monthly.reindex(columns=range(n_months), fill_value=0)
+        mean = monthly.mean(axis=1)
+        cv = (monthly.std(axis=1, ddof=0) / mean.where(mean > 0)).reindex(result.index)
+        result['demand_cv'] = cv
+        result['xyz_class'] = np.select([cv < 0.5, cv < 1.0], ['X', 'Y'], default='Z')
+
+        # Dead stock: stock on hand with no sale (or, if never sold, no movement) for dead_stock_days
+        idle_days = (today - result['last_sale_date'].fillna(result['last_movement_date'])).dt.days
+        result['idle_days'] = idle_days
+        result['is_dead_stock'] = (result['curstock'] > 0) & (idle_days.isna() | (idle_days > self.dead_stock_days))
+        return result
+
+    def analyze(self, conn) -> pd.DataFrame:
+        """Cached per-item analytics, recomputed only when the ledger moved or the day changed"""
+        self.refresh_ledger(conn)
+        version = (self._last_ledger_id, len(self._ledger), datetime.now().date())
+
+        with self._lock:
+            if self._analysis and self._analysis[0] == version:
+                return self._analysis[1]
+            ledger = self._ledger
+
+        items = self._fetch_items(conn)
+        analysis = self.compute_item_metrics(items, ledger)
+        logger.info(f"Analysed {len(analysis)} items over {len(ledger)} stock ledger rows")
+
+        with self._lock:
+            self._analysis = (version, analysis)
+        return analysis
+
+    # ── Consumers ────────────────────────────────────────────────────────────
+    def dead_stock_metrics(self, conn, top_n: int = 3) -> Dict:
+        """Dead-stock summary for the BI rule engine"""
+        analysis = self.analyze(conn)
+        if len(analysis) == 0:
+            return {}
+
+        dead = analysis[analysis['is_dead_stock']].sort_values('stock_value', ascending=False)
+        top = []
+        for _, row in dead.head(top_n).iterrows():
+            idle = 'never moved' if pd.isna(row['idle_days']) else f"{int(row['idle_days'])} days idle"
+            top.append(f"{row['itemname']} (₹{row['stock_value']:,.0f}, {idle})")
+
+        return {
+            'dead_stock_count': len(dead),
+            'dead_stock_value': float(dead['stock_value'].sum()),
+            'dead_stock_top_items': ', '.join(top),
+            'dead_stock_days': self.dead_stock_days,
+        }
+
+    def get_item_report(self, conn, limit: int = 50, dead_only: bool = False) -> Dict:
+        """API-friendly item analytics, largest stock value first"""
+        analysis = self.analyze(conn)
+        if len(analysis) == 0:
+            return {'items': [], 'total_items': 0, 'summary': {}}
+
+        ranked = analysis[analysis['is_dead_stock']] if dead_only else analysis
+        ranked = ranked.sort_values('stock_value', ascending=False)
+
+        def _number(value, digits=1):
+            return None if pd.isna(value) else round(float(value), digits)
+
+        def _date(value):
+            return None if pd.isna(value) else value.strftime('%Y-%m-%d')
+
+        items = []
+        for itemcode, row in ranked.head(limit).iterrows():
+            items.append({
+                'itemcode': int(itemcode),
+                'itemname': row['itemname'],
+                'partno': row['partno'],
+                'group': row['groupname'],
+                'current_stock': float(row['curstock']),
+                'stock_value': round(float(row['stock_value']), 2),
+                'units_sold': float(row['units_sold']),
+                'turnover': _number(row['turnover'], 2),
+                'days_of_cover': _number(row['days_of_cover']),
+                'last_movement_date': _date(row['last_movement_date']),
+                'last_sale_date': _date(row['last_sale_date']),
+                'abc_class': row['abc_class'],
+                'xyz_class': row['xyz_class'],
+                'is_dead_stock': bool(row['is_dead_stock'])
+            })
+
+        dead = analysis['is_dead_stock']
+        classes = (analysis['abc_class'] + analysis['xyz_class']).value_counts()
+        return {
+            'items': items,
+            'total_items': len(analysis),
+            'summary': {
+                'stock_value': round(float(analysis['stock_value'].sum()), 2),
+                'dead_stock_items': int(dead.sum()),
+                'dead_stock_value': round(float(analysis.loc[dead, 'stock_value'].sum()), 2),
+                'abc_xyz_counts': {k: int(v) for k, v in classes.items()},
+                'window_days': self.window_days,
+                'dead_stock_days': self.dead_stock_days
+            }
+        }
+
+
+# Global instance
+inventory_analytics = ItemInventoryAnalytics()
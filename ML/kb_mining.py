@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Fault knowledge-base mining from completed repair invoices.
+
+Every invoice is one repair: its narration (invoice and line descriptions) is
+matched to knowledge-base faults with the fallback keyword index, and the items
+sold on it are mapped to KB part keywords (or, failing that, to their group
+name). Counts are accumulated into RepairStats:
+  - invoices per fault, per part and per fault/part pair (-> confidence, lift)
+  - narration phrases (1-3 words) per fault (-> new symptom phrases)
+
+Invoices are read with a server-side cursor in chunks above the last processed
+inv_master_id, so each run only sees new invoices and memory stays bounded by
+the chunk size plus the (pruned) counters. Statistics are checkpointed to
+artifacts/kb_mining/stats.json.
+
+publish() merges the evidence into the hand-written KB (parts ranked by
+confidence, frequent co-sold parts and narration phrases added) and writes
+artifacts/knowledge_base/kb-<hash>.json plus the fault embeddings the engine
+would compute, then points CURRENT at it. The engine uses the published KB
+when it was mined from its current built-in KB.
+
+Usage:
+    python kb_mining.py [--full] [--chunk-size 5000] [--min-support 5] [--no-embeddings]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from artifacts import ARTIFACT_DIR, artifact_path, content_hash, save_array
+from keyword_index import AhoCorasick, FaultKeywordIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+MINING_DIR = os.path.join(ARTIFACT_DIR, "kb_mining")
+KB_DIR = os.path.join(ARTIFACT_DIR, "knowledge_base")
+KB_MINED = os.getenv("FAULT_KB_MINED", "true").lower() not in ("0", "false", "no")
+
+# Narration -> fault: keyword score of the fault, and share of the best fault's score
+FAULT_MATCH_MIN = 0.15
+FAULT_MATCH_RELATIVE = 0.5
+# Counter budget before rare entries are pruned
+MAX_PHRASES = 200_000
+MAX_GROUP_CANDIDATES = 20_000
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "car", "vehicle", "check", "checked", "repair", "repaired",
+    "replace", "replaced", "service", "work", "job", "done", "new", "old", "fit", "fitted", "labour",
+    "labor", "charges", "charge", "qty", "nos", "set", "per", "inv", "invoice", "bill", "cash",
+}
+
+INVOICE_QUERY = """
+    SELECT m.inv_master_id, m.description AS narration, d.description AS line_description,
+           i.itemname, g.groupname
+    FROM trn_invoice_master m
+    JOIN trn_invoice_detail d ON d.inv_master_id = m.inv_master_id AND COALESCE(d.is_deleted, false) = false
+    LEFT JOIN tblmasitem i ON i.itemcode = d.itemcode
+    LEFT JOIN tblmasgroup g ON g.groupid = i.groupid
+    WHERE m.inv_master_id > %(after)s AND COALESCE(m.is_deleted, false) = false
+    ORDER BY m.inv_master_id, d.srno
+"""
+
+
+def fault_texts(knowledge_base: List[Dict]) -> List[str]:
+    """Text embedded per fault (symptoms + description), shared with the engine's precompute"""
+    return [" ".join(fault["symptoms"]) + " " + fault["description"] for fault in knowledge_base]
+
+
+def narration_phrases(text: str, max_words: int = 3) -> Set[str]:
+    """Distinct 1-3 word phrases of a narration, without numbers or stopword-only phrases"""
+    words = [w for w in normalize(text).split() if len(w) > 2 and not w.isdigit()]
+    phrases = set()
+    for n in range(1, max_words + 1):
+        for i in range(len(words) - n + 1):
+            gram = words[i:i + n]
+            if gram[0] not in STOPWORDS and gram[-1] not in STOPWORDS:
+                phrases.add(" ".join(gram))
+    return phrases
+
+
+def _prune(counters: Dict[str, Counter], budget: int):
+    """Drop the rarest entries of nested counters until they fit the budget"""
+    total = sum(len(c) for c in counters.values())
+    floor = 1
+    while total > budget:
+        for counter in counters.values():
+            for key in [k for k, v in counter.items() if v <= floor]:
+                del counter[key]
+        total = sum(len(c) for c in counters.values())
+        floor += 1
+
+
+class PartMatcher:
+    """KB part keywords occurring in an item name or group (LIKE '%keyword%' with _ as any char)"""
+
+    def __init__(self, knowledge_base: List[Dict]):
+        self.keywords = sorted({part for fault in knowledge_base for part in fault["parts"]})
+        self._matcher = AhoCorasick(normalize(k.replace("_", " ")) for k in self.keywords)
+
+    def parts(self, itemname: Optional[str], groupname: Optional[str]) -> Set[str]:
+        text = normalize(f"{itemname or ''} | {groupname or ''}")
+        return {self.keywords[i] for i in self._matcher.find(text)}
+
+
+def group_keyword(groupname: str) -> str:
+    """Group name as a part keyword ('BRAKE PADS' -> 'brake_pads')"""
+    return re.sub(r"[^a-z0-9]+", "_", groupname.lower()).strip("_")
+
+
+class RepairStats:
+    """Co-occurrence counts mined so far (JSON-serialisable, merged incrementally)"""
+
+    def __init__(self, base_hash: str):
+        self.base_hash = base_hash
+        self.last_invoice_id = 0
+        self.invoices = 0
+        self.matched_invoices = 0
+        self.fault_invoices: Counter = Counter()
+        self.part_invoices: Counter = Counter()
+        self.fault_parts: Dict[str, Counter] = defaultdict(Counter)
+        self.fault_groups: Dict[str, Counter] = defaultdict(Counter)
+        self.fault_phrases: Dict[str, Counter] = defaultdict(Counter)
+        self.phrase_invoices: Counter = Counter()
+        self.updated_at: Optional[str] = None
+
+    def add(self, faults: List[str], parts: Set[str], groups: Set[str], phrases: Set[str]):
+        self.invoices += 1
+        self.part_invoices.update(parts)
+        self.phrase_invoices.update(phrases)
+        if not faults:
+            return
+        self.matched_invoices += 1
+        for fault in faults:
+            self.fault_invoices[fault] += 1
+            self.fault_parts[fault].update(parts)
+            self.fault_groups[fault].update(groups)
+            self.fault_phrases[fault].update(phrases)
+
+    def prune(self):
+        _prune({**self.fault_phrases, "__all__": self.phrase_invoices}, MAX_PHRASES)
+        _prune(self.fault_groups, MAX_GROUP_CANDIDATES)
+
+    def to_json(self) -> Dict:
+        return {
+            "base_hash": self.base_hash,
+            "last_invoice_id": self.last_invoice_id,
+            "invoices": self.invoices,
+            "matched_invoices": self.matched_invoices,
+            "fault_invoices": self.fault_invoices,
+            "part_invoices": self.part_invoices,
+            "fault_parts": self.fault_parts,
+            "fault_groups": self.fault_groups,
+            "fault_phrases": self.fault_phrases,
+            "phrase_invoices": self.phrase_invoices,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "RepairStats":
+        stats = cls(data["base_hash"])
+        stats.last_invoice_id = data["last_invoice_id"]
+        stats.invoices = data["invoices"]
+        stats.matched_invoices = data["matched_invoices"]
+        stats.fault_invoices = Counter(data["fault_invoices"])
+        stats.part_invoices = Counter(data["part_invoices"])
+        for name in ("fault_parts", "fault_groups", "fault_phrases"):
+            setattr(stats, name, defaultdict(Counter, {k: Counter(v) for k, v in data[name].items()}))
+        stats.phrase_invoices = Counter(data["phrase_invoices"])
+        stats.updated_at = data.get("updated_at")
+        return stats
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, base_hash: str) -> "RepairStats":
+        """Saved statistics, or empty ones when missing or mined from a different base KB"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stats = cls.from_json(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return cls(base_hash)
+        if stats.base_hash != base_hash:
+            logger.info("ℹ️ Base knowledge base changed: mining from scratch")
+            return cls(base_hash)
+        return stats
+
+
+class KBMiner:
+    def __init__(self, knowledge_base: List[Dict], stats: Optional[RepairStats] = None):
+        self.knowledge_base = knowledge_base
+        self.base_hash = content_hash(knowledge_base)
+        self.stats = stats or RepairStats(self.base_hash)
+        self.keyword_index = FaultKeywordIndex(knowledge_base)
+        self.part_matcher = PartMatcher(knowledge_base)
+
+    # ── Mining ───────────────────────────────────────────────────────────────
+    def faults_for(self, narration: str) -> List[str]:
+        scores = self.keyword_index.score(narration)
+        if not scores:
+            return []
+        cutoff = max(FAULT_MATCH_MIN, max(scores.values()) * FAULT_MATCH_RELATIVE)
+        return [self.knowledge_base[idx]["fault"] for idx, score in scores.items() if score >= cutoff]
+
+    def add_invoice(self, narration: str, items: Iterable[Tuple[Optional[str], Optional[str]]]):
+        """One repair: narration text and its (itemname, groupname) lines"""
+        parts: Set[str] = set()
+        groups: Set[str] = set()
+        for itemname, groupname in items:
+            matched = self.part_matcher.parts(itemname, groupname)
+            parts |= matched
+            if not matched and groupname:
+                groups.add(group_keyword(groupname))
+        self.stats.add(self.faults_for(narration), parts, groups, narration_phrases(narration))
+
+    def _invoices(self, rows: Iterable[Tuple]) -> Iterable[Tuple[int, str, List[Tuple]]]:
+        """Group consecutive detail rows of one invoice: (inv_master_id, narration, items)"""
+        current_id, narration, lines, items = None, "", [], []
+        for inv_master_id, master_description, line_description, itemname, groupname in rows:
+            if inv_master_id != current_id:
+                if current_id is not None:
+                    yield current_id, " ".join([narration] + lines), items
+                current_id, narration, lines, items = inv_master_id, master_description or "", [], []
+            if line_description and line_description not in lines:
+                lines.append(line_description)
+            items.append((itemname, groupname))
+        if current_id is not None:
+            yield current_id, " ".join([narration] + lines), items
+
+    def _rows(self, conn, chunk_size: int) -> Iterable[Tuple]:
+        cursor = conn.cursor(name="kb_mining_invoices")  # server-side: rows arrive chunk by chunk
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(INVOICE_QUERY, {"after": self.stats.last_invoice_id})
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def mine(self, conn, chunk_size: int = 5000, checkpoint_path: Optional[str] = None,
+             checkpoint_every: int = 50_000) -> int:
+        """Add invoices above the last processed one; returns how many were added"""
+        added = 0
+        for inv_master_id, narration, items in self._invoices(self._rows(conn, chunk_size)):
+            self.add_invoice(narration, items)
+            self.stats.last_invoice_id = inv_master_id
+            added += 1
+            if added % checkpoint_every == 0:
+                self.stats.prune()
+                if checkpoint_path:
+                    self.stats.updated_at = datetime.now().isoformat()
+                    self.stats.save(checkpoint_path)
+                logger.info(f"⛏️ {added} invoices mined (last id {inv_master_id})")
+        self.stats.prune()
+        self.stats.updated_at = datetime.now().isoformat()
+        if checkpoint_path:
+            self.stats.save(checkpoint_path)
+        return added
+
+    # ── Publishing ───────────────────────────────────────────────────────────
+    def mined_knowledge_base(self, min_support: int = 5, min_confidence: float = 0.2, min_lift: float = 2.0,
+                             max_new_parts: int = 3, max_new_symptoms: int = 5) -> List[Dict]:
+        """The base KB with parts ranked/extended and symptoms extended by the mined evidence"""
+        stats = self.stats
+        total = max(stats.invoices, 1)
+        kb = []
+        for fault in self.knowledge_base:
+            fault = json.loads(json.dumps(fault))  # deep copy
+            code = fault["fault"]
+            support = stats.fault_invoices.get(code, 0)
+            if support < min_support:
+                kb.append(fault)
+                continue
+
+            def confidence(count: int) -> float:
+                return count / support
+
+            def lift(count: int, overall: int) -> float:
+                return confidence(count) / (overall / total) if overall else 0.0
+
+            part_counts = stats.fault_parts.get(code, Counter())
+            # Parts seen on this fault's invoices first (most frequent first), the rest in KB order
+            ranked = sorted(fault["parts"], key=lambda p: -part_counts.get(p, 0))
+            new_parts = [
+                part for part, count in part_counts.most_common()
+                if part not in ranked and count >= min_support and confidence(count) >= min_confidence
+                and lift(count, stats.part_invoices[part]) >= min_lift
+            ]
+            group_counts = stats.fault_groups.get(code, Counter())
+            new_parts += [
+                group for group, count in group_counts.most_common()
+                if group and group not in ranked and group not in new_parts
+                and count >= min_support and confidence(count) >= min_confidence
+            ]
+            fault["parts"] = ranked + new_parts[:max_new_parts]
+
+            known = {normalize(s) for s in fault["symptoms"]}
+            phrase_counts = stats.fault_phrases.get(code, Counter())
+            new_symptoms = [
+                phrase for phrase, count in phrase_counts.most_common()
+                if " " in phrase and phrase not in known and count >= min_support
+                # Mostly said about this fault, not a generic workshop phrase
+                and count / stats.phrase_invoices.get(phrase, count) >= 0.6
+                and not any(phrase in k or k in phrase for k in known)
+            ]
+            fault["symptoms"] = fault["symptoms"] + new_symptoms[:max_new_symptoms]
+
+            fault["mined"] = {
+                "invoices": support,
+                "part_confidence": {p: round(confidence(part_counts[p]), 3) for p in fault["parts"] if part_counts.get(p)},
+                "new_parts": new_parts[:max_new_parts],
+                "new_symptoms": new_symptoms[:max_new_symptoms],
+            }
+            kb.append(fault)
+        return kb
+
+
+def publish(knowledge_base: List[Dict], base_hash: str, stats: RepairStats, encoder=None) -> str:
+    """Write a mined KB (and its fault embeddings when an encoder is given); returns its path"""
+    os.makedirs(KB_DIR, exist_ok=True)
+    kb_hash = content_hash(knowledge_base)
+    path = os.path.join(KB_DIR, f"kb-{kb_hash[:16]}.json")
+    document = {
+        "base_hash": base_hash,
+        "published_at": datetime.now().isoformat(),
+        "invoices": stats.invoices,
+        "last_invoice_id": stats.last_invoice_id,
+        "faults": knowledge_base,
+    }
+    with open(f"{path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    if encoder is not None:
+        # Same name the engine derives in _precompute_fault_embeddings, so it loads instead of encoding
+        texts = fault_texts(knowledge_base)
+        embeddings_path = artifact_path("kb_embeddings", f"{content_hash(texts, encoder.model_id)[:16]}.npy")
+        save_array(embeddings_path, encoder.encode(texts))
+
+    pointer = os.path.join(KB_DIR, "CURRENT")
+    with open(f"{pointer}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(path))
+    os.replace(f"{pointer}.{os.getpid()}.tmp", pointer)
+    return path
+
+
+def load_published_kb(base_knowledge_base: List[Dict]) -> Optional[List[Dict]]:
+    """The current published KB if it was mined from this base KB (FAULT_KB_MINED=false disables)"""
+    if not KB_MINED:
+        return None
+    try:
+        with open(os.path.join(KB_DIR, "CURRENT"), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+        with open(os.path.join(KB_DIR, name), "r", encoding="utf-8") as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if document.get("base_hash") != content_hash(base_knowledge_base):
+        logger.warning(f"⚠️ Published knowledge base {name} was mined from another base KB: ignored (re-run kb_mining.py)")
+        return None
+    logger.info(f"✅ Using knowledge base mined from {document['invoices']} invoices ({name})")
+    return document["faults"]
+
+
+def main():
+    import argparse
+    from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem
+    from db_utils import get_connection
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Mine the fault knowledge base from repair invoices")
+    parser.add_argument("--full", action="store_true", help="Discard saved statistics and mine every invoice")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--min-support", type=int, default=5)
+    parser.add_argument("--no-embeddings", action="store_true", help="Publish the KB without precomputing embeddings")
+    args = parser.parse_args()
+
+    # Built-in KB only: a previously published KB must not feed back into mining
+    base_kb = AdvancedFaultDiagnosisSystem.builtin_knowledge_base()
+    base_hash = content_hash(base_kb)
+
+    os.makedirs(MINING_DIR, exist_ok=True)
+    stats_path = os.path.join(MINING_DIR, "stats.json")
+    stats = RepairStats(base_hash) if args.full else RepairStats.load(stats_path, base_hash)
+    miner = KBMiner(base_kb, stats)
+
+    start = time.perf_counter()
+    conn = get_connection()
+    try:
+        added = miner.mine(conn, args.chunk_size, stats_path)
+    finally:
+        conn.close()
+    print(f"⛏️ {added} new invoices in {time.perf_counter() - start:.1f}s "
+          f"({stats.invoices} total, {stats.matched_invoices} matched to faults)")
+
+    encoder = None
+    if not args.no_embeddings:
+        from sentence_encoder import create_sentence_encoder
+        encoder = create_sentence_encoder(AdvancedFaultDiagnosisSystem.SENTENCE_MODEL_NAME)
+    path = publish(miner.mined_knowledge_base(args.min_support), base_hash, stats, encoder)
+    print(f"✅ Published {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Precompiled keyword matching for the fault diagnosis fallback path.
+
+FaultKeywordIndex reproduces AdvancedFaultDiagnosisSystem._score_fault_match for
+every fault at once. A knowledge-base phrase matches a symptom when
+  A. the phrase without spaces is a substring of the symptom without spaces
+     (covers the direct substring rule as well),
+  B. every significant phrase word (len > 3, trailing "s" dropped) is a
+     substring of the symptom, or
+  C. a phrase word and a symptom word (both >= 6 chars) are prefixes of one another.
+A and B are postings from two Aho-Corasick automata (one scan of the symptom
+each), C is a lookup of the symptom words in a prefix index, so scoring costs
+O(len(symptom) + matched postings) instead of a loop over every KB phrase.
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation to spaces, collapse whitespace"""
+    text = text.lower().strip()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text)
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: ids of every pattern occurring in a text, in one pass"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._outputs: List[Tuple[int, ...]] = [()]
+        self._always: Tuple[int, ...] = ()  # empty patterns occur in every text
+
+        node_outputs: List[List[int]] = [[]]
+        always = []
+        for pattern_id, pattern in enumerate(patterns):
+            self.patterns.append(pattern)
+            if not pattern:
+                always.append(pattern_id)
+                continue
+            node = 0
+            for char in pattern:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][char] = child
+                    self._goto.append({})
+                    node_outputs.append([])
+                node = child
+            node_outputs[node].append(pattern_id)
+        self._always = tuple(always)
+
+        # Breadth-first failure links; each node's outputs include those of its failure chain
+        fail = [0] * len(self._goto)
+        outputs: List[Tuple[int, ...]] = [()] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for node in queue:
+            outputs[node] = tuple(node_outputs[node])
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                state = fail[node]
+                while state and char not in self._goto[state]:
+                    state = fail[state]
+                target = self._goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                outputs[child] = tuple(node_outputs[child]) + outputs[fail[child]]
+                queue.append(child)
+        self._fail = fail
+        self._outputs = outputs
+
+    def find(self, text: str) -> Set[int]:
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = set(self._always)
+        visited = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if node and node not in visited:
+                visited.add(node)
+                found.update(outputs[node])
+        return found
+
+
+class PrefixIndex:
+    """Words of at least min_length chars, looked up by either-way prefix relation with a query word"""
+
+    def __init__(self, words: Iterable[str], min_length: int):
+        self.min_length = min_length
+        self._exact: Dict[str, Set[str]] = defaultdict(set)
+        self._by_prefix: Dict[str, Set[str]] = defaultdict(set)
+        for word in words:
+            if len(word) < min_length:
+                continue
+            self._exact[word].add(word)
+            for end in range(min_length, len(word) + 1):
+                self._by_prefix[word[:end]].add(word)
+
+    def related(self, word: str) -> Set[str]:
+        """Indexed words w with word.startswith(w) or w.startswith(word)"""
+        if len(word) < self.min_length:
+            return set()
+        related = set(self._by_prefix.get(word, ()))
+        for end in range(self.min_length, len(word) + 1):
+            related.update(self._exact.get(word[:end], ()))
+        return related
+
+
+class FaultKeywordIndex:
+    """Weighted-phrase fault scores for a symptom, identical to scoring each fault phrase by phrase"""
+
+    STEM_MIN_LENGTH = 6
+
+    def __init__(self, knowledge_base: List[Dict]):
+        self.fault_count = len(knowledge_base)
+        self.total_weights: List[float] = []
+        self.phrase_fault: List[int] = []
+        self.phrase_weight: List[float] = []
+        self.phrase_word_count: List[int] = []
+
+        nospace_postings: Dict[str, List[int]] = defaultdict(list)
+        word_postings: Dict[str, List[int]] = defaultdict(list)
+        stem_postings: Dict[str, Set[int]] = defaultdict(set)
+
+        for fault_idx, fault in enumerate(knowledge_base):
+            total_weight = 0.0
+            for kb_symptom in fault["symptoms"]:
+                # Weight = significant words of the raw KB phrase, as in _score_fault_match
+                weight = max(1.0, len([w for w in kb_symptom.split() if len(w) > 3]) * 1.5)
+                total_weight += weight
+                phrase_id = len(self.phrase_fault)
+                self.phrase_fault.append(fault_idx)
+                self.phrase_weight.append(weight)
+
+                kb = normalize(kb_symptom)
+                nospace_postings[kb.replace(" ", "")].append(phrase_id)
+                kb_words = [w for w in kb.split() if len(w) > 3]
+                # "brakes" is satisfied by "brake" in the symptom, and "brake" by "brake"/"brakes"
+                cores = {w[:-1] if w.endswith("s") else w for w in kb_words}
+                self.phrase_word_count.append(len(cores))
+                for core in cores:
+                    word_postings[core].append(phrase_id)
+                for word in kb_words:
+                    if len(word) >= self.STEM_MIN_LENGTH:
+                        stem_postings[word].add(phrase_id)
+            self.total_weights.append(total_weight)
+
+        self._nospace_keys = list(nospace_postings)
+        self._nospace_postings = [nospace_postings[k] for k in self._nospace_keys]
+        self._nospace_matcher = AhoCorasick(self._nospace_keys)
+        self._word_keys = list(word_postings)
+        self._word_postings = [word_postings[k] for k in self._word_keys]
+        self._word_matcher = AhoCorasick(self._word_keys)
+        self._stem_postings = dict(stem_postings)
+        self._stems = PrefixIndex(stem_postings, self.STEM_MIN_LENGTH)
+
+    def matched_phrases(self, symptom: str) -> Set[int]:
+        user = normalize(symptom)
+        matched: Set[int] = set()
+
+        for key_id in self._nospace_matcher.find(user.replace(" ", "")):
+            matched.update(self._nospace_postings[key_id])
+
+        words_found: Dict[int, int] = defaultdict(int)
+        for key_id in self._word_matcher.find(user):
+            for phrase_id in self._word_postings[key_id]:
+                words_found[phrase_id] += 1
+        word_count = self.phrase_word_count
+        matched.update(p for p, found in words_found.items() if found == word_count[p])
+
+        for user_word in set(user.split()):
+            for kb_word in self._stems.related(user_word):
+                matched.update(self._stem_postings[kb_word])
+
+        return matched
+
+    def score(self, symptom: str) -> Dict[int, float]:
+        """Fault index -> matched weight / total weight, for faults scoring above zero (in KB order)"""
+        matched_weight: Dict[int, float] = defaultdict(float)
+        for phrase_id in self.matched_phrases(symptom):
+            matched_weight[self.phrase_fault[phrase_id]] += self.phrase_weight[phrase_id]
+        return {
+            fault_idx: matched_weight[fault_idx] / self.total_weights[fault_idx]
+            for fault_idx in sorted(matched_weight)
+            if self.total_weights[fault_idx] and matched_weight[fault_idx] > 0
+        }
+
+
+class KeywordGuard:
+    """
+    SYSTEM_KEYWORDS guard compiled into one automaton over the space-collapsed
+    keywords plus a prefix index for single-word stems. A keyword hits when it
+    occurs (spaces ignored) in the symptom, or, for single words of 5+ chars,
+    when it and a symptom word of 5+ chars are prefixes of one another.
+    """
+
+    STEM_MIN_LENGTH = 5
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.keywords = list(keywords)
+        self.fault_sets = [set(faults) for faults in keywords.values()]
+        # Specificity = number of allowed faults (fewer = more targeted)
+        self.specificity = [len(faults) for faults in keywords.values()]
+        self._matcher = AhoCorasick(keyword.replace(" ", "") for keyword in self.keywords)
+        stems: Dict[str, List[int]] = defaultdict(list)
+        for keyword_id, keyword in enumerate(self.keywords):
+            if " " not in keyword and len(keyword) >= self.STEM_MIN_LENGTH:
+                stems[keyword].append(keyword_id)
+        self._stem_keywords = dict(stems)
+        self._stems = PrefixIndex(stems, self.STEM_MIN_LENGTH)
+
+    def _hits(self, symptom: str) -> List[int]:
+        s = normalize(symptom)
+        hits = self._matcher.find(s.replace(" ", ""))
+        for user_word in set(s.split()):
+            for keyword in self._stems.related(user_word):
+                hits.update(self._stem_keywords[keyword])
+        return sorted(hits)
+
+    def matches(self, symptom: str) -> List[Tuple[str, int]]:
+        """(keyword, specificity) for every keyword hit by the symptom, in SYSTEM_KEYWORDS order"""
+        return [(self.keywords[i], self.specificity[i]) for i in self._hits(symptom)]
+
+    def allowed_faults(self, symptom: str) -> Set[str]:
+        """Union of the faults of the most specific hits (within 2x); empty set = no restriction"""
+        hits = self._hits(symptom)
+        if not hits:
+            return set()
+        limit = min(self.specificity[i] for i in hits) * 2
+        allowed: Set[str] = set()
+        for i in hits:
+            if self.specificity[i] <= limit:
+                allowed.update(self.fault_sets[i])
+        return allowed
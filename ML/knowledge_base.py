@@ -0,0 +1,87 @@
+"""
+Fault knowledge base data file.
+
+The hand-written fault knowledge base and the SYSTEM_KEYWORDS guard live in
+fault_knowledge_base.json (FAULT_KB_PATH overrides the location):
+
+  {"version": 1,
+   "system_keywords": {"<keyword>": ["<fault code>", ...], ...},
+   "faults": [{"fault", "description", "severity", "symptoms", "parts",
+               "diagnostic_steps"}, ...]}
+
+Bump "version" with every edit. POST /admin/knowledge-base/reload on the fault
+diagnosis service loads a new version without a restart; only the faults whose
+text changed are embedded again (advanced_fault_diagnosis.py).
+"""
+
+import os
+import json
+from typing import Dict, List, Optional
+
+KB_PATH = os.getenv(
+    "FAULT_KB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fault_knowledge_base.json"),
+)
+
+FAULT_FIELDS = {
+    "fault": str,
+    "description": str,
+    "severity": str,
+    "symptoms": list,
+    "parts": list,
+    "diagnostic_steps": list,
+}
+SEVERITIES = {"low", "medium", "high", "critical"}
+
+
+def validate_kb_document(document: Dict):
+    """Raise ValueError describing the first problem of a knowledge base document"""
+    if not isinstance(document, dict):
+        raise ValueError("knowledge base must be a JSON object")
+    for key in ("version", "system_keywords", "faults"):
+        if key not in document:
+            raise ValueError(f"knowledge base is missing {key!r}")
+    faults = document["faults"]
+    if not isinstance(faults, list) or not faults:
+        raise ValueError("'faults' must be a non-empty list")
+
+    codes = set()
+    for position, fault in enumerate(faults):
+        for field, kind in FAULT_FIELDS.items():
+            if not isinstance(fault.get(field), kind):
+                raise ValueError(f"fault #{position} needs {field!r} ({kind.__name__})")
+        if fault["fault"] in codes:
+            raise ValueError(f"duplicate fault code {fault['fault']!r}")
+        if fault["severity"] not in SEVERITIES:
+            raise ValueError(f"fault {fault['fault']!r} has unknown severity {fault['severity']!r}")
+        if not fault["symptoms"]:
+            raise ValueError(f"fault {fault['fault']!r} has no symptoms")
+        codes.add(fault["fault"])
+
+    keywords = document["system_keywords"]
+    if not isinstance(keywords, dict):
+        raise ValueError("'system_keywords' must map keywords to fault code lists")
+    for keyword, allowed in keywords.items():
+        unknown = set(allowed) - codes
+        if unknown:
+            raise ValueError(f"system keyword {keyword!r} allows unknown faults {sorted(unknown)}")
+
+
+def load_kb_document(path: Optional[str] = None) -> Dict:
+    """Read and validate the knowledge base file (a fresh copy on every call)"""
+    with open(path or KB_PATH, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    validate_kb_document(document)
+    return document
+
+
+def changed_faults(old: List[Dict], new: List[Dict]) -> Dict[str, List[str]]:
+    """Fault codes added, changed and removed between two knowledge bases"""
+    old_by_code = {fault["fault"]: fault for fault in old}
+    new_by_code = {fault["fault"]: fault for fault in new}
+    return {
+        "added": [code for code in new_by_code if code not in old_by_code],
+        "changed": [code for code, fault in new_by_code.items()
+                    if code in old_by_code and old_by_code[code] != fault],
+        "removed": [code for code in old_by_code if code not in new_by_code],
+    }
@@ -0,0 +1,111 @@
+"""
+Lazily constructed service engines.
+Heavy engines (NLP models, TensorFlow classifiers) are wrapped in a LazyService
+so importing a service module only registers its routes. The engine is built on
+first use, or ahead of time by a background warm-up thread started once the
+server is accepting requests. Every LazyService registers itself so /health can
+report per-subsystem readiness.
+"""
+
+import time
+import asyncio
+import threading
+import logging
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_registry: List["LazyService"] = []
+
+
+class LazyService(Generic[T]):
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self.state = self.PENDING
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    def peek(self) -> Optional[T]:
+        """The engine if it has been built, without triggering a load"""
+        return self._instance
+
+    def get(self) -> T:
+        """The engine, building it on first use (concurrent callers wait for one build)"""
+        if self._instance is not None:
+            return self._instance
+        with self._lock:
+            if self._instance is None:
+                self.state = self.LOADING
+                start = time.perf_counter()
+                try:
+                    self._instance = self.factory()
+                except Exception as e:
+                    self.state = self.FAILED
+                    self.error = str(e)
+                    logger.error(f"❌ {self.name} failed to load: {e}")
+                    raise
+                finally:
+                    self.load_seconds = round(time.perf_counter() - start, 2)
+                self.state = self.READY
+                self.error = None
+                logger.info(f"✅ {self.name} ready in {self.load_seconds}s")
+        return self._instance
+
+    async def aget(self) -> T:
+        """get() from async endpoints, off the event loop so a first-use load never blocks other requests"""
+        if self._instance is not None:
+            return self._instance
+        return await asyncio.get_running_loop().run_in_executor(None, self.get)
+
+    def replace(self, instance: T):
+        """Swap in a rebuilt engine; callers already holding the previous one finish with it"""
+        with self._lock:
+            self._instance = instance
+            self.state = self.READY
+            self.error = None
+
+    def warm_up(self) -> threading.Thread:
+        """Build the engine in a daemon thread"""
+        def run():
+            try:
+                self.get()
+            except Exception:
+                pass  # state/error already recorded; the next get() retries
+        thread = threading.Thread(target=run, name=f"warm-up-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+def registered_services() -> List[LazyService]:
+    return list(_registry)
+
+
+def warm_up_all() -> List[threading.Thread]:
+    """Start background warm-up for every registered engine not yet loaded"""
+    return [service.warm_up() for service in _registry if service.state in (LazyService.PENDING, LazyService.FAILED)]
+
+
+def readiness() -> Dict[str, Dict]:
+    return {service.name: service.status() for service in _registry}
@@ -0,0 +1,152 @@
+"""
+Adaptive load shedding for the fault diagnosis service.
+
+LoadShedder picks a service tier for each new request:
+  - "full":    hybrid NLP retrieval (sentence encoder + BM25) and live parts lookups
+  - "keyword": keyword matching only (no encoder) and parts from ResultCache /
+               the in-memory catalogue (no database queries)
+
+It degrades when the requests in flight exceed FAULT_SHED_MAX_IN_FLIGHT or the
+encoder latency (EWMA of interactive-sized encode calls) exceeds
+FAULT_SHED_ENCODER_MS. The full tier is restored once FAULT_SHED_COOLDOWN_S
+seconds have passed and the requests in flight are back under
+FAULT_SHED_RECOVER_RATIO of the limit, so the tier does not flap at the
+threshold; the latency is then measured afresh. Bulk encodes (batch imports)
+are not latency samples themselves, but a saturated CPU shows up in the
+interactive calls they slow down.
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+FULL = "full"
+KEYWORD = "keyword"
+SERVICE_TIERS = (FULL, KEYWORD)
+
+MAX_IN_FLIGHT = int(os.getenv("FAULT_SHED_MAX_IN_FLIGHT", "8"))
+ENCODER_LATENCY_MS = float(os.getenv("FAULT_SHED_ENCODER_MS", "400"))
+RECOVER_RATIO = float(os.getenv("FAULT_SHED_RECOVER_RATIO", "0.5"))
+COOLDOWN_SECONDS = float(os.getenv("FAULT_SHED_COOLDOWN_S", "15"))
+# Encode calls of at most this many texts are interactive latency samples
+INTERACTIVE_TEXTS = int(os.getenv("FAULT_SHED_INTERACTIVE_TEXTS", "16"))
+
+PARTS_CACHE_SIZE = int(os.getenv("FAULT_PARTS_CACHE_SIZE", "2048"))
+PARTS_CACHE_TTL_SECONDS = float(os.getenv("FAULT_PARTS_CACHE_TTL_S", "600"))
+
+
+class LoadShedder:
+    """Service tier controller over requests in flight and encoder latency, with hysteresis"""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, encoder_latency_ms: float = ENCODER_LATENCY_MS,
+                 recover_ratio: float = RECOVER_RATIO, cooldown_seconds: float = COOLDOWN_SECONDS,
+                 interactive_texts: int = INTERACTIVE_TEXTS, smoothing: float = 0.3, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.encoder_latency_ms = encoder_latency_ms
+        self.recover_ratio = recover_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.interactive_texts = interactive_texts
+        self.smoothing = smoothing
+        self.clock = clock
+
+        self.tier = FULL
+        self.in_flight = 0
+        self.latency_ms: Optional[float] = None
+        self._degraded_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {FULL: 0, KEYWORD: 0, "degradations": 0}
+
+    def observe_encoder(self, seconds: float, texts: int = 1):
+        """Record the wall time of an encode call (ignored for bulk calls)"""
+        if texts > self.interactive_texts:
+            return
+        with self._lock:
+            ms = seconds * 1000
+            self.latency_ms = ms if self.latency_ms is None else (
+                self.smoothing * ms + (1 - self.smoothing) * self.latency_ms)
+
+    def _update_tier(self):
+        """Re-evaluate the tier (caller holds the lock)"""
+        latency = self.latency_ms or 0.0
+        if self.tier == FULL:
+            if self.in_flight > self.max_in_flight or latency > self.encoder_latency_ms:
+                self.tier = KEYWORD
+                self._degraded_at = self.clock()
+                self._stats["degradations"] += 1
+                logger.warning(f"⚠️ Diagnosis degraded to keyword tier: {self.in_flight} in flight, "
+                               f"encoder {latency:.0f} ms")
+        elif (self.clock() - self._degraded_at >= self.cooldown_seconds
+              and self.in_flight <= self.max_in_flight * self.recover_ratio):
+            # No interactive encodes run while degraded, so the latency estimate is stale:
+            # restore and measure afresh (a still-slow encoder degrades again on its first samples)
+            self.tier = FULL
+            self.latency_ms = None
+            logger.info(f"✅ Diagnosis restored to full tier: {self.in_flight} in flight")
+
+    @contextmanager
+    def request(self) -> Iterator[str]:
+        """Admit one request for its duration; yields the tier it must be served with"""
+        with self._lock:
+            self.in_flight += 1
+            self._update_tier()
+            tier = self.tier
+            self._stats[tier] += 1
+        try:
+            yield tier
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tier": self.tier,
+                "in_flight": self.in_flight,
+                "encoder_latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+                "max_in_flight": self.max_in_flight,
+                "encoder_latency_limit_ms": self.encoder_latency_ms,
+                "requests": {FULL: self._stats[FULL], KEYWORD: self._stats[KEYWORD]},
+                "degradations": self._stats["degradations"],
+            }
+
+
+class ResultCache:
+    """Thread-safe LRU with a time-to-live; values are returned as stored (callers copy)"""
+
+    def __init__(self, capacity: int = PARTS_CACHE_SIZE, ttl_seconds: float = PARTS_CACHE_TTL_SECONDS,
+                 clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
@@ -5,10 +5,15 @@ Mounts all ML sub-apps under path prefixes on a single port.
   /cashflow  -> Cash Flow Prediction (cashflow_service.py)
   /fault     -> Fault Diagnosis (advanced_fault_diagnosis.py)
   /parts     -> Parts Vision (parts_vision_service.py)
-  /health    -> Health check
+  /health    -> Health check (per-subsystem readiness)
+
+Sub-apps are mounted at import time, but their heavy engines (NLP models,
+TensorFlow) are built lazily: on first request, or by a background warm-up
+started after the server is up (disable with ML_WARMUP=false).
 """
 
 import os
+import time
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,6 +21,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from lazy_services import readiness, warm_up_all
+
+STARTED_AT = time.time()
+WARMUP_ENABLED = os.getenv("ML_WARMUP", "true").lower() not in ("0", "false", "no")
+
 # ── Main app ──────────────────────────────────────────────────────────────────
 app = FastAPI(
     title="NewGen Auto ML Services",
@@ -55,30 +65,52 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    # Always 200 while the process is up; engines that are still loading are reported, not waited for
+    engines = readiness()
+    return {
+        "status": "healthy",
+        "ready": all(engine["state"] == "ready" for engine in engines.values()),
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+        "mounts": MOUNTS,
+        "engines": engines,
+    }
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    if WARMUP_ENABLED:
+        warm_up_all()
 
 
 # ── Mount sub-apps ────────────────────────────────────────────────────────────
 # Each sub-app is a full FastAPI instance; mounting keeps their routes isolated.
+MOUNTS = {}
+
 try:
     from cashflow_service import app as cashflow_app
     app.mount("/cashflow", cashflow_app)
+    MOUNTS["cashflow"] = "mounted"
     print("✅ Cashflow service mounted at /cashflow")
 except Exception as e:
+    MOUNTS["cashflow"] = f"failed: {e}"
     print(f"⚠️  Cashflow service failed to load: {e}")
 
 try:
     from advanced_fault_diagnosis import app as fault_app
     app.mount("/fault", fault_app)
+    MOUNTS["fault"] = "mounted"
     print("✅ Advanced fault diagnosis service mounted at /fault")
 except Exception as e:
+    MOUNTS["fault"] = f"failed: {e}"
     print(f"⚠️  Advanced fault diagnosis service failed to load: {e}")
 
 try:
     from hybrid_parts_service import app as parts_app
     app.mount("/parts", parts_app)
+    MOUNTS["parts"] = "mounted"
     print("✅ Parts vision service mounted at /parts")
 except Exception as e:
+    MOUNTS["parts"] = f"failed: {e}"
     print(f"⚠️  Parts vision service failed to load: {e}")
 
 
@@ -0,0 +1,168 @@
+"""
+Micro-batching queue in front of the sentence encoder.
+
+Concurrent /diagnose requests each embed a handful of symptom texts. Run one
+by one, the transformer does many tiny forward passes and the request threads
+contend for the same cores. MicroBatcher serialises them through one worker
+thread instead: it collects encode requests for up to FAULT_ENCODE_WAIT_MS
+milliseconds or FAULT_ENCODE_BATCH texts, embeds their unique texts in one
+padded batch and resolves each request's future with its own rows.
+
+  - encode(texts):        blocking, for the engine running in the threadpool
+  - encode_async(texts):  awaitable, for async handlers (the event loop is
+                          never blocked)
+
+A request larger than the batch limit (bulk /diagnose/batch chunks) is split
+into max_batch chunks, each queued when the previous one is done: no forward
+pass exceeds the limit, and interactive requests arriving meanwhile are
+batched between the chunks instead of waiting for the whole bulk request.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_TEXTS = int(os.getenv("FAULT_ENCODE_BATCH", "64"))
+MAX_WAIT_MS = float(os.getenv("FAULT_ENCODE_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """One worker thread running encode_fn(texts, batch_size) over coalesced requests"""
+
+    def __init__(self, encode_fn: Callable[..., np.ndarray], max_batch: int = MAX_BATCH_TEXTS,
+                 max_wait_ms: float = MAX_WAIT_MS, name: str = "encoder"):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self._pending: Deque[Tuple[List[str], Future]] = deque()
+        self._condition = threading.Condition()
+        self._worker = None
+        self._closed = False
+        self._stats = {"requests": 0, "batches": 0, "texts": 0, "encoded": 0}
+
+    # ── Submission ───────────────────────────────────────────────────────────
+    def submit(self, texts: Sequence[str]) -> Future:
+        """Queue texts for embedding; the future resolves to their (len(texts) x dim) rows"""
+        future: Future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        if len(texts) <= self.max_batch:
+            self._enqueue(texts, future)
+            return future
+
+        chunks = [texts[start:start + self.max_batch] for start in range(0, len(texts), self.max_batch)]
+        rows: List[np.ndarray] = []
+
+        def queue_next_chunk(follow_up: bool = False):
+            part: Future = Future()
+            part.add_done_callback(chunk_done)
+            self._enqueue(chunks[len(rows)], part, follow_up)
+
+        def chunk_done(part: Future):
+            # Runs on the worker thread as each chunk is resolved
+            try:
+                rows.append(part.result())
+                if len(rows) < len(chunks):
+                    queue_next_chunk(follow_up=True)
+                else:
+                    future.set_result(np.concatenate(rows))
+            except Exception as e:
+                future.set_exception(e)
+
+        queue_next_chunk()
+        return future
+
+    def _enqueue(self, texts: List[str], future: Future, follow_up: bool = False):
+        """follow_up: a later chunk of a request already accepted, still run after close()"""
+        with self._condition:
+            if self._closed and not follow_up:
+                raise RuntimeError(f"{self.name} batcher is closed")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+            self._pending.append((texts, future))
+            self._condition.notify()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    async def encode_async(self, texts: Sequence[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def close(self):
+        """Stop the worker once the queued requests are done"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._worker is not None:
+            self._worker.join()
+
+    # ── Worker ───────────────────────────────────────────────────────────────
+    def _next_batch(self) -> List[Tuple[List[str], Future]]:
+        """Block for a first request, then gather more until the batch is full or the wait is over"""
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return []
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                if self._pending:
+                    if size + len(self._pending[0][0]) > self.max_batch:
+                        break
+                    batch.append(self._pending.popleft())
+                    size += len(batch[-1][0])
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    break
+                self._condition.wait(remaining)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            # Requests often share texts ("engine overheating"): embed each once
+            unique_texts = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            try:
+                embeddings = np.asarray(self.encode_fn(unique_texts, batch_size=len(unique_texts)))
+            except Exception as e:
+                logger.error(f"❌ {self.name} batch of {len(unique_texts)} texts failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._condition:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["texts"] += sum(len(texts) for texts, _ in batch)
+                self._stats["encoded"] += len(unique_texts)
+            row_of = {text: row for row, text in enumerate(unique_texts)}
+            for texts, future in batch:
+                future.set_result(embeddings[[row_of[text] for text in texts]])
+
+    def stats(self) -> Dict:
+        with self._condition:
+            batches = self._stats["batches"]
+            return {
+                **self._stats,
+                "queued": len(self._pending),
+                "mean_requests_per_batch": round(self._stats["requests"] / batches, 2) if batches else None,
+            }
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Parts association rules ("bought together") from invoice baskets.
+
+Every invoice in trn_invoice_detail is a basket of item codes. Baskets are
+streamed in chunks into a sparse basket x item matrix X and item pair counts
+accumulate as X.T @ X (scipy.sparse), so memory is bounded by the chunk and
+the number of co-occurring pairs, never by the invoice history. For each item
+a with at least min_support baskets, the rules a -> b keep
+    support    = baskets with a and b
+    confidence = support / baskets with a
+    lift       = confidence / (baskets with b / all baskets)
+and the top rules per item (by confidence, lift >= min_lift) are stored as a
+CSR-style lookup table in artifacts/parts_associations/rules.npz:
+    items (sorted item codes), indptr, consequents (positions in items),
+    support, confidence, lift
+PartAssociations answers companions(itemcodes) with a binary search per item
+and array slices; diagnosis uses it to add companion parts (pads -> discs ->
+brake fluid) to each fault's parts.
+
+Usage:
+    python parts_associations.py [--min-support 3] [--min-lift 1.5] [--top 10] [--months 36]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from artifacts import artifact_path
+
+logger = logging.getLogger(__name__)
+
+ASSOCIATIONS_ENABLED = os.getenv("PARTS_ASSOCIATIONS", "true").lower() not in ("0", "false", "no")
+COMPANIONS_PER_FAULT = int(os.getenv("PARTS_COMPANIONS_PER_FAULT", "3"))
+
+BASKET_QUERY = """
+    SELECT d.inv_master_id, d.itemcode
+    FROM trn_invoice_detail d
+    JOIN trn_invoice_master m ON m.inv_master_id = d.inv_master_id
+    WHERE COALESCE(d.is_deleted, false) = false
+      AND COALESCE(m.is_deleted, false) = false
+      AND d.itemcode IS NOT NULL
+      AND (%(since)s IS NULL OR m.inv_date >= %(since)s)
+    ORDER BY d.inv_master_id
+"""
+
+
+def rules_path() -> str:
+    return artifact_path("parts_associations", "rules.npz")
+
+
+# ── Building ─────────────────────────────────────────────────────────────────
+class BasketCounter:
+    """Item and item-pair basket counts accumulated chunk by chunk (sparse)"""
+
+    def __init__(self):
+        from scipy import sparse
+        self._sparse = sparse
+        self._column_of: Dict[int, int] = {}
+        self.itemcodes: List[int] = []
+        self.baskets = 0
+        self.pairs = None  # item x item co-occurrence (CSR), diagonal = item counts
+
+    def add_baskets(self, baskets: Iterable[Iterable[int]]):
+        rows, columns = [], []
+        for basket in baskets:
+            items = set(basket)
+            if not items:
+                continue
+            for itemcode in items:
+                column = self._column_of.get(itemcode)
+                if column is None:
+                    column = self._column_of[itemcode] = len(self.itemcodes)
+                    self.itemcodes.append(itemcode)
+                rows.append(self.baskets)
+                columns.append(column)
+            self.baskets += 1
+        if not rows:
+            return
+        first = rows[0]
+        n_items = len(self.itemcodes)
+        chunk = self._sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (np.array(rows) - first, np.array(columns))),
+            shape=(self.baskets - first, n_items),
+        )
+        counts = (chunk.T @ chunk).tocsr()
+        if self.pairs is None:
+            self.pairs = counts
+        else:
+            self.pairs.resize((n_items, n_items))
+            self.pairs = (self.pairs + counts).tocsr()
+
+    def rules(self, min_support: int = 3, min_lift: float = 1.5, top: int = 10) -> Dict[str, np.ndarray]:
+        """Top rules per item as the arrays stored in rules.npz (items sorted by item code)"""
+        n_items = len(self.itemcodes)
+        order = np.argsort(np.array(self.itemcodes, dtype=np.int64), kind="stable")
+        position = np.empty(n_items, dtype=np.int64)
+        position[order] = np.arange(n_items)
+        pairs = self.pairs if self.pairs is not None else self._sparse.csr_matrix((n_items, n_items), dtype=np.int32)
+        pairs = pairs.tocsr()
+        item_counts = pairs.diagonal().astype(np.float64)
+
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        consequents, supports, confidences, lifts = [], [], [], []
+        for sorted_idx, column in enumerate(order):
+            start, end = pairs.indptr[column], pairs.indptr[column + 1]
+            others, counts = pairs.indices[start:end], pairs.data[start:end].astype(np.float64)
+            keep = (others != column) & (counts >= min_support)
+            if item_counts[column] >= min_support and keep.any():
+                others, counts = others[keep], counts[keep]
+                confidence = counts / item_counts[column]
+                lift = confidence / (item_counts[others] / self.baskets)
+                strong = lift >= min_lift
+                others, counts, confidence, lift = others[strong], counts[strong], confidence[strong], lift[strong]
+                best = np.lexsort((-lift, -confidence))[:top]
+                consequents.append(position[others[best]])
+                supports.append(counts[best])
+                confidences.append(confidence[best])
+                lifts.append(lift[best])
+                indptr[sorted_idx + 1] = len(best)
+        indptr = np.cumsum(indptr)
+
+        def concat(arrays, dtype):
+            return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype=dtype)
+
+        return {
+            "items": np.array(self.itemcodes, dtype=np.int64)[order],
+            "item_baskets": item_counts[order].astype(np.int32),
+            "indptr": indptr.astype(np.int32),
+            "consequents": concat(consequents, np.int32),
+            "support": concat(supports, np.int32),
+            "confidence": concat(confidences, np.float32),
+            "lift": concat(lifts, np.float32),
+        }
+
+
+def stream_baskets(conn, since=None, chunk_size: int = 50_000) -> Iterable[List[List[int]]]:
+    """Invoice baskets (lists of item codes) in chunks, from a server-side cursor"""
+    cursor = conn.cursor(name="parts_association_baskets")
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(BASKET_QUERY, {"since": since})
+        current_id, basket, chunk = None, [], []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for inv_master_id, itemcode in rows:
+                if inv_master_id != current_id:
+                    if basket:
+                        chunk.append(basket)
+                    current_id, basket = inv_master_id, []
+                basket.append(int(itemcode))
+            if len(chunk) >= chunk_size // 4:
+                yield chunk
+                chunk = []
+        if basket:
+            chunk.append(basket)
+        if chunk:
+            yield chunk
+    finally:
+        cursor.close()
+
+
+def save_rules(rules: Dict[str, np.ndarray], meta: Dict, path: Optional[str] = None) -> str:
+    path = path or rules_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, meta=np.array(json.dumps(meta)), **rules)
+    os.replace(tmp_path, path)
+    return path
+
+
+# ── Lookup ───────────────────────────────────────────────────────────────────
+class PartAssociations:
+    """In-memory rule table: companion items of a set of items"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Optional[Dict] = None):
+        self.items = arrays["items"]
+        self.item_baskets = arrays["item_baskets"]
+        self.indptr = arrays["indptr"]
+        self.consequents = arrays["consequents"]
+        self.support = arrays["support"]
+        self.confidence = arrays["confidence"]
+        self.lift = arrays["lift"]
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> Optional["PartAssociations"]:
+        path = path or rules_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files if name != "meta"}
+                meta = json.loads(str(data["meta"])) if "meta" in data.files else {}
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load parts associations {path}: {e}")
+            return None
+        return cls(arrays, meta)
+
+    def __len__(self) -> int:
+        return len(self.consequents)
+
+    def rules_for(self, itemcode: int) -> List[Dict]:
+        """Rules itemcode -> companion, best first"""
+        idx = np.searchsorted(self.items, itemcode)
+        if idx >= len(self.items) or self.items[idx] != itemcode:
+            return []
+        start, end = self.indptr[idx], self.indptr[idx + 1]
+        return [{
+            "itemcode": int(self.items[self.consequents[j]]),
+            "support": int(self.support[j]),
+            "confidence": float(self.confidence[j]),
+            "lift": float(self.lift[j]),
+        } for j in range(start, end)]
+
+    def companions(self, itemcodes: Iterable[int], exclude: Iterable[int] = (), limit: int = 5) -> List[Dict]:
+        """
+        Items most often bought with any of itemcodes (best rule per companion:
+        confidence, then lift), excluding the items themselves and `exclude`.
+        """
+        itemcodes = list(itemcodes)
+        skip = set(itemcodes) | set(exclude)
+        best: Dict[int, Dict] = {}
+        for itemcode in itemcodes:
+            for rule in self.rules_for(itemcode):
+                companion = rule["itemcode"]
+                if companion in skip:
+                    continue
+                current = best.get(companion)
+                if current is None or (rule["confidence"], rule["lift"]) > (current["confidence"], current["lift"]):
+                    best[companion] = dict(rule, companion_of=itemcode)
+        ranked = sorted(best.values(), key=lambda r: (-r["confidence"], -r["lift"], r["itemcode"]))
+        return ranked[:limit]
+
+
+def add_companion_parts(source, fault_parts: List[List[Dict]], associations: PartAssociations,
+                        vehicle_info: Optional[Dict] = None, limit: int = COMPANIONS_PER_FAULT) -> List[List[Dict]]:
+    """
+    Append each fault's companion parts (items usually invoiced with its parts)
+    to its part list, flagged is_companion; one item lookup for all faults.
+    """
+    from parts_search import _part_from_row, fetch_items
+
+    vehicle_model = (vehicle_info.get("vehicle_model") or "").strip() if vehicle_info else ""
+    companions = [associations.companions([part["item_code"] for part in parts], limit=limit)
+                  for parts in fault_parts]
+    items = fetch_items(source, sorted({rule["itemcode"] for rules in companions for rule in rules}))
+    for parts, rules in zip(fault_parts, companions):
+        for rule in rules:
+            row = items.get(rule["itemcode"])
+            if row is None:
+                continue
+            part = _part_from_row({**row, "search_keyword": None, "relevance_score": 0}, vehicle_model)
+            part.update(is_companion=True, companion_of=rule["companion_of"],
+                        companion_confidence=round(rule["confidence"], 3), companion_lift=round(rule["lift"], 2))
+            parts.append(part)
+    return fault_parts
+
+
+_loaded: Tuple[Optional[float], Optional[PartAssociations]] = (None, None)
+_load_lock = threading.Lock()
+
+
+def part_associations() -> Optional[PartAssociations]:
+    """The current rule table (reloaded when rules.npz is rebuilt); None when disabled or not built"""
+    global _loaded
+    if not ASSOCIATIONS_ENABLED:
+        return None
+    path = rules_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _loaded[0] != mtime:
+        with _load_lock:
+            if _loaded[0] != mtime:
+                _loaded = (mtime, PartAssociations.load(path))
+    return _loaded[1]
+
+
+def build_associations(conn, since=None, min_support: int = 3, min_lift: float = 1.5, top: int = 10,
+                       chunk_size: int = 50_000) -> str:
+    start = time.perf_counter()
+    counter = BasketCounter()
+    for chunk in stream_baskets(conn, since, chunk_size):
+        counter.add_baskets(chunk)
+    rules = counter.rules(min_support, min_lift, top)
+    meta = {
+        "baskets": counter.baskets, "items": len(counter.itemcodes), "rules": int(len(rules["consequents"])),
+        "min_support": min_support, "min_lift": min_lift, "top": top,
+        "since": str(since) if since else None, "build_seconds": round(time.perf_counter() - start, 1),
+    }
+    path = save_rules(rules, meta)
+    logger.info(f"✅ {meta['rules']} association rules from {meta['baskets']} invoices in {meta['build_seconds']}s")
+    return path
+
+
+def main():
+    import argparse
+    from datetime import date, timedelta
+    from db_utils import get_connection
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build parts association rules from invoice baskets")
+    parser.add_argument("--min-support", type=int, default=3)
+    parser.add_argument("--min-lift", type=float, default=1.5)
+    parser.add_argument("--top", type=int, default=10, help="Rules kept per item")
+    parser.add_argument("--months", type=int, default=None, help="Only invoices of the last N months")
+    args = parser.parse_args()
+
+    since = date.today() - timedelta(days=30 * args.months) if args.months else None
+    conn = get_connection()
+    try:
+        path = build_associations(conn, since, args.min_support, args.min_lift, args.top)
+    finally:
+        conn.close()
+    print(f"✅ Rules written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""
+In-process parts catalogue snapshot.
+
+tblmasitem with its group/make/brand names is read far more often than it
+changes, so /fault and /parts lookups are answered from a snapshot held in
+memory instead of Postgres:
+  - columnar numpy arrays for item codes, prices, stock and group/make/brand ids
+    (names and part numbers as plain lists), one row per live item;
+  - a token index per text column: alphanumeric tokens -> rows, and token
+    trigrams -> tokens, so an ILIKE '%keyword%' pattern narrows to a handful of
+    candidate rows that are then verified exactly;
+  - the vehicle fitments of every item (vehicle_compat.FitmentIndex), so
+    vehicle filtering is a set lookup.
+Lookups reuse the InMemoryPartsIndex ranking from parts_search.py, so results
+match the in-process reference.
+
+Refresh is incremental: rows edited since the last poll (edited_date) and rows
+whose stock moved (trn_stock_ledger ids above the last seen one; sales and
+returns update curstock without touching edited_date) are re-read and
+patched in place. A full reload every PARTS_CATALOGUE_FULL_RELOAD_SECONDS picks
+up hard deletes. Stale snapshots are refreshed in a background thread; only
+the very first load blocks a request, and after it fails no request retries it
+for PARTS_CATALOGUE_RETRY_SECONDS (callers fall back to the database).
+"""
+
+import os
+import re
+import time
+import threading
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from psycopg2.extras import RealDictCursor
+
+from db_utils import pooled_connection
+from parts_search import PARTS_PER_KEYWORD, InMemoryPartsIndex, VehicleMatch, like_pattern
+from vehicle_compat import FitmentIndex
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_ENABLED = os.getenv("PARTS_CATALOGUE", "true").lower() not in ("0", "false", "no")
+REFRESH_SECONDS = float(os.getenv("PARTS_CATALOGUE_REFRESH_SECONDS", "60"))
+FULL_RELOAD_SECONDS = float(os.getenv("PARTS_CATALOGUE_FULL_RELOAD_SECONDS", "21600"))
+RETRY_SECONDS = float(os.getenv("PARTS_CATALOGUE_RETRY_SECONDS", "30"))
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+ITEM_COLUMNS = """
+    i.itemcode, i.itemname, i.suppref, i.packing, i.unit, i.model,
+    i.groupid, i.makeid, i.brandid,
+    COALESCE(i.sprice, 0) AS sprice, COALESCE(i.mrp, 0) AS mrp, COALESCE(i.curstock, 0) AS curstock,
+    COALESCE(i.deleted, false) AS deleted, i.edited_date
+"""
+
+
+class TokenIndex:
+    """Alphanumeric tokens of one text column -> rows, with token trigrams for substring lookups"""
+
+    def __init__(self):
+        self._rows: Dict[str, Set[int]] = defaultdict(set)
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    @staticmethod
+    def tokens(text: Optional[str]) -> Set[str]:
+        return set(_TOKEN.findall((text or "").lower()))
+
+    def add(self, row: int, text: Optional[str]):
+        for token in self.tokens(text):
+            if token not in self._rows:
+                for i in range(len(token) - 2):
+                    self._trigrams[token[i:i + 3]].add(token)
+            self._rows[token].add(row)
+
+    def remove(self, row: int, text: Optional[str]):
+        for token in self.tokens(text):
+            rows = self._rows.get(token)
+            if rows is not None:
+                rows.discard(row)
+
+    def _rows_containing(self, piece: str) -> Set[int]:
+        tokens = None
+        for i in range(len(piece) - 2):
+            found = self._trigrams.get(piece[i:i + 3], set())
+            tokens = found if tokens is None else tokens & found
+            if not tokens:
+                return set()
+        rows: Set[int] = set()
+        for token in tokens:
+            if piece in token:
+                rows |= self._rows[token]
+        return rows
+
+    def candidates(self, pattern: str) -> Optional[Set[int]]:
+        """
+        Superset of the rows whose text matches an ILIKE pattern, or None when the
+        pattern has no literal piece of 3+ characters to look up. Every alphanumeric
+        run of the pattern's literal text lies inside one token of a matching text.
+        """
+        pieces = [p for p in _TOKEN.findall(re.sub(r"[%_]", " ", pattern.lower())) if len(p) >= 3]
+        if not pieces:
+            return None
+        rows = None
+        for piece in sorted(pieces, key=len, reverse=True):
+            found = self._rows_containing(piece)
+            rows = found if rows is None else rows & found
+            if not rows:
+                return set()
+        return rows
+
+
+class PartsCatalogue(InMemoryPartsIndex):
+    """Columnar item master snapshot; candidate rows come from the token and group indexes"""
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS, full_reload_seconds: float = FULL_RELOAD_SECONDS,
+                 retry_seconds: float = RETRY_SECONDS):
+        super().__init__([])
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+        self._reset()
+        self.loaded_at: Optional[float] = None
+        self.refreshed_at: Optional[float] = None
+        self.load_failed_at: Optional[float] = None
+        self.counters = {"full_loads": 0, "incremental_refreshes": 0, "rows_patched": 0,
+                         "last_refresh_ms": None, "refresh_errors": 0}
+
+    def _reset(self):
+        self._size = 0
+        self.itemcode = np.zeros(0, dtype=np.int64)
+        self.groupid = np.zeros(0, dtype=np.int64)   # -1 = no group
+        self.makeid = np.zeros(0, dtype=np.int64)
+        self.brandid = np.zeros(0, dtype=np.int64)
+        self.sprice = np.zeros(0, dtype=np.float64)
+        self.mrp = np.zeros(0, dtype=np.float64)
+        self.curstock = np.zeros(0, dtype=np.float64)
+        self.live = np.zeros(0, dtype=bool)
+        self.itemname: List[Optional[str]] = []
+        self.suppref: List[Optional[str]] = []
+        self.packing: List[Optional[str]] = []
+        self.unit: List[Optional[str]] = []
+        self.model: List[Optional[str]] = []
+        self._row_of: Dict[int, int] = {}
+        self.groups: Dict[int, str] = {}
+        self.makes: Dict[int, str] = {}
+        self.brands: Dict[int, str] = {}
+        self._name_index = TokenIndex()
+        self._suppref_index = TokenIndex()
+        self._rows_by_group: Dict[int, Set[int]] = defaultdict(set)
+        self._fitments = FitmentIndex()
+        self._edited_watermark = None
+        self._ledger_watermark = 0
+
+    # ── Storage ──────────────────────────────────────────────────────────────
+    def _grow(self, needed: int):
+        capacity = len(self.itemcode)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        for name in ("itemcode", "groupid", "makeid", "brandid", "sprice", "mrp", "curstock", "live"):
+            column = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[:capacity] = column
+            setattr(self, name, grown)
+
+    def _unindex(self, row: int):
+        self._name_index.remove(row, self.itemname[row])
+        self._suppref_index.remove(row, self.suppref[row])
+        self._rows_by_group[int(self.groupid[row])].discard(row)
+        self._fitments.discard(int(self.itemcode[row]))
+        self.live[row] = False
+
+    def _upsert(self, record: Dict):
+        itemcode = int(record["itemcode"])
+        row = self._row_of.get(itemcode)
+        if row is None:
+            if record["deleted"]:
+                return
+            row = self._size
+            self._grow(row + 1)
+            self._size += 1
+            self._row_of[itemcode] = row
+            self.itemname.append(None)
+            self.suppref.append(None)
+            self.packing.append(None)
+            self.unit.append(None)
+            self.model.append(None)
+        elif self.live[row]:
+            self._unindex(row)
+
+        self.itemcode[row] = itemcode
+        self.groupid[row] = record["groupid"] if record["groupid"] is not None else -1
+        self.makeid[row] = record["makeid"] if record["makeid"] is not None else -1
+        self.brandid[row] = record["brandid"] if record["brandid"] is not None else -1
+        self.sprice[row] = float(record["sprice"])
+        self.mrp[row] = float(record["mrp"])
+        self.curstock[row] = float(record["curstock"])
+        self.itemname[row] = record["itemname"]
+        self.suppref[row] = record["suppref"]
+        self.packing[row] = record["packing"]
+        self.unit[row] = record["unit"]
+        self.model[row] = record.get("model")
+        if record["deleted"]:
+            return
+        self.live[row] = True
+        self._name_index.add(row, record["itemname"])
+        self._suppref_index.add(row, record["suppref"])
+        self._rows_by_group[int(self.groupid[row])].add(row)
+        self._index_fitments(row)
+
+    def _index_fitments(self, row: int):
+        self._fitments.index_item(int(self.itemcode[row]), self.itemname[row],
+                                  self.makes.get(int(self.makeid[row])), self.model[row])
+
+    def _item(self, row: int) -> Dict:
+        """Row in the InMemoryPartsIndex item shape"""
+        return {
+            "itemcode": int(self.itemcode[row]),
+            "itemname": self.itemname[row],
+            "suppref": self.suppref[row],
+            "groupname": self.groups.get(int(self.groupid[row])),
+            "makename": self.makes.get(int(self.makeid[row])),
+            "brandname": self.brands.get(int(self.brandid[row])),
+            "sprice": float(self.sprice[row]),
+            "mrp": float(self.mrp[row]),
+            "curstock": float(self.curstock[row]),
+            "unit": self.unit[row],
+            "packing": self.packing[row],
+            "deleted": not bool(self.live[row]),
+        }
+
+    # ── Refresh ──────────────────────────────────────────────────────────────
+    @staticmethod
+    def _fetch(conn, query: str, params=None) -> List[Dict]:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _fetch_lookups(self, conn) -> Tuple[Dict[int, str], Dict[int, str], Dict[int, str]]:
+        """Group, make and brand names (small tables, re-read on every refresh)"""
+        groups = {r["groupid"]: r["groupname"] for r in self._fetch(conn, "SELECT groupid, groupname FROM tblmasgroup")}
+        makes = {r["makeid"]: r["makename"] for r in self._fetch(conn, "SELECT makeid, makename FROM tblmasmake")}
+        brands = {r["brandid"]: r["brandname"] for r in self._fetch(conn, "SELECT brandid, brandname FROM tblmasbrand")}
+        return groups, makes, brands
+
+    def _ledger_max(self, conn) -> int:
+        return int(self._fetch(conn, "SELECT COALESCE(MAX(stock_ledger_id), 0) AS last_id FROM trn_stock_ledger")[0]["last_id"])
+
+    def apply(self, records: Iterable[Dict], lookups=None, ledger_watermark: Optional[int] = None):
+        """Upsert item master rows (deleted rows are dropped from the indexes) and advance the watermarks"""
+        records = list(records)
+        with self._lock:
+            if lookups is not None:
+                self.groups, self.makes, self.brands = lookups
+            # New make names or model column values can match names parsed before: re-parse them all
+            reparse = self._fitments.vocabulary.learn(
+                self.makes.values(),
+                ((self.makes.get(record["makeid"]), record.get("model")) for record in records if not record["deleted"]),
+            ) and self._size > 0
+            for record in records:
+                self._upsert(record)
+                edited = record.get("edited_date")
+                if edited is not None and (self._edited_watermark is None or edited > self._edited_watermark):
+                    self._edited_watermark = edited
+            if ledger_watermark is not None:
+                self._ledger_watermark = ledger_watermark
+            if reparse:
+                for row in self._live_rows().tolist():
+                    self._index_fitments(row)
+            self.refreshed_at = time.time()
+
+    def full_load(self, conn):
+        start = time.perf_counter()
+        # Ledger watermark first: stock moves racing the load are re-read by the next refresh
+        ledger_max = self._ledger_max(conn)
+        records = self._fetch(conn, f"""
+            SELECT {ITEM_COLUMNS}
+            FROM tblmasitem i
+            WHERE COALESCE(i.deleted, false) = false
+        """)
+        lookups = self._fetch_lookups(conn)
+        with self._lock:
+            self._reset()
+            self._grow(len(records))
+            self.apply(records, lookups, ledger_max)
+            self.loaded_at = self.refreshed_at
+        self.counters["full_loads"] += 1
+        self.counters["last_refresh_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"✅ Parts catalogue loaded: {len(records)} items in {self.counters['last_refresh_ms']} ms")
+
+    def refresh(self, conn):
+        """Patch rows edited or moved in stock since the last poll (full reload when due)"""
+        if self.loaded_at is None or time.time() - self.loaded_at >= self.full_reload_seconds:
+            self.full_load(conn)
+            return
+        start = time.perf_counter()
+        ledger_max = self._ledger_max(conn)
+        # >= on edited_date: rows sharing the watermark timestamp are re-read (upserts are idempotent)
+        records = self._fetch(conn, f"""
+            SELECT {ITEM_COLUMNS}
+            FROM tblmasitem i
+            WHERE i.edited_date >= %(edited)s
+               OR i.itemcode IN (
+                   SELECT l.itemcode FROM trn_stock_ledger l
+                   WHERE l.stock_ledger_id > %(ledger_from)s AND l.stock_ledger_id <= %(ledger_to)s
+               )
+        """, {"edited": self._edited_watermark or "-infinity",
+              "ledger_from": self._ledger_watermark, "ledger_to": ledger_max})
+        self.apply(records, self._fetch_lookups(conn), ledger_max)
+        self.counters["incremental_refreshes"] += 1
+        self.counters["rows_patched"] += len(records)
+        self.counters["last_refresh_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _refresh_pooled(self):
+        """Refresh on a pooled connection; the caller holds _refreshing"""
+        try:
+            with pooled_connection() as conn:
+                self.refresh(conn)
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            logger.warning(f"⚠️ Parts catalogue refresh failed: {e}")
+            raise
+        finally:
+            self._refreshing.release()
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh_pooled()
+        except Exception:
+            pass  # logged and counted; the current snapshot keeps serving
+
+    def _backing_off(self) -> bool:
+        return self.load_failed_at is not None and time.time() - self.load_failed_at < self.retry_seconds
+
+    def _first_load(self):
+        """Blocking first load; after a failure nobody retries it for retry_seconds"""
+        if not self._backing_off():
+            self._refreshing.acquire()
+            # Requests queued behind the load find it done, or failed just now
+            if self.loaded_at is not None or self._backing_off():
+                self._refreshing.release()
+            else:
+                try:
+                    self._refresh_pooled()
+                except Exception:
+                    self.load_failed_at = time.time()
+                    raise
+                self.load_failed_at = None
+        if self.loaded_at is None:
+            raise RuntimeError(f"parts catalogue load failed {time.time() - self.load_failed_at:.0f}s ago")
+
+    def ready(self, load: bool = True) -> "PartsCatalogue":
+        """
+        The catalogue for a lookup: loaded on first use (blocking, raises if the
+        database is unreachable or a load failed within retry_seconds; with
+        load=False raises instead of loading), refreshed in the background once
+        older than refresh_seconds.
+        """
+        if self.loaded_at is None:
+            if not load:
+                raise RuntimeError("parts catalogue not loaded")
+            self._first_load()
+        elif time.time() - self.refreshed_at >= self.refresh_seconds and self._refreshing.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background, name="parts-catalogue-refresh", daemon=True).start()
+        return self
+
+    # ── Lookups (InMemoryPartsIndex hooks) ───────────────────────────────────
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.live[:self._size])
+
+    def _items(self, rows: Iterable[int]) -> List[Dict]:
+        return [self._item(row) for row in sorted(rows) if self.live[row]]
+
+    def _group_rows(self, pattern: str) -> Set[int]:
+        pattern_re = like_pattern(pattern)
+        rows: Set[int] = set()
+        for groupid, name in self.groups.items():
+            if name is not None and pattern_re.fullmatch(name):
+                rows |= self._rows_by_group.get(groupid, set())
+        return rows
+
+    def _fault_candidates(self, part_pattern: str) -> List[Dict]:
+        name_rows = self._name_index.candidates(part_pattern)
+        suppref_rows = self._suppref_index.candidates(part_pattern)
+        if name_rows is None or suppref_rows is None:
+            return self._items(self._live_rows().tolist())
+        return self._items(name_rows | suppref_rows | self._group_rows(part_pattern))
+
+    def _fitment_index(self) -> FitmentIndex:
+        return self._fitments
+
+    def _rows_of(self, itemcodes: Iterable[int]) -> Set[int]:
+        return {self._row_of[code] for code in itemcodes if code in self._row_of}
+
+    def _vehicle_candidates(self, vehicle: VehicleMatch) -> List[Dict]:
+        if vehicle.model_items is not None:
+            return self._items(self._rows_of(vehicle.model_items))
+        model_rows = self._name_index.candidates(vehicle.model_pattern)
+        if vehicle.make_items is not None:
+            make_rows = self._rows_of(vehicle.make_items)
+            return self._items(make_rows if model_rows is None else make_rows & model_rows)
+        # itemname ILIKE make AND itemname ILIKE model; None = that side does not narrow
+        make_rows = self._name_index.candidates(vehicle.make_pattern)
+        if make_rows is None and model_rows is None:
+            return self._items(self._live_rows().tolist())
+        if make_rows is None or model_rows is None:
+            return self._items(make_rows if model_rows is None else model_rows)
+        return self._items(make_rows & model_rows)
+
+    def _category_candidates(self, pattern: Optional[str], limit: int) -> List[Dict]:
+        if pattern is not None:
+            return self._items(self._group_rows(pattern))
+        # Unfiltered: top stock (then itemcode) straight from the columns
+        live = self._live_rows()
+        order = live[np.lexsort((self.itemcode[live], -self.curstock[live]))][:limit]
+        return [self._item(row) for row in order.tolist()]
+
+    def items_by_code(self, itemcodes: Iterable[int]) -> Dict[int, Dict]:
+        with self._lock:
+            rows = (self._row_of.get(int(code)) for code in itemcodes)
+            return {item["itemcode"]: item for item in self._items(row for row in rows if row is not None)}
+
+    def fault_part_rows(self, keywords: List[str], vehicle_make: str = "", vehicle_model: str = "",
+                        vehicle_year: Optional[int] = None, per_keyword: int = PARTS_PER_KEYWORD) -> List[Dict]:
+        with self._lock:
+            return super().fault_part_rows(keywords, vehicle_make, vehicle_model, vehicle_year, per_keyword)
+
+    def category_rows(self, category: Optional[str], limit: int = 10) -> List[Dict]:
+        with self._lock:
+            return super().category_rows(category, limit)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": CATALOGUE_ENABLED,
+                "items": int(self._live_rows().size),
+                "groups": len(self.groups),
+                "vehicle_fitments": len(self._fitments),
+                "loaded_at": self.loaded_at,
+                "refreshed_at": self.refreshed_at,
+                "load_failed_at": self.load_failed_at,
+                "edited_watermark": str(self._edited_watermark) if self._edited_watermark else None,
+                "ledger_watermark": self._ledger_watermark,
+                **self.counters,
+            }
+
+
+
+parts_catalogue = PartsCatalogue()
+
+
+def catalogue_source(load: bool = True) -> Optional[PartsCatalogue]:
+    """
+    The ready catalogue, or None (disabled, not loadable, or not loaded yet when
+    load is False) so callers query the database directly
+    """
+    if not CATALOGUE_ENABLED:
+        return None
+    try:
+        return parts_catalogue.ready(load)
+    except Exception:
+        return None
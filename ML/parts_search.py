@@ -0,0 +1,617 @@
+"""
+Parts search over the ERP item master.
+
+Query builders for the three catalogue lookups (fault diagnosis part keywords,
+image-classifier categories, OCR keywords). Matching uses ILIKE on the raw
+columns so the pg_trgm GIN indexes from
+backend/migrations/add_parts_search_trgm_indexes.sql serve the '%keyword%'
+patterns; when pg_trgm is installed results are also ranked by trigram
+similarity. Without the extension the same queries run as plain ILIKE filters.
+
+Fault diagnosis resolves all part keywords of all predicted faults in one
+query: keywords are unnested into rows, candidates are collected per keyword
+from the indexed columns, ranked with ROW_NUMBER() (top 8 per keyword) and
+fanned back out to faults in Python. Vehicle relevance (model/make fit) comes
+from the item_vehicle_fitment index (vehicle_compat.py) when the table exists
+and the requested vehicle is in its vocabulary, else from ILIKE on item and
+make names.
+
+InMemoryPartsIndex evaluates the same lookups over item rows in process
+(tests, or when no database is reachable).
+"""
+
+import re
+import logging
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from vehicle_compat import FitmentIndex, VehicleQuery, fitment_vocabulary
+
+logger = logging.getLogger(__name__)
+
+PARTS_PER_KEYWORD = 8
+PARTS_PER_FAULT = 10
+
+_trigram_available: Optional[bool] = None
+
+
+def trigram_available(conn) -> bool:
+    """Whether pg_trgm is installed (checked once per process)"""
+    global _trigram_available
+    if _trigram_available is None:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+        finally:
+            cursor.close()
+        if not _trigram_available:
+            logger.warning("⚠️ pg_trgm not installed: parts search runs without trigram indexes/ranking")
+    return _trigram_available
+
+
+# ── Query builders ───────────────────────────────────────────────────────────
+def fault_parts_query(vehicle: bool, trigram: bool, fit_make: bool = False, fit_model: bool = False) -> str:
+    """
+    Top PARTS_PER_KEYWORD items per part keyword.
+    Params: keywords (text[]), make, model (ILIKE patterns, '%' when unknown), per_keyword;
+    with fit_make / fit_model also make_key, model_keys (text[]) and year (int or NULL)
+    for the item_vehicle_fitment join that replaces the make / model ILIKE.
+    Relevance tiers: 100 vehicle model + part, 90 make + part, 80 part in stock,
+    70 part, 60 universal part (no make). Items matching only the vehicle are
+    candidates when a make or model is given.
+    """
+    fitment = fit_make or fit_model
+    fitted = f"""
+    fitted AS (
+        SELECT f.itemcode, bool_or({"f.model = ANY(%(model_keys)s::text[])" if fit_model else "false"}) AS model_fit
+        FROM item_vehicle_fitment f
+        WHERE {"f.make = %(make_key)s" if fit_make else "f.model = ANY(%(model_keys)s::text[])"}
+          AND (%(year)s::int IS NULL OR f.year_from IS NULL OR f.year_from <= %(year)s::int)
+          AND (%(year)s::int IS NULL OR f.year_to IS NULL OR f.year_to >= %(year)s::int)
+        GROUP BY f.itemcode
+    ),""" if fitment else ""
+    make_fit = "ft.itemcode IS NOT NULL" if fit_make else "m.makename ILIKE %(make)s"
+    model_fit = "COALESCE(ft.model_fit, false)" if fit_model else "i.itemname ILIKE %(model)s"
+    fitted_join = "LEFT JOIN fitted ft ON ft.itemcode = i.itemcode" if fitment else ""
+
+    if not vehicle:
+        vehicle_candidates = ""
+    elif fit_model:
+        vehicle_candidates = """
+        UNION
+        SELECT k.keyword, k.part_pattern, ft.itemcode
+        FROM keywords k
+        CROSS JOIN fitted ft
+        WHERE ft.model_fit
+        """
+    elif fit_make:
+        vehicle_candidates = """
+        UNION
+        SELECT k.keyword, k.part_pattern, i.itemcode
+        FROM keywords k
+        CROSS JOIN fitted ft
+        JOIN tblmasitem i ON i.itemcode = ft.itemcode AND i.itemname ILIKE %(model)s
+        """
+    else:
+        vehicle_candidates = """
+        UNION
+        SELECT k.keyword, k.part_pattern, i.itemcode
+        FROM keywords k
+        JOIN tblmasitem i ON i.itemname ILIKE %(make)s AND i.itemname ILIKE %(model)s
+        """
+    similarity_order = "c.similarity_score DESC," if trigram else ""
+    similarity_column = "word_similarity(c.search_keyword, c.itemname) AS similarity_score," if trigram else ""
+
+    return f"""
+    WITH keywords AS (
+        SELECT DISTINCT keyword, '%%' || keyword || '%%' AS part_pattern
+        FROM unnest(%(keywords)s::text[]) AS k(keyword)
+    ),{fitted}
+    matched AS (
+        SELECT k.keyword, k.part_pattern, i.itemcode
+        FROM keywords k
+        JOIN tblmasitem i ON i.itemname ILIKE k.part_pattern OR i.suppref ILIKE k.part_pattern
+        UNION
+        SELECT k.keyword, k.part_pattern, i.itemcode
+        FROM keywords k
+        JOIN tblmasgroup g ON g.groupname ILIKE k.part_pattern
+        JOIN tblmasitem i ON i.groupid = g.groupid
+        {vehicle_candidates}
+    ),
+    candidates AS (
+        SELECT
+            mt.keyword AS search_keyword,
+            i.itemcode,
+            i.itemname,
+            i.suppref AS part_number,
+            g.groupname AS category,
+            m.makename AS car_make,
+            b.brandname AS brand,
+            i.sprice,
+            i.mrp,
+            i.curstock,
+            i.unit,
+            (
+                CASE
+                    WHEN {model_fit} AND i.itemname ILIKE mt.part_pattern THEN 100
+                    WHEN {make_fit} AND (
+                        i.itemname ILIKE mt.part_pattern OR g.groupname ILIKE mt.part_pattern
+                    ) THEN 90
+                    WHEN (i.itemname ILIKE mt.part_pattern OR g.groupname ILIKE mt.part_pattern)
+                         AND i.curstock > 0 THEN 80
+                    WHEN i.itemname ILIKE mt.part_pattern OR g.groupname ILIKE mt.part_pattern THEN 70
+                    WHEN m.makename IS NULL AND (
+                        i.itemname ILIKE mt.part_pattern OR g.groupname ILIKE mt.part_pattern
+                    ) THEN 60
+                    ELSE 0
+                END
+            ) AS relevance_score
+        FROM matched mt
+        JOIN tblmasitem i ON i.itemcode = mt.itemcode AND i.deleted = false
+        LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
+        LEFT JOIN tblmasmake m ON i.makeid = m.makeid
+        LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
+        {fitted_join}
+    ),
+    ranked AS (
+        SELECT c.*,
+               {similarity_column}
+               ROW_NUMBER() OVER (
+                   PARTITION BY c.search_keyword
+                   ORDER BY c.relevance_score DESC,
+                            CASE WHEN c.curstock > 0 THEN 1 ELSE 2 END,
+                            {similarity_order}
+                            c.curstock DESC,
+                            c.sprice ASC,
+                            c.itemcode
+               ) AS keyword_rank
+        FROM candidates c
+    )
+    SELECT * FROM ranked
+    WHERE keyword_rank <= %(per_keyword)s
+    ORDER BY search_keyword, keyword_rank
+    """
+
+
+def category_items_query(filtered: bool, trigram: bool) -> str:
+    """
+    In-stock-first items of a part category.
+    Params: pattern (ILIKE on group name) and category when filtered, limit.
+    """
+    where = "AND g.groupname ILIKE %(pattern)s" if filtered else ""
+    similarity_order = "similarity(g.groupname, %(category)s) DESC," if filtered and trigram else ""
+    return f"""
+        SELECT
+            i.itemcode, i.itemname, i.suppref as part_number,
+            g.groupname as category, m.makename as car_make,
+            b.brandname as brand, i.sprice, i.curstock
+        FROM tblmasitem i
+        LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
+        LEFT JOIN tblmasmake m ON i.makeid = m.makeid
+        LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
+        WHERE i.deleted = false {where}
+        ORDER BY {similarity_order} i.curstock DESC
+        LIMIT %(limit)s
+    """
+
+
+def specific_parts_query(keywords: Dict, category_hint: Optional[str], trigram: bool,
+                         limit: int = 20) -> Tuple[str, List]:
+    """
+    Items matching OCR-extracted brands, part numbers, car models or keywords
+    (any of them), best trigram match to the extracted text first.
+    """
+    conditions = []
+    params: List = []
+
+    def any_of(columns: List[str], terms: Iterable[str]):
+        clauses = []
+        for term in terms:
+            clauses.extend(f"{column} ILIKE %s" for column in columns)
+            params.extend([f"%{term}%"] * len(columns))
+        if clauses:
+            conditions.append(f"({' OR '.join(clauses)})")
+
+    any_of(["i.itemname", "b.brandname"], keywords.get("brands", []))
+    any_of(["i.suppref", "i.itemname"], keywords.get("part_numbers", []))
+    any_of(["i.itemname"], keywords.get("car_models", []))
+    any_of(["i.itemname"], [kw for kw in keywords.get("other_keywords", [])[:5] if len(kw) > 4])
+    if category_hint:
+        any_of(["g.groupname"], [category_hint])
+
+    query = """
+        SELECT
+            i.itemcode,
+            i.itemname,
+            i.suppref as part_number,
+            g.groupname as category,
+            m.makename as car_make,
+            b.brandname as brand,
+            i.packing,
+            0 as match_score
+        FROM tblmasitem i
+        LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
+        LEFT JOIN tblmasmake m ON i.makeid = m.makeid
+        LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
+        WHERE 1=1
+    """
+    if conditions:
+        query += " AND (" + " OR ".join(conditions) + ")"
+
+    search_text = " ".join(
+        list(keywords.get("brands", [])) + list(keywords.get("part_numbers", []))
+        + list(keywords.get("car_models", [])) + list(keywords.get("other_keywords", [])[:5])
+    )
+    if trigram and search_text:
+        query += " ORDER BY word_similarity(%s, i.itemname || ' ' || COALESCE(i.suppref, '')) DESC"
+        params.append(search_text)
+    query += " LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+# ── In-process index ─────────────────────────────────────────────────────────
+def like_pattern(pattern: str) -> "re.Pattern":
+    """SQL ILIKE pattern (% and _ wildcards) as a compiled regex"""
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def _ilike(value: Optional[str], pattern: "re.Pattern") -> bool:
+    return value is not None and pattern.fullmatch(value) is not None
+
+
+@lru_cache(maxsize=65536)
+def trigrams(text: Optional[str]) -> FrozenSet[str]:
+    """pg_trgm trigrams: lowercase alphanumeric words padded with two leading and one trailing space"""
+    grams = set()
+    for word in re.findall(r"[^\W_]+", (text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: Optional[str], b: Optional[str]) -> float:
+    """pg_trgm similarity(): shared trigrams over all trigrams"""
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def word_similarity(a: Optional[str], b: Optional[str]) -> float:
+    """Approximation of pg_trgm word_similarity(): share of a's trigrams found in b"""
+    ta = trigrams(a)
+    if not ta:
+        return 0.0
+    return len(ta & trigrams(b)) / len(ta)
+
+
+class VehicleMatch:
+    """
+    The vehicle conditions of the fault parts query: fitment index item sets
+    for the sides of the vehicle that resolved (make_items / model_items),
+    ILIKE on item and make names for the rest ('%' when not given).
+    """
+
+    def __init__(self, make: str = "", model: str = "",
+                 make_items: Optional[Set[int]] = None, model_items: Optional[Set[int]] = None):
+        self.given = bool(make or model)
+        self.make_pattern = f"%{make}%" if make else "%"
+        self.model_pattern = f"%{model}%" if model else "%"
+        self.make_re = like_pattern(self.make_pattern)
+        self.model_re = like_pattern(self.model_pattern)
+        self.make_items = make_items
+        self.model_items = model_items
+
+    def fits_make(self, item: Dict) -> bool:
+        if self.make_items is not None:
+            return item["itemcode"] in self.make_items
+        return _ilike(item.get("makename"), self.make_re)
+
+    def fits_model(self, item: Dict) -> bool:
+        if self.model_items is not None:
+            return item["itemcode"] in self.model_items
+        return _ilike(item["itemname"], self.model_re)
+
+    def fits_vehicle(self, item: Dict) -> bool:
+        """Vehicle-only candidates: items for the vehicle whatever the part keyword"""
+        if self.model_items is not None:
+            return item["itemcode"] in self.model_items
+        if self.make_items is not None:
+            return item["itemcode"] in self.make_items and _ilike(item["itemname"], self.model_re)
+        return _ilike(item["itemname"], self.make_re) and _ilike(item["itemname"], self.model_re)
+
+
+def _fault_candidate(item: Dict, keyword: str, part_re, vehicle: VehicleMatch) -> Optional[Dict]:
+    """Row of the fault parts query for one item and keyword, None if the item is not a candidate"""
+    if item.get("deleted"):
+        return None
+    name_hit = _ilike(item["itemname"], part_re)
+    group_hit = _ilike(item.get("groupname"), part_re)
+    if not (name_hit or group_hit or _ilike(item.get("suppref"), part_re)
+            or (vehicle.given and vehicle.fits_vehicle(item))):
+        return None
+    stock = float(item.get("curstock") or 0)
+    if vehicle.fits_model(item) and name_hit:
+        relevance = 100
+    elif vehicle.fits_make(item) and (name_hit or group_hit):
+        relevance = 90
+    elif (name_hit or group_hit) and stock > 0:
+        relevance = 80
+    elif name_hit or group_hit:
+        relevance = 70
+    else:
+        relevance = 0
+    return {
+        "search_keyword": keyword,
+        "itemcode": item["itemcode"],
+        "itemname": item["itemname"],
+        "part_number": item.get("suppref"),
+        "category": item.get("groupname"),
+        "car_make": item.get("makename"),
+        "brand": item.get("brandname"),
+        "sprice": item.get("sprice"),
+        "mrp": item.get("mrp"),
+        "curstock": item.get("curstock"),
+        "unit": item.get("unit"),
+        "relevance_score": relevance,
+        "similarity_score": word_similarity(keyword, item["itemname"]),
+    }
+
+
+class InMemoryPartsIndex:
+    """
+    The parts search queries evaluated over in-memory item rows. Rows carry the
+    joined item master columns: itemcode, itemname, suppref, groupname,
+    makename, brandname, sprice, mrp, curstock, unit, packing, deleted.
+    Subclasses narrow the candidate items (see parts_catalogue.PartsCatalogue);
+    this base class scans them all.
+    """
+
+    def __init__(self, items: Iterable[Dict]):
+        self.items = [dict(item) for item in items]
+        self._fitments: Optional[FitmentIndex] = None
+
+    def _fitment_index(self) -> FitmentIndex:
+        """Vehicle fitments of the items (parsed on first vehicle lookup)"""
+        if self._fitments is None:
+            self._fitments = FitmentIndex.of(self.items)
+        return self._fitments
+
+    def vehicle_match(self, make: str, model: str, year: Optional[int] = None) -> VehicleMatch:
+        fitments = self._fitment_index()
+        query = fitments.vocabulary.resolve(make, model)
+        return VehicleMatch(
+            make, model,
+            make_items=fitments.items_fitting(query.make, None, year) if query.make else None,
+            model_items=fitments.items_fitting(query.make, query.models, year) if query.models else None,
+        )
+
+    def _fault_candidates(self, part_pattern: str) -> Iterable[Dict]:
+        """Items that may match the part pattern by name, part number or group; verified by the caller"""
+        return self.items
+
+    def _vehicle_candidates(self, vehicle: VehicleMatch) -> Iterable[Dict]:
+        """Items that may fit the vehicle; verified by the caller"""
+        return self.items
+
+    def _category_candidates(self, pattern: Optional[str], limit: int) -> Iterable[Dict]:
+        """Items whose group may match the pattern (unfiltered: at least the top `limit` by stock)"""
+        return self.items
+
+    def fault_part_rows(self, keywords: List[str], vehicle_make: str = "", vehicle_model: str = "",
+                        vehicle_year: Optional[int] = None, per_keyword: int = PARTS_PER_KEYWORD) -> List[Dict]:
+        vehicle = (self.vehicle_match(vehicle_make, vehicle_model, vehicle_year)
+                   if vehicle_make or vehicle_model else VehicleMatch())
+        rows = []
+        for keyword in sorted(set(keywords)):
+            part_pattern = f"%{keyword}%"
+            part_re = like_pattern(part_pattern)
+            candidates = {}
+            for item in self._fault_candidates(part_pattern):
+                row = _fault_candidate(item, keyword, part_re, vehicle)
+                if row is not None:
+                    candidates[row["itemcode"]] = row
+            # Vehicle-only items score 0, so they only make the cut when fewer
+            # than per_keyword items score above it
+            if vehicle.given and sum(1 for c in candidates.values() if c["relevance_score"] > 0) < per_keyword:
+                for item in self._vehicle_candidates(vehicle):
+                    if item["itemcode"] not in candidates:
+                        row = _fault_candidate(item, keyword, part_re, vehicle)
+                        if row is not None:
+                            candidates[row["itemcode"]] = row
+            candidates = list(candidates.values())
+            candidates.sort(key=lambda c: (
+                -c["relevance_score"],
+                1 if float(c["curstock"] or 0) > 0 else 2,
+                -c["similarity_score"],
+                -float(c["curstock"] or 0),
+                float(c["sprice"] or 0),
+                c["itemcode"],
+            ))
+            for rank, row in enumerate(candidates[:per_keyword], 1):
+                rows.append(dict(row, keyword_rank=rank))
+        return rows
+
+    def items_by_code(self, itemcodes: Iterable[int]) -> Dict[int, Dict]:
+        """Live items by item code"""
+        wanted = set(itemcodes)
+        return {item["itemcode"]: item for item in self.items if item["itemcode"] in wanted and not item.get("deleted")}
+
+    def category_rows(self, category: Optional[str], limit: int = 10) -> List[Dict]:
+        filtered = bool(category) and category != "unknown"
+        pattern = f"%{category}%" if filtered else None
+        pattern_re = like_pattern(pattern) if filtered else None
+        rows = [
+            item for item in self._category_candidates(pattern, limit)
+            if not item.get("deleted") and (not filtered or _ilike(item.get("groupname"), pattern_re))
+        ]
+        rows.sort(key=lambda item: (
+            -similarity(item.get("groupname"), category) if filtered else 0,
+            -float(item.get("curstock") or 0),
+            item["itemcode"],
+        ))
+        return [{
+            "itemcode": item["itemcode"],
+            "itemname": item["itemname"],
+            "part_number": item.get("suppref"),
+            "category": item.get("groupname"),
+            "car_make": item.get("makename"),
+            "brand": item.get("brandname"),
+            "sprice": item.get("sprice"),
+            "curstock": item.get("curstock"),
+        } for item in rows[:limit]]
+
+
+# ── Lookups (database connection or InMemoryPartsIndex) ──────────────────────
+def fetch_fault_part_rows(source, keywords: List[str], vehicle_make: str, vehicle_model: str,
+                          vehicle_year: Optional[int] = None) -> List[Dict]:
+    if isinstance(source, InMemoryPartsIndex):
+        return source.fault_part_rows(keywords, vehicle_make, vehicle_model, vehicle_year)
+
+    vehicle = bool(vehicle_make or vehicle_model)
+    vocabulary = fitment_vocabulary(source) if vehicle else None
+    fit = vocabulary.resolve(vehicle_make, vehicle_model) if vocabulary else VehicleQuery(None, None)
+    query = fault_parts_query(vehicle=vehicle, trigram=trigram_available(source),
+                              fit_make=fit.make is not None, fit_model=fit.models is not None)
+    params = {
+        "keywords": keywords,
+        "make": f"%{vehicle_make}%" if vehicle_make else "%",
+        "model": f"%{vehicle_model}%" if vehicle_model else "%",
+        "make_key": fit.make,
+        "model_keys": sorted(fit.models or ()),
+        "year": vehicle_year,
+        "per_keyword": PARTS_PER_KEYWORD,
+    }
+    cursor = source.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def search_category_items(source, category: Optional[str], limit: int = 10) -> List[Dict]:
+    """Items of a part category (group name match), most relevant group and highest stock first"""
+    if isinstance(source, InMemoryPartsIndex):
+        return source.category_rows(category, limit)
+
+    filtered = bool(category) and category != "unknown"
+    query = category_items_query(filtered, trigram_available(source))
+    params = {"limit": limit}
+    if filtered:
+        params.update(pattern=f"%{category}%", category=category)
+    cursor = source.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def fetch_items(source, itemcodes: List[int]) -> Dict[int, Dict]:
+    """Item rows (fault parts row columns, without keyword and relevance) by item code"""
+    if not itemcodes:
+        return {}
+    if isinstance(source, InMemoryPartsIndex):
+        return {code: {
+            "itemcode": item["itemcode"],
+            "itemname": item["itemname"],
+            "part_number": item.get("suppref"),
+            "category": item.get("groupname"),
+            "car_make": item.get("makename"),
+            "brand": item.get("brandname"),
+            "sprice": item.get("sprice"),
+            "mrp": item.get("mrp"),
+            "curstock": item.get("curstock"),
+            "unit": item.get("unit"),
+        } for code, item in source.items_by_code(itemcodes).items()}
+
+    cursor = source.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute("""
+            SELECT i.itemcode, i.itemname, i.suppref AS part_number, g.groupname AS category,
+                   m.makename AS car_make, b.brandname AS brand, i.sprice, i.mrp, i.curstock, i.unit
+            FROM tblmasitem i
+            LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
+            LEFT JOIN tblmasmake m ON i.makeid = m.makeid
+            LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
+            WHERE i.itemcode = ANY(%s) AND i.deleted = false
+        """, (list(itemcodes),))
+        return {row["itemcode"]: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def _part_from_row(row: Dict, vehicle_model: str) -> Dict:
+    stock = float(row["curstock"] or 0)
+    item_name_lower = (row["itemname"] or "").lower()
+    return {
+        "item_code": row["itemcode"],
+        "item_name": row["itemname"],
+        "part_number": row["part_number"],
+        "category": row["category"],
+        "car_make": row["car_make"],
+        "brand": row["brand"],
+        "price": float(row["sprice"] or 0),
+        "mrp": float(row["mrp"] or 0),
+        "stock": stock,
+        "unit": row["unit"],
+        "search_keyword": row["search_keyword"],
+        "availability": "In Stock" if stock > 0 else "Out of Stock",
+        "relevance_score": float(row["relevance_score"] or 0),
+        # Priority flag for exact vehicle matches
+        "is_vehicle_specific": bool(vehicle_model) and vehicle_model.lower() in item_name_lower,
+    }
+
+
+def rank_parts(parts_list: List[str], rows_by_keyword: Dict[str, List[Dict]], vehicle_model: str) -> List[Dict]:
+    """One fault's parts: keyword hits in keyword order, best score per item, top PARTS_PER_FAULT"""
+    unique_parts = {}
+    for part_keyword in parts_list:
+        for row in rows_by_keyword.get(part_keyword, []):
+            part = _part_from_row(row, vehicle_model)
+            key = part["item_code"]
+            if key not in unique_parts or part["relevance_score"] > unique_parts[key]["relevance_score"]:
+                unique_parts[key] = part
+
+    sorted_parts = sorted(
+        unique_parts.values(),
+        key=lambda x: (x["relevance_score"], x["stock"], -x["price"]),
+        reverse=True
+    )
+    return sorted_parts[:PARTS_PER_FAULT]
+
+
+def resolve_fault_parts(source, parts_lists: List[List[str]], vehicle_info: Optional[Dict] = None) -> List[List[Dict]]:
+    """
+    Parts for several faults in one round trip.
+    parts_lists[i] is the part keyword list of fault i; returns the ranked parts of each
+    fault in the same order (fresh dicts per fault, so callers may annotate them).
+    """
+    keywords = sorted({keyword for parts_list in parts_lists for keyword in parts_list})
+    if not keywords:
+        return [[] for _ in parts_lists]
+
+    vehicle_make = (vehicle_info.get("vehicle_make") or "").strip() if vehicle_info else ""
+    vehicle_model = (vehicle_info.get("vehicle_model") or "").strip() if vehicle_info else ""
+    vehicle_year = vehicle_info.get("vehicle_year") if vehicle_info else None
+
+    rows = fetch_fault_part_rows(source, keywords, vehicle_make, vehicle_model, vehicle_year)
+    rows_by_keyword: Dict[str, List[Dict]] = {}
+    for row in rows:
+        rows_by_keyword.setdefault(row["search_keyword"], []).append(row)
+    logger.info(f"Resolved {len(keywords)} part keywords for {len(parts_lists)} faults in one query ({len(rows)} rows)")
+
+    return [rank_parts(parts_list, rows_by_keyword, vehicle_model) for parts_list in parts_lists]
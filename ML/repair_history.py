@@ -0,0 +1,140 @@
+"""
+Historical job cards (symptom text -> diagnosed fault) as a nearest-neighbour
+corpus for the fault diagnosis engine.
+
+build_history_index.py embeds an exported job-card history with the engine's
+sentence encoder and saves, under ARTIFACT_DIR/history_index/<hash>/:
+  - the vector index (vector_index.py: exact, IVF or HNSW),
+  - labels.npy (fault id per record) and job_cards.npy (job card ids),
+  - history.json (fault codes, encoder id, record count),
+and points ARTIFACT_DIR/history_index/CURRENT at it. The engine loads the
+current index memory-mapped at startup (or FAULT_HISTORY_INDEX=<directory>)
+and only uses it when it was built with the same encoder.
+"""
+
+import os
+import copy
+import json
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from artifacts import ARTIFACT_DIR, content_hash, load_array, save_array
+from vector_index import VectorIndex, build_vector_index, load_vector_index
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.path.join(ARTIFACT_DIR, "history_index")
+HISTORY_INFO_FILE = "history.json"
+
+
+class RepairHistory:
+    def __init__(self, index: VectorIndex, labels: np.ndarray, faults: List[str], job_cards: np.ndarray,
+                 model_id: Optional[str] = None):
+        self.index = index
+        self.labels = labels
+        self.faults = faults
+        self.job_cards = job_cards
+        self.model_id = model_id
+        self._known = np.ones(len(faults), dtype=bool)
+        self._masks: Dict[FrozenSet[str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def restrict_to(self, fault_codes: Iterable[str]):
+        """Only return records of these faults (history faults unknown to the knowledge base are skipped)"""
+        codes = set(fault_codes)
+        self._known = np.array([fault in codes for fault in self.faults], dtype=bool)
+        self._masks.clear()
+
+    def restricted_copy(self, fault_codes: Iterable[str]) -> "RepairHistory":
+        """restrict_to on a copy sharing the index and arrays (this history is unchanged)"""
+        history = copy.copy(self)
+        history._masks = {}
+        history.restrict_to(fault_codes)
+        return history
+
+    def _mask(self, allowed: Set[str]) -> Optional[np.ndarray]:
+        """Record mask for an allowed fault set (empty set = no restriction); cached per set"""
+        key = frozenset(allowed)
+        mask = self._masks.get(key)
+        if mask is None:
+            fault_ok = self._known.copy()
+            if allowed:
+                fault_ok &= np.array([fault in allowed for fault in self.faults], dtype=bool)
+            mask = None if fault_ok.all() else fault_ok[self.labels]
+            if len(self._masks) < 256:
+                self._masks[key] = mask
+        return mask
+
+    def neighbours(self, queries: np.ndarray, k: int, allowed: List[Set[str]]) -> List[List[Tuple[str, float, str]]]:
+        """(fault code, similarity, job card id) of the k nearest allowed records of each query, best first"""
+        hits = []
+        for query, allowed_faults in zip(queries, allowed):
+            scores, ids = self.index.search(query[None, :], k, self._mask(allowed_faults))
+            hits.append([
+                (self.faults[self.labels[i]], float(score), str(self.job_cards[i]))
+                for score, i in zip(scores[0], ids[0]) if i >= 0
+            ])
+        return hits
+
+    @classmethod
+    def load(cls, directory: Optional[str] = None) -> Optional["RepairHistory"]:
+        """The current (or given) saved history; None when none has been built"""
+        if directory is None:
+            directory = os.getenv("FAULT_HISTORY_INDEX") or current_history_dir()
+        if not directory or not os.path.exists(os.path.join(directory, HISTORY_INFO_FILE)):
+            return None
+        index = load_vector_index(directory)
+        if index is None:
+            return None
+        with open(os.path.join(directory, HISTORY_INFO_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        labels = load_array(os.path.join(directory, "labels.npy"))
+        job_cards = load_array(os.path.join(directory, "job_cards.npy"))
+        if labels is None or job_cards is None or len(labels) != len(index):
+            logger.warning(f"⚠️ Incomplete repair history index in {directory}")
+            return None
+        logger.info(f"✅ Repair history: {len(labels)} job cards ({index.kind} index, {directory})")
+        return cls(index, labels, info["faults"], job_cards, info.get("model_id"))
+
+
+def current_history_dir() -> Optional[str]:
+    try:
+        with open(os.path.join(HISTORY_DIR, "CURRENT"), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(HISTORY_DIR, name) if name else None
+
+
+def build_history(records: List[Dict], encoder, kind: str = "auto", batch_size: int = 256, **index_params) -> str:
+    """
+    Embed records ({"symptom", "fault", "job_card_id"}) and save a history index;
+    returns its directory, which becomes CURRENT.
+    """
+    faults = sorted({record["fault"] for record in records})
+    fault_id = {fault: i for i, fault in enumerate(faults)}
+    texts = [record["symptom"].lower() for record in records]
+    name = content_hash(texts, [r["fault"] for r in records], encoder.model_id, kind)[:16]
+    directory = os.path.join(HISTORY_DIR, name)
+
+    vectors = np.concatenate([
+        encoder.encode(texts[start:start + batch_size], batch_size=batch_size)
+        for start in range(0, len(texts), batch_size)
+    ]).astype(np.float32)
+    index = build_vector_index(vectors, kind, info={"model_id": encoder.model_id}, **index_params)
+
+    index.save(directory)
+    save_array(os.path.join(directory, "labels.npy"), np.array([fault_id[r["fault"]] for r in records], dtype=np.int32))
+    save_array(os.path.join(directory, "job_cards.npy"), np.array([str(r.get("job_card_id") or "") for r in records]))
+    with open(os.path.join(directory, HISTORY_INFO_FILE), "w", encoding="utf-8") as f:
+        json.dump({"faults": faults, "model_id": encoder.model_id, "records": len(records), "kind": index.kind}, f, indent=2)
+
+    pointer = os.path.join(HISTORY_DIR, "CURRENT")
+    with open(f"{pointer}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(f"{pointer}.{os.getpid()}.tmp", pointer)
+    return directory
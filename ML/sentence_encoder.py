@@ -0,0 +1,217 @@
+"""
+Pluggable sentence encoder backends for fault diagnosis.
+
+  torch - sentence-transformers on PyTorch (fp32, reference implementation)
+  onnx  - the same transformer exported to ONNX, int8 dynamic quantization,
+          run with ONNX Runtime; mean pooling + L2 normalisation in numpy
+
+Select with FAULT_ENCODER_BACKEND=auto|onnx|torch (default auto: ONNX when
+onnxruntime is installed, otherwise PyTorch). The ONNX export needs torch once;
+the exported model and tokenizer are kept together under
+ML/artifacts/onnx/<model>-<int8|fp32>/ and later processes load them without
+importing torch at all.
+"""
+
+import os
+import re
+import json
+import importlib.util
+import inspect
+import shutil
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from artifacts import ARTIFACT_DIR
+
+logger = logging.getLogger(__name__)
+
+ENCODER_BACKEND = os.getenv("FAULT_ENCODER_BACKEND", "auto").lower()
+ENCODER_THREADS = int(os.getenv("FAULT_ENCODER_THREADS", "0"))  # 0 = min(4, cpu count)
+
+
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def torch_backend_available() -> bool:
+    return _module_available("sentence_transformers") and _module_available("torch")
+
+
+def onnx_backend_available() -> bool:
+    return _module_available("onnxruntime") and _module_available("tokenizers")
+
+
+def sentence_encoder_available() -> bool:
+    return torch_backend_available() or onnx_backend_available()
+
+
+class TorchSentenceEncoder:
+    """sentence-transformers model on PyTorch"""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str):
+        import sentence_transformers
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.model_id = f"{model_name}@sentence-transformers-{sentence_transformers.__version__}"
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True),
+            dtype=np.float32
+        )
+
+
+class OnnxSentenceEncoder:
+    """Quantized ONNX export of a sentence-transformers model on ONNX Runtime"""
+
+    backend = "onnx"
+    MAX_LENGTH = 256
+    MODEL_FILE = "model.onnx"
+
+    def __init__(self, model_name: str, quantize: bool = True, threads: int = ENCODER_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        variant = "int8" if quantize else "fp32"
+        self.model_id = f"{model_name}@onnx-{variant}"
+        # One directory per export (model + tokenizer), renamed into place only once complete
+        model_key = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        export_dir = os.path.join(ARTIFACT_DIR, "onnx", f"{model_key}-{variant}")
+        model_path = os.path.join(export_dir, self.MODEL_FILE)
+
+        if not os.path.exists(model_path):
+            self._export(export_dir, quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Small batches on a shared CPU box: a few intra-op threads, no inter-op parallelism
+        options.intra_op_num_threads = threads or min(4, os.cpu_count() or 1)
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+        # Rust tokenizer straight from tokenizer.json (importing transformers would pull in torch)
+        self.tokenizer = Tokenizer.from_file(os.path.join(export_dir, "tokenizer.json"))
+        with open(os.path.join(export_dir, "tokenizer_config.json"), "r", encoding="utf-8") as f:
+            pad_token = json.load(f).get("pad_token") or "[PAD]"
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content", "[PAD]")
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+        self.tokenizer.enable_truncation(max_length=self.MAX_LENGTH)
+
+    def _export(self, export_dir: str, quantize: bool):
+        """
+        One-off export (requires torch and transformers): fp32 ONNX graph, then int8
+        dynamic quantization. Model and tokenizer are written to a temporary directory
+        that replaces export_dir in one rename, so a crash never leaves a model
+        without its tokenizer.
+        """
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        hub_name = self.model_name if "/" in self.model_name else f"sentence-transformers/{self.model_name}"
+        logger.info(f"Exporting {hub_name} to ONNX...")
+        tokenizer = AutoTokenizer.from_pretrained(hub_name)
+        model = AutoModel.from_pretrained(hub_name)
+        model.eval()
+
+        sample = tokenizer(["brake noise when stopping"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+        class _HiddenStates(torch.nn.Module):
+            """Keyword-only call into the transformer, returning last_hidden_state"""
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *inputs):
+                return self.transformer(**dict(zip(input_names, inputs)))[0]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # Newer torch defaults to the dynamo exporter (needs onnxscript); keep the TorchScript one
+            export_kwargs["dynamo"] = False
+        tmp_dir = f"{export_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            fp32_path = os.path.join(tmp_dir, "model-fp32.onnx")
+            with torch.no_grad():
+                torch.onnx.export(
+                    _HiddenStates(model),
+                    tuple(sample[name] for name in input_names),
+                    fp32_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=14,
+                    **export_kwargs
+                )
+
+            model_path = os.path.join(tmp_dir, self.MODEL_FILE)
+            if quantize:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+                os.remove(fp32_path)
+            else:
+                os.replace(fp32_path, model_path)
+            tokenizer.save_pretrained(tmp_dir)
+
+            os.makedirs(os.path.dirname(export_dir), exist_ok=True)
+            try:
+                os.replace(tmp_dir, export_dir)
+            except OSError:
+                pass  # another worker finished the same export first
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.info(f"✅ ONNX export written to {export_dir}")
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            batch = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            feeds = {name: batch[name] for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            # Mean pooling over real tokens, then L2 normalisation (as all-MiniLM-L6-v2 does)
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            outputs.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        if not outputs:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.vstack(outputs).astype(np.float32)
+
+
+def create_sentence_encoder(model_name: str, backend: Optional[str] = None):
+    """Build the configured encoder backend, falling back to PyTorch if ONNX is unavailable or fails"""
+    backend = (backend or ENCODER_BACKEND).lower()
+
+    if backend in ("auto", "onnx"):
+        if onnx_backend_available():
+            try:
+                encoder = OnnxSentenceEncoder(model_name)
+                logger.info(f"✅ Sentence encoder: ONNX Runtime ({encoder.model_id})")
+                return encoder
+            except Exception as e:
+                logger.warning(f"⚠️ ONNX encoder unavailable, falling back to PyTorch: {e}")
+        elif backend == "onnx":
+            logger.warning("⚠️ onnxruntime not installed, falling back to PyTorch")
+
+    encoder = TorchSentenceEncoder(model_name)
+    logger.info(f"✅ Sentence encoder: PyTorch ({encoder.model_id})")
+    return encoder
@@ -0,0 +1,133 @@
+# Receivables / Payables Settlement Schedule
+# Projects open invoices in acc_trn_invoice onto expected settlement days
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict
+import logging
+from customer_scoring import customer_scorer, CustomerPaymentScorer
+
+logger = logging.getLogger(__name__)
+
+
+class SettlementScheduleBuilder:
+    """
+    Builds known cash inflow/outflow arrays for a forecast horizon.
+
+    Open sales invoices become expected inflows and open purchase invoices
+    expected outflows. Each open balance is spread over its party's days-to-pay
+    quantiles; quantile points that already lie in the past are dropped and
+    their mass is moved to the remaining future points, and invoices that are
+    overdue beyond every quantile are expected `overdue_lag_days` from today.
+    """
+
+    FLOW_TYPES = {'SAL': 'inflow', 'PUR': 'outflow'}
+
+    def __init__(self, scorer: CustomerPaymentScorer = customer_scorer, overdue_lag_days: int = 14):
+        self.scorer = scorer
+        self.overdue_lag_days = overdue_lag_days
+
+        # Probability mass represented by each quantile point: split at the
+        # midpoints between neighbouring quantile levels
+        levels = np.array(scorer.DELAY_QUANTILES, dtype=float)
+        edges = np.concatenate([[0.0], (levels[:-1] + levels[1:]) / 2, [1.0]])
+        self.quantile_mass = np.diff(edges)
+
+    def _fetch_open_balances(self, conn) -> pd.DataFrame:
+        """All open balances aggregated by party, type and invoice date in one query"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                party_id,
+                tran_type,
+                tran_date,
+                SUM(balance_amount) AS open_amount
+            FROM public.acc_trn_invoice
+            WHERE tran_type IN ('SAL', 'PUR')
+            AND balance_amount > 0.01
+            AND tran_date IS NOT NULL
+            GROUP BY party_id, tran_type, tran_date
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        df = pd.DataFrame(rows, columns=['party_id', 'tran_type', 'tran_date', 'open_amount'])
+        if len(df) > 0:
+            df['tran_date'] = pd.to_datetime(df['tran_date'])
+            df['open_amount'] = df['open_amount'].astype(float)
+        return df
+
+    def project(self, open_balances: pd.DataFrame, party_ids: np.ndarray, party_quantiles: np.ndarray,
+                global_quantiles: np.ndarray, start_date: datetime, days_ahead: int) -> np.ndarray:
+        """Vectorized projection of open balances onto the horizon (no database access)"""
+        schedule = np.zeros(days_ahead)
+        if len(open_balances) == 0 or days_ahead <= 0:
+            return schedule
+
+        # Per-balance delay quantiles (parties without history use the global ones)
+        position = pd.Index(party_ids).get_indexer(open_balances['party_id'].to_numpy())
+        quantiles = np.where(
+            (position >= 0)[:, None],
+            party_quantiles[np.clip(position, 0, None)] if len(party_ids) else global_quantiles[None, :],
+            global_quantiles[None, :]
+        )
+
+        start = pd.Timestamp(start_date.date())
+        age = (start - open_balances['tran_date']).dt.days.to_numpy(dtype=float)
+        offsets = np.rint(quantiles - age[:, None])  # days from start_date
+
+        # Drop quantile points already in the past and renormalise the rest
+        mass = np.where(offsets >= 0, self.quantile_mass[None, :], 0.0)
+        remaining = mass.sum(axis=1)
+        fully_overdue = remaining <= 0
+        mass = np.divide(mass, remaining[:, None], out=np.zeros_like(mass), where=~fully_overdue[:, None])
+
+        # Overdue beyond every quantile: expect collection after a fixed lag
+        offsets[fully_overdue, 0] = self.overdue_lag_days
+        mass[fully_overdue, 0] = 1.0
+
+        amounts = open_balances['open_amount'].to_numpy(dtype=float)[:, None] * mass
+        in_horizon = (offsets >= 0) & (offsets < days_ahead) & (amounts > 0)
+        schedule += np.bincount(offsets[in_horizon].astype(int), weights=amounts[in_horizon],
+                                minlength=days_ahead)[:days_ahead]
+        return schedule
+
+    def build(self, conn, start_date: datetime, days_ahead: int) -> Dict:
+        """Known inflow/outflow arrays for the forecast horizon"""
+        open_balances = self._fetch_open_balances(conn)
+        result = {
+            'inflow': np.zeros(days_ahead),
+            'outflow': np.zeros(days_ahead),
+            'open_receivables': 0.0,
+            'open_payables': 0.0,
+            'unscheduled': [],
+        }
+
+        for tran_type, flow in self.FLOW_TYPES.items():
+            subset = open_balances[open_balances['tran_type'] == tran_type] if len(open_balances) else open_balances
+            if len(subset) == 0:
+                continue
+            try:
+                party_ids, party_q, global_q = self.scorer.delay_quantile_table(conn, tran_type)
+                result[flow] = self.project(subset, party_ids, party_q, global_q, start_date, days_ahead)
+            except Exception as e:
+                # One side's scoring must not discard the other side's flows: this one stays unscheduled
+                logger.error(f"Error scheduling {tran_type} settlements, leaving {flow}s to the model: {e}")
+                result['unscheduled'].append(flow)
+                continue
+            total = float(subset['open_amount'].sum())
+            if tran_type == 'SAL':
+                result['open_receivables'] = total
+            else:
+                result['open_payables'] = total
+
+        logger.info(
+            f"Settlement schedule: ₹{result['inflow'].sum():,.0f} in / ₹{result['outflow'].sum():,.0f} out "
+            f"expected within {days_ahead} days"
+        )
+        return result
+
+
+# Global instance
+settlement_schedule = SettlementScheduleBuilder()
@@ -47,6 +47,8 @@ try:
 except ImportError:
     OCR_AVAILABLE = False
 
+from parts_search import specific_parts_query, trigram_available
+
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -220,74 +222,8 @@ class SpecificPartIdentifier:
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             
-            # Build smart search query
-            query = """
-                SELECT 
-                    i.itemcode,
-                    i.itemname,
-                    i.suppref as part_number,
-                    g.groupname as category,
-                    m.makename as car_make,
-                    b.brandname as brand,
-                    i.packing,
-                    0 as match_score
-                FROM tblmasitem i
-                LEFT JOIN tblmasgroup g ON i.groupid = g.groupid
-                LEFT JOIN tblmasmake m ON i.makeid = m.makeid
-                LEFT JOIN tblmasbrand b ON i.brandid = b.brandid
-                WHERE 1=1
-            """
-            
-            conditions = []
-            params = []
-            
-            # Search by brands
-            if keywords['brands']:
-                brand_conditions = []
-                for brand in keywords['brands']:
-                    brand_conditions.append("UPPER(i.itemname) LIKE %s OR UPPER(b.brandname) LIKE %s")
-                    params.extend([f'%{brand}%', f'%{brand}%'])
-                if brand_conditions:
-                    conditions.append(f"({' OR '.join(brand_conditions)})")
-            
-            # Search by part numbers
-            if keywords['part_numbers']:
-                pn_conditions = []
-                for pn in keywords['part_numbers']:
-                    pn_conditions.append("UPPER(i.suppref) LIKE %s OR UPPER(i.itemname) LIKE %s")
-                    params.extend([f'%{pn}%', f'%{pn}%'])
-                if pn_conditions:
-                    conditions.append(f"({' OR '.join(pn_conditions)})")
-            
-            # Search by car models
-            if keywords['car_models']:
-                model_conditions = []
-                for model in keywords['car_models']:
-                    model_conditions.append("UPPER(i.itemname) LIKE %s")
-                    params.append(f'%{model}%')
-                if model_conditions:
-                    conditions.append(f"({' OR '.join(model_conditions)})")
-            
-            # Search by other keywords
-            if keywords['other_keywords']:
-                kw_conditions = []
-                for kw in keywords['other_keywords'][:5]:  # Limit to top 5
-                    if len(kw) > 4:  # Only meaningful keywords
-                        kw_conditions.append("UPPER(i.itemname) LIKE %s")
-                        params.append(f'%{kw}%')
-                if kw_conditions:
-                    conditions.append(f"({' OR '.join(kw_conditions)})")
-            
-            # Add category hint if available
-            if category_hint:
-                conditions.append("UPPER(g.groupname) LIKE %s")
-                params.append(f'%{category_hint}%')
-            
-            # Combine conditions
-            if conditions:
-                query += " AND (" + " OR ".join(conditions) + ")"
-            
-            query += " LIMIT 20"
+            # ILIKE conditions served by the pg_trgm indexes, best trigram match first when available
+            query, params = specific_parts_query(keywords, category_hint, trigram_available(conn), limit=20)
             
             cursor.execute(query, params)
             results = cursor.fetchall()
@@ -0,0 +1,105 @@
+"""
+Batch diagnosis tests: /fault/diagnose/batch must give every job card exactly
+the /diagnose result while encoding once per chunk and looking parts up once
+per vehicle. A hashed bag-of-words encoder stands in for the sentence model so
+the tests run without model downloads or a database.
+
+Run: cd ML && pytest test_batch_diagnosis.py -v
+"""
+
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import advanced_fault_diagnosis
+from advanced_fault_diagnosis import advanced_diagnosis, app
+from conftest import JOB_CARDS
+from hybrid_retrieval import reciprocal_rank_fusion
+from repair_history import RepairHistory
+from vector_index import ExactIndex
+
+
+# ─── Batch vs single diagnosis ────────────────────────────────────────────────
+class TestBatchDiagnosis:
+    def test_matches_single_diagnosis(self, system):
+        expected = [system.diagnose_fault(symptoms, vehicle) for symptoms, vehicle in JOB_CARDS]
+        assert system.diagnose_batch(JOB_CARDS) == expected
+
+    def test_one_encoder_pass_of_unique_texts(self, system):
+        system.diagnose_batch(JOB_CARDS)
+        assert len(system.sentence_model.calls) == 1
+        encoded = system.sentence_model.calls[0]
+        assert len(encoded) == len(set(encoded))
+        assert "brake noise when stopping" in encoded
+
+    def test_one_parts_lookup_per_vehicle(self, system):
+        system.diagnose_batch(JOB_CARDS)
+        assert len(system.parts_lookups) == 3  # Maruti Swift, Honda City, no vehicle
+
+    def test_repair_history_votes_for_past_faults(self, system):
+        allowed = system._allowed_faults("engine overheating")
+        fault_code = sorted(allowed)[0] if allowed else system.automotive_knowledge_base[0]["fault"]
+        past = system.sentence_model.encode(["engine overheating", "clutch slipping"])
+        system._fault_by_code = {f["fault"]: f for f in system.automotive_knowledge_base}
+        system.repair_history = RepairHistory(
+            ExactIndex.build(past), np.array([0, 0]), [fault_code], np.array(["JC7", "JC8"])
+        )
+        faults = system.diagnose_batch([(["engine overheating"], {})])[0]["predicted_faults"]
+        match = next(f for f in faults if f["fault"] == fault_code)
+        assert match["similar_job_cards"] == ["JC7"]
+        assert match["retrieval_scores"]["history"] == pytest.approx(1.0)
+
+        # History is the third ranked list of the fusion: confidence is the fused score, not the cosine
+        column = [f["fault"] for f in system.automotive_knowledge_base].index(fault_code)
+        query = system._l2_normalize(system.sentence_model.encode(["engine overheating"]))
+        history = np.zeros((1, len(system.automotive_knowledge_base)))
+        history[0, column] = 1.0
+        fused = reciprocal_rank_fusion([query @ system.fault_embeddings_normalized.T,
+                                        system.bm25_index.scores(["engine overheating"]), history])
+        assert match["confidence"] == pytest.approx(fused[0, column], abs=1e-4)
+        assert [f["confidence"] for f in faults] == sorted((f["confidence"] for f in faults), reverse=True)
+
+    def test_history_hit_confidence_is_fused_not_raw_similarity(self, system):
+        # An exact past job card (cosine 1.0) for a fault the KB retrievers rank last among the allowed ones
+        texts = ["brake noise when stopping"]
+        dense = system._l2_normalize(system.sentence_model.encode(texts)) @ system.fault_embeddings_normalized.T
+        codes = [f["fault"] for f in system.automotive_knowledge_base]
+        weakest = min(system._allowed_faults(texts[0]), key=lambda c: dense[0, codes.index(c)])
+        system._fault_by_code = {f["fault"]: f for f in system.automotive_knowledge_base}
+        system.repair_history = RepairHistory(
+            ExactIndex.build(system.sentence_model.encode(texts)), np.array([0]), [weakest], np.array(["JC9"])
+        )
+        faults = system.diagnose_batch([(texts, {})])[0]["predicted_faults"]
+        match = next(f for f in faults if f["fault"] == weakest)
+        assert match["retrieval_scores"]["history"] == pytest.approx(1.0) and match["similar_job_cards"] == ["JC9"]
+        assert 0 < match["confidence"] < 1.0
+        assert all(0 < f["confidence"] <= 1 and "history" in f["retrieval_scores"] for f in faults)
+
+    def test_fallback_without_model(self, system):
+        system.sentence_model = None
+        expected = [system.diagnose_fault(symptoms, vehicle) for symptoms, vehicle in JOB_CARDS]
+        assert system.diagnose_batch(JOB_CARDS) == expected
+
+
+# ─── Endpoint ─────────────────────────────────────────────────────────────────
+class TestBatchEndpoint:
+    def test_streams_ndjson_in_input_order(self, system, monkeypatch):
+        monkeypatch.setattr(advanced_diagnosis, "_instance", system)
+        monkeypatch.setattr(advanced_diagnosis, "state", advanced_diagnosis.READY)
+        monkeypatch.setattr(advanced_fault_diagnosis, "BATCH_CHUNK_SIZE", 2)
+        body = {"job_cards": [
+            {"job_card_id": f"JC{i}", "symptoms": symptoms, **vehicle} for i, (symptoms, vehicle) in enumerate(JOB_CARDS)
+        ]}
+        with TestClient(app) as client:
+            response = client.post("/diagnose/batch", json=body)
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["job_card_id"] for line in lines] == [f"JC{i}" for i in range(len(JOB_CARDS))]
+        assert all(line["success"] for line in lines)
+        assert len(system.sentence_model.calls) == 3  # chunks of 2
+
+    def test_rejects_empty_batch(self):
+        with TestClient(app) as client:
+            assert client.post("/diagnose/batch", json={"job_cards": []}).status_code == 400
@@ -0,0 +1,574 @@
+"""
+Business rule engine tests: the rules in bi_rules.json must give exactly the
+recommendations, alerts and insights of the if/else implementations they
+replaced (reference copies below) over generated metrics, including zero and
+negative values; plus exclusive rule groups, guarded derived metrics and hot
+reload of the rule file.
+
+Run: cd ML && pytest test_bi_rules.py -v
+"""
+
+import json
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import auto_parts_business_intelligence as bi_module
+from auto_parts_business_intelligence import AutoPartsBusinessIntelligence
+from bi_rules import CompiledRuleSet, RuleEngine
+from cashflow_predictor import CashFlowPredictor
+
+
+# ─── Reference implementations (before bi_rules.json) ────────────────────────
+def reference_business_health(metrics, predictions):
+    recommendations, alerts, insights = [], [], []
+
+    # Inventory
+    inventory_value = metrics.get('inventory_value', 0.0)
+    monthly_cogs = metrics.get('cogs_30d', 0.0)
+    if monthly_cogs > 0:
+        months_of_inventory = inventory_value / monthly_cogs
+        insights.append({
+            'metric': 'Inventory Turnover',
+            'value': f'{months_of_inventory:.1f} months',
+            'status': 'good' if months_of_inventory < 2 else 'warning' if months_of_inventory < 3 else 'critical'
+        })
+        if months_of_inventory > 3:
+            alerts.append({
+                'type': 'WARNING',
+                'title': 'High Inventory Levels',
+                'message': f'You have {months_of_inventory:.1f} months of inventory. This ties up ₹{inventory_value:,.0f} in working capital.',
+                'action': 'Review slow-moving items and consider promotions'
+            })
+            recommendations.append({
+                'category': 'Inventory Management',
+                'priority': 'HIGH',
+                'recommendation': 'Reduce Excess Inventory',
+                'description': f'Current inventory: ₹{inventory_value:,.0f} ({months_of_inventory:.1f} months supply)',
+                'expected_impact': f'Free up ₹{inventory_value * 0.3:,.0f} in working capital',
+                'action_items': [
+                    'Identify slow-moving auto parts (>90 days)',
+                    'Offer 10-15% discount on slow-moving items',
+                    'Return excess stock to suppliers if possible',
+                    'Reduce purchase orders for overstocked items'
+                ]
+            })
+        elif months_of_inventory < 1:
+            recommendations.append({
+                'category': 'Inventory Management',
+                'priority': 'MEDIUM',
+                'recommendation': 'Increase Inventory Levels',
+                'description': f'Only {months_of_inventory:.1f} months of inventory may cause stockouts',
+                'expected_impact': 'Prevent lost sales and customer dissatisfaction',
+                'action_items': [
+                    'Identify fast-moving parts',
+                    'Increase safety stock for popular items',
+                    'Negotiate better terms with suppliers for bulk orders'
+                ]
+            })
+
+    # Customer credit
+    if metrics.get('receivables'):
+        total_outstanding = metrics['receivables']
+        avg_days = int(metrics.get('receivables_avg_days', 0))
+        overdue_60 = metrics.get('receivables_over_60', 0.0)
+        if avg_days > 45:
+            alerts.append({
+                'type': 'CRITICAL',
+                'title': 'High Customer Credit Days',
+                'message': f'Average payment delay: {avg_days} days. ₹{total_outstanding:,.0f} outstanding',
+                'action': 'Tighten credit policy and follow up with customers'
+            })
+            recommendations.append({
+                'category': 'Credit Management',
+                'priority': 'CRITICAL',
+                'recommendation': 'Improve Collection Process',
+                'description': f'₹{total_outstanding:,.0f} tied up in receivables (avg {avg_days} days)',
+                'expected_impact': f'Collect ₹{total_outstanding * 0.5:,.0f} within 15 days',
+                'action_items': [
+                    'Call customers with invoices >45 days old',
+                    'Offer 5% discount for immediate payment',
+                    'Stop credit for customers with >60 days overdue',
+                    'Implement cash-on-delivery for new customers',
+                    'Send daily payment reminders via WhatsApp/SMS'
+                ]
+            })
+        if overdue_60 > total_outstanding * 0.2:
+            recommendations.append({
+                'category': 'Bad Debt Risk',
+                'priority': 'HIGH',
+                'recommendation': 'Address Overdue Accounts',
+                'description': f'₹{overdue_60:,.0f} overdue >60 days (risk of bad debt)',
+                'expected_impact': 'Prevent write-offs and improve cash flow',
+                'action_items': [
+                    'Visit customers with large overdue amounts personally',
+                    'Offer payment plans (EMI) for large amounts',
+                    'Consider legal notice for amounts >₹50,000',
+                    'Stop supplying to chronic defaulters'
+                ]
+            })
+
+    # Supplier payments
+    if metrics.get('pending_payment_count'):
+        pending_count = int(metrics['pending_payment_count'])
+        total_pending = metrics.get('pending_payment_total', 0.0)
+        oldest_days = int(metrics.get('pending_payment_oldest_days', 0))
+        if oldest_days > 30:
+            recommendations.append({
+                'category': 'Supplier Relations',
+                'priority': 'HIGH',
+                'recommendation': 'Clear Pending Supplier Payments',
+                'description': f'{pending_count} payments pending (₹{total_pending:,.0f}), oldest: {oldest_days} days',
+                'expected_impact': 'Maintain good supplier relationships and credit terms',
+                'action_items': [
+                    'Prioritize payments to critical suppliers (brake parts, engine parts)',
+                    'Negotiate extended terms if cash is tight',
+                    'Clear payments >30 days to avoid supply disruption',
+                    'Request discounts for early payment'
+                ]
+            })
+
+    # Cash flow patterns
+    low_balance_days = [p for p in predictions if p['predicted_balance'] < 10000]
+    if len(low_balance_days) > 5:
+        alerts.append({
+            'type': 'WARNING',
+            'title': 'Multiple Low Cash Days Ahead',
+            'message': f'{len(low_balance_days)} days with balance <₹10,000',
+            'action': 'Plan cash reserves for lean periods'
+        })
+        recommendations.append({
+            'category': 'Cash Reserve',
+            'priority': 'MEDIUM',
+            'recommendation': 'Build Cash Buffer',
+            'description': 'Auto parts business needs cash buffer for inventory purchases',
+            'expected_impact': 'Avoid missing bulk purchase opportunities',
+            'action_items': [
+                'Maintain minimum ₹20,000 cash reserve',
+                'Set up overdraft facility with bank',
+                'Accelerate collections before making large purchases',
+                'Consider invoice discounting for immediate cash'
+            ]
+        })
+
+    # Profitability
+    if metrics.get('revenue_30d'):
+        revenue = metrics['revenue_30d']
+        cogs = metrics.get('cogs_30d', 0.0)
+        gross_profit = revenue - cogs
+        margin_pct = (gross_profit / revenue * 100) if revenue > 0 else 0
+        insights.append({
+            'metric': 'Gross Profit Margin',
+            'value': f'{margin_pct:.1f}%',
+            'status': 'good' if margin_pct > 25 else 'warning' if margin_pct > 15 else 'critical'
+        })
+        if margin_pct < 20:
+            recommendations.append({
+                'category': 'Profitability',
+                'priority': 'HIGH',
+                'recommendation': 'Improve Profit Margins',
+                'description': f'Current margin: {margin_pct:.1f}% (Industry standard: 25-35%)',
+                'expected_impact': f'Increase monthly profit by ₹{revenue * 0.1:,.0f}',
+                'action_items': [
+                    'Review pricing - increase prices by 5-10% on slow-moving items',
+                    'Negotiate better rates with suppliers (target 5% discount)',
+                    'Focus on high-margin products (filters, oils, accessories)',
+                    'Reduce discounts - limit to 5% maximum',
+                    'Add value-added services (installation, warranty)'
+                ]
+            })
+        elif margin_pct > 35:
+            recommendations.append({
+                'category': 'Market Share',
+                'priority': 'MEDIUM',
+                'recommendation': 'Expand Market Share',
+                'description': f'Strong margins ({margin_pct:.1f}%) allow competitive pricing',
+                'expected_impact': 'Increase sales volume by 20-30%',
+                'action_items': [
+                    'Offer competitive prices to attract more customers',
+                    'Run promotional campaigns',
+                    'Expand product range',
+                    'Improve customer service and retention'
+                ]
+            })
+
+    return {'recommendations': recommendations[:10], 'alerts': alerts[:5], 'insights': insights,
+            'industry': 'Auto Parts Retail'}
+
+
+def reference_cashflow_recommendations(predictions, risk, pending_payments=None, receivables=None):
+    recommendations = []
+    days_ahead = len(predictions)
+    avg_daily_inflow = np.mean([p['predicted_inflow'] for p in predictions])
+    avg_daily_outflow = np.mean([p['predicted_outflow'] for p in predictions])
+    final_balance = predictions[-1]['predicted_balance']
+    min_balance = min(p['predicted_balance'] for p in predictions)
+
+    if pending_payments:
+        total_pending = sum(row[2] for row in pending_payments)
+        oldest_days = pending_payments[0][4]
+        supplier_list = [f"{row[0]} (₹{row[2]:,.2f}, {row[4]} days)" for row in pending_payments[:3]]
+        priority = 'CRITICAL' if oldest_days > 45 else 'HIGH' if oldest_days > 30 else 'MEDIUM'
+        recommendations.append({
+            'category': 'Supplier Payments',
+            'priority': priority,
+            'recommendation': f'Process {len(pending_payments)} Pending Supplier Payments',
+            'description': f'Total ₹{total_pending:,.2f} in unposted payments. Oldest: {oldest_days} days',
+            'expected_impact': f'Maintain supplier relationships and avoid late fees',
+            'action_items': [
+                f'Review and post {len(pending_payments)} pending payment vouchers',
+                f'Prioritize: {supplier_list[0] if supplier_list else "N/A"}',
+                'Verify bank balances before posting',
+                'Consider payment terms negotiation if cash is tight'
+            ]
+        })
+
+    if receivables and receivables[1] and receivables[1] > 0:
+        total_outstanding = float(receivables[1])
+        avg_days = int(receivables[2] or 0)
+        customer_count = receivables[0]
+        if avg_days > 45 or total_outstanding > avg_daily_inflow * 30:
+            recommendations.append({
+                'category': 'Receivables Management',
+                'priority': 'HIGH',
+                'recommendation': 'Accelerate Customer Collections',
+                'description': f'₹{total_outstanding:,.2f} outstanding from {customer_count} customers (avg {avg_days} days)',
+                'expected_impact': f'Could improve cash flow by ₹{total_outstanding * 0.3:,.2f} in next {days_ahead} days',
+                'action_items': [
+                    f'Follow up with customers having invoices older than {avg_days} days',
+                    'Offer 2-3% early payment discount for immediate settlement',
+                    'Send payment reminders via email/SMS',
+                    'Consider invoice factoring for large outstanding amounts'
+                ]
+            })
+        elif avg_days > 30:
+            recommendations.append({
+                'category': 'Receivables Management',
+                'priority': 'MEDIUM',
+                'recommendation': 'Monitor Customer Payment Patterns',
+                'description': f'₹{total_outstanding:,.2f} outstanding with average {avg_days} days aging',
+                'expected_impact': 'Prevent payment delays and maintain healthy cash flow',
+                'action_items': [
+                    'Review credit terms for slow-paying customers',
+                    'Implement automated payment reminders',
+                    'Consider advance payment incentives for new orders'
+                ]
+            })
+
+    if days_ahead >= 30:
+        first_week_balance = np.mean([p['predicted_balance'] for p in predictions[:7]])
+        last_week_balance = np.mean([p['predicted_balance'] for p in predictions[-7:]])
+        trend = (last_week_balance - first_week_balance) / first_week_balance if first_week_balance != 0 else 0
+        if trend < -0.15:
+            recommendations.append({
+                'category': 'Cash Flow Trend',
+                'priority': 'HIGH',
+                'recommendation': 'Address Declining Cash Flow Trend',
+                'description': f'Cash balance declining by {abs(trend)*100:.1f}% over {days_ahead} days',
+                'expected_impact': 'Stabilize cash position and prevent shortages',
+                'action_items': [
+                    'Review and reduce discretionary expenses',
+                    'Analyze profitability of recent sales',
+                    'Consider temporary credit line for working capital',
+                    'Evaluate pricing strategy and margins'
+                ]
+            })
+        elif trend > 0.15:
+            recommendations.append({
+                'category': 'Growth Opportunity',
+                'priority': 'MEDIUM',
+                'recommendation': 'Leverage Positive Cash Flow',
+                'description': f'Cash balance improving by {trend*100:.1f}% over {days_ahead} days',
+                'expected_impact': 'Optimize excess cash for business growth',
+                'action_items': [
+                    'Consider inventory expansion for high-demand items',
+                    'Invest in marketing to capture more market share',
+                    'Negotiate bulk purchase discounts with suppliers',
+                    'Explore short-term investment opportunities'
+                ]
+            })
+
+    if avg_daily_outflow > avg_daily_inflow * 1.1:
+        recommendations.append({
+            'category': 'Working Capital',
+            'priority': 'HIGH',
+            'recommendation': 'Optimize Working Capital Management',
+            'description': f'Daily outflow (₹{avg_daily_outflow:,.2f}) exceeds inflow (₹{avg_daily_inflow:,.2f})',
+            'expected_impact': 'Reduce cash burn rate by 10-15%',
+            'action_items': [
+                'Review inventory turnover and reduce slow-moving stock',
+                'Negotiate better payment terms with suppliers',
+                'Implement just-in-time inventory practices',
+                'Analyze and reduce operational costs'
+            ]
+        })
+
+    if risk['risk_level'] in ['CRITICAL', 'HIGH']:
+        if min_balance < 0:
+            shortage = abs(min_balance)
+            recommendations.append({
+                'category': 'Financing',
+                'priority': 'CRITICAL',
+                'recommendation': 'Arrange Short-term Financing',
+                'description': f'Predicted cash shortage of ₹{shortage:,.2f} within {days_ahead} days',
+                'expected_impact': 'Prevent business disruption and maintain operations',
+                'action_items': [
+                    f'Arrange overdraft facility for ₹{shortage * 1.5:,.2f}',
+                    'Consider invoice discounting for immediate cash',
+                    'Explore short-term business loans',
+                    'Contact bank to discuss working capital solutions'
+                ]
+            })
+        recommendations.append({
+            'category': 'Payment Management',
+            'priority': 'HIGH',
+            'recommendation': 'Prioritize Critical Payments',
+            'description': 'High cash flow risk requires careful payment management',
+            'expected_impact': 'Preserve ₹50,000-100,000 in working capital',
+            'action_items': [
+                'Defer non-essential expenses',
+                'Negotiate extended payment terms with suppliers',
+                'Prioritize payments to critical suppliers only',
+                'Review and cancel unnecessary subscriptions/services'
+            ]
+        })
+
+    if days_ahead >= 60:
+        recommendations.append({
+            'category': 'Strategic Planning',
+            'priority': 'MEDIUM',
+            'recommendation': 'Plan for Long-term Cash Flow',
+            'description': f'60-day forecast shows final balance of ₹{final_balance:,.2f}',
+            'expected_impact': 'Better preparedness for future cash needs',
+            'action_items': [
+                'Create monthly cash flow budget',
+                'Identify seasonal patterns in your business',
+                'Build cash reserves for lean periods',
+                'Review and adjust business strategy quarterly'
+            ]
+        })
+
+    return recommendations
+
+
+# ─── Generated inputs ─────────────────────────────────────────────────────────
+def amount(rng, scale):
+    """Mostly positive amounts, with zeros and negatives (credit notes, reversals) mixed in"""
+    kind = rng.random()
+    if kind < 0.15:
+        return 0.0
+    if kind < 0.3:
+        return -round(rng.uniform(1, scale), 2)
+    return round(rng.uniform(1, scale), 2)
+
+
+def generate_business_metrics(count=400, seed=11):
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        metrics = {
+            'inventory_value': amount(rng, 2_000_000),
+            'cogs_30d': amount(rng, 600_000),
+            'revenue_30d': amount(rng, 900_000),
+            'receivables': amount(rng, 500_000),
+            'receivables_avg_days': rng.choice([0.0, rng.uniform(0, 120)]),
+            'receivables_over_60': amount(rng, 300_000),
+            'pending_payment_count': float(rng.choice([0, 0, 1, 4, -1])),
+            'pending_payment_total': amount(rng, 200_000),
+            'pending_payment_oldest_days': float(rng.randrange(0, 90)),
+        }
+        cases.append((metrics, generate_predictions(rng, rng.choice([7, 30, 60]))))
+    return cases
+
+
+def generate_predictions(rng, days):
+    balance = rng.uniform(-20_000, 200_000)
+    drift = rng.uniform(-3_000, 3_000)
+    predictions = []
+    for _ in range(days):
+        inflow, outflow = rng.uniform(0, 20_000), rng.uniform(0, 20_000)
+        balance += drift + rng.uniform(-2_000, 2_000)
+        predictions.append({'predicted_inflow': inflow, 'predicted_outflow': outflow, 'predicted_balance': balance})
+    return predictions
+
+
+class FakeCursor:
+    def __init__(self, pending_payments, receivables):
+        self.pending_payments = pending_payments
+        self.receivables = receivables
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.pending_payments
+
+    def fetchone(self):
+        return self.receivables
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, pending_payments, receivables):
+        self._cursor = FakeCursor(pending_payments, receivables)
+
+    def cursor(self):
+        return self._cursor
+
+    def rollback(self):
+        pass
+
+
+def generate_cashflow_cases(count=400, seed=5):
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        predictions = generate_predictions(rng, rng.choice([7, 30, 60, 90]))
+        risk = {'risk_level': rng.choice(['LOW', 'MEDIUM', 'HIGH', 'CRITICAL'])}
+        pending = sorted(
+            ((f"SUPPLIER {i}", rng.randrange(1, 5), round(rng.uniform(100, 90_000), 2), None, rng.randrange(0, 90))
+             for i in range(rng.randrange(0, 6))),
+            key=lambda row: -row[4])
+        receivables = (rng.randrange(0, 40), amount(rng, 900_000), rng.choice([None, rng.uniform(0, 90)]))
+        cases.append((predictions, risk, pending, receivables))
+    return cases
+
+
+# ─── Parity ───────────────────────────────────────────────────────────────────
+class TestParity:
+    @pytest.fixture
+    def business(self, monkeypatch):
+        monkeypatch.setattr(bi_module.inventory_analytics, 'dead_stock_metrics', lambda conn: {})
+        return AutoPartsBusinessIntelligence()
+
+    @pytest.mark.parametrize("metrics, predictions", generate_business_metrics())
+    def test_business_health(self, business, monkeypatch, metrics, predictions):
+        monkeypatch.setattr(business, 'get_metrics', lambda conn: metrics)
+        result = business.analyze_business_health(FakeConnection([], None), predictions)
+        assert result == reference_business_health(metrics, predictions)
+
+    @pytest.mark.parametrize("metrics", [
+        {'revenue_30d': -50_000.0, 'cogs_30d': 20_000.0, 'inventory_value': 10_000.0},
+        {'receivables': -12_000.0, 'receivables_avg_days': 50.0, 'receivables_over_60': -1_000.0},
+        {'pending_payment_count': -1.0, 'pending_payment_total': 500.0, 'pending_payment_oldest_days': 40.0},
+        {},
+    ])
+    def test_negative_and_missing_metrics(self, business, monkeypatch, metrics):
+        # The old checks were truthiness tests: a negative metric still triggers its rules
+        monkeypatch.setattr(business, 'get_metrics', lambda conn: metrics)
+        result = business.analyze_business_health(FakeConnection([], None), [])
+        assert result == reference_business_health(metrics, [])
+        assert result['recommendations'] or not metrics
+
+    def test_many_companies_in_one_pass(self, business):
+        cases = generate_business_metrics(count=50, seed=3)
+        rows = [dict(metrics, low_balance_days=sum(1 for p in predictions if p['predicted_balance'] < 10000))
+                for metrics, predictions in cases]
+        assert business.analyze_metrics(rows) == [reference_business_health(m, p) for m, p in cases]
+
+    @pytest.mark.parametrize("predictions, risk, pending, receivables", generate_cashflow_cases())
+    def test_cashflow_recommendations(self, predictions, risk, pending, receivables):
+        predictor = CashFlowPredictor()
+        result = predictor._generate_recommendations(predictions, risk, [], FakeConnection(pending, receivables))
+        assert result == reference_cashflow_recommendations(predictions, risk, pending, receivables)
+
+    def test_cashflow_without_connection(self):
+        predictions = generate_predictions(random.Random(1), 60)
+        risk = {'risk_level': 'HIGH'}
+        assert (CashFlowPredictor()._generate_recommendations(predictions, risk, [])
+                == reference_cashflow_recommendations(predictions, risk))
+
+
+# ─── Rule sets ────────────────────────────────────────────────────────────────
+def recommendation(rule_id, message):
+    return {'id': rule_id, 'kind': 'recommendations', 'output': {'rule': rule_id, 'message': message}}
+
+
+class TestRuleGroups:
+    SPEC = {
+        'derived': [{'name': 'ratio', 'op': 'div', 'args': ['a', 'b'],
+                     'when': {'metric': 'b', 'op': '>', 'value': 0}, 'else': 0}],
+        'rules': [
+            dict(recommendation('high', 'a={a:.0f}'), group='level', when={'metric': 'a', 'op': '>', 'value': 100}),
+            dict(recommendation('medium', 'a={a:.0f}'), group='level', when={'metric': 'a', 'op': '>', 'value': 10}),
+            dict(recommendation('any', 'ratio={ratio:.1f}'), when={'metric': 'a', 'op': '>', 'value': 10}),
+            dict(recommendation('guarded', 'ratio={ratio:.1f}'), when={'metric': 'ratio', 'op': '<', 'value': 1}),
+        ],
+    }
+
+    def fired(self, frame):
+        return [[r['rule'] for r in result['recommendations']]
+                for result in CompiledRuleSet('test', self.SPEC).evaluate(frame)]
+
+    def test_first_rule_of_a_group_wins_per_row(self):
+        frame = pd.DataFrame({'a': [500, 50, 5], 'b': [1000, 1000, 1000]})
+        assert self.fired(frame) == [['high', 'any', 'guarded'], ['medium', 'any', 'guarded'], ['guarded']]
+
+    def test_guarded_derived_metric(self):
+        frame = pd.DataFrame({'a': [50, 50, 50], 'b': [100, 0, -100]})
+        results = CompiledRuleSet('test', self.SPEC).evaluate(frame)
+        assert [r['recommendations'][-1]['message'] for r in results] == ['ratio=0.5', 'ratio=0.0', 'ratio=0.0']
+
+    def test_missing_metric_never_fires(self):
+        assert self.fired(pd.DataFrame({'b': [1.0]})) == [[]]  # a missing: ratio is NaN too
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError, match="unknown kind"):
+            CompiledRuleSet('test', {'rules': [{'id': 'x', 'kind': 'warnings', 'output': {}}]})
+
+
+# ─── Hot reload ───────────────────────────────────────────────────────────────
+class TestHotReload:
+    @pytest.fixture
+    def rules_path(self, tmp_path):
+        path = tmp_path / 'rules.json'
+        self.write(path, threshold=10, version=1)
+        return path
+
+    def write(self, path, threshold=None, version=None, text=None):
+        if text is None:
+            text = json.dumps({'version': version, 'rule_sets': {'demo': {'rules': [
+                dict(recommendation('big', 'a={a:.0f}'), when={'metric': 'a', 'op': '>', 'value': threshold})]}}})
+        previous = os.stat(path).st_mtime_ns if path.exists() else 0
+        path.write_text(text)
+        os.utime(path, ns=(previous + 1_000_000_000, previous + 1_000_000_000))  # coarse filesystem clocks
+
+    def messages(self, engine, a):
+        return [r['message'] for r in engine.evaluate_one({'a': a}, 'demo')['recommendations']]
+
+    def test_reloads_when_the_file_changes(self, rules_path):
+        engine = RuleEngine(str(rules_path))
+        assert self.messages(engine, 50) == ['a=50']
+        assert engine.info()['version'] == 1
+
+        self.write(rules_path, threshold=100, version=2)
+        assert self.messages(engine, 50) == []
+        assert self.messages(engine, 150) == ['a=150']
+        assert engine.info() == {'path': str(rules_path), 'version': 2, 'rule_sets': {'demo': 1}}
+
+    def test_unchanged_file_is_not_recompiled(self, rules_path):
+        engine = RuleEngine(str(rules_path))
+        compiled = engine.rule_set('demo')
+        assert engine.rule_set('demo') is compiled
+
+    def test_broken_file_keeps_the_previous_rules(self, rules_path):
+        engine = RuleEngine(str(rules_path))
+        assert self.messages(engine, 50) == ['a=50']
+        self.write(rules_path, text='{"version": 2, "rule_sets": {')
+        assert self.messages(engine, 50) == ['a=50']
+        self.write(rules_path, text=json.dumps({'version': 3, 'rule_sets': {'demo': {'derived': [
+            {'name': 'x', 'op': 'pow', 'args': ['a', 2]}]}}}))
+        assert self.messages(engine, 50) == ['a=50'] and engine.info()['version'] == 1
+
+    def test_missing_file_or_rule_set(self, tmp_path):
+        engine = RuleEngine(str(tmp_path / 'missing.json'))
+        assert engine.evaluate_one({'a': 50}, 'demo') == {'recommendations': [], 'alerts': [], 'insights': []}
+
+    def test_shipped_rules_compile(self):
+        info = RuleEngine().info()
+        assert info['version'] is not None and set(info['rule_sets']) == {'business_health', 'cashflow'}
@@ -0,0 +1,57 @@
+"""
+Customer payment scoring tests: RFM / delay scores from an invoice frame, and
+the fallback to the global prior when nothing has been settled yet.
+
+Run: cd ML && pytest test_customer_scoring.py -v
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from customer_scoring import CustomerPaymentScorer
+
+TODAY = datetime(2024, 6, 30)
+
+
+def invoices(rows):
+    """(party_id, tran_date, amount, balance, settled_date) rows -> invoice frame"""
+    df = pd.DataFrame(rows, columns=['party_id', 'tran_date', 'tran_amount', 'balance_amount', 'settled_date'])
+    df['partyname'] = 'Party ' + df['party_id'].astype(str)
+    df['tran_date'] = pd.to_datetime(df['tran_date'])
+    df['settled_date'] = pd.to_datetime(df['settled_date'])
+    return df
+
+
+# ─── Scores ───────────────────────────────────────────────────────────────────
+class TestComputeScores:
+    def test_settled_history(self):
+        scorer = CustomerPaymentScorer(prior_strength=0)
+        frame = invoices([
+            (1, '2024-05-01', 1000, 0, '2024-05-11'),
+            (1, '2024-05-10', 500, 0, '2024-05-20'),
+            (2, '2024-03-01', 800, 0, '2024-05-01'),
+        ])
+        scores, global_stats = scorer.compute_scores(frame, TODAY)
+        assert scores.loc[1, 'expected_delay_p50'] == 10.0
+        assert scores.loc[2, 'expected_delay_p50'] == 61.0
+        assert scores.loc[2, 'late_probability'] == 1.0 and scores.loc[1, 'late_probability'] == 0.0
+        assert global_stats['late_rate'] == round(1 / 3, 4)
+
+    def test_all_open_ledger_uses_the_global_prior(self):
+        scorer = CustomerPaymentScorer()
+        frame = invoices([
+            (1, '2024-06-01', 1000, 1000, None),
+            (2, '2024-04-01', 300, 120, '2024-05-01'),
+        ])
+        scores, global_stats = scorer.compute_scores(frame, TODAY)
+        assert list(scores.index) == [1, 2]
+        assert scores['settled_invoices'].tolist() == [0, 0]
+        assert global_stats['delay_quantiles'] == [30.0] * len(scorer.DELAY_QUANTILES)
+        np.testing.assert_allclose(scores['expected_collection_days'], 30.0)
+        assert scores.loc[1, 'outstanding_balance'] == 1000 and scores.loc[2, 'open_invoices'] == 1
+
+    def test_empty_frame(self):
+        scores, global_stats = CustomerPaymentScorer().compute_scores(invoices([]), TODAY)
+        assert scores.empty and global_stats['late_rate'] == 0.0
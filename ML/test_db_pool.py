@@ -0,0 +1,133 @@
+"""
+Connection pool tests: borrowers beyond DB_POOL_MAX wait for a returned
+connection instead of failing, time out with PoolError, and get a live
+connection when the server dropped an idle one (fake psycopg2 connections, no
+database needed).
+
+Run: cd ML && pytest test_db_pool.py -v
+"""
+
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+import db_utils
+from db_utils import pooled_connection
+
+
+class FakeConnection:
+    class info:
+        transaction_status = TRANSACTION_STATUS_IDLE
+
+    def __init__(self):
+        self.closed = 0
+        self.dropped = False  # server side gone; noticed on the next operation
+        self.queries = []
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, query):
+        if self.dropped:
+            self.closed = 2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.queries.append(query)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    connections = []
+
+    def connect(*args, **kwargs):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    monkeypatch.setenv("DB_POOL_MIN", "1")
+    monkeypatch.setenv("DB_POOL_MAX", "2")
+    monkeypatch.setattr(db_utils, "_pool", None)
+    monkeypatch.setattr(db_utils, "_pool_slots", None)
+    monkeypatch.setattr(db_utils, "DB_POOL_TIMEOUT", 5)
+    db_utils.get_pool()
+    return connections
+
+
+class TestPooledConnection:
+    def test_borrower_waits_for_a_returned_connection(self, pool):
+        release = threading.Event()
+        holding = threading.Barrier(3)
+        borrowed = []
+
+        def hold():
+            with pooled_connection() as conn:
+                borrowed.append(conn)
+                holding.wait(5)
+                assert release.wait(5)
+
+        holders = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in holders:
+            thread.start()
+        holding.wait(5)  # the pool is exhausted
+
+        def wait():
+            with pooled_connection() as conn:
+                borrowed.append(conn)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive() and len(borrowed) == 2
+
+        release.set()
+        waiter.join(5)
+        for thread in holders:
+            thread.join(5)
+        assert len(borrowed) == 3 and borrowed[2] in borrowed[:2]
+        assert len(pool) == 2
+
+    def test_times_out_when_the_pool_stays_exhausted(self, pool, monkeypatch):
+        monkeypatch.setattr(db_utils, "DB_POOL_TIMEOUT", 0.1)
+        with pooled_connection(), pooled_connection():
+            with pytest.raises(PoolError, match="no pooled connection free"):
+                with pooled_connection():
+                    pass
+        with pooled_connection() as conn:  # slots are returned
+            assert not conn.closed
+
+    def test_failed_unit_of_work_returns_its_slot(self, pool):
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                with pooled_connection():
+                    raise ValueError("query failed")
+        with pooled_connection(), pooled_connection():
+            pass
+
+    def test_dropped_connection_is_replaced(self, pool):
+        with pooled_connection() as conn:
+            pass
+        conn.closed = 2  # server closed it while idle
+        with pooled_connection() as fresh:
+            assert fresh is not conn and not fresh.closed
+
+    def test_connection_dropped_by_the_server_is_replaced(self, pool):
+        with pooled_connection() as conn:
+            pass
+        conn.dropped = True  # psycopg2 still reports it open
+        with pooled_connection() as fresh:
+            assert fresh is not conn and not fresh.closed
+        assert conn.closed and len(pool) == 2
+
+    def test_checkout_pings_the_connection(self, pool):
+        with pooled_connection() as conn:
+            assert conn.queries == ["SELECT 1"]
@@ -0,0 +1,74 @@
+"""
+Symptom embedding cache tests: hit / miss accounting (repeated texts within one
+call are misses encoded once, not hits), the memory and disk tiers, and
+entries shared with a second cache on the same directory, which never
+truncates them.
+
+Run: cd ML && pytest test_embedding_cache.py -v
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    """Encodes a text as [len(text), number of words]; records every call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), len(text.split())] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def encoder():
+    return CountingEncoder()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache("test-model", dim=2, cache_dir=str(tmp_path), capacity=8, disk_capacity=32)
+
+
+class TestEmbeddingCache:
+    def test_duplicates_in_one_call_are_misses_encoded_once(self, cache, encoder):
+        result = cache.encode(["Brake noise", "brake  noise", "engine overheating"], encoder)
+        assert encoder.calls == [["brake noise", "engine overheating"]]
+        np.testing.assert_array_equal(result, [[11, 2], [11, 2], [18, 2]])
+        stats = cache.stats()
+        assert (stats["memory_hits"], stats["disk_hits"], stats["misses"], stats["batch_duplicates"]) == (0, 0, 3, 1)
+        assert stats["lookups"] == 3 and stats["hit_rate"] == 0.0
+
+    def test_memory_hits(self, cache, encoder):
+        cache.encode(["brake noise"], encoder)
+        cache.encode(["brake noise", "BRAKE NOISE"], encoder)
+        assert len(encoder.calls) == 1
+        stats = cache.stats()
+        assert stats["memory_hits"] == 2 and stats["misses"] == 1 and stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+
+    def test_disk_entries_are_shared(self, cache, encoder, tmp_path):
+        cache.encode(["brake noise", "clutch slipping"], encoder)
+        other = EmbeddingCache("test-model", dim=2, cache_dir=str(tmp_path))
+        np.testing.assert_array_equal(other.encode(["clutch slipping"], encoder), [[15, 2]])
+        assert len(encoder.calls) == 1
+        assert other.stats()["disk_hits"] == 1 and other.stats()["disk_entries"] == 2
+
+    def test_models_do_not_share_entries(self, cache, encoder, tmp_path):
+        cache.encode(["brake noise"], encoder)
+        EmbeddingCache("other-model", dim=2, cache_dir=str(tmp_path)).encode(["brake noise"], encoder)
+        assert len(encoder.calls) == 2
+
+    def test_second_cache_never_truncates_the_matrix(self, cache, encoder, tmp_path, monkeypatch):
+        cache.encode(["brake noise"], encoder)
+        exists = os.path.exists
+        # A worker that checked for the matrix just before another one created it
+        monkeypatch.setattr(os.path, "exists", lambda path: not path.endswith(".f16") and exists(path))
+        other = EmbeddingCache("test-model", dim=2, cache_dir=str(tmp_path), capacity=8, disk_capacity=32)
+        np.testing.assert_array_equal(other.encode(["brake noise"], encoder), [[11, 2]])
+        assert other.stats()["disk_hits"] == 1
@@ -0,0 +1,182 @@
+"""
+Parity tests for the compiled keyword matchers in the fault diagnosis fallback.
+
+The precompiled index and keyword guard (keyword_index.py) must give exactly the
+results of the loop-based reference implementations over a generated symptom
+corpus: KB phrases, plurals, punctuation and spacing variants, truncated stems,
+cross-fault word mixes and random vocabulary.
+
+Run: cd ML && pytest test_fault_matching_parity.py -v
+"""
+
+import random
+
+import pytest
+
+from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem
+from keyword_index import AhoCorasick, FaultKeywordIndex, KeywordGuard, PrefixIndex
+
+
+# ─── Fixtures ─────────────────────────────────────────────────────────────────
+@pytest.fixture(scope="module")
+def system():
+    # Knowledge base only: no NLP models are loaded
+    system = AdvancedFaultDiagnosisSystem.__new__(AdvancedFaultDiagnosisSystem)
+    system._load_automotive_knowledge_base()
+    system.keyword_index = FaultKeywordIndex(system.automotive_knowledge_base)
+    return system
+
+
+def generate_symptoms(knowledge_base, count=3000, seed=7):
+    rng = random.Random(seed)
+    phrases = [s for fault in knowledge_base for s in fault["symptoms"]]
+    vocabulary = sorted({w for p in phrases for w in p.lower().split()})
+    vocabulary += ["brakes", "overheats", "over heating", "tyres", "noise!", "car", "the", "when", "won't", "a/c"]
+    vocabulary += sorted(AdvancedFaultDiagnosisSystem.SYSTEM_KEYWORDS)
+
+    symptoms = list(phrases)
+    for _ in range(count):
+        kind = rng.randrange(7)
+        words = rng.choice(phrases).split()
+        if kind == 0:    # plural / singular of every word
+            words = [w[:-1] if w.endswith("s") else w + "s" for w in words]
+        elif kind == 1:  # spacing removed or inserted
+            joined = "".join(words)
+            cut = rng.randrange(1, max(2, len(joined)))
+            words = [joined[:cut], joined[cut:]] if rng.random() < 0.5 else [joined]
+        elif kind == 2:  # truncated stems
+            words = [w[:rng.randrange(3, len(w) + 1)] if len(w) > 3 else w for w in words]
+        elif kind == 3:  # two phrases from different faults
+            words = words + rng.choice(phrases).split()
+        elif kind == 4:  # random vocabulary
+            words = rng.sample(vocabulary, rng.randrange(1, 6))
+        elif kind == 5:  # punctuation and case noise
+            words = [rng.choice(["", "(", "'"]) + w.upper() + rng.choice(["", "!", ",", "-", "..."]) for w in words]
+        else:            # phrase embedded in a sentence
+            words = ["my", "car", "has"] + words + rng.sample(vocabulary, 2)
+        symptoms.append(" ".join(words))
+    return symptoms
+
+
+def reference_scores(system, symptom):
+    scores = {}
+    for fault_idx, fault in enumerate(system.automotive_knowledge_base):
+        score = system._score_fault_match(fault, symptom.lower())
+        if score > 0:
+            scores[fault_idx] = score
+    return scores
+
+
+def reference_allowed_faults(system, symptom):
+    """SYSTEM_KEYWORDS guard as a loop over every keyword (implementation before KeywordGuard)"""
+    s = system._normalize(symptom)
+    s_nospace = s.replace(" ", "")
+
+    matched = []
+    for kw, faults in system.SYSTEM_KEYWORDS.items():
+        kw_norm = kw.replace(" ", "")
+        hit = False
+        if kw_norm in s_nospace or kw in s:
+            hit = True
+        elif " " not in kw and len(kw_norm) >= 5:
+            for user_word in s.split():
+                if len(user_word) >= 5 and (user_word.startswith(kw_norm) or kw_norm.startswith(user_word)):
+                    hit = True
+                    break
+        if hit:
+            matched.append((len(faults), set(faults)))
+
+    if not matched:
+        return set()
+    matched.sort(key=lambda x: x[0])
+    most_specific_count = matched[0][0]
+    allowed = set()
+    for count, faults in matched:
+        if count <= most_specific_count * 2:
+            allowed.update(faults)
+    return allowed
+
+
+def keyword_variants(keywords, seed=17):
+    """Keywords with stems, extensions, collapsed spaces and surrounding words"""
+    rng = random.Random(seed)
+    variants = []
+    for kw in keywords:
+        variants += [kw, kw.upper() + "!", kw.replace(" ", ""), kw + "ing", kw + "s", kw[:-1], kw[:5], kw[:4],
+                     f"my {kw} is broken", f"{kw} and {rng.choice(list(keywords))}"]
+    return variants
+
+
+# ─── Building blocks ──────────────────────────────────────────────────────────
+class TestMatchers:
+    def test_aho_corasick_finds_every_substring_pattern(self):
+        rng = random.Random(3)
+        patterns = ["".join(rng.choice("abc") for _ in range(rng.randrange(1, 5))) for _ in range(60)] + [""]
+        matcher = AhoCorasick(patterns)
+        for _ in range(500):
+            text = "".join(rng.choice("abcd") for _ in range(rng.randrange(0, 20)))
+            expected = {i for i, p in enumerate(patterns) if p in text}
+            assert matcher.find(text) == expected
+
+    def test_prefix_index_either_direction(self):
+        index = PrefixIndex(["overheat", "grinding", "brake"], min_length=6)
+        assert index.related("overheating") == {"overheat"}
+        assert index.related("overhe") == {"overheat"}
+        assert index.related("grind") == set()   # shorter than min_length
+        assert index.related("brakes") == set()  # "brake" is not indexed
+
+
+# ─── Fault scoring (user-036) ─────────────────────────────────────────────────
+class TestFaultKeywordIndexParity:
+    def test_scores_match_reference(self, system):
+        for symptom in generate_symptoms(system.automotive_knowledge_base):
+            assert system.keyword_index.score(symptom.lower()) == reference_scores(system, symptom), symptom
+
+    def test_scaled_knowledge_base(self, system):
+        # 10x knowledge base with phrases recombined across faults
+        rng = random.Random(11)
+        base = system.automotive_knowledge_base
+        words = sorted({w for fault in base for s in fault["symptoms"] for w in s.split()})
+        scaled = []
+        for i in range(len(base) * 10):
+            fault = dict(base[i % len(base)])
+            fault["fault"] = f"{fault['fault']}_{i}"
+            fault["symptoms"] = [" ".join(rng.sample(words, rng.randrange(1, 5))) for _ in range(rng.randrange(1, 8))]
+            scaled.append(fault)
+        scaled_system = AdvancedFaultDiagnosisSystem.__new__(AdvancedFaultDiagnosisSystem)
+        scaled_system.automotive_knowledge_base = scaled
+        index = FaultKeywordIndex(scaled)
+        for symptom in generate_symptoms(scaled, count=300, seed=5)[-300:]:
+            assert index.score(symptom.lower()) == reference_scores(scaled_system, symptom), symptom
+
+    def test_fallback_analysis_matches_reference(self, system):
+        class ReferenceIndex:
+            def score(self, symptom):
+                return reference_scores(system, symptom)
+
+        rng = random.Random(13)
+        corpus = generate_symptoms(system.automotive_knowledge_base, count=400)
+        reference_system = AdvancedFaultDiagnosisSystem.__new__(AdvancedFaultDiagnosisSystem)
+        reference_system.__dict__.update(system.__dict__, keyword_index=ReferenceIndex())
+        for _ in range(200):
+            symptoms = rng.sample(corpus, rng.randrange(1, 4))
+            assert system._fallback_analysis(symptoms) == reference_system._fallback_analysis(symptoms), symptoms
+
+
+# ─── Keyword guard (user-037) ─────────────────────────────────────────────────
+class TestKeywordGuardParity:
+    def test_guard_is_compiled_at_class_load(self):
+        assert isinstance(AdvancedFaultDiagnosisSystem.KEYWORD_GUARD, KeywordGuard)
+        assert AdvancedFaultDiagnosisSystem.KEYWORD_GUARD.keywords == list(AdvancedFaultDiagnosisSystem.SYSTEM_KEYWORDS)
+
+    def test_allowed_faults_match_reference(self, system):
+        corpus = generate_symptoms(system.automotive_knowledge_base) + keyword_variants(system.SYSTEM_KEYWORDS)
+        for symptom in corpus:
+            symptom = symptom.lower()
+            assert system._allowed_faults(symptom) == reference_allowed_faults(system, symptom), symptom
+
+    def test_matches_report_specificity(self, system):
+        hits = dict(system.KEYWORD_GUARD.matches("engine overheating and squealing brakes"))
+        assert hits["overheating"] == 3
+        assert hits["squeal"] == 1
+        assert hits["engine"] == 7
@@ -0,0 +1,92 @@
+"""
+Hashed n-gram fault classifier and model registry tests.
+
+Run: cd ML && pytest test_fault_text_classifier.py -v
+"""
+
+import numpy as np
+import pytest
+
+import artifacts
+from artifacts import ModelRegistry
+from fault_text_classifier import HashedFaultClassifier, augment, hashed_features
+
+TEXTS = [
+    "engine overheating temperature gauge high steam",
+    "engine won't start no crank battery dead",
+    "brake noise squealing grinding",
+    "brake pedal soft spongy feel",
+    "ac not cooling warm air",
+    "exhaust smoke black white",
+]
+LABELS = ["cooling_system_failure", "battery_failure", "brake_pad_wear",
+          "brake_fluid_leak", "refrigerant_low", "exhaust_system_fault"]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return HashedFaultClassifier.train(TEXTS, LABELS)
+
+
+# ─── Features ─────────────────────────────────────────────────────────────────
+class TestFeatures:
+    def test_hashed_rows_are_unit_norm(self):
+        X = hashed_features(["Brake noise", "BRAKE NOISE", "steam"])
+        np.testing.assert_allclose(np.sqrt(X.multiply(X).sum(axis=1)).A1, 1.0)
+        assert (X[0] != X[1]).nnz == 0  # case-insensitive
+
+    def test_augment_adds_windows(self):
+        texts, labels = augment(["brake pedal soft spongy feel", "ac noise"], ["a", "b"])
+        assert texts == ["brake pedal soft spongy feel", "brake pedal soft", "pedal soft spongy",
+                         "soft spongy feel", "ac noise"]
+        assert labels == ["a", "a", "a", "a", "b"]
+
+
+# ─── Classifier ───────────────────────────────────────────────────────────────
+class TestClassifier:
+    def test_training_phrases(self, classifier):
+        assert [faults[0][0] for faults in classifier.top_faults(TEXTS, k=1)] == LABELS
+
+    def test_rephrased_symptoms(self, classifier):
+        assert classifier.top_faults(["brakes squealing"], k=1)[0][0][0] == "brake_pad_wear"
+        assert classifier.top_faults(["car won't start, battery dead"], k=1)[0][0][0] == "battery_failure"
+
+    def test_probabilities(self, classifier):
+        probabilities = classifier.predict_proba(TEXTS + ["completely unrelated words"])
+        assert probabilities.shape == (len(TEXTS) + 1, len(LABELS))
+        np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, rtol=1e-6)
+        assert classifier.predict_proba([]).shape == (0, len(LABELS))
+
+    def test_batch_matches_single(self, classifier):
+        batch = classifier.predict_proba(TEXTS)
+        for i, text in enumerate(TEXTS):
+            np.testing.assert_allclose(classifier.predict_proba([text])[0], batch[i], rtol=1e-6)
+
+    def test_temperature_folded_into_weights(self, classifier):
+        assert classifier.temperature > 0
+        unscaled = HashedFaultClassifier(classifier.classes_, classifier.weights * classifier.temperature,
+                                         classifier.bias * classifier.temperature)
+        log_p, log_q = np.log(classifier.predict_proba(TEXTS)), np.log(unscaled.predict_proba(TEXTS))
+        # softmax(z / T): log-probabilities differ by the same factor up to a per-row constant
+        np.testing.assert_allclose(np.ptp(log_p, axis=1) * classifier.temperature, np.ptp(log_q, axis=1), rtol=1e-3)
+
+    def test_threshold(self, classifier):
+        faults = classifier.top_faults(["brake noise squealing grinding"], k=3, threshold=0.5)[0]
+        assert [fault for fault, _ in faults] == ["brake_pad_wear"]
+
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+class TestModelRegistry:
+    def test_save_and_load(self, classifier, tmp_path, monkeypatch):
+        monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+        registry = ModelRegistry("fault_text_classifier")
+        assert registry.load() is None and registry.versions() == []
+
+        registry.save(classifier, "v1", {"samples": len(TEXTS)})
+        registry.save(classifier, "v2")
+        assert registry.versions() == ["v1", "v2"] and registry.current_version() == "v2"
+        model, metadata = registry.load("v1")
+        assert metadata == {"name": "fault_text_classifier", "version": "v1", "samples": len(TEXTS)}
+        np.testing.assert_allclose(model.predict_proba(TEXTS), classifier.predict_proba(TEXTS))
+        assert registry.load()[1]["version"] == "v2"
+        assert registry.load("missing") is None
@@ -0,0 +1,124 @@
+"""
+Hybrid retrieval tests: BM25 against a per-document reference, reciprocal rank
+fusion, and the engine's hybrid / keyword tiers (hashed bag-of-words encoder,
+no model downloads).
+
+Run: cd ML && pytest test_hybrid_retrieval.py -v
+"""
+
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from hybrid_retrieval import BM25Index, RetrievalScores, keyword_evidence, reciprocal_rank_fusion, stem, terms
+
+DOCUMENTS = [
+    "brake noise squealing when braking brake pads worn",
+    "engine overheating coolant leak radiator boiling",
+    "brake pedal soft spongy brake fluid leak",
+    "battery dead engine not starting",
+]
+
+
+def reference_bm25(documents, query, k1=1.2, b=0.75):
+    """Textbook Okapi BM25 of one query against each document, term by term"""
+    tokenized = [terms(d) for d in documents]
+    average_length = sum(map(len, tokenized)) / len(tokenized)
+    scores = []
+    for doc_terms in tokenized:
+        counts, score = Counter(doc_terms), 0.0
+        for term in set(terms(query)):
+            df = sum(term in d for d in tokenized)
+            if not counts[term]:
+                continue
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            tf = counts[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc_terms) / average_length))
+        scores.append(score)
+    return scores
+
+
+# ─── BM25 ─────────────────────────────────────────────────────────────────────
+class TestBM25:
+    def test_terms(self):
+        assert stem("brakes") == "brake" and stem("overheating") == "overheat" and stem("gas") == "gas"
+        assert terms("My car's brakes are squealing!") == ["brake", "are", "squeal", "brake are", "are squeal"]
+
+    @pytest.mark.parametrize("query", ["brakes squealing", "engine overheating and steam", "spongy pedal",
+                                       "dead battery, engine won't start", "wiper broken"])
+    def test_matches_reference(self, query):
+        index = BM25Index(DOCUMENTS)
+        np.testing.assert_allclose(index.scores([query])[0], reference_bm25(DOCUMENTS, query), rtol=1e-5)
+
+    def test_batch_is_one_matrix(self):
+        index = BM25Index(DOCUMENTS)
+        queries = ["brake noise", "coolant leak", "nothing relevant"]
+        batch = index.scores(queries)
+        assert batch.shape == (3, len(DOCUMENTS))
+        for row, query in enumerate(queries):
+            np.testing.assert_allclose(batch[row], index.scores([query])[0])
+        assert not batch[2].any()
+
+    def test_keyword_evidence(self):
+        assert keyword_evidence(np.array([4.0, 1.7, 1.5, 0.0])).tolist() == [True, True, False, False]
+        assert not keyword_evidence(np.zeros(3)).any()
+
+
+# ─── Rank fusion ──────────────────────────────────────────────────────────────
+class TestReciprocalRankFusion:
+    def test_hand_computed(self):
+        dense = np.array([[0.9, 0.8, 0.1]])
+        keyword = np.array([[0.0, 3.0, 1.0]])
+        fused = reciprocal_rank_fusion([dense, keyword], k=10)
+        expected = np.array([1 / 11, 1 / 12 + 1 / 11, 1 / 13 + 1 / 12]) / (2 / 11)
+        np.testing.assert_allclose(fused[0], expected)
+        assert fused[0].argmax() == 1  # found by both beats first by one
+
+    def test_first_everywhere_is_one(self):
+        scores = np.array([[0.2, 0.7], [0.9, 0.1]])
+        fused = reciprocal_rank_fusion([scores, scores * 5])
+        np.testing.assert_allclose(fused.max(axis=1), 1.0)
+
+    def test_rows_are_independent(self):
+        rng = np.random.default_rng(0)
+        dense, keyword = rng.random((5, 8)), rng.random((5, 8))
+        fused = RetrievalScores.fuse(dense, keyword)
+        np.testing.assert_allclose(fused.take([3]).fused[0], reciprocal_rank_fusion([dense[3:4], keyword[3:4]])[0])
+
+    def test_history_is_a_third_ranked_list(self):
+        rng = np.random.default_rng(1)
+        dense, keyword = rng.random((4, 6)), rng.random((4, 6))
+        history = np.zeros((4, 6))
+        history[2, 5] = 0.9
+        fused = RetrievalScores.fuse(dense, keyword, history)
+        np.testing.assert_allclose(fused.fused, reciprocal_rank_fusion([dense, keyword, history]))
+        assert fused.take([2]).history[0, 5] == 0.9 and RetrievalScores.fuse(dense, keyword).take([2]).history is None
+
+
+# ─── Engine tiers ─────────────────────────────────────────────────────────────
+class TestEngineTiers:
+    def test_hybrid_reports_both_retrievers(self, system):
+        analysis = system.analyze_symptom_batch([["brake noise when stopping"]])[0]
+        assert analysis["method"] == "hybrid_retrieval"
+        top = analysis["predicted_faults"][0]
+        assert top["fault"] == "brake_pad_wear"
+        assert set(top["retrieval_scores"]) == {"semantic", "keyword"}
+        assert 0 < top["confidence"] <= 1
+
+    def test_keyword_tier_skips_the_encoder(self, system):
+        symptoms = ["engine overheating", "coolant leak"]
+        assert system.analyze_symptom_batch([symptoms], mode="keyword") == [system._fallback_analysis(symptoms)]
+        assert system.sentence_model.calls == []
+
+    def test_encoder_failure_degrades_to_keywords(self, system):
+        def broken(texts, batch_size=32):
+            raise RuntimeError("out of memory")
+        system.sentence_model.encode = broken
+        symptoms = ["clutch slipping"]
+        assert system.analyze_symptom_batch([symptoms]) == [system._fallback_analysis(symptoms)]
+
+    def test_unknown_mode(self, system):
+        with pytest.raises(ValueError):
+            system.analyze_symptom_batch([["brake noise"]], mode="fast")
@@ -0,0 +1,76 @@
+"""
+Item inventory analytics tests: turnover, days of cover, ABC / XYZ classes and
+dead stock from in-memory item and ledger frames, including an empty ledger.
+
+Run: cd ML && pytest test_inventory_analytics.py -v
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inventory_analytics import ItemInventoryAnalytics
+
+TODAY = datetime(2024, 12, 31)
+
+
+def items(*rows):
+    """(itemcode, itemname, curstock, unit_cost) rows -> item master frame"""
+    df = pd.DataFrame(rows, columns=['itemcode', 'itemname', 'curstock', 'unit_cost'])
+    df['partno'] = None
+    df['groupname'] = 'SPARES'
+    return df.set_index('itemcode')
+
+
+def ledger(*rows):
+    """(itemcode, tran_type, tran_date, qty) rows -> typed stock ledger frame"""
+    return ItemInventoryAnalytics._typed_ledger(
+        [(i + 1, itemcode, tran_type, tran_date, qty) for i, (itemcode, tran_type, tran_date, qty) in enumerate(rows)]
+    )
+
+
+@pytest.fixture
+def analytics():
+    return ItemInventoryAnalytics(window_days=365, dead_stock_days=180)
+
+
+# ─── Metrics ──────────────────────────────────────────────────────────────────
+class TestItemMetrics:
+    def test_turnover_and_cover(self, analytics):
+        # 10 on hand all year, 12 sold on the last day after a purchase of 12 the same day
+        result = analytics.compute_item_metrics(
+            items((1, 'BRAKE PAD', 10, 100.0)),
+            ledger((1, 'Purc', '2024-12-31', 12), (1, 'Sale', '2024-12-31', -12)),
+            TODAY,
+        )
+        row = result.loc[1]
+        assert row['units_sold'] == 12
+        assert row['avg_stock'] == pytest.approx(10)
+        assert row['turnover'] == pytest.approx(1.2)
+        assert row['days_of_cover'] == pytest.approx(10 / (12 / 365))
+        assert not row['is_dead_stock']
+
+    def test_dead_stock_and_abc(self, analytics):
+        result = analytics.compute_item_metrics(
+            items((1, 'FAST', 5, 10.0), (2, 'IDLE', 3, 50.0), (3, 'NEVER MOVED', 2, 20.0)),
+            ledger((1, 'Sale', '2024-12-01', -100), (2, 'Sale', '2024-01-15', -5)),
+            TODAY,
+        )
+        assert result['is_dead_stock'].tolist() == [False, True, True]
+        assert np.isnan(result.loc[3, 'idle_days'])
+        assert result['abc_class'].tolist() == ['A', 'B', 'C']
+
+    def test_empty_ledger(self, analytics):
+        result = analytics.compute_item_metrics(items((1, 'BRAKE PAD', 4, 100.0), (2, 'CLUTCH', 0, 80.0)),
+                                                analytics._ledger, TODAY)
+        assert result['units_sold'].tolist() == [0, 0]
+        assert result['avg_stock'].tolist() == [4, 0]
+        assert result['is_dead_stock'].tolist() == [True, False]
+        assert result['abc_class'].tolist() == ['C', 'C']
+
+    def test_untyped_empty_ledger(self, analytics):
+        untyped = pd.DataFrame(columns=ItemInventoryAnalytics.LEDGER_COLUMNS)
+        result = analytics.compute_item_metrics(items((1, 'BRAKE PAD', 4, 100.0)), untyped, TODAY)
+        assert result.loc[1, 'units_sold'] == 0
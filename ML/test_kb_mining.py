@@ -0,0 +1,124 @@
+"""
+Knowledge-base mining tests over in-memory invoice rows (no database needed).
+
+Run: cd ML && pytest test_kb_mining.py -v
+"""
+
+import pytest
+
+import kb_mining
+from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem
+from kb_mining import KBMiner, PartMatcher, RepairStats, load_published_kb, narration_phrases, publish
+
+
+class InvoiceCursor:
+    """Server-side cursor over (inv_master_id, narration, line_description, itemname, groupname) rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.itersize = None
+
+    def execute(self, query, params):
+        self.pending = [row for row in self.rows if row[0] > params["after"]]
+
+    def fetchmany(self, size):
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class InvoiceConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        assert name, "invoices must be streamed with a named (server-side) cursor"
+        return InvoiceCursor(self.rows)
+
+
+def invoice_rows(start_id, count):
+    rows = []
+    for inv_id in range(start_id, start_id + count):
+        if inv_id % 3 == 0:
+            rows += [(inv_id, "Engine overheating, radiator boiling", "coolant top up", "THERMOSTAT 82C", "COOLING"),
+                     (inv_id, "Engine overheating, radiator boiling", None, "FAN MOTOR 12V", "FAN MOTORS")]
+        elif inv_id % 3 == 1:
+            rows += [(inv_id, "Brake squeal when braking", None, "BRAKE PAD SET FRONT", "BRAKES")]
+        else:
+            rows += [(inv_id, "General service", None, "ENGINE OIL 5W30", "LUBRICANTS")]
+    return rows
+
+
+@pytest.fixture(scope="module")
+def base_kb():
+    return AdvancedFaultDiagnosisSystem.builtin_knowledge_base()
+
+
+# ─── Matching ─────────────────────────────────────────────────────────────────
+class TestMatching:
+    def test_narration_to_faults(self, base_kb):
+        miner = KBMiner(base_kb)
+        assert "cooling_system_failure" in miner.faults_for("Engine overheating, radiator boiling")
+        assert miner.faults_for("General service") == []
+
+    def test_part_keywords_in_item_names(self, base_kb):
+        matcher = PartMatcher(base_kb)
+        assert "water_pump" in matcher.parts("WATER-PUMP ASSY", None)
+        assert "thermostat" in matcher.parts("THERMOSTAT 82C", "COOLING")
+
+    def test_phrases_skip_stopwords_and_numbers(self):
+        phrases = narration_phrases("Replaced the brake pads 2 sets")
+        assert "brake pads" in phrases
+        assert not any(p.startswith("replaced") or p.endswith("the") for p in phrases)
+
+
+# ─── Incremental mining ───────────────────────────────────────────────────────
+class TestMining:
+    def test_incremental_equals_full(self, base_kb):
+        rows = invoice_rows(1, 60)
+        full = KBMiner(base_kb)
+        full.mine(InvoiceConnection(rows), chunk_size=7)
+
+        incremental = KBMiner(base_kb)
+        assert incremental.mine(InvoiceConnection(rows[:40]), chunk_size=7) > 0
+        incremental.stats = RepairStats.from_json(incremental.stats.to_json())  # checkpoint round trip
+        incremental.mine(InvoiceConnection(rows), chunk_size=5)
+
+        drop = lambda stats: {k: v for k, v in stats.to_json().items() if k != "updated_at"}
+        assert drop(incremental.stats) == drop(full.stats)
+        assert full.stats.invoices == 60 and full.stats.last_invoice_id == 60
+
+    def test_invoice_split_across_chunks(self, base_kb):
+        miner = KBMiner(base_kb)
+        miner.mine(InvoiceConnection(invoice_rows(3, 1)), chunk_size=1)  # one invoice, two rows
+        assert miner.stats.invoices == 1
+        assert miner.stats.fault_groups["cooling_system_failure"]["fan_motors"] == 1
+
+    def test_mined_knowledge_base(self, base_kb):
+        miner = KBMiner(base_kb)
+        miner.mine(InvoiceConnection(invoice_rows(1, 60)))
+        kb = {fault["fault"]: fault for fault in miner.mined_knowledge_base(min_support=5)}
+        cooling = kb["cooling_system_failure"]
+        assert cooling["parts"][0] == "thermostat"
+        assert "fan_motors" in cooling["parts"]
+        assert cooling["mined"]["invoices"] == 20
+        base_cooling = next(f for f in base_kb if f["fault"] == "cooling_system_failure")
+        assert set(base_cooling["parts"]) <= set(cooling["parts"])
+        assert "mined" not in base_cooling  # base KB untouched
+
+
+# ─── Publishing ───────────────────────────────────────────────────────────────
+class TestPublishing:
+    def test_publish_and_load(self, base_kb, tmp_path, monkeypatch):
+        monkeypatch.setattr(kb_mining, "KB_DIR", str(tmp_path))
+        miner = KBMiner(base_kb)
+        miner.mine(InvoiceConnection(invoice_rows(1, 30)))
+        mined = miner.mined_knowledge_base(min_support=3)
+        publish(mined, miner.base_hash, miner.stats)
+
+        assert load_published_kb(base_kb) == mined
+        assert load_published_kb(base_kb[1:]) is None  # mined from another base KB
+        monkeypatch.setattr(kb_mining, "KB_MINED", False)
+        assert load_published_kb(base_kb) is None
@@ -0,0 +1,169 @@
+"""
+Knowledge base data file and hot reload tests: validation, incremental
+embedding of new / changed faults, and the admin endpoint swapping engines
+while the previous one keeps serving (hashed bag-of-words encoder).
+
+Run: cd ML && pytest test_kb_reload.py -v
+"""
+
+import copy
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import advanced_fault_diagnosis
+import artifacts
+import knowledge_base
+from advanced_fault_diagnosis import AdvancedFaultDiagnosisSystem, advanced_diagnosis, app
+from kb_mining import fault_texts
+from knowledge_base import changed_faults, load_kb_document, validate_kb_document
+from load_shedding import ResultCache
+
+WIPER_MOTOR = {
+    "fault": "wiper_motor_failure",
+    "description": "Wiper motor burnt out or linkage seized",
+    "severity": "low",
+    "symptoms": ["wipers stopped moving", "wiper motor humming", "wipers stuck mid screen"],
+    "parts": ["wiper_motor", "wiper_linkage"],
+    "diagnostic_steps": ["Check wiper fuse and relay", "Test motor with direct 12V supply"],
+}
+
+
+def next_version(document):
+    """The data file's document with one fault changed, one added and one removed"""
+    document = copy.deepcopy(document)
+    document["version"] += 1
+    faults = document["faults"]
+    faults[0]["description"] += " and coolant loss"
+    removed = faults.pop()
+    for allowed in document["system_keywords"].values():
+        if removed["fault"] in allowed:
+            allowed.remove(removed["fault"])
+    faults.append(WIPER_MOTOR)
+    document["system_keywords"]["wiper motor"] = ["wiper_motor_failure"]
+    return document, removed["fault"]
+
+
+@pytest.fixture(autouse=True)
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+
+
+# ─── Data file ────────────────────────────────────────────────────────────────
+class TestKnowledgeBaseFile:
+    def test_engine_reads_the_data_file(self):
+        document = load_kb_document()
+        assert AdvancedFaultDiagnosisSystem.builtin_knowledge_base() == document["faults"]
+        assert AdvancedFaultDiagnosisSystem.SYSTEM_KEYWORDS == document["system_keywords"]
+
+    @pytest.mark.parametrize("edit, message", [
+        (lambda d: d["faults"].append(dict(d["faults"][0])), "duplicate fault code"),
+        (lambda d: d["faults"][1].pop("parts"), "needs 'parts'"),
+        (lambda d: d["faults"][2].update(severity="urgent"), "unknown severity"),
+        (lambda d: d["system_keywords"].update(horn=["horn_failure", "siren_fault"]), "unknown faults"),
+        (lambda d: d.pop("version"), "missing 'version'"),
+    ])
+    def test_validation(self, edit, message):
+        document = load_kb_document()
+        edit(document)
+        with pytest.raises(ValueError, match=message):
+            validate_kb_document(document)
+
+    def test_changed_faults(self):
+        document = load_kb_document()
+        new, removed = next_version(document)
+        assert changed_faults(document["faults"], new["faults"]) == {
+            "added": ["wiper_motor_failure"], "changed": [document["faults"][0]["fault"]], "removed": [removed],
+        }
+
+
+# ─── Engine swap ──────────────────────────────────────────────────────────────
+class TestWithKnowledgeBase:
+    def test_embeds_only_new_and_changed_faults(self, system):
+        new, _ = next_version(load_kb_document())
+        engine = system.with_knowledge_base(new)
+        assert system.sentence_model.calls == [fault_texts([new["faults"][0], WIPER_MOTOR])]
+        assert engine.kb_encoded == 2
+        np.testing.assert_array_equal(engine.fault_embeddings[1:-1], system.fault_embeddings[1:-1])
+        assert engine.fault_embeddings.shape[0] == len(engine.automotive_knowledge_base) == len(new["faults"])
+
+    def test_previous_engine_is_untouched(self, system):
+        before = system.diagnose_fault(["wipers stopped moving"], {})
+        version, faults = system.kb_version, system.automotive_knowledge_base
+        engine = system.with_knowledge_base(next_version(load_kb_document())[0])
+
+        assert system.kb_version == version and system.automotive_knowledge_base is faults
+        assert system.diagnose_fault(["wipers stopped moving"], {}) == before
+        assert "wiper motor" not in system.SYSTEM_KEYWORDS
+        assert engine.kb_version == version + 1
+        assert "wiper_motor_failure" in engine.KEYWORD_GUARD.allowed_faults("wiper motor humming")
+        assert "wiper_motor_failure" not in system.KEYWORD_GUARD.allowed_faults("wiper motor humming")
+        top = engine.diagnose_fault(["wipers stopped moving", "wiper motor humming"], {})["predicted_faults"][0]
+        assert top["fault"] == "wiper_motor_failure"
+
+    def test_cached_parts_are_per_version(self, system, monkeypatch):
+        del system.search_parts_for_faults
+        monkeypatch.setattr(advanced_fault_diagnosis, "parts_cache", ResultCache())
+        system._resolve_parts = lambda parts_lists, vehicle_info, database=True: (
+            [[{"item_name": keyword.upper()} for keyword in parts] for parts in parts_lists] if database else None)
+        vehicle = {"vehicle_make": "Maruti", "vehicle_model": "Swift"}
+        full = system.search_parts_for_faults([["wiper_motor"]], vehicle)
+        assert system.search_parts_for_faults([["wiper_motor"]], vehicle, cached_only=True) == full
+
+        engine = system.with_knowledge_base(next_version(load_kb_document())[0])
+        assert engine.search_parts_for_faults([["wiper_motor"]], vehicle, cached_only=True) == [[]]
+        assert system.search_parts_for_faults([["wiper_motor"]], vehicle, cached_only=True) == full
+
+    def test_unchanged_keywords_keep_the_compiled_guard(self, system):
+        document = load_kb_document()
+        document["version"] += 1
+        assert system.with_knowledge_base(document).KEYWORD_GUARD is AdvancedFaultDiagnosisSystem.KEYWORD_GUARD
+        assert system.sentence_model.calls == []
+
+
+# ─── Admin endpoint ───────────────────────────────────────────────────────────
+class TestReloadEndpoint:
+    @pytest.fixture
+    def client(self, system, tmp_path, monkeypatch):
+        monkeypatch.setattr(advanced_diagnosis, "_instance", system)
+        monkeypatch.setattr(advanced_diagnosis, "state", advanced_diagnosis.READY)
+        monkeypatch.setattr(advanced_fault_diagnosis, "ML_ADMIN_TOKEN", "secret")
+        path = tmp_path / "kb.json"
+        path.write_text(json.dumps(load_kb_document()))
+        monkeypatch.setattr(knowledge_base, "KB_PATH", str(path))
+        with TestClient(app) as client:
+            client.kb_path = path
+            yield client
+
+    def reload(self, client, token="secret"):
+        return client.post("/admin/knowledge-base/reload", headers={"X-Admin-Token": token} if token else {})
+
+    def test_token(self, client, monkeypatch):
+        assert self.reload(client, token=None).status_code == 401
+        assert self.reload(client, token="guess").status_code == 401
+        monkeypatch.setattr(advanced_fault_diagnosis, "ML_ADMIN_TOKEN", None)
+        assert self.reload(client).status_code == 403
+
+    def test_reload_swaps_the_engine(self, client, system):
+        assert self.reload(client).json() == {"status": "unchanged", "version": system.kb_version}
+        new, removed = next_version(load_kb_document())
+        client.kb_path.write_text(json.dumps(new))
+
+        body = self.reload(client).json()
+        assert body["status"] == "reloaded" and body["version"] == system.kb_version + 1
+        assert body["faults"]["added"] == ["wiper_motor_failure"] and body["faults"]["removed"] == [removed]
+        assert body["embedded_texts"] == 2
+        engine = advanced_diagnosis.peek()
+        assert engine is not system and engine.kb_version == body["version"]
+        diagnosis = client.post("/diagnose", json={"symptoms": ["wipers stopped moving", "wiper motor humming"]})
+        assert diagnosis.json()["diagnosis"]["predicted_faults"][0]["fault"] == "wiper_motor_failure"
+
+    def test_invalid_file_keeps_the_current_version(self, client, system):
+        document = load_kb_document()
+        document["version"] += 1
+        document["faults"][0]["severity"] = "urgent"
+        client.kb_path.write_text(json.dumps(document))
+        assert self.reload(client).status_code == 400
+        assert advanced_diagnosis.peek() is system
@@ -0,0 +1,161 @@
+"""
+Load shedding tests: tier controller hysteresis, the parts result cache and the
+keyword tier of /diagnose (hashed bag-of-words encoder, no database).
+
+Run: cd ML && pytest test_load_shedding.py -v
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import advanced_fault_diagnosis
+from advanced_fault_diagnosis import advanced_diagnosis, app
+from load_shedding import FULL, KEYWORD, LoadShedder, ResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def admit(shedder, count=1):
+    """Tiers of `count` requests admitted one after another (each completes)"""
+    tiers = []
+    for _ in range(count):
+        with shedder.request() as tier:
+            tiers.append(tier)
+    return tiers
+
+
+# ─── Controller ───────────────────────────────────────────────────────────────
+class TestLoadShedder:
+    def test_in_flight_limit(self):
+        shedder = LoadShedder(max_in_flight=2, cooldown_seconds=0)
+        with shedder.request() as first, shedder.request() as second, shedder.request() as third:
+            assert (first, second, third) == (FULL, FULL, KEYWORD)
+            assert shedder.stats()["in_flight"] == 3
+        assert shedder.stats()["in_flight"] == 0
+        assert admit(shedder) == [FULL]  # load gone: restored
+        assert shedder.stats()["degradations"] == 1
+
+    def test_encoder_latency_with_hysteresis(self):
+        clock = FakeClock()
+        shedder = LoadShedder(max_in_flight=8, encoder_latency_ms=100, cooldown_seconds=10, clock=clock)
+        shedder.observe_encoder(0.05)
+        assert admit(shedder) == [FULL]
+        for _ in range(5):
+            shedder.observe_encoder(0.5)
+        assert admit(shedder, 2) == [KEYWORD, KEYWORD]
+        clock.now = 5
+        assert admit(shedder) == [KEYWORD]  # still cooling down
+        clock.now = 11
+        assert admit(shedder) == [FULL]
+        assert shedder.latency_ms is None  # measured afresh
+        shedder.observe_encoder(0.5)
+        assert admit(shedder) == [KEYWORD]  # encoder still slow
+
+    def test_recovery_needs_low_load(self):
+        clock = FakeClock()
+        shedder = LoadShedder(max_in_flight=4, recover_ratio=0.5, cooldown_seconds=1, clock=clock)
+        held = [shedder.request() for _ in range(6)]
+        tiers = [request.__enter__() for request in held]
+        assert tiers[-1] == KEYWORD
+        clock.now = 2
+        assert admit(shedder) == [KEYWORD]  # 7 in flight
+        for request in held[:4]:
+            request.__exit__(None, None, None)
+        assert admit(shedder) == [KEYWORD]  # 3 in flight > 4 x 0.5
+        held[4].__exit__(None, None, None)
+        assert admit(shedder) == [FULL]  # 2 in flight, the new one included
+        held[5].__exit__(None, None, None)
+
+    def test_bulk_encodes_are_not_samples(self):
+        shedder = LoadShedder(interactive_texts=16)
+        shedder.observe_encoder(3.0, texts=256)
+        assert shedder.latency_ms is None
+        shedder.observe_encoder(0.02, texts=3)
+        assert shedder.latency_ms == pytest.approx(20)
+
+
+class TestResultCache:
+    def test_ttl_and_lru(self):
+        clock = FakeClock()
+        cache = ResultCache(capacity=2, ttl_seconds=10, clock=clock)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)  # evicts b, the least recently used
+        assert cache.get("b") is None and cache.get("c") == 3
+        clock.now = 11
+        assert cache.get("a") is None
+        assert cache.stats() == {"entries": 1, "hits": 2, "misses": 2}
+
+
+# ─── Engine ───────────────────────────────────────────────────────────────────
+@pytest.fixture
+def parts_system(system, monkeypatch):
+    """The batch test system with the real cached search over a fake parts source"""
+    del system.search_parts_for_faults
+    monkeypatch.setattr(advanced_fault_diagnosis, "parts_cache", ResultCache())
+    system.resolved = []
+
+    def resolve_parts(parts_lists, vehicle_info, database=True):
+        system.resolved.append((parts_lists, database))
+        if not database:
+            return None  # no in-memory catalogue
+        return [[{"item_code": hash(keyword) % 1000, "item_name": keyword.upper()} for keyword in parts]
+                for parts in parts_lists]
+
+    system._resolve_parts = resolve_parts
+    return system
+
+
+class TestCachedParts:
+    def test_full_tier_fills_the_cache_for_the_keyword_tier(self, parts_system):
+        vehicle = {"vehicle_make": "Maruti", "vehicle_model": "Swift"}
+        full = parts_system.search_parts_for_faults([["brake_pad"], ["thermostat"]], vehicle)
+        assert [len(parts) for parts in full] == [1, 1]
+        cached = parts_system.search_parts_for_faults([["brake_pad"], ["battery"]], vehicle, cached_only=True)
+        assert cached == [full[0], []]
+        assert parts_system.resolved[-1] == ([["battery"]], False)  # miss: never the database
+
+    def test_cache_is_per_vehicle_and_copied(self, parts_system):
+        parts = parts_system.search_parts_for_faults([["radiator"]], {"vehicle_make": "Honda"})[0]
+        parts[0]["fault_type"] = "mutated"
+        assert parts_system.search_parts_for_faults([["radiator"]], {"vehicle_make": "Honda"},
+                                                    cached_only=True)[0][0].get("fault_type") is None
+        assert parts_system.search_parts_for_faults([["radiator"]], {"vehicle_make": "Maruti"},
+                                                    cached_only=True) == [[]]
+
+    def test_keyword_tier_skips_the_encoder(self, parts_system):
+        result = parts_system.diagnose_fault(["brake noise when stopping"], {}, tier=KEYWORD)
+        assert result["service_tier"] == KEYWORD
+        assert result["analysis_method"] == "keyword_matching"
+        assert parts_system.sentence_model.calls == []
+        assert all(database is False for _, database in parts_system.resolved)
+
+
+# ─── Endpoint ─────────────────────────────────────────────────────────────────
+class TestEndpoint:
+    @pytest.fixture
+    def client(self, system, monkeypatch):
+        monkeypatch.setattr(advanced_diagnosis, "_instance", system)
+        monkeypatch.setattr(advanced_diagnosis, "state", advanced_diagnosis.READY)
+        with TestClient(app) as client:
+            yield client
+
+    def test_reports_full_tier(self, client, monkeypatch):
+        monkeypatch.setattr(advanced_fault_diagnosis, "load_shedder", LoadShedder())
+        body = client.post("/diagnose", json={"symptoms": ["engine overheating"]}).json()
+        assert body["service_tier"] == FULL and body["diagnosis"]["analysis_method"] == "hybrid_retrieval"
+
+    def test_sheds_to_keyword_tier(self, client, system, monkeypatch):
+        monkeypatch.setattr(advanced_fault_diagnosis, "load_shedder", LoadShedder(max_in_flight=0))
+        body = client.post("/diagnose", json={"symptoms": ["engine overheating"]}).json()
+        assert body["service_tier"] == KEYWORD and body["diagnosis"]["service_tier"] == KEYWORD
+        assert system.sentence_model.calls == []
+        stats = client.get("/load/stats").json()
+        assert stats["requests"] == {FULL: 0, KEYWORD: 1} and "parts_cache" in stats
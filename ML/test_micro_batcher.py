@@ -0,0 +1,157 @@
+"""
+Encoder micro-batching tests: coalescing of concurrent requests, per-request
+rows, failures and the async interface, and the engine diagnosing through the
+queue (hashed bag-of-words encoder, no model downloads).
+
+Run: cd ML && pytest test_micro_batcher.py -v
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+import advanced_fault_diagnosis
+from conftest import JOB_CARDS
+from load_shedding import LoadShedder
+from micro_batcher import MicroBatcher
+
+
+class GatedEncoder:
+    """Encodes each text as [len(text), batch position]; the first call waits for the gate"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        if len(self.calls) == 1:
+            self.started.set()
+            assert self.gate.wait(5)
+        return np.array([[len(text), row] for row, text in enumerate(texts)], dtype=np.float32)
+
+
+@pytest.fixture
+def encoder():
+    return GatedEncoder()
+
+
+@pytest.fixture
+def batcher(encoder):
+    batcher = MicroBatcher(encoder.encode, max_batch=8, max_wait_ms=50)
+    yield batcher
+    encoder.gate.set()
+    batcher.close()
+
+
+def hold_worker(batcher, encoder):
+    """Submit a first request and wait until the worker is busy encoding it"""
+    future = batcher.submit(["warm up"])
+    assert encoder.started.wait(5)
+    return future
+
+
+# ─── Coalescing ───────────────────────────────────────────────────────────────
+class TestMicroBatcher:
+    def test_queued_requests_share_one_batch(self, batcher, encoder):
+        first = hold_worker(batcher, encoder)
+        futures = [batcher.submit(texts) for texts in (["brake noise"], ["engine overheating", "brake noise"],
+                                                       ["clutch slipping"])]
+        encoder.gate.set()
+        assert first.result(5).tolist() == [[7, 0]]
+        results = [future.result(5) for future in futures]
+        assert encoder.calls[1] == ["brake noise", "engine overheating", "clutch slipping"]  # deduplicated
+        assert [r.tolist() for r in results] == [[[11, 0]], [[18, 1], [11, 0]], [[15, 2]]]
+        stats = batcher.stats()
+        assert stats["batches"] == 2 and stats["requests"] == 4 and stats["texts"] == 5 and stats["encoded"] == 4
+
+    def test_batch_limit(self, batcher, encoder):
+        hold_worker(batcher, encoder)
+        futures = [batcher.submit([f"text {i}-{j}" for j in range(3)]) for i in range(3)]
+        large = batcher.submit([f"large {j}" for j in range(12)])
+        encoder.gate.set()
+        for future in futures + [large]:
+            future.result(5)
+        assert [len(call) for call in encoder.calls[1:]] == [6, 3, 8, 4]  # 3 + 3, then 3 (+8 > 8), 12 in chunks
+
+    def test_large_request_is_encoded_in_chunks(self, batcher, encoder):
+        hold_worker(batcher, encoder)
+        texts = [f"bulk {j:02d}" for j in range(20)]
+        large = batcher.submit(texts)
+        encoder.gate.set()
+        rows = large.result(5)
+        assert [len(call) for call in encoder.calls[1:]] == [8, 8, 4]
+        assert rows.tolist() == [[7, j % 8] for j in range(20)]  # rows in request order
+
+    def test_interactive_request_runs_between_chunks(self, batcher, encoder):
+        hold_worker(batcher, encoder)
+        large = batcher.submit([f"bulk {j:02d}" for j in range(24)])
+        small = batcher.submit(["brake noise"])
+        encoder.gate.set()
+        small.result(5), large.result(5)
+        assert [len(call) for call in encoder.calls[1:]] == [8, 1, 8, 8]
+
+    def test_chunks_of_an_accepted_request_finish_after_close(self, batcher, encoder):
+        hold_worker(batcher, encoder)
+        large = batcher.submit([f"bulk {j:02d}" for j in range(20)])
+        closing = threading.Thread(target=batcher.close)
+        closing.start()
+        encoder.gate.set()
+        closing.join(5)
+        assert large.result(5).shape == (20, 2)
+
+    def test_failure_reaches_every_request_of_the_batch(self, batcher, encoder):
+        def broken(texts, batch_size=32):
+            raise RuntimeError("out of memory")
+        batcher.encode_fn = broken
+        futures = [batcher.submit(["a"]), batcher.submit(["b"])]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(5)
+        batcher.encode_fn = encoder.encode
+        encoder.gate.set()
+        assert batcher.encode(["still serving"]).shape == (1, 2)
+
+    def test_async_interface(self, batcher, encoder):
+        encoder.gate.set()
+
+        async def many():
+            return await asyncio.gather(*(batcher.encode_async([f"symptom {i}"]) for i in range(20)))
+
+        results = asyncio.run(many())
+        assert [r[0, 0] for r in results] == [len(f"symptom {i}") for i in range(20)]
+        assert sum(len(call) for call in encoder.calls) == 20 and len(encoder.calls) < 20
+
+    def test_closed(self, batcher, encoder):
+        encoder.gate.set()
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.submit(["brake noise"])
+
+
+# ─── Engine ───────────────────────────────────────────────────────────────────
+class TestEngineThroughQueue:
+    def test_same_diagnoses_and_latency_samples(self, system, monkeypatch):
+        expected = system.diagnose_batch(JOB_CARDS)
+        shedder = LoadShedder()
+        monkeypatch.setattr(advanced_fault_diagnosis, "load_shedder", shedder)
+        system.encode_batcher = MicroBatcher(system.sentence_model.encode)
+        try:
+            results = [None] * len(JOB_CARDS)
+
+            def diagnose(i):
+                results[i] = system.diagnose_fault(*JOB_CARDS[i])
+
+            threads = [threading.Thread(target=diagnose, args=(i,)) for i in range(len(JOB_CARDS))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            system.encode_batcher.close()
+        assert results == expected
+        assert system.encode_batcher.stats()["requests"] == len(JOB_CARDS)
+        assert shedder.latency_ms is not None
@@ -0,0 +1,127 @@
+"""
+Parts association rule tests over in-memory invoice baskets (no database needed).
+
+Run: cd ML && pytest test_parts_associations.py -v
+"""
+
+import numpy as np
+import pytest
+
+import parts_associations
+from parts_associations import (BasketCounter, PartAssociations, add_companion_parts, part_associations,
+                                save_rules, stream_baskets)
+from parts_search import InMemoryPartsIndex
+
+PADS, DISCS, FLUID, OIL, FILTER, BULB = 101, 102, 103, 201, 202, 301
+
+
+class BasketCursor:
+    """Server-side cursor over (inv_master_id, itemcode) rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.itersize = None
+
+    def execute(self, query, params):
+        self.pending = list(self.rows)
+
+    def fetchmany(self, size):
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class BasketConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        assert name, "baskets must be streamed with a named (server-side) cursor"
+        return BasketCursor(self.rows)
+
+
+def baskets():
+    """40 brake jobs (pads+discs, half with fluid), 40 services (oil+filter), 20 bulbs"""
+    result = []
+    for i in range(40):
+        result.append([PADS, DISCS, FLUID] if i % 2 else [PADS, DISCS])
+        result.append([OIL, FILTER, PADS] if i == 0 else [OIL, FILTER])
+    result += [[BULB]] * 20
+    return result
+
+
+def basket_rows(basket_list):
+    return [(inv_id, item) for inv_id, basket in enumerate(basket_list, 1) for item in basket]
+
+
+@pytest.fixture
+def counter():
+    counter = BasketCounter()
+    counter.add_baskets(baskets())
+    return counter
+
+
+# ─── Counting and rules ───────────────────────────────────────────────────────
+class TestRules:
+    def test_support_confidence_lift(self, counter):
+        rules = PartAssociations(counter.rules(min_support=3, min_lift=1.2))
+        by_item = {rule["itemcode"]: rule for rule in rules.rules_for(PADS)}
+        assert set(by_item) == {DISCS, FLUID}
+        assert by_item[DISCS]["support"] == 40
+        assert by_item[DISCS]["confidence"] == pytest.approx(40 / 41)
+        assert by_item[DISCS]["lift"] == pytest.approx((40 / 41) / (40 / 100))
+        assert by_item[FLUID]["confidence"] == pytest.approx(20 / 41)
+        assert rules.rules_for(PADS)[0]["itemcode"] == DISCS  # best confidence first
+
+    def test_thresholds(self, counter):
+        rules = PartAssociations(counter.rules(min_support=3, min_lift=1.2))
+        assert OIL not in {rule["itemcode"] for rule in rules.rules_for(PADS)}  # one basket only
+        assert rules.rules_for(BULB) == []
+        assert rules.rules_for(999) == []
+        assert len(PartAssociations(counter.rules(min_support=3, min_lift=1.2, top=1)).rules_for(PADS)) == 1
+
+    def test_chunked_counts_match_single_pass(self, counter):
+        chunked = BasketCounter()
+        for chunk in stream_baskets(BasketConnection(basket_rows(baskets())), chunk_size=8):
+            chunked.add_baskets(chunk)
+        assert chunked.baskets == counter.baskets == 100
+        expected, actual = counter.rules(min_support=1, min_lift=0), chunked.rules(min_support=1, min_lift=0)
+        for name in expected:
+            np.testing.assert_allclose(actual[name], expected[name])
+
+
+# ─── Lookup ───────────────────────────────────────────────────────────────────
+class TestCompanions:
+    def test_companions(self, counter):
+        rules = PartAssociations(counter.rules(min_support=3, min_lift=1.2))
+        companions = rules.companions([PADS])
+        assert [c["itemcode"] for c in companions] == [DISCS, FLUID]
+        assert companions[0]["companion_of"] == PADS
+        assert [c["itemcode"] for c in rules.companions([PADS, DISCS])] == [FLUID]
+        assert rules.companions([PADS], exclude=[DISCS], limit=1)[0]["itemcode"] == FLUID
+
+    def test_save_and_reload(self, counter, tmp_path, monkeypatch):
+        path = str(tmp_path / "rules.npz")
+        monkeypatch.setattr(parts_associations, "rules_path", lambda: path)
+        assert part_associations() is None
+        save_rules(counter.rules(min_support=3, min_lift=1.2), {"baskets": counter.baskets})
+        loaded = part_associations()
+        assert loaded.meta["baskets"] == 100
+        assert loaded.companions([PADS]) == PartAssociations(counter.rules(min_support=3, min_lift=1.2)).companions([PADS])
+        assert part_associations() is loaded  # cached until the file changes
+
+    def test_companion_parts_added_to_faults(self, counter):
+        index = InMemoryPartsIndex([
+            {"itemcode": code, "itemname": name, "suppref": None, "groupname": "BRAKES", "makename": None,
+             "brandname": None, "sprice": 100.0, "mrp": 120.0, "curstock": 5, "unit": "NOS", "deleted": False}
+            for code, name in ((DISCS, "BRAKE DISC FRONT"), (FLUID, "BRAKE FLUID DOT4"))
+        ])
+        fault_parts = [[{"item_code": PADS, "item_name": "BRAKE PAD SET"}], []]
+        add_companion_parts(index, fault_parts, PartAssociations(counter.rules(min_support=3, min_lift=1.2)))
+        companions = fault_parts[0][1:]
+        assert [part["item_code"] for part in companions] == [DISCS, FLUID]
+        assert all(part["is_companion"] and part["companion_of"] == PADS for part in companions)
+        assert companions[0]["item_name"] == "BRAKE DISC FRONT" and companions[0]["availability"] == "In Stock"
+        assert fault_parts[1] == []
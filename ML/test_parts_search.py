@@ -0,0 +1,201 @@
+"""
+Parts search tests against the in-process index (no database needed).
+
+Run: cd ML && pytest test_parts_search.py -v
+"""
+
+import random
+
+import pytest
+
+import parts_catalogue
+from conftest import catalogue_of, item
+from parts_catalogue import PartsCatalogue, TokenIndex
+from parts_search import (
+    InMemoryPartsIndex, category_items_query, fault_parts_query, like_pattern,
+    fetch_items, resolve_fault_parts, search_category_items, similarity, specific_parts_query, word_similarity,
+)
+
+
+SAMPLE_ITEMS = [
+    item(1, "RADIATOR SWIFT", "RADIATOR", "MARUTI", curstock=2),
+    item(2, "RADIATOR HOSE UPPER", "HOSES", None, curstock=0),
+    item(3, "RADIATOR CAP", "RADIATOR", None, curstock=5, sprice=50),
+    item(4, "THERMOSTAT VALVE", "COOLING", "MARUTI", curstock=1),
+    item(5, "WATER PUMP ASSY", "COOLING", "HYUNDAI", curstock=3),
+    item(6, "SWIFT DOOR HANDLE", "BODY", "MARUTI", curstock=9),
+    item(7, "RADIATOR OLD STOCK", "RADIATOR", None, curstock=10, deleted=True),
+    item(8, "BRAKE PAD", "BRAKES", None, curstock=4, suppref="RAD-123"),
+]
+
+
+@pytest.fixture(params=["scan", "catalogue"])
+def index(request):
+    if request.param == "catalogue":
+        return catalogue_of(SAMPLE_ITEMS)
+    return InMemoryPartsIndex(SAMPLE_ITEMS)
+
+
+# ─── Matching primitives ──────────────────────────────────────────────────────
+class TestPrimitives:
+    def test_like_pattern_wildcards(self):
+        assert like_pattern("%water_pump%").fullmatch("NEW WATER PUMP ASSY")
+        assert not like_pattern("%water_pump%").fullmatch("WATERPUMP")
+        assert like_pattern("%").fullmatch("")
+
+    def test_trigram_similarity_matches_pg_trgm(self):
+        # Values from the pg_trgm documentation
+        assert similarity("word", "two words") == pytest.approx(0.363636, abs=1e-6)
+        assert word_similarity("word", "two words") == pytest.approx(0.8)
+
+
+# ─── Fault part lookup ────────────────────────────────────────────────────────
+class TestFaultParts:
+    def test_relevance_tiers_and_fan_out(self, index):
+        radiator_parts, cooling_parts = resolve_fault_parts(
+            index, [["radiator"], ["thermostat", "water_pump"]], {"vehicle_make": "Maruti", "vehicle_model": "Swift"}
+        )
+        assert [p["item_code"] for p in radiator_parts][:2] == [1, 3]
+        assert radiator_parts[0]["relevance_score"] == 100
+        assert radiator_parts[0]["is_vehicle_specific"]
+        assert 7 not in [p["item_code"] for p in radiator_parts]  # deleted
+        assert {p["item_code"] for p in cooling_parts} >= {4, 5}
+
+    def test_vehicle_only_items_need_a_vehicle(self, index):
+        without_vehicle = resolve_fault_parts(index, [["radiator"]], {"vehicle_make": None, "vehicle_model": None})[0]
+        with_vehicle = resolve_fault_parts(index, [["radiator"]], {"vehicle_model": "Swift"})[0]
+        assert 6 not in [p["item_code"] for p in without_vehicle]
+        assert 6 in [p["item_code"] for p in with_vehicle]
+
+    def test_part_number_match(self, index):
+        parts = resolve_fault_parts(index, [["rad-1"]])[0]
+        assert [p["item_code"] for p in parts] == [8]
+
+    def test_each_fault_gets_its_own_dicts(self, index):
+        first, second = resolve_fault_parts(index, [["radiator"], ["radiator"]])
+        first[0]["fault_type"] = "cooling_system_failure"
+        assert "fault_type" not in second[0]
+
+    def test_empty_keywords(self, index):
+        assert resolve_fault_parts(index, [[], []]) == [[], []]
+
+    def test_fetch_items_by_code(self, index):
+        rows = fetch_items(index, [3, 7, 99])
+        assert list(rows) == [3]  # deleted and unknown codes dropped
+        assert rows[3]["itemname"] == "RADIATOR CAP" and rows[3]["category"] == "RADIATOR"
+
+
+# ─── Category lookup ──────────────────────────────────────────────────────────
+class TestCategoryItems:
+    def test_category_filter_and_stock_order(self, index):
+        rows = search_category_items(index, "radiator")
+        assert [r["itemcode"] for r in rows] == [3, 1]
+
+    def test_unknown_category_is_unfiltered(self, index):
+        rows = search_category_items(index, "unknown", limit=3)
+        assert [r["itemcode"] for r in rows] == [6, 3, 8]
+
+
+# ─── Parts catalogue ──────────────────────────────────────────────────────────
+WORDS = ["RADIATOR", "HOSE", "PUMP", "WATER", "BRAKE", "PAD", "SWIFT", "CITY", "CLUTCH", "PLATE",
+         "FILTER", "OIL", "AIR", "BEARING", "SHOCK", "ABSORBER", "WIPER", "BLADE", "MIRROR", "LAMP"]
+GROUPS = ["RADIATOR", "BRAKES", "FILTERS", "SUSPENSION", "ELECTRICALS", None]
+MAKES = ["MARUTI", "HONDA", "HYUNDAI", None]
+
+
+def random_items(count, seed):
+    rng = random.Random(seed)
+    return [item(
+        code, " ".join(rng.sample(WORDS, rng.randint(1, 4))), rng.choice(GROUPS), rng.choice(MAKES),
+        curstock=rng.choice([0, 0, 1, 2, 5, 10]), sprice=rng.randint(1, 50) * 10,
+        suppref=rng.choice([None, f"P{rng.randint(100, 999)}-{rng.choice(WORDS)[:3]}"]),
+        deleted=rng.random() < 0.05,
+    ) for code in range(1, count + 1)]
+
+
+class TestPartsCatalogue:
+    def test_token_index_candidates_are_a_superset(self):
+        tokens = TokenIndex()
+        texts = ["WATER PUMP ASSY", "WATERPUMP", "PUMP-WATER", "RAD-123"]
+        for row, text in enumerate(texts):
+            tokens.add(row, text)
+        for pattern in ["%water_pump%", "%ater%", "%rad-1%", "%pump%", "%P%"]:
+            expected = {row for row, text in enumerate(texts) if like_pattern(pattern).fullmatch(text)}
+            found = tokens.candidates(pattern)
+            assert found is None or expected <= found, pattern
+        assert tokens.candidates("%P%") is None
+
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_matches_full_scan(self, seed):
+        items = random_items(400, seed)
+        scan, catalogue = InMemoryPartsIndex(items), catalogue_of(items)
+        keywords = ["radiator", "water_pump", "brake", "oil", "p1", "filter", "xyz"]
+        for vehicle in [{}, {"vehicle_make": "maruti"}, {"vehicle_make": "honda", "vehicle_model": "city"}]:
+            assert resolve_fault_parts(catalogue, [keywords], vehicle) == resolve_fault_parts(scan, [keywords], vehicle)
+        for category in ["radiator", "brake", "unknown", None, "nothing"]:
+            assert search_category_items(catalogue, category) == search_category_items(scan, category)
+
+    def test_incremental_updates(self):
+        catalogue = catalogue_of(SAMPLE_ITEMS)
+        record = {"itemcode": 3, "itemname": "RADIATOR CAP 1.1 BAR", "suppref": None, "packing": None,
+                  "unit": "NOS", "groupid": None, "makeid": None, "brandid": None,
+                  "sprice": 55, "mrp": 60, "curstock": 0, "deleted": False, "edited_date": None}
+        catalogue.apply([record], ledger_watermark=42)
+        cap = [r for r in search_category_items(catalogue, "unknown", limit=20) if r["itemcode"] == 3][0]
+        assert cap["itemname"] == "RADIATOR CAP 1.1 BAR" and cap["curstock"] == 0
+        assert catalogue.stats()["ledger_watermark"] == 42
+
+        catalogue.apply([dict(record, deleted=True)])
+        assert 3 not in [p["item_code"] for p in resolve_fault_parts(catalogue, [["radiator"]])[0]]
+        catalogue.apply([dict(record, itemcode=99, itemname="RADIATOR FAN MOTOR", curstock=7)])
+        assert 99 in [p["item_code"] for p in resolve_fault_parts(catalogue, [["fan_motor"]])[0]]
+        assert catalogue.stats()["items"] == len([i for i in SAMPLE_ITEMS if not i["deleted"]])
+
+
+    def test_failed_first_load_backs_off(self, monkeypatch):
+        attempts = []
+
+        def unreachable():
+            attempts.append(1)
+            raise ConnectionError("database unreachable")
+
+        monkeypatch.setattr(parts_catalogue, "pooled_connection", unreachable)
+        monkeypatch.setattr(parts_catalogue, "parts_catalogue", PartsCatalogue(retry_seconds=60))
+        for _ in range(3):
+            assert parts_catalogue.catalogue_source() is None
+        assert len(attempts) == 1
+
+        parts_catalogue.parts_catalogue.load_failed_at -= 60
+        assert parts_catalogue.catalogue_source() is None
+        assert len(attempts) == 2
+
+    def test_no_load_without_database(self, monkeypatch):
+        monkeypatch.setattr(parts_catalogue, "pooled_connection", lambda: pytest.fail("catalogue load attempted"))
+        monkeypatch.setattr(parts_catalogue, "parts_catalogue", PartsCatalogue())
+        assert parts_catalogue.catalogue_source(load=False) is None
+
+        catalogue = catalogue_of(SAMPLE_ITEMS)
+        catalogue.loaded_at = catalogue.refreshed_at
+        monkeypatch.setattr(parts_catalogue, "parts_catalogue", catalogue)
+        assert parts_catalogue.catalogue_source(load=False) is catalogue
+
+
+# ─── Query builders ───────────────────────────────────────────────────────────
+class TestQueryBuilders:
+    def test_fault_query_variants(self):
+        assert "%(make)s AND i.itemname ILIKE %(model)s" not in fault_parts_query(vehicle=False, trigram=False)
+        assert "%(make)s AND i.itemname ILIKE %(model)s" in fault_parts_query(vehicle=True, trigram=False)
+        assert "word_similarity" in fault_parts_query(vehicle=False, trigram=True)
+        assert "LOWER(" not in fault_parts_query(vehicle=True, trigram=True)
+
+    def test_category_query_variants(self):
+        assert "%(pattern)s" not in category_items_query(filtered=False, trigram=True)
+        assert "similarity(g.groupname" in category_items_query(filtered=True, trigram=True)
+
+    def test_specific_query_placeholders(self):
+        keywords = {"brands": ["BOSCH"], "part_numbers": ["0986AB"], "car_models": ["BOLERO"],
+                    "other_keywords": ["CLUTCH", "SLAVE", "CYLINDER"]}
+        query, params = specific_parts_query(keywords, "clutch", trigram=True)
+        assert query.count("%s") == len(params)
+        assert params[-1] == 20
+        assert "word_similarity" in query
@@ -0,0 +1,96 @@
+"""
+ONNX encoder export tests: the model and its tokenizer appear together in one
+rename, a failed export leaves nothing behind, and a finished export is reused
+(a tiny word-level transformer stands in for the hub model, no downloads).
+
+Run: cd ML && pytest test_sentence_encoder.py -v
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from tokenizers import Tokenizer, models, pre_tokenizers  # noqa: E402
+
+import sentence_encoder  # noqa: E402
+from sentence_encoder import OnnxSentenceEncoder  # noqa: E402
+
+VOCABULARY = ["[PAD]", "[UNK]", "brake", "noise", "when", "stopping", "engine", "overheating"]
+
+
+class TinyTokenizer:
+    """Stand-in for AutoTokenizer: word-level tokenizer saved as tokenizer.json"""
+
+    def __init__(self, fail_on_save=False):
+        self.tokenizer = Tokenizer(models.WordLevel({w: i for i, w in enumerate(VOCABULARY)}, unk_token="[UNK]"))
+        self.tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+        self.fail_on_save = fail_on_save
+
+    def __call__(self, texts, return_tensors="pt"):
+        ids = [self.tokenizer.encode(text).ids for text in texts]
+        return {"input_ids": torch.tensor(ids), "attention_mask": torch.ones(len(ids), len(ids[0]), dtype=torch.long)}
+
+    def save_pretrained(self, directory):
+        if self.fail_on_save:
+            raise OSError("disk full")
+        self.tokenizer.save(os.path.join(directory, "tokenizer.json"))
+        with open(os.path.join(directory, "tokenizer_config.json"), "w", encoding="utf-8") as f:
+            json.dump({"pad_token": "[PAD]"}, f)
+
+
+class TinyTransformer(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.embeddings = torch.nn.Embedding(len(VOCABULARY), 8)
+
+    def forward(self, input_ids=None, attention_mask=None):
+        return (self.embeddings(input_ids) * attention_mask.unsqueeze(-1),)
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentence_encoder, "ARTIFACT_DIR", str(tmp_path))
+    hub = {"tokenizer": TinyTokenizer(), "exports": 0}
+
+    def from_pretrained(name):
+        hub["exports"] += 1
+        return TinyTransformer()
+
+    monkeypatch.setattr(transformers.AutoModel, "from_pretrained", staticmethod(from_pretrained))
+    monkeypatch.setattr(transformers.AutoTokenizer, "from_pretrained", staticmethod(lambda name: hub["tokenizer"]))
+    hub["root"] = tmp_path / "onnx"
+    return hub
+
+
+class TestOnnxExport:
+    @pytest.mark.parametrize("quantize, variant", [(False, "fp32"), (True, "int8")])
+    def test_export_holds_model_and_tokenizer(self, hub, quantize, variant):
+        encoder = OnnxSentenceEncoder("tiny-model", quantize=quantize, threads=1)
+        assert sorted(os.listdir(hub["root"])) == [f"tiny-model-{variant}"]
+        assert sorted(os.listdir(hub["root"] / f"tiny-model-{variant}")) == [
+            "model.onnx", "tokenizer.json", "tokenizer_config.json"]
+        embeddings = encoder.encode(["brake noise when stopping", "engine overheating"])
+        assert embeddings.shape == (2, 8)
+        np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1, rtol=1e-5)
+
+    def test_failed_export_leaves_nothing_behind(self, hub):
+        hub["tokenizer"] = TinyTokenizer(fail_on_save=True)
+        with pytest.raises(OSError, match="disk full"):
+            OnnxSentenceEncoder("tiny-model", quantize=False, threads=1)
+        assert os.listdir(hub["root"]) == []
+
+        hub["tokenizer"] = TinyTokenizer()
+        OnnxSentenceEncoder("tiny-model", quantize=False, threads=1)
+        assert hub["exports"] == 2
+
+    def test_finished_export_is_reused(self, hub):
+        first = OnnxSentenceEncoder("tiny-model", quantize=False, threads=1)
+        second = OnnxSentenceEncoder("tiny-model", quantize=False, threads=1)
+        assert hub["exports"] == 1
+        np.testing.assert_array_equal(first.encode(["brake noise"]), second.encode(["brake noise"]))
@@ -0,0 +1,121 @@
+"""
+Settlement schedule and forecast blend tests: projection of open balances onto
+expected settlement days, per-tran_type failure isolation, and scheduled flows
+blended into CashFlowPredictor.predict (fitted and fallback).
+
+Run: cd ML && pytest test_settlement_schedule.py -v
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cashflow_predictor import CashFlowPredictor
+from customer_scoring import CustomerPaymentScorer
+from settlement_schedule import SettlementScheduleBuilder
+
+START = datetime(2024, 6, 1)
+QUANTILES = np.array([5.0, 10.0, 20.0, 30.0, 40.0])
+
+
+class FakeConnection:
+    """Returns the given rows for the open-balance query"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeScorer:
+    DELAY_QUANTILES = CustomerPaymentScorer.DELAY_QUANTILES
+
+    def __init__(self, failing=()):
+        self.failing = failing
+
+    def delay_quantile_table(self, conn, tran_type):
+        if tran_type in self.failing:
+            raise ValueError(f"{tran_type} scoring failed")
+        return np.array([1]), QUANTILES[None, :], QUANTILES
+
+
+ROWS = [
+    (1, 'SAL', datetime(2024, 6, 1), 1000.0),
+    (2, 'PUR', datetime(2024, 6, 1), 400.0),
+]
+
+
+# ─── Schedule ─────────────────────────────────────────────────────────────────
+class TestSettlementSchedule:
+    def test_project_spreads_over_party_quantiles(self):
+        builder = SettlementScheduleBuilder(FakeScorer())
+        balances = pd.DataFrame({'party_id': [1], 'tran_date': [pd.Timestamp(START)], 'open_amount': [1000.0]})
+        schedule = builder.project(balances, np.array([1]), QUANTILES[None, :], QUANTILES, START, 60)
+        expected = np.zeros(60)
+        expected[QUANTILES.astype(int)] = 1000 * builder.quantile_mass
+        np.testing.assert_allclose(schedule, expected)
+        assert schedule.sum() == pytest.approx(1000)
+
+    def test_past_points_move_to_the_future_and_overdue_lags(self):
+        builder = SettlementScheduleBuilder(FakeScorer(), overdue_lag_days=14)
+        balances = pd.DataFrame({
+            'party_id': [1, 1],
+            'tran_date': [pd.Timestamp('2024-05-17'), pd.Timestamp('2024-01-01')],  # 15 and 152 days old
+            'open_amount': [100.0, 50.0],
+        })
+        schedule = builder.project(balances, np.array([1]), QUANTILES[None, :], QUANTILES, START, 60)
+        assert schedule[:5].sum() == 0 and schedule[5] > 0  # the 20-day point is 5 days out
+        assert schedule[14] == pytest.approx(50)  # overdue beyond every quantile: expected after the lag
+        assert schedule.sum() == pytest.approx(150)
+
+    def test_build(self):
+        result = SettlementScheduleBuilder(FakeScorer()).build(FakeConnection(ROWS), START, 60)
+        assert result['inflow'].sum() == pytest.approx(1000) and result['outflow'].sum() == pytest.approx(400)
+        assert (result['open_receivables'], result['open_payables'], result['unscheduled']) == (1000, 400, [])
+
+    def test_one_side_failing_keeps_the_other(self):
+        result = SettlementScheduleBuilder(FakeScorer(failing=('PUR',))).build(FakeConnection(ROWS), START, 60)
+        assert result['inflow'].sum() == pytest.approx(1000)
+        assert not result['outflow'].any() and result['unscheduled'] == ['outflow']
+
+
+# ─── Forecast blend ───────────────────────────────────────────────────────────
+def history(days=40):
+    dates = pd.date_range('2024-04-01', periods=days)
+    return pd.DataFrame({'date': dates, 'inflow': 1000.0, 'outflow': 800.0, 'net_flow': 200.0})
+
+
+KNOWN = {'inflow': np.array([5000.0] + [0.0] * 9), 'outflow': np.zeros(10)}
+
+
+class TestKnownFlowBlend:
+    def test_fitted_model_adds_only_the_residual(self):
+        predictor = CashFlowPredictor()
+        data = history()
+        assert predictor.fit(data)
+        result = predictor.predict(START, 10, 10000, data, known_flows=KNOWN)
+        inflows = [p['predicted_inflow'] for p in result['predictions']]
+        # Model level 1000 minus the scheduled daily level 500 on top of the schedule
+        assert inflows == pytest.approx([5500.0] + [500.0] * 9)
+        assert result['model_info']['known_flows_blended'] and result['model_info']['scheduled_inflow'] == 5000
+
+    def test_fallback_blends_too(self):
+        np.random.seed(0)
+        data = history(5)
+        data['net_flow'] = 0.0  # no noise
+        result = CashFlowPredictor().predict(START, 10, 10000, data, known_flows=KNOWN)
+        inflows = [p['predicted_inflow'] for p in result['predictions']]
+        assert inflows == pytest.approx([5500.0] + [500.0] * 9)
+        assert result['model_info']['known_flows_blended'] and not result['model_info']['is_fitted']
@@ -0,0 +1,103 @@
+"""
+Vector index tests: approximate indexes against exact search, masks, and
+save/load round trips (memory-mapped) of indexes and the repair history.
+
+Run: cd ML && pytest test_vector_index.py -v
+"""
+
+import numpy as np
+import pytest
+
+import repair_history
+from repair_history import RepairHistory, build_history
+from vector_index import HNSW_AVAILABLE, ExactIndex, IVFIndex, build_vector_index, l2_normalize, load_vector_index
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(3)
+    centres = rng.standard_normal((20, 32)).astype(np.float32)
+    labels = rng.integers(0, 20, 3000)
+    vectors = l2_normalize(centres[labels] + 0.4 * rng.standard_normal((3000, 32)).astype(np.float32))
+    queries = l2_normalize(vectors[:50] + 0.2 * rng.standard_normal((50, 32)).astype(np.float32))
+    return vectors, labels, queries
+
+
+# ─── Indexes ──────────────────────────────────────────────────────────────────
+class TestIndexes:
+    def test_exact_matches_brute_force(self, corpus):
+        vectors, _, queries = corpus
+        scores, ids = ExactIndex.build(vectors).search(queries, 5)
+        expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+        assert (ids == expected).all()
+        assert np.allclose(scores, np.take_along_axis(queries @ vectors.T, expected, axis=1), atol=1e-5)
+
+    def test_ivf_probing_every_list_is_exact(self, corpus):
+        vectors, _, queries = corpus
+        ivf = IVFIndex.build(vectors, nlist=16)
+        ivf.nprobe = 16
+        assert (ivf.search(queries, 10)[1] == ExactIndex.build(vectors).search(queries, 10)[1]).all()
+
+    def test_ivf_recall(self, corpus):
+        vectors, _, queries = corpus
+        exact_ids = ExactIndex.build(vectors).search(queries, 10)[1]
+        ivf_ids = IVFIndex.build(vectors, nlist=64).search(queries, 10)[1]
+        recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact_ids, ivf_ids)])
+        assert recall > 0.9
+
+    @pytest.mark.parametrize("kind", ["exact", "ivf"] + (["hnsw"] if HNSW_AVAILABLE else []))
+    def test_mask_restricts_hits(self, corpus, kind):
+        vectors, labels, queries = corpus
+        mask = labels < 3
+        _, ids = build_vector_index(vectors, kind).search(queries, 8, mask)
+        assert all(mask[i] for i in ids.ravel() if i >= 0)
+        assert (ids[:, 0] >= 0).all()
+
+    def test_fewer_vectors_than_k(self):
+        scores, ids = ExactIndex.build(np.eye(3, dtype=np.float32)).search(np.ones((1, 3)), 5)
+        assert list(ids[0]) == [0, 1, 2, -1, -1]
+        assert np.isinf(scores[0, 3:]).all()
+
+    @pytest.mark.parametrize("kind", ["exact", "ivf"])
+    def test_save_and_load_memory_mapped(self, corpus, tmp_path, kind):
+        vectors, _, queries = corpus
+        index = build_vector_index(vectors, kind)
+        index.save(str(tmp_path / "index"))
+        loaded = load_vector_index(str(tmp_path / "index"))
+        assert isinstance(loaded.vectors, np.memmap)
+        assert (loaded.search(queries, 5)[1] == index.search(queries, 5)[1]).all()
+
+    def test_missing_index(self, tmp_path):
+        assert load_vector_index(str(tmp_path)) is None
+
+
+# ─── Repair history ───────────────────────────────────────────────────────────
+class FixedEncoder:
+    model_id = "test-encoder"
+
+    def __init__(self, vectors):
+        self.vectors = {}
+        self._pending = list(vectors)
+
+    def encode(self, texts, batch_size=32):
+        return np.stack([self.vectors.setdefault(t, self._pending.pop(0)) for t in texts])
+
+
+class TestRepairHistory:
+    def test_build_load_and_filter(self, corpus, tmp_path, monkeypatch):
+        monkeypatch.setattr(repair_history, "HISTORY_DIR", str(tmp_path))
+        vectors, labels, queries = corpus
+        faults = [f"fault_{i}" for i in range(20)]
+        records = [{"symptom": f"symptom {i}", "fault": faults[label], "job_card_id": f"JC{i}"}
+                   for i, label in enumerate(labels)]
+        build_history(records, FixedEncoder(vectors), kind="exact")
+
+        history = RepairHistory.load()
+        assert len(history) == len(records) and history.model_id == "test-encoder"
+        hits = history.neighbours(vectors[:1], 3, [set()])[0]
+        assert hits[0][0] == faults[labels[0]] and hits[0][2] == "JC0"
+
+        hits = history.neighbours(queries[:1], 3, [{"fault_1"}])[0]
+        assert {fault for fault, _, _ in hits} == {"fault_1"}
+        history.restrict_to(["fault_2"])
+        assert history.neighbours(queries[:1], 3, [{"fault_1"}])[0] == []
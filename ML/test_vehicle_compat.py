@@ -0,0 +1,144 @@
+"""
+Vehicle compatibility index tests (no database needed).
+
+Run: cd ML && pytest test_vehicle_compat.py -v
+"""
+
+import pytest
+
+from conftest import catalogue_of, item
+from parts_search import InMemoryPartsIndex, fault_parts_query, resolve_fault_parts
+from vehicle_compat import Fitment, FitmentIndex, VehicleVocabulary, compact, model_pieces, parse_years
+
+
+@pytest.fixture(scope="module")
+def vocabulary():
+    return VehicleVocabulary()
+
+
+# ─── Parsing ──────────────────────────────────────────────────────────────────
+class TestParsing:
+    def test_normalized_names(self):
+        assert compact("WAGON-R") == compact("Wagon R") == compact("wagonr") == "wagonr"
+        assert compact("I-20") == "i20"
+
+    @pytest.mark.parametrize("text, years", [
+        ("BRAKE PAD SWIFT 2012-2017", (2012, 2017)),
+        ("BRAKE PAD SWIFT 2012-17", (2012, 2017)),
+        ("CLUTCH PLATE 1998-02", (1998, 2002)),
+        ("MIRROR 2015 TO 2019", (2015, 2019)),
+        ("BUMPER CRETA 2018+", (2018, None)),
+        ("BUMPER CRETA 2018 ONWARDS", (2018, None)),
+        ("HEAD LAMP I20 2014", (2014, None)),
+        ("OIL FILTER 1200CC", (None, None)),
+    ])
+    def test_years(self, text, years):
+        assert parse_years(text) == years
+
+    def test_models_and_makes_from_item_name(self, vocabulary):
+        fitments = vocabulary.fitments("BRAKE PAD SWIFT DZIRE 2012-17")
+        assert {(f.make, f.model) for f in fitments} == {("maruti", "swift"), ("maruti", "dzire"), ("maruti", "swiftdzire")}
+        assert all((f.year_from, f.year_to) == (2012, 2017) for f in fitments)
+        assert {(f.make, f.model) for f in vocabulary.fitments("SUZUKI WAGON-R CLUTCH")} == {("maruti", "wagonr"), ("maruti", "")}
+
+    def test_make_column(self, vocabulary):
+        assert vocabulary.fitments("RADIATOR CAP", "MARUTI SUZUKI") == {Fitment("maruti", "", None, None, "make")}
+
+    def test_everyday_words_need_the_make(self, vocabulary):
+        assert vocabulary.fitments("SPARK PLUG") == frozenset()
+        assert vocabulary.fitments("CITY BRAKE PAD") == frozenset()
+        assert ("honda", "city") in {(f.make, f.model) for f in vocabulary.fitments("CITY BRAKE PAD", "HONDA")}
+
+    def test_model_column_extends_the_vocabulary(self):
+        vocabulary = VehicleVocabulary()
+        assert model_pieces("SWIFT/DZIRE, ALL") == ["SWIFT", "DZIRE"]
+        assert vocabulary.learn(["ASHOK LEYLAND"], [("ASHOK LEYLAND", "DOST PLUS")])
+        assert not vocabulary.learn(["ASHOK LEYLAND"], [("ASHOK LEYLAND", "DOST PLUS")])
+        assert ("ashokleyland", "dostplus") in {(f.make, f.model) for f in vocabulary.fitments("DOST PLUS KING PIN")}
+
+    def test_resolve(self, vocabulary):
+        assert vocabulary.resolve("Maruti Suzuki", "Swift Dzire") == ("maruti", frozenset({"swiftdzire"}))
+        assert vocabulary.resolve("Hyundai", "Grand i10") == ("hyundai", frozenset({"grandi10"}))
+        assert vocabulary.resolve("Honda", "Swift") == ("honda", None)  # not a Honda model
+        assert vocabulary.resolve("Unknown Motors", "Xyz") == (None, None)
+
+
+# ─── In-memory index ──────────────────────────────────────────────────────────
+class TestFitmentIndex:
+    def test_set_lookups_and_years(self):
+        index = FitmentIndex.of([
+            item(1, "BRAKE PAD SWIFT 2005-2010", makename="MARUTI"),
+            item(2, "BRAKE PAD SWIFT 2011+"),
+            item(3, "RADIATOR CAP", makename="MARUTI"),
+            item(4, "HEAD LAMP CRETA"),
+        ])
+        assert index.items_fitting("maruti", frozenset({"swift"})) == {1, 2}
+        assert index.items_fitting("maruti", frozenset({"swift"}), year=2008) == {1}
+        assert index.items_fitting("maruti", None) == {1, 2, 3}
+        assert index.items_fitting(None, frozenset({"creta"})) == {4}
+        index.discard(1)
+        assert index.items_fitting("maruti", None) == {2, 3}
+
+
+# ─── Parts search ─────────────────────────────────────────────────────────────
+FITMENT_ITEMS = [
+    item(1, "BRAKE PAD WAGON-R", "BRAKES", curstock=2),
+    item(2, "BRAKE PAD ALTO 2005-2010", "BRAKES", "MARUTI", curstock=2),
+    item(3, "BRAKE PAD I20", "BRAKES", "HYUNDAI", curstock=2),
+    item(4, "BRAKE PAD UNIVERSAL", "BRAKES", curstock=2),
+    item(5, "WAGONR DOOR HANDLE", "BODY", curstock=1),
+]
+
+
+@pytest.fixture(params=["scan", "catalogue"])
+def index(request):
+    if request.param == "catalogue":
+        return catalogue_of(FITMENT_ITEMS)
+    return InMemoryPartsIndex(FITMENT_ITEMS)
+
+
+class TestVehicleAwareSearch:
+    def test_model_spellings_match(self, index):
+        parts = resolve_fault_parts(index, [["brake"]], {"vehicle_make": "Maruti Suzuki", "vehicle_model": "Wagon R"})[0]
+        assert parts[0]["item_code"] == 1 and parts[0]["relevance_score"] == 100
+        assert 5 in [p["item_code"] for p in parts]  # vehicle-only candidate, WAGONR spelling
+
+    def test_make_from_item_name(self, index):
+        scores = {p["item_code"]: p["relevance_score"]
+                  for p in resolve_fault_parts(index, [["brake"]], {"vehicle_make": "Maruti"})[0]}
+        assert scores[1] == scores[2] == 100  # no model given: every name hit is a model fit
+        scores = {p["item_code"]: p["relevance_score"]
+                  for p in resolve_fault_parts(index, [["brake"]], {"vehicle_make": "Maruti", "vehicle_model": "Alto"})[0]}
+        assert scores[2] == 100 and scores[1] == 90 and scores[3] == 80  # WAGON-R name says maruti
+
+    def test_year_filter(self, index):
+        alto = {"vehicle_make": "Maruti", "vehicle_model": "Alto"}
+        assert resolve_fault_parts(index, [["brake"]], dict(alto, vehicle_year=2008))[0][0]["item_code"] == 2
+        assert resolve_fault_parts(index, [["brake"]], dict(alto, vehicle_year=2015))[0][0]["relevance_score"] < 100
+
+    def test_unknown_vehicle_falls_back_to_names(self, index):
+        parts = resolve_fault_parts(index, [["brake"]], {"vehicle_model": "universal"})[0]
+        assert parts[0]["item_code"] == 4 and parts[0]["relevance_score"] == 100
+
+    def test_catalogue_reparses_on_new_models(self):
+        catalogue = catalogue_of([item(1, "DOST PLUS BRAKE SHOE", "BRAKES", curstock=1),
+                                  item(2, "BRAKE SHOE", "BRAKES", "ASHOK LEYLAND", curstock=1)])
+        vehicle = {"vehicle_make": "Ashok Leyland", "vehicle_model": "Dost Plus"}
+        record = {"itemcode": 2, "itemname": "BRAKE SHOE", "suppref": None, "packing": None, "unit": "NOS",
+                  "groupid": 1, "makeid": 1, "brandid": 1, "sprice": 100, "mrp": 100, "curstock": 1,
+                  "deleted": False, "edited_date": None, "model": "DOST PLUS"}
+        catalogue.apply([record])
+        scores = {p["item_code"]: p["relevance_score"] for p in resolve_fault_parts(catalogue, [["brake"]], vehicle)[0]}
+        assert scores == {1: 100, 2: 100}
+
+
+class TestFitmentQuery:
+    def test_fitment_variants(self):
+        plain = fault_parts_query(vehicle=True, trigram=False)
+        assert "item_vehicle_fitment" not in plain
+        both = fault_parts_query(vehicle=True, trigram=False, fit_make=True, fit_model=True)
+        assert "f.make = %(make_key)s" in both and "COALESCE(ft.model_fit, false) AND" in both
+        assert "i.itemname ILIKE %(make)s" not in both
+        make_only = fault_parts_query(vehicle=True, trigram=False, fit_make=True)
+        assert "i.itemname ILIKE %(model)s AND i.itemname ILIKE mt.part_pattern" in make_only
+        assert "ft.itemcode IS NOT NULL" in make_only
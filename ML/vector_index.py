@@ -0,0 +1,313 @@
+"""
+Nearest-neighbour indexes over L2-normalised embeddings (inner product = cosine).
+
+  - ExactIndex: one matrix product over every vector (reference, small corpora)
+  - IVFIndex:   spherical k-means coarse quantizer; vectors are stored grouped by
+                list so a query scans only the nprobe lists closest to it
+  - HNSWIndex:  hnswlib graph, when hnswlib is installed
+
+Indexes are built offline (build_history_index.py), saved as a directory of
+.npy files plus meta.json, and loaded memory-mapped so worker processes share
+the pages. Every index takes an optional boolean mask over vector ids so
+callers can restrict hits (e.g. to the faults allowed by SYSTEM_KEYWORDS)
+without over-fetching.
+"""
+
+import os
+import json
+import shutil
+import logging
+import importlib.util
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from artifacts import load_array, save_array
+
+logger = logging.getLogger(__name__)
+
+HNSW_AVAILABLE = importlib.util.find_spec("hnswlib") is not None
+
+# Below this many vectors brute force is as fast as any index
+IVF_MIN_VECTORS = int(os.getenv("VECTOR_INDEX_IVF_MIN", "20000"))
+IVF_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "48"))
+HNSW_EF_SEARCH = int(os.getenv("VECTOR_INDEX_EF_SEARCH", "96"))
+
+META_FILE = "meta.json"
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _pad(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    out_scores = np.full(k, -np.inf, dtype=np.float32)
+    out_ids = np.full(k, -1, dtype=np.int64)
+    out_scores[:len(scores)] = scores
+    out_ids[:len(ids)] = ids
+    return out_scores, out_ids
+
+
+class VectorIndex:
+    """Top-k inner-product search; ids are row numbers of the vectors the index was built from"""
+
+    kind = "base"
+
+    def __init__(self, dimension: int, count: int, info: Optional[Dict] = None):
+        self.dimension = dimension
+        self.count = count
+        self.info = dict(info or {})
+
+    def __len__(self) -> int:
+        return self.count
+
+    def search(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (scores, ids), each (len(queries), k), best first. Missing hits (fewer than
+        k vectors, or filtered out by mask) have id -1 and score -inf.
+        """
+        queries = l2_normalize(np.atleast_2d(queries))
+        results = [self._search_one(query, k, mask) for query in queries]
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+
+    def _search_one(self, query: np.ndarray, k: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def _meta(self) -> Dict:
+        return {"kind": self.kind, "dimension": self.dimension, "count": self.count, "info": self.info}
+
+    def save(self, directory: str):
+        """Write the index to directory (built in a temp directory, then renamed into place)"""
+        tmp_dir = f"{directory.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, array in self._arrays().items():
+            save_array(os.path.join(tmp_dir, f"{name}.npy"), array)
+        self._save_extra(tmp_dir)
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(self._meta(), f, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+    def _save_extra(self, directory: str):
+        pass
+
+
+class ExactIndex(VectorIndex):
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray, info: Optional[Dict] = None):
+        super().__init__(vectors.shape[1], vectors.shape[0], info)
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, info: Optional[Dict] = None) -> "ExactIndex":
+        return cls(l2_normalize(vectors), info)
+
+    def search(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = l2_normalize(np.atleast_2d(queries))
+        scores = queries @ self.vectors.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        all_scores, all_ids = [], []
+        for row in scores:
+            top = _top_k(row, k)
+            top = top[np.isfinite(row[top])]
+            s, i = _pad(row[top], top, k)
+            all_scores.append(s)
+            all_ids.append(i)
+        return np.stack(all_scores), np.stack(all_ids)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {"vectors": self.vectors}
+
+    @classmethod
+    def _load(cls, directory: str, meta: Dict) -> "ExactIndex":
+        return cls(load_array(os.path.join(directory, "vectors.npy")), meta.get("info"))
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index. vectors/ids are sorted by list; list j is
+    vectors[offsets[j]:offsets[j + 1]], ids[...] holds the original row numbers.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, ids: np.ndarray, offsets: np.ndarray,
+                 info: Optional[Dict] = None, nprobe: int = IVF_NPROBE):
+        super().__init__(vectors.shape[1], vectors.shape[0], info)
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, batch: int = 16384) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + batch] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), batch)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, iterations: int = 20,
+              sample_size: int = 100_000, seed: int = 0, info: Optional[Dict] = None) -> "IVFIndex":
+        vectors = l2_normalize(vectors)
+        n = len(vectors)
+        nlist = max(1, min(n, nlist or int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+
+        # Spherical k-means on a sample, then assign every vector
+        sample = vectors[rng.choice(n, size=min(n, max(sample_size, nlist * 32)), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = l2_normalize(sums)
+
+        assignment = cls._assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+        return cls(centroids, vectors[order], order.astype(np.int64), offsets, info)
+
+    def _search_one(self, query: np.ndarray, k: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        centroid_scores = self.centroids @ query
+        if mask is None:
+            lists = _top_k(centroid_scores, min(self.nprobe, len(self.centroids)))
+            spans = [(self.offsets[j], self.offsets[j + 1]) for j in lists if self.offsets[j + 1] > self.offsets[j]]
+            if not spans:
+                return _pad(np.zeros(0), np.zeros(0, dtype=np.int64), k)
+            ids = np.concatenate([self.ids[a:b] for a, b in spans])
+            vectors = np.concatenate([self.vectors[a:b] for a, b in spans])
+        else:
+            # Keep probing lists (closest first) until as many allowed vectors are
+            # scanned as an unfiltered probe would scan, so recall holds for narrow filters
+            target = max(k, self.nprobe * self.count // len(self.centroids))
+            positions, found = [], 0
+            for j in np.argsort(-centroid_scores):
+                a, b = self.offsets[j], self.offsets[j + 1]
+                allowed = np.flatnonzero(mask[self.ids[a:b]])
+                if len(allowed):
+                    positions.append(allowed + a)
+                    found += len(allowed)
+                    if found >= target:
+                        break
+            if not positions:
+                return _pad(np.zeros(0), np.zeros(0, dtype=np.int64), k)
+            positions = np.concatenate(positions)
+            ids = self.ids[positions]
+            vectors = self.vectors[positions]
+        scores = vectors @ query
+        top = _top_k(scores, k)
+        return _pad(scores[top], ids[top], k)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids, "vectors": self.vectors, "ids": self.ids, "offsets": self.offsets}
+
+    def _meta(self) -> Dict:
+        return {**super()._meta(), "nlist": len(self.centroids)}
+
+    @classmethod
+    def _load(cls, directory: str, meta: Dict) -> "IVFIndex":
+        arrays = {name: load_array(os.path.join(directory, f"{name}.npy"))
+                  for name in ("centroids", "vectors", "ids", "offsets")}
+        # Small arrays probed on every query are read into memory
+        return cls(np.array(arrays["centroids"]), arrays["vectors"], arrays["ids"],
+                   np.array(arrays["offsets"]), meta.get("info"))
+
+
+class HNSWIndex(VectorIndex):
+    """hnswlib graph (loaded into memory; hnswlib has no mmap mode)"""
+
+    kind = "hnsw"
+
+    def __init__(self, graph, dimension: int, count: int, info: Optional[Dict] = None, ef_search: int = HNSW_EF_SEARCH):
+        super().__init__(dimension, count, info)
+        self.graph = graph
+        self.ef_search = ef_search
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, m: int = 16, ef_construction: int = 200,
+              info: Optional[Dict] = None) -> "HNSWIndex":
+        import hnswlib
+        vectors = l2_normalize(vectors)
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction)
+        graph.add_items(vectors, np.arange(len(vectors)))
+        return cls(graph, vectors.shape[1], len(vectors), info)
+
+    def _search_one(self, query: np.ndarray, k: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        k_found = min(k, self.count if mask is None else int(mask.sum()))
+        if k_found == 0:
+            return _pad(np.zeros(0), np.zeros(0, dtype=np.int64), k)
+        self.graph.set_ef(max(self.ef_search, k_found))
+        labels, distances = self.graph.knn_query(
+            query[None, :], k=k_found, filter=None if mask is None else (lambda i: bool(mask[i]))
+        )
+        # hnswlib "ip" distance is 1 - inner product
+        return _pad(1.0 - distances[0], labels[0].astype(np.int64), k)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def _save_extra(self, directory: str):
+        self.graph.save_index(os.path.join(directory, "graph.bin"))
+
+    @classmethod
+    def _load(cls, directory: str, meta: Dict) -> "HNSWIndex":
+        import hnswlib
+        graph = hnswlib.Index(space="ip", dim=meta["dimension"])
+        graph.load_index(os.path.join(directory, "graph.bin"), max_elements=meta["count"])
+        return cls(graph, meta["dimension"], meta["count"], meta.get("info"))
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (ExactIndex, IVFIndex, HNSWIndex)}
+
+
+def build_vector_index(vectors: np.ndarray, kind: str = "auto", info: Optional[Dict] = None, **params) -> VectorIndex:
+    """Build an index: "auto" = exact below IVF_MIN_VECTORS, else HNSW when hnswlib is installed, else IVF"""
+    if kind == "auto":
+        if len(vectors) < IVF_MIN_VECTORS:
+            kind = "exact"
+        else:
+            kind = "hnsw" if HNSW_AVAILABLE else "ivf"
+    if kind == "hnsw" and not HNSW_AVAILABLE:
+        raise ValueError("hnswlib is not installed (pip install hnswlib) - use kind='ivf'")
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index kind: {kind}")
+    return INDEX_TYPES[kind].build(vectors, info=info, **params)
+
+
+def load_vector_index(directory: str) -> Optional[VectorIndex]:
+    """Load a saved index (memory-mapped); None if missing or unreadable"""
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return INDEX_TYPES[meta["kind"]]._load(directory, meta)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load vector index {directory}: {e}")
+        return None
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Vehicle compatibility index: which items fit which make / model / years.
+
+Item fitment is only implicit in the item master: the make id (tblmasmake),
+the free-text model column and make/model/year tokens inside itemname
+("BRAKE PAD SWIFT DZIRE 2012-17", "WAGON-R CLUTCH PLATE"). This module parses
+them once into normalized fitments
+    (make, model, year_from, year_to)    model '' = the whole make
+so vehicle filtering is a set lookup instead of ILIKE scans of every name:
+  - item_vehicle_fitment (backend/migrations/add_item_vehicle_fitment.sql) is
+    built offline by this script and refreshed incrementally from
+    tblmasitem/tblmasmake edited_date; parts_search.py joins it on its
+    (make, model) index when the table exists;
+  - FitmentIndex keeps the same fitments in memory for the in-process parts
+    indexes (parts_search.InMemoryPartsIndex, parts_catalogue.PartsCatalogue).
+
+Names are normalized to lowercase alphanumerics with separators dropped, so
+"WAGON R", "WAGON-R" and "WAGONR" are all model 'wagonr'. The vocabulary is
+a built-in list of common makes/models extended with tblmasmake names and
+the values of tblmasitem.model; vehicles outside it are left to the ILIKE
+matching the parts search used before.
+
+Usage:
+    python vehicle_compat.py [--full]
+"""
+
+import os
+import re
+import sys
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY_TTL_SECONDS = float(os.getenv("VEHICLE_VOCABULARY_TTL_SECONDS", "600"))
+
+BUILTIN_MODELS: Dict[str, List[str]] = {
+    "maruti": ["swift", "swift dzire", "dzire", "alto", "alto 800", "alto k10", "wagon r", "baleno", "ertiga",
+               "brezza", "vitara brezza", "celerio", "ciaz", "ritz", "zen", "zen estilo", "omni", "eeco",
+               "esteem", "gypsy", "s cross", "ignis", "xl6", "a star", "sx4", "stingray", "s presso"],
+    "hyundai": ["santro", "i10", "grand i10", "i20", "elite i20", "creta", "verna", "eon", "xcent", "venue",
+                "accent", "getz", "aura", "alcazar", "tucson"],
+    "honda": ["city", "amaze", "jazz", "brio", "civic", "wr v", "mobilio", "accord", "cr v"],
+    "tata": ["nexon", "tiago", "tigor", "altroz", "harrier", "indica", "indigo", "safari", "sumo", "nano",
+             "ace", "zest", "bolt", "hexa", "punch"],
+    "mahindra": ["bolero", "scorpio", "xuv500", "xuv300", "xuv700", "thar", "xylo", "kuv100", "tuv300",
+                 "marazzo", "quanto", "verito", "logan"],
+    "toyota": ["innova", "innova crysta", "fortuner", "etios", "etios liva", "corolla", "corolla altis",
+               "camry", "qualis", "glanza", "urban cruiser"],
+    "ford": ["ecosport", "figo", "figo aspire", "fiesta", "endeavour", "ikon", "freestyle"],
+    "renault": ["kwid", "duster", "triber", "lodgy", "pulse", "scala", "kiger"],
+    "nissan": ["micra", "sunny", "terrano", "magnite", "kicks"],
+    "volkswagen": ["polo", "vento", "ameo", "jetta", "taigun"],
+    "skoda": ["rapid", "octavia", "superb", "fabia", "laura", "kushaq"],
+    "chevrolet": ["beat", "spark", "cruze", "sail", "enjoy", "tavera", "aveo", "optra"],
+    "kia": ["seltos", "sonet", "carens", "carnival"],
+    "fiat": ["punto", "linea", "palio"],
+}
+
+MAKE_ALIASES: Dict[str, str] = {
+    "maruti suzuki": "maruti", "suzuki": "maruti", "msil": "maruti",
+    "hyundai motors": "hyundai",
+    "tata motors": "tata",
+    "mahindra and mahindra": "mahindra", "mahindra & mahindra": "mahindra",
+    "vw": "volkswagen",
+    "chevy": "chevrolet", "general motors": "chevrolet",
+}
+
+# Model names that are also everyday words in item names ("SPARK PLUG",
+# "CITY BUS"): only counted when the item's make says the same vehicle
+CONTEXT_ONLY_MODELS = {"city", "spark", "beat", "ace", "sail", "enjoy", "rapid", "superb", "sunny",
+                       "venue", "pulse", "scala", "bolt", "punch", "kicks", "aura", "zest", "ritz",
+                       "logan", "glanza", "carnival"}
+
+# tblmasitem.model values that do not name a vehicle
+NON_MODELS = {"all", "universal", "common", "na", "none", "general", "std", "standard", "others", "other"}
+
+MAX_PHRASE_TOKENS = 3
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+_MODEL_SEPARATORS = re.compile(r"[,/;&|]+")
+_YEAR = r"(19[89]\d|20[0-4]\d)"
+_YEAR_RANGE = re.compile(rf"\b{_YEAR}\s*(?:-|to|/)\s*(19[89]\d|20[0-4]\d|\d{{2}})\b")
+_YEAR_FROM = re.compile(rf"\b{_YEAR}\s*(?:\+|on\b|onwards\b)")
+_YEAR_SINGLE = re.compile(rf"\b{_YEAR}\b")
+
+
+def compact(text: Optional[str]) -> str:
+    """Normalized name: lowercase alphanumerics, separators dropped ('Wagon-R' -> 'wagonr')"""
+    return "".join(_TOKEN.findall((text or "").lower()))
+
+
+def parse_years(text: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Model years in an item name: '2012-2017' / '2012-17' / '2012 to 2017' is a
+    range, '2015+' / '2015 on(wards)' and a lone year are open-ended
+    """
+    text = (text or "").lower()
+    match = _YEAR_RANGE.search(text)
+    if match:
+        start, end = int(match.group(1)), match.group(2)
+        if len(end) == 2:
+            end = start // 100 * 100 + int(end)
+            end += 100 if end < start else 0  # '1998-02'
+        return min(start, int(end)), max(start, int(end))
+    match = _YEAR_FROM.search(text) or _YEAR_SINGLE.search(text)
+    if match:
+        return int(match.group(1)), None
+    return None, None
+
+
+class Fitment(NamedTuple):
+    make: str
+    model: str  # '' = any model of the make
+    year_from: Optional[int]
+    year_to: Optional[int]
+    source: str  # 'make' (tblmasmake), 'name' (itemname) or 'model' (tblmasitem.model)
+
+    def covers(self, year: Optional[int]) -> bool:
+        return year is None or ((self.year_from is None or self.year_from <= year)
+                                and (self.year_to is None or year <= self.year_to))
+
+
+class VehicleQuery(NamedTuple):
+    """A requested vehicle in fitment keys; None where it is outside the vocabulary"""
+    make: Optional[str]
+    models: Optional[FrozenSet[str]]
+
+
+class VehicleVocabulary:
+    """Known makes (with aliases) and models, matched as compact phrases of 1-3 name tokens"""
+
+    def __init__(self, models_by_make: Optional[Dict[str, Iterable[str]]] = None):
+        self._make_of: Dict[str, str] = {}  # compact alias -> make key
+        self.makes_of_model: Dict[str, Set[str]] = defaultdict(set)
+        for alias, make in MAKE_ALIASES.items():
+            self._make_of[compact(alias)] = make
+        for make, models in (BUILTIN_MODELS if models_by_make is None else models_by_make).items():
+            self.add_make(make)
+            for model in models:
+                self.add_model(make, model)
+
+    def make_key(self, name: Optional[str]) -> Optional[str]:
+        key = compact(name)
+        return self._make_of.get(key) if key else None
+
+    def add_make(self, name: Optional[str]) -> Optional[str]:
+        key = compact(name)
+        if not key:
+            return None
+        if key not in self._make_of:
+            self._make_of[key] = key
+        return self._make_of[key]
+
+    def add_model(self, make: str, model: str) -> bool:
+        """Register a model of a make key; whether it was new"""
+        key = compact(model)
+        if not key or make in self.makes_of_model.get(key, ()):
+            return False
+        self.makes_of_model[key].add(make)
+        return True
+
+    def learn(self, makes: Iterable[Optional[str]] = (),
+              models: Iterable[Tuple[Optional[str], Optional[str]]] = ()) -> bool:
+        """
+        Add make names (tblmasmake) and (make name, tblmasitem.model) pairs;
+        whether the vocabulary grew (names parsed before may now match more)
+        """
+        grew = False
+        for name in makes:
+            grew |= bool(compact(name)) and compact(name) not in self._make_of
+            self.add_make(name)
+        for make_name, model in models:
+            grew |= bool(compact(make_name)) and compact(make_name) not in self._make_of
+            make = self.add_make(make_name)
+            if make is None:
+                continue
+            for piece in model_pieces(model):
+                if not self.models_in(piece):
+                    grew |= self.add_model(make, piece)
+        return grew
+
+    def digest(self) -> str:
+        """Content hash: the fitment table is rebuilt when the vocabulary changes"""
+        text = repr((sorted(self._make_of.items()), sorted((m, sorted(k)) for m, k in self.makes_of_model.items())))
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def phrases(text: Optional[str]) -> Set[str]:
+        tokens = _TOKEN.findall((text or "").lower())
+        return {"".join(tokens[i:i + n]) for n in range(1, MAX_PHRASE_TOKENS + 1) for i in range(len(tokens) - n + 1)}
+
+    def makes_in(self, text: Optional[str]) -> Set[str]:
+        return {self._make_of[p] for p in self.phrases(text) if p in self._make_of}
+
+    def models_in(self, text: Optional[str]) -> Set[str]:
+        return {p for p in self.phrases(text) if p in self.makes_of_model}
+
+    def fitments(self, itemname: Optional[str], makename: Optional[str] = None,
+                 model: Optional[str] = None) -> FrozenSet[Fitment]:
+        """Fitments of one item from its make name, item name and model column"""
+        year_from, year_to = parse_years(itemname)
+        if year_from is None:
+            year_from, year_to = parse_years(model)
+        item_make = self.make_key(makename)
+        context = self.makes_in(itemname) | self.makes_in(model) | ({item_make} if item_make else set())
+
+        fitments: Dict[Tuple[str, str], Fitment] = {}
+        for source, text in (("model", model), ("name", itemname)):
+            for model_key in self.models_in(text):
+                makes = self.makes_of_model[model_key]
+                chosen = makes & context or (set() if model_key in CONTEXT_ONLY_MODELS else makes)
+                for make in chosen:
+                    fitments.setdefault((make, model_key), Fitment(make, model_key, year_from, year_to, source))
+        for make in sorted(context):
+            source = "make" if make == item_make else "name"
+            fitments.setdefault((make, ""), Fitment(make, "", year_from, year_to, source))
+        return frozenset(fitments.values())
+
+    def resolve(self, make: Optional[str], model: Optional[str]) -> VehicleQuery:
+        """Requested make/model as fitment keys (the longest known model names in `model`)"""
+        make_key = self.make_key(make) if make else None
+        models = None
+        if model:
+            found = self.models_in(model)
+            if make_key is not None:
+                found = {m for m in found if make_key in self.makes_of_model[m]}
+            # 'Swift Dzire' asks for the swiftdzire, not every swift
+            found = {m for m in found if not any(m != other and m in other for other in found)}
+            models = frozenset(found) or None
+        return VehicleQuery(make_key, models)
+
+
+def model_pieces(model: Optional[str]) -> List[str]:
+    """Vehicle names in a tblmasitem.model value ('SWIFT/DZIRE' -> SWIFT, DZIRE)"""
+    pieces = []
+    for piece in _MODEL_SEPARATORS.split(model or ""):
+        key = compact(piece)
+        if len(key) >= 3 and not key.isdigit() and key not in NON_MODELS:
+            pieces.append(piece.strip())
+    return pieces
+
+
+# ── In-memory index ──────────────────────────────────────────────────────────
+class FitmentIndex:
+    """Item code -> fitments, with make and model postings for set lookups"""
+
+    def __init__(self, vocabulary: Optional[VehicleVocabulary] = None):
+        self.vocabulary = vocabulary or VehicleVocabulary()
+        self._fitments: Dict[int, FrozenSet[Fitment]] = {}
+        self._by_make: Dict[str, Set[int]] = defaultdict(set)
+        self._by_model: Dict[str, Set[int]] = defaultdict(set)
+
+    @classmethod
+    def of(cls, items: Iterable[Dict]) -> "FitmentIndex":
+        """Index of joined item rows (itemcode, itemname, makename, optional model)"""
+        items = [item for item in items if not item.get("deleted")]
+        vocabulary = VehicleVocabulary()
+        vocabulary.learn((item.get("makename") for item in items),
+                         ((item.get("makename"), item.get("model")) for item in items))
+        index = cls(vocabulary)
+        for item in items:
+            index.index_item(item["itemcode"], item["itemname"], item.get("makename"), item.get("model"))
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(fitments) for fitments in self._fitments.values())
+
+    def discard(self, itemcode: int):
+        for fitment in self._fitments.pop(itemcode, ()):
+            self._by_make[fitment.make].discard(itemcode)
+            if fitment.model:
+                self._by_model[fitment.model].discard(itemcode)
+
+    def set(self, itemcode: int, fitments: Iterable[Fitment]):
+        self.discard(itemcode)
+        fitments = frozenset(fitments)
+        if not fitments:
+            return
+        self._fitments[itemcode] = fitments
+        for fitment in fitments:
+            self._by_make[fitment.make].add(itemcode)
+            if fitment.model:
+                self._by_model[fitment.model].add(itemcode)
+
+    def index_item(self, itemcode: int, itemname: Optional[str], makename: Optional[str] = None,
+                   model: Optional[str] = None):
+        self.set(itemcode, self.vocabulary.fitments(itemname, makename, model))
+
+    def fitments_of(self, itemcode: int) -> FrozenSet[Fitment]:
+        return self._fitments.get(itemcode, frozenset())
+
+    def items_fitting(self, make: Optional[str], models: Optional[FrozenSet[str]] = None,
+                      year: Optional[int] = None) -> Set[int]:
+        """Items fitting any of the models (of the make, when given), or any model of the make"""
+        if models:
+            candidates = set().union(*(self._by_model.get(model, set()) for model in models))
+            wanted = lambda f: f.model in models and (make is None or f.make == make)
+        elif make:
+            candidates = set(self._by_make.get(make, set()))
+            wanted = lambda f: f.make == make
+        else:
+            return set()
+        return {code for code in candidates
+                if any(wanted(f) and f.covers(year) for f in self._fitments[code])}
+
+
+# ── Fitment table ────────────────────────────────────────────────────────────
+_vocabulary_cache: Tuple[float, Optional[VehicleVocabulary]] = (0.0, None)
+_fitment_table: Optional[bool] = None
+_cache_lock = threading.Lock()
+
+
+def fitment_vocabulary(conn) -> Optional[VehicleVocabulary]:
+    """
+    Vocabulary of the fitment table for resolving requested vehicles (cached for
+    VOCABULARY_TTL_SECONDS), or None when the migration has not been run
+    """
+    global _vocabulary_cache, _fitment_table
+    if _fitment_table is None:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT to_regclass('item_vehicle_fitment') IS NOT NULL")
+            _fitment_table = bool(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+        if not _fitment_table:
+            logger.warning("⚠️ item_vehicle_fitment missing: vehicle matching falls back to item name ILIKE")
+    if not _fitment_table:
+        return None
+    loaded_at, vocabulary = _vocabulary_cache
+    if vocabulary is None or time.monotonic() - loaded_at >= VOCABULARY_TTL_SECONDS:
+        with _cache_lock:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT DISTINCT make, model FROM item_vehicle_fitment")
+                pairs = cursor.fetchall()
+            finally:
+                cursor.close()
+            vocabulary = VehicleVocabulary()
+            for make, model in pairs:
+                vocabulary.add_make(make)
+                if model:
+                    vocabulary.add_model(make, model)
+            _vocabulary_cache = (time.monotonic(), vocabulary)
+    return vocabulary
+
+
+def database_vocabulary(conn) -> VehicleVocabulary:
+    """Built-in vocabulary plus tblmasmake names and the tblmasitem.model values of live items"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT makename FROM tblmasmake")
+        makes = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT DISTINCT m.makename, i.model
+            FROM tblmasitem i
+            JOIN tblmasmake m ON m.makeid = i.makeid
+            WHERE COALESCE(i.deleted, false) = false AND COALESCE(i.model, '') <> ''
+        """)
+        models = cursor.fetchall()
+    finally:
+        cursor.close()
+    vocabulary = VehicleVocabulary()
+    vocabulary.learn(makes, models)
+    return vocabulary
+
+
+ITEMS_QUERY = """
+    SELECT i.itemcode, i.itemname, m.makename, i.model, COALESCE(i.deleted, false) AS deleted
+    FROM tblmasitem i
+    LEFT JOIN tblmasmake m ON m.makeid = i.makeid
+"""
+
+
+def refresh_fitment_table(conn, full: bool = False, chunk_size: int = 5000) -> Dict:
+    """
+    Rebuild item_vehicle_fitment for items edited since the last run (or all
+    items: on --full, on the first run and whenever the vocabulary changed).
+    Runs in one transaction, so lookups see either the old or the new mapping.
+    """
+    from psycopg2.extras import execute_values
+
+    start = time.perf_counter()
+    vocabulary = database_vocabulary(conn)
+    digest = vocabulary.digest()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT items_watermark, vocabulary_hash FROM item_vehicle_fitment_state WHERE id = 1")
+        state = cursor.fetchone()
+        cursor.execute("SELECT GREATEST((SELECT MAX(edited_date) FROM tblmasitem), (SELECT MAX(edited_date) FROM tblmasmake))")
+        watermark = cursor.fetchone()[0]
+        full = full or state is None or state[0] is None or state[1] != digest
+
+        if full:
+            cursor.execute("DELETE FROM item_vehicle_fitment")
+            cursor.execute(ITEMS_QUERY)
+        else:
+            # >= on edited_date: rows sharing the watermark timestamp are redone (idempotent)
+            cursor.execute(ITEMS_QUERY + """
+                WHERE i.edited_date >= %(since)s OR m.edited_date >= %(since)s
+            """, {"since": state[0]})
+        items = cursor.fetchall()
+
+        rows = []
+        for itemcode, itemname, makename, model, deleted in items:
+            if not deleted:
+                rows.extend((itemcode, f.make, f.model, f.year_from, f.year_to, f.source)
+                            for f in vocabulary.fitments(itemname, makename, model))
+        if not full:
+            cursor.execute("DELETE FROM item_vehicle_fitment WHERE itemcode = ANY(%s)",
+                           ([item[0] for item in items],))
+        for i in range(0, len(rows), chunk_size):
+            execute_values(cursor, """
+                INSERT INTO item_vehicle_fitment (itemcode, make, model, year_from, year_to, source)
+                VALUES %s
+            """, rows[i:i + chunk_size])
+        cursor.execute("""
+            INSERT INTO item_vehicle_fitment_state (id, items_watermark, vocabulary_hash, refreshed_at)
+            VALUES (1, %(watermark)s, %(digest)s, now())
+            ON CONFLICT (id) DO UPDATE
+            SET items_watermark = EXCLUDED.items_watermark, vocabulary_hash = EXCLUDED.vocabulary_hash,
+                refreshed_at = EXCLUDED.refreshed_at
+        """, {"watermark": watermark, "digest": digest})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    summary = {"full": full, "items": len(items), "fitments": len(rows),
+               "seconds": round(time.perf_counter() - start, 1)}
+    logger.info(f"✅ Vehicle fitments {'rebuilt' if full else 'refreshed'}: "
+                f"{summary['fitments']} fitments for {summary['items']} items in {summary['seconds']}s")
+    return summary
+
+
+def main():
+    import argparse
+    from db_utils import get_connection
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build/refresh the item -> vehicle fitment table")
+    parser.add_argument("--full", action="store_true", help="Rebuild every item instead of the edited ones")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        summary = refresh_fitment_table(conn, full=args.full)
+    finally:
+        conn.close()
+    print(f"✅ {summary['fitments']} fitments for {summary['items']} items ({'full' if summary['full'] else 'incremental'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+-- Migration: Item -> vehicle fitment index
+-- Description: Normalized make/model/year fitments parsed from tblmasitem
+--              (itemname, model) and tblmasmake by ML/vehicle_compat.py, so
+--              the ML parts search filters by vehicle with an indexed join
+--              instead of ILIKE '%model%' on every item name.
+-- Populate and refresh with: cd ML && python vehicle_compat.py [--full]
+-- The ML services detect the table at runtime and fall back to item name
+-- ILIKE matching when this migration has not been run.
+
+CREATE TABLE IF NOT EXISTS item_vehicle_fitment (
+    itemcode   bigint       NOT NULL,
+    make       varchar(100) NOT NULL,             -- normalized: lowercase alphanumerics ('maruti')
+    model      varchar(100) NOT NULL DEFAULT '',  -- normalized ('wagonr'); '' = any model of the make
+    year_from  smallint,                          -- NULL = no lower bound
+    year_to    smallint,                          -- NULL = no upper bound
+    source     varchar(10)  NOT NULL,             -- 'make' (tblmasmake), 'name' (itemname), 'model' (tblmasitem.model)
+    PRIMARY KEY (itemcode, make, model)
+);
+
+-- Items of a vehicle: make + model, make alone, or model alone
+CREATE INDEX IF NOT EXISTS idx_item_vehicle_fitment_make_model
+    ON item_vehicle_fitment (make, model, itemcode);
+
+CREATE INDEX IF NOT EXISTS idx_item_vehicle_fitment_model
+    ON item_vehicle_fitment (model, itemcode) WHERE model <> '';
+
+-- Incremental refresh bookkeeping (single row)
+CREATE TABLE IF NOT EXISTS item_vehicle_fitment_state (
+    id               smallint PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    items_watermark  timestamp without time zone,  -- max tblmasitem/tblmasmake edited_date seen
+    vocabulary_hash  varchar(64),                   -- a changed vocabulary forces a full rebuild
+    refreshed_at     timestamp without time zone NOT NULL DEFAULT now()
+);
+
+-- Incremental refresh reads items edited since the watermark
+CREATE INDEX IF NOT EXISTS idx_tblmasitem_edited_date
+    ON tblmasitem (edited_date);
+
+ANALYZE item_vehicle_fitment;
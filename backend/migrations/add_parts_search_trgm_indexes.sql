@@ -0,0 +1,31 @@
+-- Migration: Trigram indexes for parts search
+-- Description: Lets the ML parts search (ML/parts_search.py) answer
+--              ILIKE '%keyword%' and similarity() lookups on item names, part
+--              numbers, groups and brands from GIN indexes instead of
+--              sequential scans of the item master.
+-- The ML services detect pg_trgm at runtime and fall back to plain ILIKE
+-- filtering (no similarity ranking) when this migration has not been run.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Item master: name and supplier part number
+CREATE INDEX IF NOT EXISTS idx_tblmasitem_itemname_trgm
+    ON tblmasitem USING gin (itemname gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_tblmasitem_suppref_trgm
+    ON tblmasitem USING gin (suppref gin_trgm_ops);
+
+-- Lookup tables matched by name
+CREATE INDEX IF NOT EXISTS idx_tblmasgroup_groupname_trgm
+    ON tblmasgroup USING gin (groupname gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_tblmasbrand_brandname_trgm
+    ON tblmasbrand USING gin (brandname gin_trgm_ops);
+
+-- Joining matched groups back to their items
+CREATE INDEX IF NOT EXISTS idx_tblmasitem_groupid
+    ON tblmasitem (groupid);
+
+ANALYZE tblmasitem;
+ANALYZE tblmasgroup;
+ANALYZE tblmasbrand;